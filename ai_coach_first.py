@@ -2,7 +2,16 @@ import cv2
 import mediapipe as mp
 import numpy as np
 import json
+import os
+import sys
+import threading
 import time
+from collections import deque
+
+# 复用后端的姿态后端（Tasks PoseLandmarker，没有模型包时退回 legacy）
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+from app.services.ai_engine import create_pose_backend  # noqa: E402
+from app.services.overlay import OverlayRenderer  # noqa: E402
 
 # ================= 配置区域 =================
 # 1. 角度数据库路径
@@ -13,18 +22,24 @@ TARGET_ACTION = "Tree_Pose"
 
 # 3. 容忍度 (超过这个角度差就开始报错)
 THRESHOLD = 20.0
+
+# 4. 模型复杂度 (0=Lite / 1=Full / 2=Heavy，1 更快，实时性好)
+MODEL_COMPLEXITY = 1
+
+# 5. 低延迟模式：采集线程只保留最新一帧，推理线程只处理最新一帧，显示按摄像头帧率刷新并叠加最近一次的结果
+#    False 时为单循环（读取 -> 推理 -> 绘制 -> 显示），用于对比延迟
+LOW_LATENCY = True
+
+# 6. 摄像头编号，或录制好的视频文件路径（按原帧率回放）
+CAMERA_SOURCE = 0
 # ===========================================
 
 # MediaPipe 初始化
 mp_pose = mp.solutions.pose
-mp_drawing = mp.solutions.drawing_utils
-pose = mp_pose.Pose(
-    static_image_mode=False,  # 视频流模式
-    model_complexity=1,  # 1=Lite/2=Heavy (1更快，实时性好)
-    smooth_landmarks=True,
-    min_detection_confidence=0.5,
-    min_tracking_confidence=0.5
-)
+
+# 叠加层：骨架一次 polylines 绘制，文字（角度、分数、建议、延迟）缓存为精灵
+overlay = OverlayRenderer(mp_pose.POSE_CONNECTIONS, landmark_color=(255, 255, 255),
+                          connection_color=(255, 255, 255))
 
 # 关节定义 (保持和之前 extract_angles.py 一致)
 JOINTS = {
@@ -38,6 +53,9 @@ JOINTS = {
     "right_hip": [12, 24, 26],
 }
 
+# 屏幕上的延迟与帧率每隔多久刷新一次（每帧都变的数字既看不清，也会挤占文字精灵缓存）
+HUD_INTERVAL = 0.25
+
 
 def load_standard_angles():
     try:
@@ -75,131 +93,431 @@ def calculate_angle_3d(a, b, c):
     return angle
 
 
-def main():
-    standard_angles = load_standard_angles()
-    if standard_angles is None:
-        return
+def capture_time(cap, read_returned):
+    """帧的拍摄时间（time.monotonic() 时钟）
 
-    cap = cv2.VideoCapture(0)
+    V4L2 后端的 CAP_PROP_POS_MSEC 是驱动的缓冲区时间戳（CLOCK_MONOTONIC，与 time.monotonic() 同一时钟），
+    包含帧在驱动缓冲区里排队的时间，更接近真实的拍摄时刻；
+    其他后端或视频文件（返回的是播放位置）对不上时，退回 read() 返回的时间
+    """
+    stamp = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+    if 0.0 <= read_returned - stamp < 1.0:
+        return stamp
+    return read_returned
 
-    # 简单的 FPS 计数
-    p_time = 0
 
-    print("[INFO] 摄像头已启动，请站在摄像头前...")
-    print("按 'q' 退出程序")
+# ================= 角度对比与绘制 =================
+class PoseFeedback:
+    """一帧的对比结果：joints 为 [(关节名, 归一化 2D 坐标, 实时角度, 是否超差)]"""
+
+    __slots__ = ("joints", "score", "messages")
+
+    def __init__(self, joints, score, messages):
+        self.joints = joints
+        self.score = score
+        self.messages = messages
+
+
+def evaluate_pose(results, standard_angles):
+    """与标准角度对比，没有检测到人体时返回 None"""
+    if not results.pose_world_landmarks:
+        return None
+    landmarks = results.pose_world_landmarks.landmark
+    # 用于在屏幕上显示角度文字的 2D 坐标
+    landmarks_2d = results.pose_landmarks.landmark
 
-    while cap.isOpened():
-        success, image = cap.read()
-        if not success:
-            break
-
-        # 镜像翻转，像照镜子一样
-        image = cv2.flip(image, 1)
-        h, w, _ = image.shape
-
-        # 转 RGB
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        image.flags.writeable = False
-        results = pose.process(image_rgb)
-        image.flags.writeable = True
-
-        # 转回 BGR 用于显示
-        image = cv2.cvtColor(image_rgb, cv2.COLOR_RGB2BGR)
-
-        # 核心逻辑
-        if results.pose_world_landmarks:
-            landmarks = results.pose_world_landmarks.landmark
-
-            # 用于绘制骨架的 2D 坐标 (用于画图)
-            landmarks_2d = results.pose_landmarks.landmark
-
-            error_messages = []
-            total_score = 100
-
-            # 遍历每一个关键关节进行检查
-            for joint_name, (idx1, idx2, idx3) in JOINTS.items():
-                # 计算用户的实时角度
-                user_angle = calculate_angle_3d(
-                    landmarks[idx1], landmarks[idx2], landmarks[idx3]
-                )
-
-                # 获取标准角度
-                std_angle = standard_angles.get(joint_name, -1)
-
-                if std_angle == -1: continue  # 如果标准库里没有这个数据，跳过
-
-                # 计算偏差
-                diff = abs(user_angle - std_angle)
-
-                # 获取 2D 坐标用于在屏幕上显示角度文字
-                # 关节中心点
-                cx, cy = int(landmarks_2d[idx2].x * w), int(landmarks_2d[idx2].y * h)
-
-                # 判定颜色
-                color = (0, 255, 0)  # 绿色 (Good)
-                if diff > THRESHOLD:
-                    color = (0, 0, 255)  # 红色 (Bad)
-                    total_score -= 10  # 扣分
-
-                    # 生成指导意见
-                    if user_angle < std_angle:
-                        msg = f"Extend {joint_name}!"  # 需要伸展
-                    else:
-                        msg = f"Bend {joint_name}!"  # 需要弯曲
-                    error_messages.append(msg)
-
-                # 在关节旁边显示实时角度
-                cv2.putText(image, str(int(user_angle)), (cx, cy),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-
-                # 可视化圆圈
-                cv2.circle(image, (cx, cy), 8, color, -1)
-
-            # --- 绘制 UI ---
-            # 1. 绘制基本骨架
-            mp_drawing.draw_landmarks(
-                image,
-                results.pose_landmarks,
-                mp_pose.POSE_CONNECTIONS,
-                mp_drawing.DrawingSpec(color=(255, 255, 255), thickness=2, circle_radius=2),
-                mp_drawing.DrawingSpec(color=(255, 255, 255), thickness=2, circle_radius=2)
-            )
-
-            # 2. 显示总分
-            score_color = (0, 255, 0)
-            if total_score < 80: score_color = (0, 255, 255)  # 黄
-            if total_score < 60: score_color = (0, 0, 255)  # 红
-
-            cv2.rectangle(image, (0, 0), (250, 150), (0, 0, 0), -1)  # 背景黑框
-            cv2.putText(image, f"Score: {max(0, total_score)}", (10, 40),
-                        cv2.FONT_HERSHEY_SIMPLEX, 1, score_color, 2)
-
-            # 3. 显示指导建议 (只显示前 2 条，避免刷屏)
-            y_offset = 80
-            if not error_messages:
-                cv2.putText(image, "Perfect!", (10, y_offset),
-                            cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+    joints = []
+    error_messages = []
+    total_score = 100
+
+    # 遍历每一个关键关节进行检查
+    for joint_name, (idx1, idx2, idx3) in JOINTS.items():
+        # 计算用户的实时角度
+        user_angle = calculate_angle_3d(landmarks[idx1], landmarks[idx2], landmarks[idx3])
+
+        # 获取标准角度
+        std_angle = standard_angles.get(joint_name, -1)
+
+        if std_angle == -1: continue  # 如果标准库里没有这个数据，跳过
+
+        # 计算偏差
+        diff = abs(user_angle - std_angle)
+        bad = diff > THRESHOLD
+        if bad:
+            total_score -= 10  # 扣分
+
+            # 生成指导意见
+            if user_angle < std_angle:
+                msg = f"Extend {joint_name}!"  # 需要伸展
             else:
-                for msg in error_messages[:2]:
-                    cv2.putText(image, msg, (10, y_offset),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
-                    y_offset += 30
+                msg = f"Bend {joint_name}!"  # 需要弯曲
+            error_messages.append(msg)
+
+        # 关节中心点
+        joints.append((joint_name, (landmarks_2d[idx2].x, landmarks_2d[idx2].y), user_angle, bad))
+
+    return PoseFeedback(joints, max(0, total_score), error_messages)
+
+
+def draw_feedback(image, results, feedback):
+    h, w, _ = image.shape
+    for _, (x, y), user_angle, bad in feedback.joints:
+        cx, cy = int(x * w), int(y * h)
+        # 判定颜色：绿色 (Good) / 红色 (Bad)
+        color = (0, 0, 255) if bad else (0, 255, 0)
+
+        # 在关节旁边显示实时角度
+        overlay.text(image, str(int(user_angle)), (cx, cy), 0.5, color, 2)
+
+        # 可视化圆圈
+        cv2.circle(image, (cx, cy), 8, color, -1)
+
+    # --- 绘制 UI ---
+    # 1. 绘制基本骨架
+    overlay.skeleton(image, results.pose_landmarks)
+
+    # 2. 显示总分
+    score_color = (0, 255, 0)
+    if feedback.score < 80: score_color = (0, 255, 255)  # 黄
+    if feedback.score < 60: score_color = (0, 0, 255)  # 红
+
+    cv2.rectangle(image, (0, 0), (250, 150), (0, 0, 0), -1)  # 背景黑框
+    overlay.text(image, f"Score: {feedback.score}", (10, 40), 1, score_color, 2)
+
+    # 3. 显示指导建议 (只显示前 2 条，避免刷屏)
+    y_offset = 80
+    if not feedback.messages:
+        overlay.text(image, "Perfect!", (10, y_offset), 1, (0, 255, 0), 2)
+    else:
+        for msg in feedback.messages[:2]:
+            overlay.text(image, msg, (10, y_offset), 0.6, (0, 0, 255), 2)
+            y_offset += 30
+
+
+# ================= 延迟与帧率统计 =================
+class RateMeter:
+    """最近 window 秒内的事件频率"""
+
+    def __init__(self, window=2.0):
+        self.window = window
+        self._times = deque()
+
+    def tick(self, now):
+        self._times.append(now)
+        while self._times and now - self._times[0] > self.window:
+            self._times.popleft()
+
+    def rate(self):
+        if len(self._times) < 2 or self._times[-1] == self._times[0]:
+            return 0.0
+        return (len(self._times) - 1) / (self._times[-1] - self._times[0])
+
+
+class LatencyStats:
+    """拍摄 -> 反馈上屏的延迟（每个推理结果第一次显示时记录一次）与各环节的帧率
+
+    延迟从帧的拍摄时间（见 capture_time）算到 imshow + waitKey 返回；
+    之后显示器刷新的最多一帧时间软件无法测量，不在其中
+    """
+
+    def __init__(self, window=300):
+        self.latencies = deque(maxlen=window)
+        self.inference = deque(maxlen=window)
+        self.all_latencies = []
+        self.camera = RateMeter()
+        self.pose = RateMeter()
+        self.display = RateMeter()
+        self.skipped = 0  # 推理忙时被跳过的帧
+
+    def record(self, captured_at, displayed_at, inference_seconds):
+        latency = displayed_at - captured_at
+        self.latencies.append(latency)
+        self.all_latencies.append(latency)
+        self.inference.append(inference_seconds)
+        self.pose.tick(displayed_at)
+
+    @staticmethod
+    def percentile(values, pct):
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+    def hud_lines(self):
+        return [
+            f"Latency p50 {self.percentile(self.latencies, 50) * 1000:.0f}ms "
+            f"p95 {self.percentile(self.latencies, 95) * 1000:.0f}ms",
+            f"Infer {self.percentile(self.inference, 50) * 1000:.0f}ms  Skipped {self.skipped}",
+            f"Cam {self.camera.rate():.0f} Pose {self.pose.rate():.0f} UI {self.display.rate():.0f} fps",
+        ]
+
+    def summary(self):
+        values = self.all_latencies
+        return (f"拍摄到反馈上屏延迟 p50 {self.percentile(values, 50) * 1000:.0f}ms / "
+                f"p95 {self.percentile(values, 95) * 1000:.0f}ms / p99 {self.percentile(values, 99) * 1000:.0f}ms"
+                f"（{len(values)} 个结果），推理 p50 {self.percentile(self.inference, 50) * 1000:.0f}ms，"
+                f"跳过 {self.skipped} 帧")
+
+
+def draw_hud(image, lines):
+    h, w, _ = image.shape
+    cv2.rectangle(image, (w - 330, 0), (w, 20 + 25 * len(lines)), (0, 0, 0), -1)
+    for i, line in enumerate(lines):
+        overlay.text(image, line, (w - 320, 25 + 25 * i), 0.5, (255, 255, 255), 1)
+
+
+# ================= 低延迟模式 =================
+class FrameGrabber:
+    """采集线程：持续读取摄像头，只保留最新一帧（旧帧直接覆盖），帧不会在缓冲区里排队
+
+    推理线程与显示循环各自记住上次取到的帧序号，wait_newer() 等到有更新的帧为止
+    """
+
+    def __init__(self, cap, stats):
+        self.cap = cap
+        self.stats = stats
+        self.finished = False
+        self._cond = threading.Condition()
+        self._frame = None  # (序号, BGR 图像, 拍摄时间)
+        self._seq = 0
+        self._thread = threading.Thread(target=self._run, name="capture", daemon=True)
+        # 视频文件按原帧率回放（摄像头的 read() 本身按帧率阻塞）
+        is_file = cap.get(cv2.CAP_PROP_FRAME_COUNT) > 0
+        fps = cap.get(cv2.CAP_PROP_FPS) if is_file else 0
+        self._frame_interval = 1.0 / fps if fps > 0 else 0.0
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self.finished = True
+        self._thread.join(2.0)
+
+    def _run(self):
+        next_frame = time.monotonic()
+        while not self.finished:
+            success, image = self.cap.read()
+            now = time.monotonic()
+            if not success:
+                break
+            captured = capture_time(self.cap, now)
+            # 镜像翻转，像照镜子一样
+            image = cv2.flip(image, 1)
+            with self._cond:
+                self._seq += 1
+                self._frame = (self._seq, image, captured)
+                self._cond.notify_all()
+            self.stats.camera.tick(now)
+            if self._frame_interval:
+                next_frame += self._frame_interval
+                time.sleep(max(0.0, next_frame - time.monotonic()))
+        with self._cond:
+            self.finished = True
+            self._cond.notify_all()
+
+    def wait_newer(self, after_seq, timeout=0.5):
+        """返回比 after_seq 更新的最新一帧；超时或读取结束时返回 None"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.finished or (self._frame and self._frame[0] > after_seq), timeout)
+            if self._frame is None or self._frame[0] <= after_seq:
+                return None
+            return self._frame
+
+
+class CoachResult:
+    """推理线程的输出：对应帧的拍摄时间、推理耗时、检测结果与对比结果"""
+
+    __slots__ = ("seq", "captured_at", "inference_seconds", "results", "feedback")
+
+    def __init__(self, seq, captured_at, inference_seconds, results, feedback):
+        self.seq = seq
+        self.captured_at = captured_at
+        self.inference_seconds = inference_seconds
+        self.results = results
+        self.feedback = feedback
+
+
+class PoseWorker:
+    """推理线程：每次取最新一帧推理并做角度对比，推理期间到达的旧帧直接跳过
+
+    推理出错时记录到 error 并退出线程，显示循环看到 error 后停止（不继续显示过时的姿态）
+    """
+
+    def __init__(self, grabber, pose, standard_angles, stats):
+        self.grabber = grabber
+        self.pose = pose
+        self.standard_angles = standard_angles
+        self.stats = stats
+        self.latest = None  # 最近一次的 CoachResult（整体替换，显示循环直接读取）
+        self.error = None
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="pose", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopping = True
+        self._thread.join(2.0)
+
+    def _run(self):
+        try:
+            self._loop()
+        except Exception as e:
+            print(f"[ERROR] 推理线程出错，停止运行: {e}")
+            self.error = e
+
+    def _loop(self):
+        last_seq = 0
+        while not self._stopping and not self.grabber.finished:
+            item = self.grabber.wait_newer(last_seq)
+            if item is None:
+                continue
+            seq, image, captured = item
+            if last_seq:
+                self.stats.skipped += seq - last_seq - 1
+            last_seq = seq
+            start = time.monotonic()
+            image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            results = self.pose.detect(image_rgb, int(captured * 1000))
+            feedback = evaluate_pose(results, self.standard_angles)
+            self.latest = CoachResult(seq, captured, time.monotonic() - start, results, feedback)
+
+
+def run_low_latency(cap, standard_angles, stats):
+    # 推理线程自己只取最新帧，后端用同步的 VIDEO 模式（保留跨帧跟踪）
+    pose = create_pose_backend(MODEL_COMPLEXITY, running_mode="video")
+    print(f"[INFO] 姿态后端: {pose.name} (model_complexity={pose.model_complexity})，低延迟模式")
+    grabber = FrameGrabber(cap, stats)
+    worker = PoseWorker(grabber, pose, standard_angles, stats)
+    grabber.start()
+    worker.start()
+
+    shown_seq = 0  # 已上屏的推理结果对应的帧序号
+    frame_seq = 0
+    hud, hud_at = [], 0.0
+    try:
+        while worker.error is None:
+            item = grabber.wait_newer(frame_seq)
+            if item is None:
+                if grabber.finished:
+                    break
+                continue
+            frame_seq, image, _ = item
+            # 采集到的帧也是推理线程的输入，在副本上绘制
+            image = image.copy()
+            result = worker.latest
+            if result is not None and result.feedback is not None:
+                draw_feedback(image, result.results, result.feedback)
+            now = time.monotonic()
+            if now - hud_at >= HUD_INTERVAL:
+                hud, hud_at = stats.hud_lines(), now
+            draw_hud(image, hud)
+
+            cv2.imshow('AI Yoga Coach', image)
+            key = cv2.waitKey(1) & 0xFF
+            displayed = time.monotonic()
+            stats.display.tick(displayed)
+            if result is not None and result.seq != shown_seq:
+                shown_seq = result.seq
+                stats.record(result.captured_at, displayed, result.inference_seconds)
+            if key == ord('q'):
+                break
+    finally:
+        worker.stop()
+        grabber.stop()
+        pose.close()
+
+
+# ================= 单循环模式 =================
+def run_sequential(cap, standard_angles, stats):
+    # 视频流模式：Tasks 后端异步推理，推理忙时丢弃新帧，detect() 只提交帧，结果由回调带回
+    # 推理耗时 = 回调时间 - 该时间戳的提交时间（detect() 本身的耗时只是提交时间）
+    latest = {}
+    submitted = {}  # 时间戳(ms) -> 提交时间；被丢弃的帧没有回调，收到更新的结果时一并清掉
+    lock = threading.Lock()
+
+    def on_result(frame, timestamp_ms):
+        now = time.monotonic()
+        with lock:
+            start = submitted.pop(timestamp_ms, None)
+            for stale in [ts for ts in submitted if ts < timestamp_ms]:
+                del submitted[stale]
+            latest["result"] = (frame, timestamp_ms / 1000.0, now - start if start is not None else 0.0)
+
+    pose = create_pose_backend(MODEL_COMPLEXITY, running_mode="live_stream", result_callback=on_result)
+    print(f"[INFO] 姿态后端: {pose.name} (model_complexity={pose.model_complexity})，单循环模式")
+
+    shown_at = None
+    hud, hud_at = [], 0.0
+    try:
+        while cap.isOpened():
+            success, image = cap.read()
+            read_at = time.monotonic()
+            if not success:
+                break
+            captured = capture_time(cap, read_at)
+            stats.camera.tick(read_at)
+
+            # 镜像翻转，像照镜子一样
+            image = cv2.flip(image, 1)
+
+            # 转 RGB
+            image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            timestamp_ms = int(captured * 1000)
+            with lock:
+                submitted[timestamp_ms] = time.monotonic()
+            pose.detect(image_rgb, timestamp_ms)
+
+            # 核心逻辑（结果可能来自更早的帧，按回调带回的时间戳计算延迟）
+            with lock:
+                results, result_captured, inference_seconds = latest.get("result", (None, None, 0.0))
+            if results is not None:
+                feedback = evaluate_pose(results, standard_angles)
+                if feedback is not None:
+                    draw_feedback(image, results, feedback)
+
+            now = time.monotonic()
+            if now - hud_at >= HUD_INTERVAL:
+                hud, hud_at = stats.hud_lines(), now
+            draw_hud(image, hud)
+
+            cv2.imshow('AI Yoga Coach', image)
+            key = cv2.waitKey(1) & 0xFF
+            displayed = time.monotonic()
+            stats.display.tick(displayed)
+            if result_captured is not None and result_captured != shown_at:
+                shown_at = result_captured
+                stats.record(result_captured, displayed, inference_seconds)
+            if key == ord('q'):
+                break
+    finally:
+        pose.close()
 
-        # 计算 FPS
-        c_time = time.time()
-        fps = 1 / (c_time - p_time)
-        p_time = c_time
-        cv2.putText(image, f"FPS: {int(fps)}", (w - 100, 30),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
 
-        cv2.imshow('AI Yoga Coach', image)
+def main():
+    standard_angles = load_standard_angles()
+    if standard_angles is None:
+        return
 
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
+    cap = cv2.VideoCapture(CAMERA_SOURCE)
+    # 驱动缓冲区只留 1 帧（部分后端支持），减少排队
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
 
-    cap.release()
-    cv2.destroyAllWindows()
+    print("[INFO] 摄像头已启动，请站在摄像头前...")
+    print("按 'q' 退出程序")
+
+    stats = LatencyStats()
+    try:
+        if LOW_LATENCY:
+            run_low_latency(cap, standard_angles, stats)
+        else:
+            run_sequential(cap, standard_angles, stats)
+    finally:
+        cap.release()
+        cv2.destroyAllWindows()
+    print(f"[INFO] {stats.summary()}")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,4 @@
+# 进程启动时尽早应用 CPU 线程预算：BLAS 的线程数环境变量须在任何模块导入 numpy 之前设置
+from .core.resources import configure_process
+
+configure_process()
@@ -0,0 +1,134 @@
+# Token -> 用户身份缓存 (TTL + LRU)
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional, Set
+
+from sqlalchemy import event
+
+from .config import settings
+
+
+class CachedUser:
+    """缓存中的用户快照（与 ORM 会话解耦，可跨请求/线程安全复用）"""
+    __slots__ = ("user_id", "username", "email", "created_at")
+
+    def __init__(self, user_id: str, username: str, email: Optional[str], created_at: Optional[datetime]):
+        self.user_id = user_id
+        self.username = username
+        self.email = email
+        self.created_at = created_at
+
+    @classmethod
+    def from_orm_user(cls, user) -> "CachedUser":
+        return cls(user.user_id, user.username, user.email, user.created_at)
+
+
+class TokenUserCache:
+    """已验证 token 到用户身份的有界缓存
+
+    - 条目在 TTL 或 token 自身过期时间（取较早者）后失效
+    - 超出容量时按 LRU 淘汰
+    - 用户被修改或删除时，按 user_id 失效其所有 token
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # token -> (CachedUser, expires_at)
+        self._tokens_by_user: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, token: str) -> Optional[CachedUser]:
+        """命中返回用户快照，未命中或已过期返回 None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            user, expires_at = entry
+            if expires_at <= now:
+                self._remove(token)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return user
+
+    def put(self, token: str, user: CachedUser, token_exp: Optional[float] = None) -> None:
+        """写入缓存；token_exp 为 JWT 的 exp（Unix 时间戳）"""
+        if self.max_size <= 0:
+            return
+        expires_at = time.time() + self.ttl_seconds
+        if token_exp is not None:
+            expires_at = min(expires_at, float(token_exp))
+        with self._lock:
+            if token in self._entries:
+                self._remove(token)
+            self._entries[token] = (user, expires_at)
+            self._tokens_by_user.setdefault(user.user_id, set()).add(token)
+            while len(self._entries) > self.max_size:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate_user(self, user_id: str) -> None:
+        """失效某个用户的全部缓存 token"""
+        with self._lock:
+            tokens = self._tokens_by_user.pop(user_id, set())
+            for token in tokens:
+                self._entries.pop(token, None)
+            if tokens:
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def _remove(self, token: str) -> None:
+        """调用方需持有锁"""
+        entry = self._entries.pop(token, None)
+        if entry is None:
+            return
+        user_id = entry[0].user_id
+        tokens = self._tokens_by_user.get(user_id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[user_id]
+
+
+# 全局缓存实例
+token_cache = TokenUserCache(
+    max_size=settings.AUTH_CACHE_MAX_SIZE,
+    ttl_seconds=settings.AUTH_CACHE_TTL_SECONDS,
+)
+
+
+def register_invalidation_listeners(user_model) -> None:
+    """用户被修改或删除时自动失效缓存"""
+    def _invalidate(mapper, connection, target):
+        token_cache.invalidate_user(target.user_id)
+
+    event.listen(user_model, "after_update", _invalidate)
+    event.listen(user_model, "after_delete", _invalidate)
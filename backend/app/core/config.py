@@ -11,16 +11,136 @@ class Settings(BaseSettings):
     # 安全配置
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
     ALGORITHM: str = "HS256"
+    ADMIN_TOKEN: str = os.getenv("ADMIN_TOKEN", "")  # 管理接口令牌 (X-Admin-Token 请求头)，为空表示禁用
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7  # 7天
     
+    # 密码哈希配置
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "12"))  # bcrypt 工作因子
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", "0"))  # 0 表示本进程线程预算的一半
+    PASSWORD_HASH_MAX_PENDING: int = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))  # 超过则返回 503
+    
+    # 认证缓存配置 (token -> 用户身份)
+    AUTH_CACHE_MAX_SIZE: int = int(os.getenv("AUTH_CACHE_MAX_SIZE", "10000"))
+    AUTH_CACHE_TTL_SECONDS: float = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "300"))
+    
     # 数据库配置
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./aimovement.db")
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "5"))  # 建议与每个进程的并发线程数匹配
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # 秒，-1 表示不回收
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    SQLITE_WAL: bool = os.getenv("SQLITE_WAL", "true").lower() == "true"  # WAL + synchronous=NORMAL
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    DB_INIT_ON_STARTUP: bool = os.getenv("DB_INIT_ON_STARTUP", "true").lower() == "true"  # 导入应用时建表并补齐列与索引（serve.py 的 worker 由主进程代做）
+    
+    # 推理结果后写配置
+    RESULT_WRITE_BEHIND: bool = os.getenv("RESULT_WRITE_BEHIND", "true").lower() == "true"  # false 时同步提交
+    RESULT_BATCH_SIZE: int = int(os.getenv("RESULT_BATCH_SIZE", "50"))
+    RESULT_FLUSH_INTERVAL_MS: int = int(os.getenv("RESULT_FLUSH_INTERVAL_MS", "200"))
+    RESULT_QUEUE_MAX: int = int(os.getenv("RESULT_QUEUE_MAX", "10000"))
+    
+    # 进度汇总配置
+    PROGRESS_RECENT_WINDOW: int = int(os.getenv("PROGRESS_RECENT_WINDOW", "10"))  # 保留最近 N 次分数用于趋势
+    
+    # 分析调度配置
+    ANALYSIS_WORKERS: int = int(os.getenv("ANALYSIS_WORKERS", "1"))  # 同时运行的分析任务数
+    ANALYSIS_FRAME_STRIDE: int = int(os.getenv("ANALYSIS_FRAME_STRIDE", "1"))  # 每 N 帧做一次姿态检测
+    SCHEDULER_AGING_RATE: float = float(os.getenv("SCHEDULER_AGING_RATE", "1.0"))  # 每等待 1 秒抵消的预估秒数
+    SCHEDULER_BATCH_PENALTY_SECONDS: float = float(os.getenv("SCHEDULER_BATCH_PENALTY_SECONDS", "30"))
+    SCHEDULER_SECONDS_PER_UNIT: float = float(os.getenv("SCHEDULER_SECONDS_PER_UNIT", "0.04"))  # 每单位成本的初始预估秒数（运行中校准）
+    SCHEDULER_CALIBRATION_ALPHA: float = float(os.getenv("SCHEDULER_CALIBRATION_ALPHA", "0.2"))
+    SHUTDOWN_DRAIN_SECONDS: float = float(os.getenv("SHUTDOWN_DRAIN_SECONDS", "0"))  # 关闭时继续执行已排队任务的最长时间，0 表示直接取消
+    
+    # 分析任务队列配置（独立的 worker 进程从持久化队列领取分析任务，见 worker.py）
+    JOB_QUEUE_ENABLED: bool = os.getenv("JOB_QUEUE_ENABLED", "false").lower() == "true"  # false 时后台分析在 API 进程内执行
+    JOB_QUEUE_BACKEND: str = os.getenv("JOB_QUEUE_BACKEND", "sql")  # sql：使用 DATABASE_URL 的 analysis_jobs 表 / redis
+    JOB_QUEUE_REDIS_URL: str = os.getenv("JOB_QUEUE_REDIS_URL", "redis://localhost:6379/0")
+    JOB_QUEUE_REDIS_PREFIX: str = os.getenv("JOB_QUEUE_REDIS_PREFIX", "aimovement:jobs")
+    JOB_LEASE_SECONDS: float = float(os.getenv("JOB_LEASE_SECONDS", "60"))  # worker 心跳续期，停止续期后到期重新入队
+    JOB_MAX_ATTEMPTS: int = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))  # 含失败重试与 worker 崩溃后的重新领取
+    JOB_RETRY_DELAY_SECONDS: float = float(os.getenv("JOB_RETRY_DELAY_SECONDS", "10"))  # 失败后第 N 次重试前等待 N 倍该时间
+    JOB_POLL_INTERVAL: float = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))  # 队列为空时 worker 的轮询间隔（秒）
+    JOB_RETENTION_HOURS: float = float(os.getenv("JOB_RETENTION_HOURS", "168"))  # 已结束任务的保留时间
+    
+    # CPU 线程预算配置（多个 worker 进程共享一台机器时避免线程超额订阅）
+    THREAD_BUDGET_ENABLED: bool = os.getenv("THREAD_BUDGET_ENABLED", "true").lower() == "true"
+    CPU_WORKERS: int = int(os.getenv("CPU_WORKERS", os.getenv("WEB_CONCURRENCY", "1")))  # 共享本机 CPU 的进程数
+    THREADS_PER_WORKER: int = int(os.getenv("THREADS_PER_WORKER", "0"))  # 每个进程的线程预算，0 表示 可用核数 / CPU_WORKERS
+    CPU_AFFINITY: str = os.getenv("CPU_AFFINITY", "")  # 为空不绑核；auto 按进程槽位绑定各自的核；或显式列表如 0-3,8
+    
+    # 姿态模型后端配置
+    POSE_BACKEND: str = os.getenv("POSE_BACKEND", "auto")  # auto: 有 PoseLandmarker 模型包时用 Tasks，否则 legacy / tasks / legacy / fake
+    POSE_DELEGATE: str = os.getenv("POSE_DELEGATE", "cpu")  # Tasks 后端的推理设备：cpu / gpu
+    # POSE_BACKEND=fake 时的模拟后端（不加载模型，用于压测 API 层与 CI）
+    FAKE_POSE_LATENCY_MS: float = float(os.getenv("FAKE_POSE_LATENCY_MS", "30"))  # 每帧模拟的推理耗时
+    FAKE_POSE_JITTER_MS: float = float(os.getenv("FAKE_POSE_JITTER_MS", "0"))  # 耗时的抖动幅度（±）
+    FAKE_POSE_LANDMARKS: str = os.getenv("FAKE_POSE_LANDMARKS", "")  # manage.py record-landmarks 录制的关键点文件，为空时使用内置脚本动作
+    
+    # 推理前帧过滤配置（在缩小的灰度图上判断，远比姿态推理便宜）
+    FRAME_GATE_ENABLED: bool = os.getenv("FRAME_GATE_ENABLED", "true").lower() == "true"
+    FRAME_GATE_MOTION_THRESHOLD: float = float(os.getenv("FRAME_GATE_MOTION_THRESHOLD", "0.01"))  # 与上次推理帧相比发生变化的像素比例，低于此值视为静止
+    FRAME_GATE_BLUR_THRESHOLD: float = float(os.getenv("FRAME_GATE_BLUR_THRESHOLD", "10.0"))  # 拉普拉斯方差，低于此值视为模糊，0 表示不检查
+    FRAME_GATE_MAX_SKIP: int = int(os.getenv("FRAME_GATE_MAX_SKIP", "15"))  # 连续多少帧未推理后强制推理一次
+    FRAME_GATE_SIZE: int = int(os.getenv("FRAME_GATE_SIZE", "256"))  # 判断用缩小图的最长边
+    
+    # 质量档位配置（按延迟预算在模型复杂度 / 推理分辨率 / 帧间隔之间取舍）
+    QUALITY_ENABLED: bool = os.getenv("QUALITY_ENABLED", "true").lower() == "true"  # false 时固定使用 standard 档
+    QUALITY_MAX_TIER: str = os.getenv("QUALITY_MAX_TIER", "high")  # high / standard / reduced / low / minimal
+    QUALITY_SAFETY_FACTOR: float = float(os.getenv("QUALITY_SAFETY_FACTOR", "0.8"))  # 只用预算的这一比例，吸收预估误差
+    ANALYSIS_TARGET_SECONDS: float = float(os.getenv("ANALYSIS_TARGET_SECONDS", "60"))  # 同步分析的目标完成时间，0 表示不限
+    ANALYSIS_BATCH_TARGET_SECONDS: float = float(os.getenv("ANALYSIS_BATCH_TARGET_SECONDS", "600"))  # 后台分析的目标完成时间
+    
+    # 分析取消配置
+    ANALYSIS_MAX_SECONDS: float = float(os.getenv("ANALYSIS_MAX_SECONDS", "0"))  # 同步分析的服务端截止时间，0 表示不限
+    DISCONNECT_POLL_INTERVAL: float = float(os.getenv("DISCONNECT_POLL_INTERVAL", "0.5"))  # 检测客户端断开的轮询间隔（秒）
+    
+    # 相同分析去重配置（内容哈希 + 动作 + 分析选项）
+    SINGLEFLIGHT_ENABLED: bool = os.getenv("SINGLEFLIGHT_ENABLED", "true").lower() == "true"
+    SINGLEFLIGHT_CROSS_PROCESS: bool = os.getenv("SINGLEFLIGHT_CROSS_PROCESS", "true").lower() == "true"  # 通过数据库租约跨进程去重
+    SINGLEFLIGHT_LEASE_SECONDS: float = float(os.getenv("SINGLEFLIGHT_LEASE_SECONDS", "60"))  # 持有方心跳续期，崩溃后到期由等待方接手
+    SINGLEFLIGHT_POLL_INTERVAL: float = float(os.getenv("SINGLEFLIGHT_POLL_INTERVAL", "0.5"))
+    SINGLEFLIGHT_RESULT_TTL: float = float(os.getenv("SINGLEFLIGHT_RESULT_TTL", "60"))  # 完成后保留结果，覆盖超时重试
+    
+    # 上传配置
+    MAX_UPLOAD_SIZE_MB: int = int(os.getenv("MAX_UPLOAD_SIZE_MB", "100"))
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024  # 流式读写的块大小
+    UPLOAD_SESSION_TTL_HOURS: float = float(os.getenv("UPLOAD_SESSION_TTL_HOURS", "24"))  # 断点续传会话无进展多久后过期
+    UPLOAD_MAX_ACTIVE_SESSIONS: int = int(os.getenv("UPLOAD_MAX_ACTIVE_SESSIONS", "5"))  # 每个用户同时未完成的会话数上限，0 表示不限
+    UPLOAD_PURGE_INTERVAL_SECONDS: float = float(os.getenv("UPLOAD_PURGE_INTERVAL_SECONDS", "3600"))  # 清理过期会话的间隔，0 表示只用 manage.py
+    
+    # 媒体探测与规范化配置
+    FFPROBE_BIN: str = os.getenv("FFPROBE_BIN", "ffprobe")  # 不可用时退回 OpenCV
+    FFMPEG_BIN: str = os.getenv("FFMPEG_BIN", "ffmpeg")
+    PROBE_TIMEOUT_SECONDS: float = float(os.getenv("PROBE_TIMEOUT_SECONDS", "15"))
+    PROBE_SAMPLE_FRAMES: int = int(os.getenv("PROBE_SAMPLE_FRAMES", "60"))  # OpenCV 估计可变帧率时抽样的帧数
+    NORMALIZE_UPLOADS: bool = os.getenv("NORMALIZE_UPLOADS", "false").lower() == "true"
+    NORMALIZE_MAX_SIDE: int = int(os.getenv("NORMALIZE_MAX_SIDE", "720"))  # 规范化后的最长边（像素）
+    NORMALIZE_FPS: float = float(os.getenv("NORMALIZE_FPS", "30"))  # 规范化后的恒定帧率
+    NORMALIZE_TIMEOUT_SECONDS: float = float(os.getenv("NORMALIZE_TIMEOUT_SECONDS", "600"))
+    
+    # 指标配置
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"  # 提供 /metrics 并记录请求延迟
+    METRICS_DIR: str = os.getenv("METRICS_DIR", "")  # 多 worker 进程时的共享快照目录，为空表示只导出本进程
+    METRICS_FLUSH_INTERVAL: float = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))  # 写快照的间隔（秒）
+    
+    # 请求剖析配置
+    PROFILE_SAMPLE_RATE: float = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # 随机剖析的请求比例（0 ~ 1）
+    PROFILE_SLOW_MS: float = float(os.getenv("PROFILE_SLOW_MS", "0"))  # 超过该延迟的请求自动保存调用栈采样，0 表示关闭
+    PROFILE_INTERVAL_MS: float = float(os.getenv("PROFILE_INTERVAL_MS", "10"))  # 调用栈采样间隔
+    PROFILE_MAX_FILES: int = int(os.getenv("PROFILE_MAX_FILES", "100"))  # 保留的剖析结果数，超出时删除最旧的
     
     # 文件路径配置
     BASE_DIR: Path = Path(__file__).parent.parent.parent
-    UPLOAD_DIR: Path = BASE_DIR / "uploads"
-    OUTPUT_DIR: Path = BASE_DIR / "outputs"
+    STORAGE_DIR: Path = Path(os.getenv("STORAGE_DIR", str(BASE_DIR)))  # uploads/ 与 outputs/ 所在目录，静态文件从这里提供
+    UPLOAD_DIR: Path = STORAGE_DIR / "uploads"
+    UPLOAD_PARTIAL_DIR: Path = UPLOAD_DIR / "partial"  # 断点续传中的未完成文件
+    NORMALIZED_DIR: Path = UPLOAD_DIR / "normalized"  # 规范化后的分析输入
+    OUTPUT_DIR: Path = STORAGE_DIR / "outputs"
+    ANGLE_SERIES_DIR: Path = OUTPUT_DIR / "series"  # 逐帧角度序列
+    PROFILE_DIR: Path = OUTPUT_DIR / "profiles"  # 请求剖析结果
     DATA_DIR: Path = BASE_DIR / "data"
+    POSE_MODEL_DIR: Path = Path(os.getenv("POSE_MODEL_DIR", str(BASE_DIR / "models")))  # PoseLandmarker 模型包 (*.task)
     YOGA_ANGLES_JSON: Path = DATA_DIR / "yoga_angles.json"
     
     # CORS 配置
@@ -30,6 +150,10 @@ class Settings(BaseSettings):
     STATIC_URL: str = "/static"
     BASE_URL: str = os.getenv("BASE_URL", "http://localhost:8000")
     
+    @property
+    def MAX_UPLOAD_BYTES(self) -> int:
+        return self.MAX_UPLOAD_SIZE_MB * 1024 * 1024
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -38,6 +162,9 @@ class Settings(BaseSettings):
 settings = Settings()
 
 # 确保必要的目录存在
-settings.UPLOAD_DIR.mkdir(exist_ok=True)
-settings.OUTPUT_DIR.mkdir(exist_ok=True)
+settings.UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+settings.UPLOAD_PARTIAL_DIR.mkdir(exist_ok=True)
+settings.NORMALIZED_DIR.mkdir(exist_ok=True)
+settings.OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+settings.ANGLE_SERIES_DIR.mkdir(exist_ok=True)
 settings.DATA_DIR.mkdir(exist_ok=True)
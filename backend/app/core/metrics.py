@@ -0,0 +1,472 @@
+# 进程内指标（计数器 / 仪表 / 直方图）与 Prometheus 文本格式导出
+import bisect
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .config import settings
+
+try:
+    import fcntl
+except ImportError:  # 非 POSIX 平台：不合并已退出进程的指标文件
+    fcntl = None
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 默认直方图分桶（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+STAGE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+DB_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+# 回调指标的一个样本：(名称, 类型, 说明, {标签: 值}, 数值)
+Sample = Tuple[str, str, str, Dict[str, str], float]
+
+
+class _Value:
+    """计数器 / 仪表的一个标签组合"""
+
+    __slots__ = ("_lock", "value")
+
+    def __init__(self, lock: threading.Lock):
+        self._lock = lock
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self.value = float(value)
+
+
+class _Buckets:
+    """直方图的一个标签组合（各桶计数不累加，导出时再累加）"""
+
+    __slots__ = ("_lock", "_bounds", "counts", "sum")
+
+    def __init__(self, lock: threading.Lock, bounds: Sequence[float]):
+        self._lock = lock
+        self._bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # 最后一个为 +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self._bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], Any] = {}
+
+    def labels(self, *values) -> Any:
+        """取标签组合对应的子指标（按位置对应 labelnames，首次使用时创建）"""
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        return _Value(self._lock)
+
+    def samples(self) -> List[list]:
+        with self._lock:
+            return [[list(key), child.value] for key, child in self._children.items()]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    """多进程汇总时只累加仍在运行的进程的值"""
+
+    type = "gauge"
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.labels().dec(amount)
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _Buckets(self._lock, self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def samples(self) -> List[list]:
+        with self._lock:
+            return [[list(key), list(child.counts), child.sum] for key, child in self._children.items()]
+
+
+class MetricsRegistry:
+    """本进程的指标集合；回调指标（各服务的 stats()）在生成快照时求值"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._callbacks: List[Callable[[], Iterable[Sample]]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> Any:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_callback(self, callback: Callable[[], Iterable[Sample]]) -> None:
+        self._callbacks.append(callback)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """{名称: {type, help, labelnames, [buckets], samples}}，可 JSON 序列化"""
+        result = {}
+        for metric in list(self._metrics.values()):
+            entry = {"type": metric.type, "help": metric.documentation,
+                     "labelnames": list(metric.labelnames), "samples": metric.samples()}
+            if isinstance(metric, Histogram):
+                entry["buckets"] = list(metric.buckets)
+            result[metric.name] = entry
+        for callback in self._callbacks:
+            try:
+                samples = list(callback())
+            except Exception as e:
+                print(f"警告: 指标回调执行失败: {str(e)}")
+                continue
+            for name, metric_type, documentation, labels, value in samples:
+                entry = result.setdefault(name, {"type": metric_type, "help": documentation,
+                                                 "labelnames": list(labels), "samples": []})
+                entry["samples"].append([[str(labels[k]) for k in entry["labelnames"]], float(value)])
+        return result
+
+
+def merge_snapshots(snapshots: Iterable[Dict[str, Dict[str, Any]]], include_gauges=None) -> Dict[str, Dict[str, Any]]:
+    """按名称与标签累加多个快照；include_gauges(i) 为 False 的快照不计入仪表（进程已退出）"""
+    merged: Dict[str, Dict[str, Any]] = {}
+    for index, snapshot in enumerate(snapshots):
+        for name, entry in snapshot.items():
+            if entry["type"] == "gauge" and include_gauges is not None and not include_gauges(index):
+                continue
+            target = merged.setdefault(name, {**entry, "samples": {}})
+            if entry["type"] == "histogram" and target.get("buckets") != entry.get("buckets"):
+                continue  # 分桶改过的旧进程数据无法合并
+            for sample in entry["samples"]:
+                key = tuple(sample[0])
+                current = target["samples"].get(key)
+                if entry["type"] == "histogram":
+                    if current is None:
+                        target["samples"][key] = [list(sample[1]), sample[2]]
+                    else:
+                        current[0] = [a + b for a, b in zip(current[0], sample[1])]
+                        current[1] += sample[2]
+                else:
+                    target["samples"][key] = (current or 0.0) + sample[1]
+    # 转回快照格式
+    return {
+        name: {**entry, "samples": [
+            [list(key), *value] if entry["type"] == "histogram" else [list(key), value]
+            for key, value in entry["samples"].items()
+        ]}
+        for name, entry in merged.items()
+    }
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def render(snapshot: Dict[str, Dict[str, Any]]) -> str:
+    """快照 -> Prometheus 文本格式"""
+    lines = []
+    for name in sorted(snapshot):
+        entry = snapshot[name]
+        names = entry["labelnames"]
+        lines.append(f"# HELP {name} {entry['help']}")
+        lines.append(f"# TYPE {name} {entry['type']}")
+        for sample in sorted(entry["samples"], key=lambda s: s[0]):
+            if entry["type"] == "histogram":
+                values, counts, total = sample
+                cumulative = 0
+                for bound, count in zip(list(entry["buckets"]) + [float("inf")], counts):
+                    cumulative += count
+                    le = 'le="' + _number(bound) + '"'
+                    lines.append(f"{name}_bucket{_labels(names, values, le)} {cumulative}")
+                lines.append(f"{name}_sum{_labels(names, values)} {_number(total)}")
+                lines.append(f"{name}_count{_labels(names, values)} {cumulative}")
+            else:
+                lines.append(f"{name}{_labels(names, sample[0])} {_number(sample[1])}")
+    return "\n".join(lines) + "\n"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class MetricsExporter:
+    """多 worker 进程时经共享目录汇总指标
+
+    - 每个进程每隔 interval 秒把快照写到 directory/metrics_<pid>.json（临时文件 + 原子替换）
+    - 抓取时先写本进程的快照，再累加目录下所有进程的快照；已退出进程的仪表不计入
+    - 已退出进程的计数器与直方图合并到 metrics_exited.json 后删除其文件，
+      worker 被回收重启时文件数不会增长，计数也不会倒退
+    - directory 为空时只导出本进程的指标（单进程部署）
+    """
+
+    EXITED_FILE = "metrics_exited.json"
+
+    def __init__(self, registry: MetricsRegistry, directory: Optional[Path] = None, interval: float = 5.0):
+        self.registry = registry
+        self.directory = Path(directory) if directory else None
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ========== 生命周期 ==========
+    def start(self) -> None:
+        if self.directory is None or self.running:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="metrics-exporter", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        thread = self._thread
+        if thread is None:
+            return
+        self._stop.set()
+        thread.join(self.interval + 1)
+        self._thread = None
+        self.flush()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    # ========== 快照文件 ==========
+    def _path(self, pid: int) -> Path:
+        return self.directory / f"metrics_{pid}.json"
+
+    def flush(self) -> None:
+        """写本进程的快照"""
+        if self.directory is None:
+            return
+        path = self._path(os.getpid())
+        tmp = path.with_suffix(".tmp")
+        try:
+            tmp.write_text(json.dumps({"pid": os.getpid(), "metrics": self.registry.snapshot()}), encoding="utf-8")
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"警告: 指标快照写入失败: {str(e)}")
+
+    @staticmethod
+    def _read(path: Path) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None  # 正在被替换或已被合并
+
+    @contextmanager
+    def _locked(self, exclusive: bool):
+        """目录文件锁：合并已退出进程时独占，读取快照时共享（非 POSIX 平台不加锁）"""
+        if fcntl is None:
+            yield
+            return
+        with open(self.directory / ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+
+    def _fold_exited(self, paths: List[Path]) -> None:
+        """把已退出进程的快照合并进 metrics_exited.json（文件锁保护，多个进程同时抓取时只合并一次）"""
+        if fcntl is None:
+            return
+        with self._locked(exclusive=True):
+            exited_path = self.directory / self.EXITED_FILE
+            snapshots = [(self._read(exited_path) or {}).get("metrics", {})]
+            folded = []
+            for path in paths:
+                data = self._read(path)
+                if data is not None:
+                    snapshots.append(data["metrics"])
+                    folded.append(path)
+            if not folded:
+                return
+            merged = merge_snapshots(snapshots, include_gauges=lambda index: False)
+            tmp = exited_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps({"pid": None, "metrics": merged}), encoding="utf-8")
+            os.replace(tmp, exited_path)
+            for path in folded:
+                path.unlink(missing_ok=True)
+
+    def collect(self) -> Dict[str, Dict[str, Any]]:
+        """本进程（单进程部署）或所有进程的汇总快照"""
+        if self.directory is None:
+            return self.registry.snapshot()
+        self.flush()
+        exited = []
+        for path in self.directory.glob("metrics_*.json"):
+            pid = path.stem.split("_", 1)[1]
+            if pid.isdigit() and not _pid_alive(int(pid)):
+                exited.append(path)
+        if exited:
+            self._fold_exited(exited)
+        snapshots, live = [], []
+        # 持共享锁读取：其他进程合并时，已写入 metrics_exited.json 但尚未删除的快照不会被重复计入
+        with self._locked(exclusive=False):
+            for path in self.directory.glob("metrics_*.json"):
+                data = self._read(path)
+                if data is not None:
+                    snapshots.append(data["metrics"])
+                    live.append(data["pid"] is not None and _pid_alive(int(data["pid"])))
+        return merge_snapshots(snapshots, include_gauges=lambda index: live[index])
+
+    def render(self) -> str:
+        return render(self.collect())
+
+
+class MetricsMiddleware:
+    """按路由模板记录 HTTP 请求数与延迟（路由模板而不是实际路径，避免标签基数随 ID 增长）"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_IN_PROGRESS.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_PROGRESS.dec()
+            HTTP_REQUEST_SECONDS.labels(scope["method"], route_label(scope), status_code).observe(time.perf_counter() - start)
+
+
+def route_label(scope) -> str:
+    """FastAPI 匹配到的路由模板；挂载的静态目录用挂载路径；未匹配的请求归为 unmatched"""
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if template:
+        # 较新的 FastAPI 中 route.path 不含 include_router 的前缀：按模板段数从实际路径中取回前缀
+        # （路由模板中没有 {x:path} 这类跨段参数，段数一一对应）
+        segments = scope["path"].strip("/").split("/")
+        depth = len(template.strip("/").split("/")) if template.strip("/") else 0
+        prefix = "/".join(segments[:len(segments) - depth])
+        return f"/{prefix}{template}" if prefix else template
+    if scope.get("endpoint") is not None and scope.get("root_path"):
+        return scope["root_path"]
+    return "unmatched"
+
+
+# ========== 全局注册表与指标定义 ==========
+registry = MetricsRegistry()
+metrics_exporter = MetricsExporter(
+    registry,
+    directory=settings.METRICS_DIR or None,
+    interval=settings.METRICS_FLUSH_INTERVAL
+)
+
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "aimovement_http_request_duration_seconds", "HTTP 请求延迟（秒）", ["method", "route", "status"])
+HTTP_IN_PROGRESS = registry.gauge("aimovement_http_requests_in_progress", "正在处理的 HTTP 请求数")
+
+VIDEOS_IN_FLIGHT = registry.gauge("aimovement_videos_in_flight", "正在分析的视频数")
+VIDEO_ANALYSIS_SECONDS = registry.histogram(
+    "aimovement_video_analysis_seconds", "单个视频的分析耗时（秒）", ["outcome"])
+FRAMES = registry.counter("aimovement_frames_total", "读取并输出的帧数")
+FRAMES_INFERRED = registry.counter("aimovement_frames_inferred_total", "运行姿态模型的帧数")
+FRAMES_DETECTED = registry.counter("aimovement_frames_detected_total", "计入统计且检测到人体的帧数")
+STAGE_SECONDS = registry.histogram(
+    "aimovement_frame_stage_seconds", "每帧各阶段耗时（秒）", ["stage"], buckets=STAGE_BUCKETS)
+FRAME_GATE_DECISIONS = registry.counter(
+    "aimovement_frame_gate_decisions_total", "推理前帧过滤的决策次数", ["decision"])
+MODEL_INIT_SECONDS = registry.histogram(
+    "aimovement_pose_model_init_seconds", "姿态后端创建耗时（秒）", ["backend", "complexity"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+UPLOAD_BYTES = registry.counter("aimovement_upload_bytes_total", "接收的上传字节数", ["kind"])
+OUTPUT_BYTES = registry.counter("aimovement_output_bytes_total", "写出的分析结果字节数", ["kind"])
+DB_COMMIT_SECONDS = registry.histogram(
+    "aimovement_db_commit_seconds", "数据库提交耗时（秒，含 flush）", buckets=DB_BUCKETS)
@@ -0,0 +1,351 @@
+# 按需请求剖析（采样调用栈 + 分阶段耗时 + tracemalloc 峰值）与慢请求自动捕获
+import contextvars
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from .config import settings
+from .metrics import route_label
+
+PROFILE_HEADER = b"x-profile"
+ADMIN_HEADER = b"x-admin-token"
+MAX_STACK_DEPTH = 64
+TOP_STACKS = 200  # 写入文件的调用栈条数（按样本数排序），完整数据另存为 folded 文本
+TOP_ALLOCATIONS = 20
+
+# 当前请求的剖析会话（分析调度器会把提交时的上下文带到工作线程）
+current_profile: contextvars.ContextVar[Optional["RequestProfile"]] = contextvars.ContextVar(
+    "current_profile", default=None)
+
+
+def _frame_label(code, cache: Dict[Any, str]) -> str:
+    label = cache.get(code)
+    if label is None:
+        label = cache[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return label
+
+
+class RequestProfile:
+    """一个请求的剖析数据
+
+    reason: requested（管理令牌 + X-Profile 请求头）/ sampled（按 PROFILE_SAMPLE_RATE 抽中）/
+    slow（慢请求捕获：请求开始时并不知道会变慢，所以每个请求都采样，结束后只保存超过阈值的）
+    """
+
+    def __init__(self, method: str, path: str, reason: str, memory: bool = False):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = method
+        self.path = path
+        self.reason = reason
+        self.memory = memory
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.threads: Dict[int, str] = {threading.get_ident(): threading.current_thread().name}
+        self.thread_names = set(self.threads.values())  # 采样过的所有线程（工作线程结束后仍保留）
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.stages: Dict[str, Any] = {}
+        self.marks: Dict[str, float] = {}
+        self.notes: Dict[str, Any] = {}
+        self.memory_stats: Optional[Dict[str, Any]] = None
+
+    @contextmanager
+    def attach(self) -> Iterator["RequestProfile"]:
+        """在当前线程执行的代码也计入本请求的采样（如分析调度器的工作线程）"""
+        ident = threading.get_ident()
+        added = ident not in self.threads
+        self.threads[ident] = threading.current_thread().name
+        self.thread_names.add(self.threads[ident])
+        try:
+            yield self
+        finally:
+            if added:
+                self.threads.pop(ident, None)
+
+    def add_stages(self, name: str, stages: Dict[str, Any]) -> None:
+        self.stages[name] = stages
+
+    def mark(self, name: str) -> None:
+        """记录从请求开始到现在的毫秒数（如 upload_saved / probed / analyzed），相邻两点之差即各阶段耗时"""
+        self.marks[name] = round((time.perf_counter() - self.started) * 1000, 2)
+
+    def note(self, key: str, value: Any) -> None:
+        self.notes[key] = value
+
+    def as_dict(self, route: str, status: int, duration: float, interval: float) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "reason": self.reason,
+            "method": self.method,
+            "path": self.path,
+            "route": route,
+            "status": status,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started_at)),
+            "duration_ms": round(duration * 1000, 2),
+            "sample_interval_ms": round(interval * 1000, 3),
+            "samples": self.samples,
+            "threads": sorted(self.thread_names),
+            "marks_ms": self.marks,
+            "stages": self.stages,
+            "notes": self.notes,
+            "memory": self.memory_stats,
+            "stacks": [{"stack": stack, "count": count} for stack, count in self.stacks.most_common(TOP_STACKS)],
+        }
+
+
+class StackSampler:
+    """后台线程定时读取 sys._current_frames()，把各会话所关注线程的调用栈按 folded 格式累计
+
+    墙钟采样：等待 I/O、锁或事件循环空转的时间同样计入。事件循环线程由同时进行的所有请求共享，
+    其样本会计入每个关注它的会话；分析工作线程只属于提交该任务的请求
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self._sessions: List[RequestProfile] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._labels: Dict[Any, str] = {}
+
+    def add(self, profile: RequestProfile) -> None:
+        with self._lock:
+            self._sessions.append(profile)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+
+    def remove(self, profile: RequestProfile) -> None:
+        with self._lock:
+            if profile in self._sessions:
+                self._sessions.remove(profile)
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while True:
+            with self._lock:
+                if not self._sessions:
+                    self._thread = None
+                    return
+                sessions = list(self._sessions)
+            frames = sys._current_frames()
+            folded: Dict[int, str] = {}
+            for session in sessions:
+                for ident in list(session.threads):
+                    if ident == own:
+                        continue
+                    stack = folded.get(ident)
+                    if stack is None:
+                        frame = frames.get(ident)
+                        if frame is None:
+                            continue
+                        stack = folded[ident] = self._fold(frame)
+                    session.stacks[stack] += 1
+                session.samples += 1
+            del frames
+            time.sleep(self.interval)
+
+    def _fold(self, frame) -> str:
+        parts = []
+        while frame is not None and len(parts) < MAX_STACK_DEPTH:
+            parts.append(_frame_label(frame.f_code, self._labels))
+            frame = frame.f_back
+        return ";".join(reversed(parts))
+
+
+class MemoryTracer:
+    """tracemalloc 开销较大（分配密集的代码慢数倍），只在显式剖析时开启，同一时刻只服务一个请求"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._owner: Optional[RequestProfile] = None
+        self._started_tracing = False
+
+    def start(self, profile: RequestProfile) -> bool:
+        with self._lock:
+            if self._owner is not None:
+                return False
+            self._owner = profile
+            self._started_tracing = not tracemalloc.is_tracing()
+            if self._started_tracing:
+                tracemalloc.start(10)
+            tracemalloc.reset_peak()
+            return True
+
+    def stop(self, profile: RequestProfile) -> None:
+        with self._lock:
+            if self._owner is not profile:
+                return
+            current, peak = tracemalloc.get_traced_memory()
+            top = tracemalloc.take_snapshot().statistics("lineno")[:TOP_ALLOCATIONS]
+            profile.memory_stats = {
+                "peak_bytes": peak,
+                "current_bytes": current,
+                "top_allocations": [
+                    {"location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                     "bytes": stat.size, "count": stat.count}
+                    for stat in top
+                ],
+            }
+            if self._started_tracing:
+                tracemalloc.stop()
+            self._owner = None
+
+
+class ProfileStore:
+    """剖析结果文件：<目录>/<时间>_<原因>_<id>.json，另存 .folded（可直接用 flamegraph.pl / speedscope 打开）"""
+
+    def __init__(self, directory: Path, max_files: int = 100):
+        self.directory = Path(directory)
+        self.max_files = max_files
+
+    def save(self, data: Dict[str, Any], stacks: Counter) -> str:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}_{data['reason']}_{data['id']}"
+        (self.directory / f"{name}.folded").write_text(
+            "".join(f"{stack} {count}\n" for stack, count in stacks.most_common()), encoding="utf-8")
+        (self.directory / f"{name}.json").write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+        self._prune()
+        return name
+
+    def _prune(self) -> None:
+        files = sorted(self.directory.glob("*.json"))
+        for path in files[:max(0, len(files) - self.max_files)]:
+            path.unlink(missing_ok=True)
+            path.with_suffix(".folded").unlink(missing_ok=True)
+
+    def list(self) -> List[Dict[str, Any]]:
+        """最新的在前；只读取文件头部需要的字段"""
+        items = []
+        for path in sorted(self.directory.glob("*.json"), reverse=True):
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            items.append({
+                "name": path.stem,
+                **{key: data.get(key) for key in ("id", "reason", "method", "path", "route", "status",
+                                                  "started_at", "duration_ms", "samples")},
+                "memory_peak_bytes": (data.get("memory") or {}).get("peak_bytes"),
+                "size": path.stat().st_size,
+            })
+        return items
+
+    def path(self, name: str, suffix: str = ".json") -> Optional[Path]:
+        """按名称取文件；名称只能是 save() 生成的格式（防止路径穿越）"""
+        if not name or "/" in name or "\\" in name or name.startswith("."):
+            return None
+        path = self.directory / f"{name}{suffix}"
+        return path if path.is_file() else None
+
+
+def _admin_token_valid(value: Optional[bytes]) -> bool:
+    if not settings.ADMIN_TOKEN or not value:
+        return False
+    return hmac.compare_digest(value.decode("latin-1"), settings.ADMIN_TOKEN)
+
+
+class ProfilingMiddleware:
+    """为请求创建剖析会话并在结束后按需保存
+
+    - 显式剖析：X-Profile: 1 且 X-Admin-Token 有效，采样 + tracemalloc，响应头带 X-Profile-Id
+    - 抽样剖析：按 PROFILE_SAMPLE_RATE 随机抽取，同显式剖析
+    - 慢请求捕获：PROFILE_SLOW_MS > 0 时每个请求都采样调用栈（不开 tracemalloc），超过阈值才保存
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def _reason(self, scope) -> Optional[str]:
+        headers = dict(scope.get("headers", []))
+        if headers.get(PROFILE_HEADER, b"").strip() in (b"1", b"true") and _admin_token_valid(headers.get(ADMIN_HEADER)):
+            return "requested"
+        if settings.PROFILE_SAMPLE_RATE > 0 and random.random() < settings.PROFILE_SAMPLE_RATE:
+            return "sampled"
+        if settings.PROFILE_SLOW_MS > 0:
+            return "slow"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        reason = self._reason(scope)
+        if reason is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"], reason, memory=reason != "slow")
+        status_code = 500
+
+        async def send_with_profile_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if profile.reason != "slow":
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [(b"x-profile-id", profile.id.encode())]
+            await send(message)
+
+        if profile.memory and not memory_tracer.start(profile):
+            profile.note("memory", "另一个请求正在使用 tracemalloc，本次未记录内存")
+        token = current_profile.set(profile)
+        sampler.add(profile)
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            sampler.remove(profile)
+            current_profile.reset(token)
+            duration = time.perf_counter() - profile.started
+            # 慢请求捕获模式下未超过阈值的请求（不开 tracemalloc）直接结束，不额外切换线程
+            if reason != "slow" or duration * 1000 >= settings.PROFILE_SLOW_MS:
+                # tracemalloc 快照与写文件都可能耗时数十毫秒，放到线程池，不阻塞事件循环上的其他请求
+                await run_in_threadpool(self._finish, profile, route_label(scope), status_code, duration)
+
+    @staticmethod
+    def _finish(profile: "RequestProfile", route: str, status_code: int, duration: float) -> None:
+        memory_tracer.stop(profile)
+        data = profile.as_dict(route, status_code, duration, sampler.interval)
+        try:
+            profile_store.save(data, profile.stacks)
+        except OSError as e:
+            print(f"警告: 剖析结果保存失败: {str(e)}")
+
+
+def active_profile() -> Optional[RequestProfile]:
+    return current_profile.get()
+
+
+def mark(name: str) -> None:
+    """当前请求被剖析时记录时间点，否则什么也不做"""
+    profile = current_profile.get()
+    if profile is not None:
+        profile.mark(name)
+
+
+@contextmanager
+def attach_current_thread() -> Iterator[Optional[RequestProfile]]:
+    """当前上下文有剖析会话时，把当前线程加入采样；没有时什么也不做"""
+    profile = current_profile.get()
+    if profile is None:
+        yield None
+        return
+    with profile.attach():
+        yield profile
+
+
+# 全局实例
+sampler = StackSampler(interval=settings.PROFILE_INTERVAL_MS / 1000.0)
+memory_tracer = MemoryTracer()
+profile_store = ProfileStore(settings.PROFILE_DIR, max_files=settings.PROFILE_MAX_FILES)
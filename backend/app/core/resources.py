@@ -0,0 +1,180 @@
+# CPU 线程预算：多个 worker 进程共享一台机器时，限制每个进程的 OpenCV / BLAS 线程数并可选绑核
+import os
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .config import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows：不支持自动分配槽位
+    fcntl = None
+
+# BLAS / OpenMP 实现读取的线程数环境变量（须在导入 numpy 之前设置，之后只能通过 threadpoolctl 调整）
+BLAS_THREAD_ENV = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "VECLIB_MAXIMUM_THREADS",
+                   "NUMEXPR_NUM_THREADS", "BLIS_NUM_THREADS")
+CGROUP_CPU_MAX = Path("/sys/fs/cgroup/cpu.max")
+SLOT_DIR = Path(tempfile.gettempdir()) / "aimovement-cpu-slots"
+
+
+def parse_cpu_list(text: str) -> List[int]:
+    """"0-3,8" -> [0, 1, 2, 3, 8]"""
+    cpus = set()
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        start, _, end = part.partition("-")
+        cpus.update(range(int(start), int(end or start) + 1))
+    return sorted(cpus)
+
+
+def available_cpus() -> List[int]:
+    """本进程可用的 CPU（继承的亲和性）"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def cgroup_cpu_limit() -> Optional[float]:
+    """容器的 CPU 配额（cgroup v2 cpu.max，如 "200000 100000" 即 2 核），没有限制时为 None"""
+    try:
+        quota, period = CGROUP_CPU_MAX.read_text().split()[:2]
+    except (OSError, ValueError):
+        return None
+    if quota == "max":
+        return None
+    return int(quota) / int(period)
+
+
+class ThreadBudget:
+    """本进程的线程预算：threads 为 OpenCV / BLAS 的线程数，cpus 为绑定的核（None 表示不绑核）"""
+
+    def __init__(self, workers: int, threads: int, cpus: Optional[List[int]] = None, slot: Optional[int] = None):
+        self.workers = workers
+        self.threads = threads
+        self.cpus = cpus
+        self.slot = slot
+        self.applied: Dict[str, Any] = {}
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"workers": self.workers, "threads": self.threads, "cpus": self.cpus, "slot": self.slot,
+                "applied": self.applied}
+
+
+def compute_budget(cpus: List[int], workers: int, threads_per_worker: int = 0, affinity: str = "",
+                   slot: Optional[int] = None, cpu_limit: Optional[float] = None) -> ThreadBudget:
+    """按可用核数与进程数分配线程预算
+
+    - threads_per_worker 为 0 时取 可用核数 / workers（至少 1），可用核数同时受容器配额限制
+    - affinity 为 auto 时第 slot 个进程绑定 cpus 中连续的 threads 个核（超出时回绕），
+      为显式列表时绑定该列表，为空时不绑核
+    """
+    workers = max(1, workers)
+    if affinity and affinity != "auto":
+        cpus = parse_cpu_list(affinity)
+    usable = len(cpus)
+    if cpu_limit:
+        usable = min(usable, max(1, int(cpu_limit)))
+    threads = threads_per_worker or max(1, usable // workers)
+    bound = None
+    if affinity == "auto" and slot is not None:
+        start = (slot * threads) % len(cpus)
+        bound = sorted({cpus[(start + i) % len(cpus)] for i in range(min(threads, len(cpus)))})
+    elif affinity:
+        bound = cpus
+    return ThreadBudget(workers, threads, bound, slot)
+
+
+_slot_handle = None  # 持有槽位文件锁的文件对象（进程存活期间保持打开）
+
+
+def claim_slot(workers: int) -> Optional[int]:
+    """取本进程的槽位号：WORKER_INDEX 环境变量（启动器设置）优先，否则用文件锁在 0..workers-1 中占一个
+
+    锁随进程退出自动释放，worker 重启后可以拿回同一个槽位；全部被占时返回 None（不绑核）
+    """
+    global _slot_handle
+    if os.getenv("WORKER_INDEX", "").isdigit():
+        return int(os.environ["WORKER_INDEX"]) % max(1, workers)
+    if fcntl is None:
+        return None
+    SLOT_DIR.mkdir(parents=True, exist_ok=True)
+    for slot in range(max(1, workers)):
+        handle = open(SLOT_DIR / f"slot-{slot}.lock", "w")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            continue
+        _slot_handle = handle
+        return slot
+    return None
+
+
+def apply_thread_budget(budget: ThreadBudget) -> ThreadBudget:
+    """设置 BLAS 环境变量、OpenCV 线程数、threadpoolctl（已导入 numpy 且已安装时）与 CPU 亲和性
+
+    显式设置过的 BLAS 环境变量保持不变。MediaPipe 的 Python API 不提供推理线程数的设置，
+    它的线程池按机器核数创建，只能通过绑核限制在预算内运行
+    """
+    applied = {}
+    for name in BLAS_THREAD_ENV:
+        os.environ.setdefault(name, str(budget.threads))
+    applied["blas_env"] = {name: os.environ[name] for name in BLAS_THREAD_ENV}
+    if "numpy" in sys.modules:
+        # numpy 已加载时环境变量不再生效，需要 threadpoolctl 在运行时调整
+        try:
+            from threadpoolctl import threadpool_limits
+            threadpool_limits(limits=budget.threads)
+            applied["threadpoolctl"] = True
+        except ImportError:
+            applied["threadpoolctl"] = False
+    import cv2
+    cv2.setNumThreads(budget.threads)
+    applied["opencv_threads"] = cv2.getNumThreads()
+    if budget.cpus is not None and hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, budget.cpus)
+            applied["affinity"] = sorted(os.sched_getaffinity(0))
+        except OSError as e:
+            print(f"警告: 无法绑定 CPU {budget.cpus}: {str(e)}")
+    budget.applied = applied
+    return budget
+
+
+def configure_process(worker_index: Optional[int] = None) -> Optional[ThreadBudget]:
+    """按配置计算并应用本进程的线程预算（重复调用只生效一次）
+
+    worker_index 给定时（启动器 fork 出的 worker）按该槽位重新应用，
+    可用核按首次应用前继承的亲和性计算（主进程自己可能已经绑核）
+    """
+    global thread_budget, _inherited_cpus
+    if not settings.THREAD_BUDGET_ENABLED or (thread_budget is not None and worker_index is None):
+        return thread_budget
+    if _inherited_cpus is None:
+        _inherited_cpus = available_cpus()
+    affinity = settings.CPU_AFFINITY.strip()
+    if worker_index is not None:
+        os.environ["WORKER_INDEX"] = str(worker_index)
+        slot = worker_index % max(1, settings.CPU_WORKERS)
+    else:
+        slot = claim_slot(settings.CPU_WORKERS) if affinity == "auto" else None
+    budget = compute_budget(list(_inherited_cpus), settings.CPU_WORKERS, settings.THREADS_PER_WORKER,
+                            affinity, slot, cgroup_cpu_limit())
+    thread_budget = apply_thread_budget(budget)
+    return thread_budget
+
+
+def budget_threads() -> int:
+    """本进程的线程预算（未启用预算时为可用核数），用于各线程池的默认大小"""
+    if thread_budget is not None:
+        return thread_budget.threads
+    return len(available_cpus())
+
+
+# 本进程已应用的预算（configure_process() 之后）
+thread_budget: Optional[ThreadBudget] = None
+_inherited_cpus: Optional[List[int]] = None
@@ -1,21 +1,111 @@
 # JWT 和密码加密
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status
 from .config import settings
+from .resources import budget_threads
 
 # 密码加密上下文
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt__rounds 为工作因子，调整后旧哈希会在下次登录时自动重新计算
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """验证密码"""
-    return pwd_context.verify(plain_password, hashed_password)
+class PasswordHasher:
+    """专用的密码哈希线程池
 
-def get_password_hash(password: str) -> str:
-    """生成密码哈希"""
-    return pwd_context.hash(password)
+    bcrypt 计算是 CPU 密集型操作，放在 FastAPI 共享线程池中会在登录高峰时
+    挤占其他同步接口。这里使用独立的、有界的线程池，并统计排队情况；
+    排队数超过上限时直接返回 503，避免请求无限堆积。
+    """
+
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pwd-hash")
+        self._lock = threading.Lock()
+        self.pending = 0  # 已提交但未完成（排队 + 执行中）
+        self.active = 0  # 执行中
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.total_wait_seconds = 0.0
+        self.total_run_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    async def hash(self, password: str) -> str:
+        """在线程池中生成密码哈希"""
+        return await self._run(pwd_context.hash, password)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """在线程池中验证密码；若工作因子已变更，同时返回新的哈希"""
+        verified, new_hash = await self._run(pwd_context.verify_and_update, plain_password, hashed_password)
+        if verified and new_hash:
+            with self._lock:
+                self.rehashed += 1
+        return verified, new_hash
+
+    async def _run(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="服务繁忙，请稍后重试",
+                    headers={"Retry-After": "1"},
+                )
+            self.pending += 1
+        submitted_at = time.perf_counter()
+
+        def task():
+            started_at = time.perf_counter()
+            with self._lock:
+                self.active += 1
+                wait = started_at - submitted_at
+                self.total_wait_seconds += wait
+                self.max_wait_seconds = max(self.max_wait_seconds, wait)
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self.active -= 1
+                    self.total_run_seconds += time.perf_counter() - started_at
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, task)
+        finally:
+            with self._lock:
+                self.pending -= 1
+                self.completed += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "pending": self.pending,
+                "active": self.active,
+                "queued": self.pending - self.active,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "rehashed": self.rehashed,
+                "avg_wait_ms": round(self.total_wait_seconds / self.completed * 1000, 2) if self.completed else 0.0,
+                "max_wait_ms": round(self.max_wait_seconds * 1000, 2),
+                "avg_run_ms": round(self.total_run_seconds / self.completed * 1000, 2) if self.completed else 0.0,
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+
+# 全局密码哈希线程池
+password_hasher = PasswordHasher(
+    max_workers=settings.PASSWORD_HASH_WORKERS or max(1, budget_threads() // 2),
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """创建 JWT token"""
@@ -0,0 +1,62 @@
+# 分阶段计时（基准测试与性能分析用）
+import time
+from typing import Any, Dict, Optional
+
+
+class StageTimer:
+    """按阶段累计耗时：每次 lap(stage) 把距上一次 lap 的时间记到该阶段
+
+    只在两次调用之间取一次时间戳，开销远小于被测的帧处理；
+    不计时的调用方传入 NULL_TIMER，避免在热路径上判断 None。
+    给定 histogram（以阶段为唯一标签的直方图，如 metrics.STAGE_SECONDS）时，每次 lap 的耗时同时记入直方图
+    """
+
+    def __init__(self, histogram: Optional[Any] = None):
+        self.seconds: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self._histogram = histogram
+        self._observers: Dict[str, Any] = {}
+        self._last = time.perf_counter()
+
+    def reset(self) -> None:
+        """从现在开始计时（丢弃上一次 lap 之后的时间）"""
+        self._last = time.perf_counter()
+
+    def lap(self, stage: str) -> None:
+        now = time.perf_counter()
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + (now - self._last)
+        self.counts[stage] = self.counts.get(stage, 0) + 1
+        if self._histogram is not None:
+            observer = self._observers.get(stage)
+            if observer is None:
+                observer = self._observers[stage] = self._histogram.labels(stage)
+            observer.observe(now - self._last)
+        self._last = now
+
+    @property
+    def total(self) -> float:
+        return sum(self.seconds.values())
+
+    def as_dict(self, per: int = 0) -> Dict[str, Dict[str, float]]:
+        """各阶段的总耗时（毫秒）与占比；per > 0 时附带每单位（如每帧）的耗时"""
+        total = self.total or 1.0
+        result = {}
+        for stage, seconds in self.seconds.items():
+            entry = {"total_ms": round(seconds * 1000, 3), "share": round(seconds / total, 4)}
+            if per:
+                entry["per_frame_ms"] = round(seconds * 1000 / per, 4)
+            result[stage] = entry
+        return result
+
+
+class _NullTimer:
+    """不计时"""
+
+    def reset(self) -> None:
+        pass
+
+    def lap(self, stage: str) -> None:
+        pass
+
+
+NULL_TIMER = _NullTimer()
@@ -1,24 +1,149 @@
 # 数据库连接
-from sqlalchemy import create_engine
+from sqlalchemy import MetaData, Table, create_engine, event, inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.ext.declarative import declarative_base
 import os
+import time
+
+from .core.config import settings
+from .core.metrics import DB_COMMIT_SECONDS
 
 # 数据库 URL (SQLite 作为默认数据库，生产环境可改为 PostgreSQL/MySQL)
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./aimovement.db")
 
+def _is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+def _is_sqlite_memory(url: str) -> bool:
+    return _is_sqlite(url) and (":memory:" in url or url.rstrip("/") == "sqlite:")
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """SQLite 连接初始化：WAL 允许读写并发，busy_timeout 让写入排队而不是立即报 locked"""
+    cursor = dbapi_connection.cursor()
+    try:
+        if settings.SQLITE_WAL:
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    finally:
+        cursor.close()
+
+def _pool_options(url: str) -> dict:
+    """连接池参数（内存 SQLite 使用单连接池，不支持这些参数）"""
+    if _is_sqlite_memory(url):
+        return {}
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+def create_db_engine(url: str) -> Engine:
+    """按配置创建同步数据库引擎"""
+    connect_args = {}
+    if _is_sqlite(url):
+        connect_args = {
+            "check_same_thread": False,
+            "timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000.0,
+        }
+    db_engine = create_engine(url, connect_args=connect_args, **_pool_options(url))
+    if _is_sqlite(url):
+        event.listen(db_engine, "connect", _set_sqlite_pragmas)
+    return db_engine
+
 # 创建数据库引擎
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
-)
+engine = create_db_engine(DATABASE_URL)
+
+class TimedSession(Session):
+    """记录每次提交的耗时（含 flush），见 /metrics 的 aimovement_db_commit_seconds"""
+
+    def commit(self) -> None:
+        start = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            DB_COMMIT_SECONDS.observe(time.perf_counter() - start)
 
 # 创建会话工厂
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=TimedSession)
 
 # 声明基类
 Base = declarative_base()
 
+# ========== 表结构初始化 ==========
+# 先检查再执行的 DDL 不是原子的：多个进程同时启动时，另一个进程可能已经完成了同样的修改，
+# 此时报错（表 / 索引 / 列已存在，索引不存在）可以忽略
+def _apply_ddl(apply, applied) -> None:
+    """执行一条 DDL；失败时若 applied() 表明目标状态已由其他进程达成则忽略"""
+    try:
+        apply()
+    except DBAPIError:
+        if not applied():
+            raise
+
+def _index_names(bind: Engine, table_name: str) -> set:
+    return {index["name"] for index in inspect(bind).get_indexes(table_name)}
+
+def _column_names(bind: Engine, table_name: str) -> set:
+    return {column["name"] for column in inspect(bind).get_columns(table_name)}
+
+def init_db(bind: Engine = None) -> None:
+    """建表并补齐新增的列与索引；可重复执行，多个进程同时执行也不会失败
+
+    多进程部署时由 serve.py 主进程或 manage.py init-db 执行一次（worker 设置 DB_INIT_ON_STARTUP=false）
+    """
+    bind = bind or engine
+    for table in Base.metadata.sorted_tables:
+        _apply_ddl(lambda: table.create(bind=bind, checkfirst=True), lambda: inspect(bind).has_table(table.name))
+    ensure_columns(bind)
+    ensure_indexes(bind)
+
+def ensure_columns(bind: Engine = None) -> None:
+    """为已存在的表补加新增的可空列（create_all 不修改已有的表）"""
+    bind = bind or engine
+    inspector = inspect(bind)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            column_type = column.type.compile(dialect=bind.dialect)
+
+            def add_column():
+                with bind.begin() as conn:
+                    conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+
+            _apply_ddl(add_column, lambda: column.name in _column_names(bind, table.name))
+
+# 已被新的复合索引取代的旧索引（表名 -> 索引名），ensure_indexes 时删除
+OBSOLETE_INDEXES = {
+    "videos": {"ix_videos_user_id", "ix_videos_user_created", "ix_videos_user_action_created"},
+}
+
+def ensure_indexes(bind: Engine = None) -> None:
+    """为已存在的表补建新增的索引（create_all 只在建表时创建索引），并删除被取代的旧索引"""
+    bind = bind or engine
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            _apply_ddl(lambda: index.create(bind=bind, checkfirst=True),
+                       lambda: index.name in _index_names(bind, table.name))
+    inspector = inspect(bind)
+    for table_name, names in OBSOLETE_INDEXES.items():
+        if not inspector.has_table(table_name):
+            continue
+        if not names & {index["name"] for index in inspector.get_indexes(table_name)}:
+            continue
+        reflected = Table(table_name, MetaData(), autoload_with=bind)
+        for index in reflected.indexes:
+            if index.name in names:
+                _apply_ddl(lambda: index.drop(bind=bind), lambda: index.name not in _index_names(bind, table_name))
+
 # 依赖注入：获取数据库会话
 def get_db() -> Session:
     db = SessionLocal()
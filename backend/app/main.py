@@ -1,23 +1,52 @@
 # FastAPI 入口
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from pathlib import Path
 
-from .database import Base, engine
+from .database import engine, init_db
 from .core.config import settings
 # 导入模型以确保它们被注册到 Base
 from . import models
-from .routers import auth, business
+from .routers import admin, auth, business, history, metrics, uploads
+from .services.result_writer import result_writer
+from .services.scheduler import analysis_scheduler
+from .services.upload_sessions import purge_periodically
+from .core.security import password_hasher
+from .core.limits import BodySizeLimitMiddleware
+from .core.metrics import MetricsMiddleware, metrics_exporter
+from .core.profiling import ProfilingMiddleware
 
-# 初始化数据库表（必须在导入模型之后）
-Base.metadata.create_all(bind=engine)
+# 初始化数据库表（必须在导入模型之后）；serve.py 多进程部署时由主进程执行一次
+if settings.DB_INIT_ON_STARTUP:
+    init_db(engine)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动后台写入线程、分析调度器与过期上传会话的定期清理，关闭时写完剩余结果"""
+    result_writer.start()
+    analysis_scheduler.start()
+    metrics_exporter.start()
+    purger = None
+    if settings.UPLOAD_PURGE_INTERVAL_SECONDS > 0:
+        purger = asyncio.create_task(purge_periodically(settings.UPLOAD_PURGE_INTERVAL_SECONDS))
+    yield
+    if purger is not None:
+        purger.cancel()
+    # 先停调度器（正在执行的分析跑完，按 SHUTDOWN_DRAIN_SECONDS 排空队列），再写完剩余结果
+    analysis_scheduler.stop(drain=settings.SHUTDOWN_DRAIN_SECONDS)
+    result_writer.stop()
+    password_hasher.shutdown()
+    metrics_exporter.stop()
 
 # 创建 FastAPI 应用
 app = FastAPI(
     title=settings.PROJECT_NAME,
     description="AI 运动教练 API - 基于 MediaPipe 的瑜伽动作分析系统",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS 配置 (允许前端访问)
@@ -29,14 +58,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 请求体大小限制（预留 1MB 给 multipart 表单字段与边界）
+app.add_middleware(BodySizeLimitMiddleware, max_bytes=settings.MAX_UPLOAD_BYTES + 1024 * 1024)
+
+# 按需请求剖析与慢请求捕获（未开启抽样与慢请求阈值时，只有携带管理令牌的 X-Profile 请求会被剖析）
+app.add_middleware(ProfilingMiddleware)
+
+# 请求延迟指标（最外层，包含被大小限制拒绝的请求）
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 # 挂载静态目录，以便前端可以通过 URL 访问上传和处理后的视频
 # 例如: http://localhost:8000/static/outputs/xxx.mp4
-static_path = settings.BASE_DIR
+static_path = settings.STORAGE_DIR
 app.mount(settings.STATIC_URL, StaticFiles(directory=str(static_path)), name="static")
 
 # 注册路由
 app.include_router(auth.router, prefix=settings.API_V1_PREFIX)
 app.include_router(business.router, prefix=settings.API_V1_PREFIX)
+app.include_router(history.router, prefix=settings.API_V1_PREFIX)
+app.include_router(uploads.router, prefix=settings.API_V1_PREFIX)
+app.include_router(admin.router, prefix=settings.API_V1_PREFIX)
+if settings.METRICS_ENABLED:
+    app.include_router(metrics.router)
 
 @app.get("/")
 def root():
@@ -1,5 +1,5 @@
 # 数据库模型 (SQLAlchemy)
-from sqlalchemy import Column, String, Integer, Float, JSON, DateTime, ForeignKey, Text
+from sqlalchemy import Column, String, Integer, Float, JSON, DateTime, ForeignKey, Text, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
@@ -25,7 +25,7 @@ class Video(Base):
     __tablename__ = "videos"
     
     video_id = Column(String(36), primary_key=True, default=generate_uuid)
-    user_id = Column(String(36), ForeignKey("users.user_id"), nullable=True, index=True)
+    user_id = Column(String(36), ForeignKey("users.user_id"), nullable=True)  # 由下面的复合索引覆盖
     file_path = Column(String(500), nullable=False)
     processed_path = Column(String(500), nullable=True)  # 处理后的视频路径
     action_type = Column(String(200), nullable=True)  # 动作类型
@@ -38,3 +38,81 @@ class Video(Base):
     
     # 关系
     user = relationship("User", back_populates="videos")
+    
+    # 复合索引：按用户分页浏览历史（可选按动作过滤），按 (created_at, video_id) 倒序做键集分页，
+    # video_id 作为同一时间的次序，排序与游标比较都由索引覆盖
+    __table_args__ = (
+        Index("ix_videos_user_created_id", "user_id", "created_at", "video_id"),
+        Index("ix_videos_user_action_created_id", "user_id", "action_type", "created_at", "video_id"),
+    )
+
+class PoseProgress(Base):
+    """每个用户每个动作的进度汇总，结果持久化时增量更新"""
+    __tablename__ = "pose_progress"
+    
+    user_id = Column(String(36), ForeignKey("users.user_id"), primary_key=True)
+    action_type = Column(String(200), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)  # 练习次数
+    score_sum = Column(Float, nullable=False, default=0.0)
+    score_min = Column(Float, nullable=True)
+    score_max = Column(Float, nullable=True)
+    recent_scores = Column(JSON, nullable=True)  # 最近 N 次分数（按时间正序）
+    last_practiced_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class UploadSession(Base):
+    """断点续传上传会话"""
+    __tablename__ = "upload_sessions"
+    
+    upload_id = Column(String(36), primary_key=True, default=generate_uuid)
+    user_id = Column(String(36), ForeignKey("users.user_id"), nullable=False, index=True)
+    filename = Column(String(255), nullable=False)
+    file_ext = Column(String(10), nullable=False)
+    declared_size = Column(Integer, nullable=False)  # 客户端声明的总大小（字节）
+    received_bytes = Column(Integer, nullable=False, default=0)  # 已接收的连续字节数
+    status = Column(String(20), nullable=False, default="uploading")  # uploading / finalizing / completed
+    action_type = Column(String(200), nullable=True)
+    camera_angle = Column(String(50), nullable=True)
+    device = Column(String(100), nullable=True)
+    video_id = Column(String(36), nullable=True)  # 完成后对应的视频记录
+    expires_at = Column(DateTime, nullable=True, index=True)  # 未完成时的过期时间，每次提交分片后顺延
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class AnalysisLease(Base):
+    """相同分析的跨进程去重租约（key = 内容哈希 + 动作 + 分析选项）"""
+    __tablename__ = "analysis_leases"
+    
+    key = Column(String(64), primary_key=True)
+    owner = Column(String(100), nullable=False)  # 持有租约的进程
+    status = Column(String(20), nullable=False, default="running")  # running / done / failed
+    result = Column(JSON, nullable=True)  # 完成后供等待方直接使用的分析结果
+    error = Column(Text, nullable=True)
+    expires_at = Column(DateTime, nullable=False)  # running 时由心跳续期；done / failed 时为结果保留期限
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class AnalysisJob(Base):
+    """持久化的分析任务队列（JOB_QUEUE_BACKEND=sql），由独立的 worker 进程按租约领取"""
+    __tablename__ = "analysis_jobs"
+    
+    job_id = Column(String(36), primary_key=True, default=generate_uuid)
+    user_id = Column(String(36), nullable=True)  # 提交者（匿名提交为空）
+    payload = Column(JSON, nullable=False)  # 分析参数（输入文件、动作、探测结果等）
+    priority = Column(Integer, nullable=False, default=0)  # 越小越先领取：0 interactive / 1 batch
+    status = Column(String(20), nullable=False, default="queued")  # queued / running / done / failed
+    attempts = Column(Integer, nullable=False, default=0)  # 已领取次数（每次领取加 1，兼作条件更新的版本号）
+    max_attempts = Column(Integer, nullable=False, default=3)
+    owner = Column(String(100), nullable=True)  # 持有租约的 worker
+    lease_expires_at = Column(DateTime, nullable=True)  # running 时由心跳续期
+    available_at = Column(DateTime, default=datetime.utcnow)  # 失败重试前的等待
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    
+    # 领取：按状态与优先级找到最早可执行的任务；清理：按结束时间删除
+    __table_args__ = (
+        Index("ix_analysis_jobs_claim", "status", "priority", "available_at"),
+        Index("ix_analysis_jobs_finished", "status", "finished_at"),
+    )
@@ -0,0 +1,41 @@
+# 管理接口：请求剖析结果的列表与下载、分析任务队列状态
+from typing import List, Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import FileResponse
+from starlette.concurrency import run_in_threadpool
+
+from ..core.config import settings
+from ..core.profiling import profile_store
+from ..services.job_queue import get_job_queue
+from .auth import require_admin
+
+router = APIRouter(prefix="/admin", tags=["管理"], dependencies=[Depends(require_admin)])
+
+
+@router.get("/profiles")
+async def list_profiles() -> List[dict]:
+    """已捕获的剖析结果（最新的在前）"""
+    return await run_in_threadpool(profile_store.list)
+
+
+@router.get("/profiles/{name}")
+def download_profile(name: str, format: Literal["json", "folded"] = Query("json")):
+    """下载剖析结果；format=folded 返回折叠调用栈文本，可直接生成火焰图"""
+    suffix = ".folded" if format == "folded" else ".json"
+    path = profile_store.path(name, suffix)
+    if path is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="剖析结果不存在"
+        )
+    media_type = "text/plain; charset=utf-8" if format == "folded" else "application/json"
+    return FileResponse(str(path), media_type=media_type, filename=path.name)
+
+
+@router.get("/jobs")
+async def job_queue_stats() -> dict:
+    """分析任务队列的各状态任务数、过期租约数与最早排队时间（JOB_QUEUE_ENABLED 时）"""
+    if not settings.JOB_QUEUE_ENABLED:
+        return {"enabled": False}
+    return {"enabled": True, **await run_in_threadpool(get_job_queue().stats)}
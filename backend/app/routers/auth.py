@@ -1,22 +1,56 @@
 # 登录注册接口
-from fastapi import APIRouter, Depends, HTTPException, status, Security
+import hmac
+from fastapi import APIRouter, Depends, HTTPException, status, Security, Header
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm, HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from typing import Optional
 from datetime import timedelta
 
-from ..database import get_db
+from ..database import get_db, SessionLocal
 from ..models import User
 from ..schemas import UserCreate, UserResponse, Token, UserLogin
-from ..core.security import verify_password, get_password_hash, create_access_token, decode_access_token
+from ..core.security import create_access_token, decode_access_token, password_hasher
 from ..core.config import settings
+from ..core.auth_cache import CachedUser, token_cache, register_invalidation_listeners
 
 router = APIRouter(prefix="/auth", tags=["认证"])
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_PREFIX}/auth/login", auto_error=False)
 http_bearer = HTTPBearer(auto_error=False)
 
-def get_current_user(token: Optional[str] = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+# 用户被修改或删除时失效认证缓存
+register_invalidation_listeners(User)
+
+def _load_user(payload: dict) -> Optional[CachedUser]:
+    """按 token 中的 user_id（旧 token 回退到 username）加载用户快照"""
+    username = payload.get("sub")
+    user_id = payload.get("user_id")
+    # 只在缓存未命中时才打开数据库会话
+    with SessionLocal() as db:
+        if user_id:
+            user = db.get(User, user_id)
+        else:
+            user = db.query(User).filter(User.username == username).first()
+        if user is None or user.username != username:
+            return None
+        return CachedUser.from_orm_user(user)
+
+def _authenticate_token(token: str) -> tuple:
+    """校验 token 并返回 (用户快照, 错误信息)"""
+    cached = token_cache.get(token)
+    if cached is not None:
+        return cached, None
+    payload = decode_access_token(token)
+    if payload is None or payload.get("sub") is None:
+        return None, "无效的认证凭证"
+    user = _load_user(payload)
+    if user is None:
+        return None, "用户不存在"
+    token_cache.put(token, user, token_exp=payload.get("exp"))
+    return user, None
+
+def get_current_user(token: Optional[str] = Depends(oauth2_scheme)) -> CachedUser:
     """从 token 获取当前用户"""
     if not token:
         raise HTTPException(
@@ -24,64 +58,47 @@ def get_current_user(token: Optional[str] = Depends(oauth2_scheme), db: Session
             detail="缺少认证凭证",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    payload = decode_access_token(token)
-    if payload is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="无效的认证凭证",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    username: str = payload.get("sub")
-    if username is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="无效的认证凭证",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    user = db.query(User).filter(User.username == username).first()
+    user, error = _authenticate_token(token)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="用户不存在",
+            detail=error,
             headers={"WWW-Authenticate": "Bearer"},
         )
     return user
 
 def get_optional_current_user(
-    credentials: Optional[HTTPAuthorizationCredentials] = Security(http_bearer),
-    db: Session = Depends(get_db)
-) -> Optional[User]:
+    credentials: Optional[HTTPAuthorizationCredentials] = Security(http_bearer)
+) -> Optional[CachedUser]:
     """可选地获取当前用户（用于允许匿名访问的接口）"""
     if not credentials:
         return None
     try:
-        token = credentials.credentials
-        payload = decode_access_token(token)
-        if payload is None:
-            return None
-        username: str = payload.get("sub")
-        if username is None:
-            return None
-        user = db.query(User).filter(User.username == username).first()
+        user, _ = _authenticate_token(credentials.credentials)
         return user
     except Exception:
         return None
 
-@router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def register(user_data: UserCreate, db: Session = Depends(get_db)):
-    """用户注册"""
-    # 检查用户名是否已存在
-    existing_user = db.query(User).filter(User.username == user_data.username).first()
-    if existing_user:
+def is_admin(x_admin_token: Optional[str] = Header(None)) -> bool:
+    """请求是否携带了有效的管理令牌"""
+    if not settings.ADMIN_TOKEN or not x_admin_token:
+        return False
+    return hmac.compare_digest(x_admin_token, settings.ADMIN_TOKEN)
+
+def require_admin(admin: bool = Depends(is_admin)) -> bool:
+    """仅允许管理员访问"""
+    if not admin:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="用户名已存在"
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="需要管理员权限"
         )
-    
-    # 创建新用户
+    return True
+
+def _find_user(db: Session, username: str) -> Optional[User]:
+    return db.query(User).filter(User.username == username).first()
+
+def _create_user(db: Session, user_data: UserCreate, hashed_password: str) -> User:
     try:
-        hashed_password = get_password_hash(user_data.password)
         new_user = User(
             username=user_data.username,
             password_hash=hashed_password,
@@ -98,37 +115,45 @@ def register(user_data: UserCreate, db: Session = Depends(get_db)):
             detail=f"用户创建失败: {str(e)}"
         )
 
-@router.post("/login", response_model=Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    """用户登录（支持 OAuth2 表单）"""
-    user = db.query(User).filter(User.username == form_data.username).first()
-    
-    if not user or not verify_password(form_data.password, user.password_hash):
+def _update_password_hash(db: Session, user: User, new_hash: str) -> None:
+    try:
+        user.password_hash = new_hash
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"警告: 密码哈希更新失败: {str(e)}")
+
+# 接口为 async 以便等待密码哈希线程池；数据库操作仍放在线程池中执行，不阻塞事件循环
+@router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
+async def register(user_data: UserCreate, db: Session = Depends(get_db)):
+    """用户注册"""
+    # 检查用户名是否已存在
+    existing_user = await run_in_threadpool(_find_user, db, user_data.username)
+    if existing_user:
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="用户名或密码错误",
-            headers={"WWW-Authenticate": "Bearer"},
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="用户名已存在"
         )
     
-    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.username, "user_id": user.user_id},
-        expires_delta=access_token_expires
-    )
+    # 在专用线程池中计算密码哈希
+    hashed_password = await password_hasher.hash(user_data.password)
     
-    return {
-        "access_token": access_token,
-        "token_type": "bearer",
-        "user_id": user.user_id,
-        "username": user.username
-    }
+    # 创建新用户
+    return await run_in_threadpool(_create_user, db, user_data, hashed_password)
 
-@router.post("/login/json", response_model=Token)
-def login_json(user_data: UserLogin, db: Session = Depends(get_db)):
-    """用户登录（JSON 格式）"""
-    user = db.query(User).filter(User.username == user_data.username).first()
+async def _authenticate(username: str, password: str, db: Session) -> dict:
+    """校验用户名密码并签发 token；工作因子变更时顺带更新密码哈希"""
+    user = await run_in_threadpool(_find_user, db, username)
+    
+    verified = False
+    if user:
+        # 提交后实例会过期，先取出需要的字段，避免之后在事件循环中重新加载
+        user_id, username = user.user_id, user.username
+        verified, new_hash = await password_hasher.verify_and_update(password, user.password_hash)
+        if verified and new_hash:
+            await run_in_threadpool(_update_password_hash, db, user, new_hash)
     
-    if not user or not verify_password(user_data.password, user.password_hash):
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="用户名或密码错误",
@@ -137,18 +162,28 @@ def login_json(user_data: UserLogin, db: Session = Depends(get_db)):
     
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username, "user_id": user.user_id},
+        data={"sub": username, "user_id": user_id},
         expires_delta=access_token_expires
     )
     
     return {
         "access_token": access_token,
         "token_type": "bearer",
-        "user_id": user.user_id,
-        "username": user.username
+        "user_id": user_id,
+        "username": username
     }
 
+@router.post("/login", response_model=Token)
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    """用户登录（支持 OAuth2 表单）"""
+    return await _authenticate(form_data.username, form_data.password, db)
+
+@router.post("/login/json", response_model=Token)
+async def login_json(user_data: UserLogin, db: Session = Depends(get_db)):
+    """用户登录（JSON 格式）"""
+    return await _authenticate(user_data.username, user_data.password, db)
+
 @router.get("/me", response_model=UserResponse)
-def get_current_user_info(current_user: User = Depends(get_current_user)):
+def get_current_user_info(current_user: CachedUser = Depends(get_current_user)):
     """获取当前用户信息"""
     return current_user
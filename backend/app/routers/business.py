@@ -1,77 +1,98 @@
 # 视频上传与推理接口
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, status
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Request, UploadFile, File, Form, status
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from typing import Optional
+import asyncio
 import uuid
 import os
-import shutil
-from pathlib import Path
 
 from ..database import get_db
-from ..models import User, Video
-from ..schemas import InferenceResponse, StandardPoseResponse
-from ..services.ai_engine import PoseAnalyzer
+from ..models import Video
+from ..schemas import InferenceResponse, JobAccepted, JobStatus, StandardPoseResponse
+from ..services.analysis import (
+    ai_engine, analysis_options, analyze_upload, choose_quality, enqueue_analysis, persist_result_async,
+    normalize_uploaded_video
+)
+from ..services.result_writer import result_writer
+from ..services.scheduler import analysis_scheduler
+from ..services.quality import quality_controller
+from ..services.singleflight import analysis_key, analysis_singleflight
+from ..services.cancellation import (
+    AnalysisCancelled, CancellationToken, cancellation_stats, request_deadline, wait_job, watch_disconnect
+)
+from ..services.job_queue import get_job_queue
+from ..services.storage import validate_video_filename, save_upload_file, probe_saved_video
+from ..core import resources
 from ..core.config import settings
+from ..core.auth_cache import CachedUser, token_cache
+from ..core.profiling import mark as mark_profile
+from ..core.security import password_hasher
 from .auth import get_current_user, get_optional_current_user
 
 router = APIRouter(prefix="", tags=["业务"])
 
-# 初始化 AI 引擎
-ai_engine = PoseAnalyzer(angles_json_path=str(settings.YOGA_ANGLES_JSON))
+def _create_video(db: Session, **values) -> dict:
+    """写入视频记录（在线程池中执行），返回响应需要的字段"""
+    try:
+        video = Video(**values)
+        db.add(video)
+        db.commit()
+        db.refresh(video)
+    except Exception:
+        db.rollback()
+        raise
+    return {
+        "video_id": video.video_id,
+        "file_path": video.file_path,
+        "action_type": video.action_type,
+        "created_at": video.created_at
+    }
 
 @router.post("/upload/video")
 async def upload_video(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     action_type: Optional[str] = Form(None),
     camera_angle: Optional[str] = Form(None),
     device: Optional[str] = Form(None),
-    current_user: User = Depends(get_current_user),
+    current_user: CachedUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """上传视频文件"""
     # 验证文件类型
-    if not file.filename:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="文件名不能为空"
-        )
-    
-    allowed_extensions = {".mp4", ".avi", ".mov", ".mkv", ".webm"}
-    file_ext = Path(file.filename).suffix.lower()
-    if file_ext not in allowed_extensions:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"不支持的文件类型，仅支持: {', '.join(allowed_extensions)}"
-        )
+    file_ext = validate_video_filename(file.filename)
     
     # 生成唯一文件名
     file_id = str(uuid.uuid4())
     original_filename = settings.UPLOAD_DIR / f"{file_id}{file_ext}"
     
-    # 保存文件
+    # 分块保存文件（超过大小限制立即中止）
     try:
-        with open(original_filename, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        file_size, file_sha256 = await save_upload_file(file, original_filename)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"文件保存失败: {str(e)}"
         )
     
-    # 创建数据库记录
+    # 探测时长、帧率、分辨率等（无法解析时拒绝）
+    probe = await probe_saved_video(original_filename)
+    
+    # 创建数据库记录（线程池中执行，不阻塞事件循环）
     try:
-        video = Video(
+        video = await run_in_threadpool(
+            _create_video, db,
             user_id=current_user.user_id,
             file_path=str(original_filename),
             action_type=action_type,
             camera_angle=camera_angle,
-            device=device
+            device=device,
+            extra_metadata={"size": file_size, "sha256": file_sha256, "probe": probe}
         )
-        db.add(video)
-        db.commit()
-        db.refresh(video)
     except Exception as e:
-        db.rollback()
         # 删除已上传的文件
         if original_filename.exists():
             os.remove(original_filename)
@@ -80,94 +101,116 @@ async def upload_video(
             detail=f"数据库记录创建失败: {str(e)}"
         )
     
-    return {
-        "video_id": video.video_id,
-        "file_path": video.file_path,
-        "action_type": video.action_type,
-        "created_at": video.created_at
-    }
+    # 后台规范化为恒定帧率与统一分辨率（NORMALIZE_UPLOADS 开启时）
+    if settings.NORMALIZE_UPLOADS:
+        background_tasks.add_task(normalize_uploaded_video, video["video_id"], original_filename, probe)
+    
+    return {**video, "probe": probe}
 
 @router.post("/infer/sync", response_model=InferenceResponse)
 async def sync_inference(
+    request: Request,
     file: UploadFile = File(...),
     actionType: str = Form(...),
-    db: Session = Depends(get_db),
-    current_user: Optional[User] = Depends(get_optional_current_user)
+    x_request_timeout: Optional[float] = Header(None, description="客户端愿意等待的秒数，超过后停止分析"),
+    current_user: Optional[CachedUser] = Depends(get_optional_current_user)
 ):
     """
     同步推理接口：
     1. 保存上传的视频
     2. 调用 AI 引擎逐帧分析并绘制建议
     3. 返回处理后的视频 URL 和分析结果
+    
+    客户端断开或超过截止时间（X-Request-Timeout 请求头 / ANALYSIS_MAX_SECONDS）时停止分析并清理文件
     """
-    # 1. 保存原始视频
-    if not file.filename:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="文件名不能为空"
-        )
+    # 截止时间从请求到达时开始计算（包含上传与排队时间）
+    token = CancellationToken(deadline=request_deadline(x_request_timeout))
     
-    allowed_extensions = {".mp4", ".avi", ".mov", ".mkv", ".webm"}
-    file_ext = Path(file.filename).suffix.lower()
-    if file_ext not in allowed_extensions:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"不支持的文件类型，仅支持: {', '.join(allowed_extensions)}"
-        )
+    # 1. 保存原始视频
+    file_ext = validate_video_filename(file.filename)
     
     file_id = str(uuid.uuid4())
     original_filename = settings.UPLOAD_DIR / f"{file_id}{file_ext}"
     
     try:
-        with open(original_filename, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        file_size, file_sha256 = await save_upload_file(file, original_filename)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"文件保存失败: {str(e)}"
         )
     
-    # 2. 定义输出路径
-    processed_filename = settings.OUTPUT_DIR / f"processed_{file_id}.mp4"
+    mark_profile("upload_saved")
+    probe = await probe_saved_video(original_filename)
+    extra = {"size": file_size, "sha256": file_sha256, "probe": probe}
+    mark_profile("probed")
     
-    # 3. AI 处理
-    try:
-        result = ai_engine.process_video(
-            input_path=str(original_filename),
-            output_path=str(processed_filename),
-            target_pose_name=actionType
+    # 2. AI 处理：作为交互任务交给调度器（按预估成本排队，开启规范化时先转码）
+    # 匿名请求不写视频记录，也就不保存角度序列文件（否则没有记录引用，会一直留在磁盘上）
+    keep_series = current_user is not None
+    
+    async def run_analysis(cancel_token: CancellationToken):
+        # 按截止时间与排队情况选择质量档位：高峰期降级而不是超时，空闲时全质量
+        quality = choose_quality(probe, deadline=token.deadline, job_class="interactive")
+        future = analysis_scheduler.submit(
+            analyze_upload, original_filename, actionType, file_id, probe, extra,
+            cancel_token=cancel_token, quality=quality, keep_series=keep_series,
+            cost=quality["cost"], job_class="interactive", label=file_id
         )
-    except Exception as e:
-        # 删除临时文件
+        result = await wait_job(future, cancel_token)
+        extra["analysis_cost"] = future.timing
+        return result
+    
+    def discard_upload():
         if original_filename.exists():
             os.remove(original_filename)
+    
+    watcher = asyncio.create_task(watch_disconnect(request, token))
+    try:
+        if settings.SINGLEFLIGHT_ENABLED:
+            # 相同内容、动作与分析选项的并发请求（超时重试、多设备提交同一视频）只分析一次
+            # 是否保存角度序列也参与去重键：匿名请求的结果不能交给需要写记录的请求
+            key = analysis_key(file_sha256, actionType, {**analysis_options(), "keep_series": keep_series})
+            result, coalesced = await analysis_singleflight.run(key, run_analysis, token, on_abandon=discard_upload)
+            if coalesced:
+                extra["coalesced"] = True
+        else:
+            result = await run_analysis(token)
+    except AnalysisCancelled as e:
+        # 合并执行时其他请求可能仍在分析这个文件，由共享的分析任务结束后删除
+        if not settings.SINGLEFLIGHT_ENABLED:
+            discard_upload()
+        if e.reason == "deadline_exceeded":
+            raise HTTPException(
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                detail="分析超过截止时间，已取消"
+            )
+        # 客户端已断开，响应不会被读取
+        raise HTTPException(status_code=499, detail="客户端已断开，分析已取消")
+    except Exception as e:
+        # 删除临时文件
+        discard_upload()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"AI 分析失败: {str(e)}"
         )
+    finally:
+        watcher.cancel()
+    mark_profile("analyzed")
     
-    # 4. 创建数据库记录（如果用户已登录）
+    # 3. 创建数据库记录（如果用户已登录），由后台线程批量提交
     if current_user:
         try:
-            video = Video(
-                user_id=current_user.user_id,
-                file_path=str(original_filename),
-                processed_path=str(processed_filename),
-                action_type=actionType,
-                score=result.get("score"),
-                suggestions=result.get("suggestions", [])
-            )
-            db.add(video)
-            db.commit()
+            await persist_result_async(result, current_user.user_id, original_filename, actionType, extra=extra)
         except Exception as e:
-            db.rollback()
             # 注意：这里不删除文件，因为处理已完成，只是数据库记录失败
             print(f"警告: 数据库记录创建失败: {str(e)}")
+        mark_profile("persisted")
     
-    # 5. 构建返回结果
-    # 构建相对路径，用于静态文件访问
-    relative_path = str(processed_filename.relative_to(settings.BASE_DIR)).replace("\\", "/")
-    video_url = f"{settings.BASE_URL}{settings.STATIC_URL}/{relative_path}"
+    # 4. 构建返回结果
+    video_url = result["video_url"]
     
     return InferenceResponse(
         status="completed",
@@ -175,13 +218,83 @@ async def sync_inference(
             "action": actionType,
             "score": result.get("score"),
             "video_url": video_url,
-            "suggestions": result.get("suggestions", [])
+            "suggestions": result.get("suggestions", []),
+            "quality": result.get("quality")
         },
         video_url=video_url,
         score=result.get("score"),
         suggestions=result.get("suggestions", [])
     )
 
+def _require_job_queue():
+    if not settings.JOB_QUEUE_ENABLED:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="未启用分析任务队列 (JOB_QUEUE_ENABLED)"
+        )
+    return get_job_queue()
+
+@router.post("/infer/async", response_model=JobAccepted, status_code=status.HTTP_202_ACCEPTED)
+async def async_inference(
+    file: UploadFile = File(...),
+    actionType: str = Form(...),
+    current_user: Optional[CachedUser] = Depends(get_optional_current_user)
+):
+    """
+    异步推理接口：保存视频后写入分析任务队列，立即返回任务 id
+    
+    由独立的 worker 进程（worker.py）执行分析，通过 GET /jobs/{job_id} 查询状态与结果；
+    已登录用户的结果同时写入历史记录
+    """
+    _require_job_queue()
+    file_ext = validate_video_filename(file.filename)
+    
+    file_id = str(uuid.uuid4())
+    original_filename = settings.UPLOAD_DIR / f"{file_id}{file_ext}"
+    
+    try:
+        file_size, file_sha256 = await save_upload_file(file, original_filename)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"文件保存失败: {str(e)}"
+        )
+    
+    probe = await probe_saved_video(original_filename)
+    extra = {"size": file_size, "sha256": file_sha256, "probe": probe}
+    
+    try:
+        job_id = await run_in_threadpool(
+            enqueue_analysis, original_filename, actionType, file_id,
+            current_user.user_id if current_user else None, extra, job_class="interactive"
+        )
+    except Exception as e:
+        if original_filename.exists():
+            os.remove(original_filename)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"分析任务创建失败: {str(e)}"
+        )
+    
+    return JobAccepted(job_id=job_id, status_url=f"{settings.API_V1_PREFIX}/jobs/{job_id}")
+
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job(
+    job_id: str,
+    current_user: Optional[CachedUser] = Depends(get_optional_current_user)
+):
+    """查询分析任务的状态与结果（登录用户提交的任务只对本人可见）"""
+    queue = _require_job_queue()
+    job = await run_in_threadpool(queue.get, job_id)
+    if job is None or (job["user_id"] and (current_user is None or current_user.user_id != job["user_id"])):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"未找到分析任务: {job_id}"
+        )
+    return JobStatus(**{key: value for key, value in job.items() if key != "user_id"})
+
 @router.get("/standards")
 def get_standards():
     """返回支持的动作列表供前端选择"""
@@ -220,5 +333,13 @@ def health_check():
     return {
         "status": "healthy",
         "service": "AIMovement API",
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "auth_cache": token_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "result_writer": result_writer.stats(),
+        "scheduler": analysis_scheduler.stats(),
+        "singleflight": analysis_singleflight.stats(),
+        "cancellations": cancellation_stats.stats(),
+        "quality": quality_controller.stats(),
+        "thread_budget": resources.thread_budget.as_dict() if resources.thread_budget else None
     }
@@ -0,0 +1,201 @@
+# 历史记录接口
+import base64
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from ..database import get_db
+from ..models import PoseProgress, Video
+from ..schemas import PoseProgressResponse, VideoPage, VideoSummary
+from ..services.progress import score_trend
+from ..services.angle_series import read_header, read_range
+from ..services.exporter import EXPORT_FORMATS, ExportFilters, stream_export
+from ..services.storage import static_url
+from ..core.auth_cache import CachedUser
+from .auth import get_current_user, get_optional_current_user, is_admin
+
+router = APIRouter(prefix="", tags=["历史"])
+
+def encode_cursor(created_at: datetime, video_id: str) -> str:
+    """游标 = (created_at, video_id)，video_id 用于同一时刻的稳定排序"""
+    raw = f"{created_at.isoformat()}|{video_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, video_id = base64.urlsafe_b64decode(padded).decode("utf-8").split("|", 1)
+        return datetime.fromisoformat(created_at), video_id
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="无效的分页游标"
+        )
+
+@router.get("/videos", response_model=VideoPage)
+def list_videos(
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor"),
+    limit: int = Query(20, ge=1, le=100),
+    action_type: Optional[str] = Query(None, description="按动作过滤"),
+    current_user: CachedUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    当前用户的分析历史，按创建时间倒序，游标分页：
+    每页只在 (user_id, [action_type,] created_at, video_id) 复合索引上做一次范围扫描，
+    与翻页深度无关
+    """
+    # 只查询列表需要的列，跳过 suggestions / extra_metadata 等 JSON 大字段
+    query = db.query(
+        Video.video_id,
+        Video.action_type,
+        Video.camera_angle,
+        Video.device,
+        Video.score,
+        Video.processed_path,
+        Video.created_at,
+    ).filter(Video.user_id == current_user.user_id)
+
+    if action_type:
+        query = query.filter(Video.action_type == action_type)
+
+    if cursor:
+        cursor_created_at, cursor_video_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            Video.created_at < cursor_created_at,
+            and_(Video.created_at == cursor_created_at, Video.video_id < cursor_video_id)
+        ))
+
+    # 多取一条用于判断是否还有下一页
+    rows = query.order_by(Video.created_at.desc(), Video.video_id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    items = [
+        VideoSummary(
+            video_id=row.video_id,
+            action_type=row.action_type,
+            camera_angle=row.camera_angle,
+            device=row.device,
+            score=row.score,
+            video_url=static_url(row.processed_path),
+            created_at=row.created_at,
+        )
+        for row in rows
+    ]
+    next_cursor = encode_cursor(rows[-1].created_at, rows[-1].video_id) if has_more else None
+    return VideoPage(items=items, next_cursor=next_cursor)
+
+@router.get("/progress", response_model=List[PoseProgressResponse])
+def get_progress(
+    action_type: Optional[str] = Query(None, description="只返回指定动作"),
+    current_user: CachedUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """当前用户每个动作的进度（读取增量维护的汇总表，每个动作一行）"""
+    query = db.query(PoseProgress).filter(PoseProgress.user_id == current_user.user_id)
+    if action_type:
+        query = query.filter(PoseProgress.action_type == action_type)
+
+    progress = []
+    for row in query.order_by(PoseProgress.last_practiced_at.desc()):
+        recent = row.recent_scores or []
+        progress.append(PoseProgressResponse(
+            action_type=row.action_type,
+            count=row.count,
+            best_score=row.score_max,
+            worst_score=row.score_min,
+            average_score=round(row.score_sum / row.count, 2) if row.count else None,
+            trend=round(score_trend(recent), 3),
+            recent_scores=recent,
+            last_practiced_at=row.last_practiced_at,
+        ))
+    return progress
+
+@router.get("/videos/{video_id}/angles")
+def get_video_angles(
+    video_id: str,
+    start: float = Query(0.0, ge=0, description="起始时间（秒）"),
+    end: Optional[float] = Query(None, ge=0, description="结束时间（秒），默认到视频结尾"),
+    max_points: int = Query(500, ge=10, le=5000, description="最多返回的点数"),
+    current_user: CachedUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    关节角度随时间变化的曲线数据：
+    自动选择不超过 max_points 的最精细降采样层，每个点包含该时间桶内的 min / max / mean
+    """
+    video = db.query(Video.user_id, Video.extra_metadata).filter(Video.video_id == video_id).first()
+    if video is None or video.user_id != current_user.user_id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"未找到视频: {video_id}"
+        )
+    series_path = (video.extra_metadata or {}).get("angle_series")
+    if not series_path or not Path(series_path).exists():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="该视频没有角度序列数据"
+        )
+
+    # 序列的采样率以文件头为准（按帧间隔分析时低于视频帧率）
+    fps = read_header(series_path)["fps"] or 30.0
+    start_frame = int(start * fps)
+    end_frame = int(end * fps) if end is not None else None
+    return read_range(series_path, start_frame, end_frame, max_points)
+
+@router.get("/export")
+def export_videos(
+    format: str = Query("csv", description="导出格式: csv / ndjson / parquet"),
+    start: Optional[datetime] = Query(None, description="起始时间（含）"),
+    end: Optional[datetime] = Query(None, description="结束时间（不含）"),
+    action_type: List[str] = Query([], description="按动作过滤，可重复"),
+    user_id: List[str] = Query([], description="按用户过滤，可重复（仅管理员）"),
+    include_angles: bool = Query(False, description="是否包含逐帧角度数据"),
+    admin: bool = Depends(is_admin),
+    current_user: Optional[CachedUser] = Depends(get_optional_current_user)
+):
+    """
+    流式导出分析历史（分块传输，内存占用与结果规模无关）：
+    普通用户只能导出自己的记录，管理员可按用户列表导出整个群组
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"不支持的导出格式，仅支持: {', '.join(EXPORT_FORMATS)}"
+        )
+    if not admin:
+        if current_user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="缺少认证凭证",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        if user_id and user_id != [current_user.user_id]:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="只能导出自己的记录"
+            )
+        user_id = [current_user.user_id]
+
+    filters = ExportFilters(user_ids=user_id, action_types=action_type, start=start, end=end)
+    try:
+        body = stream_export(format, filters, include_angles=include_angles)
+    except RuntimeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail=str(e)
+        )
+
+    media_type, extension = EXPORT_FORMATS[format]
+    filename = f"videos_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.{extension}"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
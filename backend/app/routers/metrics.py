@@ -0,0 +1,66 @@
+# Prometheus 指标接口
+from typing import Iterable
+
+from fastapi import APIRouter
+from fastapi.responses import Response
+from starlette.concurrency import run_in_threadpool
+
+from ..core.auth_cache import token_cache
+from ..core.metrics import CONTENT_TYPE, Sample, metrics_exporter, registry
+from ..core.security import password_hasher
+from ..services.cancellation import cancellation_stats
+from ..services.quality import quality_controller
+from ..services.result_writer import result_writer
+from ..services.scheduler import analysis_scheduler
+from ..services.singleflight import analysis_singleflight
+
+router = APIRouter(tags=["监控"])
+
+
+def service_samples() -> Iterable[Sample]:
+    """各服务 stats() 中的队列长度与累计次数（抓取或写快照时求值，不在业务路径上增加开销）"""
+    scheduler = analysis_scheduler.stats()
+    yield ("aimovement_scheduler_running", "gauge", "正在执行的分析任务数", {}, scheduler["running"])
+    for job_class, values in scheduler["classes"].items():
+        labels = {"job_class": job_class}
+        yield ("aimovement_scheduler_queued", "gauge", "排队中的分析任务数", labels, values["queued"])
+        yield ("aimovement_scheduler_submitted_total", "counter", "提交的分析任务数", labels, values["submitted"])
+        yield ("aimovement_scheduler_completed_total", "counter", "完成的分析任务数", labels, values["completed"])
+    yield ("aimovement_scheduler_failed_total", "counter", "失败的分析任务数", {}, scheduler["failed"])
+
+    for key, count in cancellation_stats.stats()["by_reason"].items():
+        reason, stage = key.split(":", 1)
+        yield ("aimovement_cancellations_total", "counter", "分析取消次数（stage: queued / running / waiting）",
+               {"reason": reason, "stage": stage}, count)
+
+    for tier, count in quality_controller.stats()["chosen"].items():
+        yield ("aimovement_quality_tier_total", "counter", "各质量档位被选中的次数", {"tier": tier}, count)
+
+    writer = result_writer.stats()
+    yield ("aimovement_result_writer_pending", "gauge", "等待写入数据库的结果数", {}, writer["pending"])
+    yield ("aimovement_result_writer_written_total", "counter", "写入数据库的结果数", {}, writer["written"])
+    yield ("aimovement_result_writer_failed_total", "counter", "写入失败的结果数", {}, writer["failed"])
+
+    singleflight = analysis_singleflight.stats()
+    yield ("aimovement_singleflight_inflight", "gauge", "进行中的去重分析数", {}, singleflight["inflight"])
+    for scope in ("local", "remote"):
+        yield ("aimovement_singleflight_coalesced_total", "counter", "复用其他请求分析结果的次数",
+               {"scope": scope}, singleflight[f"coalesced_{scope}"])
+
+    hasher = password_hasher.stats()
+    yield ("aimovement_password_hash_pending", "gauge", "等待或正在计算的密码哈希数", {}, hasher["pending"])
+    yield ("aimovement_password_hash_rejected_total", "counter", "哈希队列已满被拒绝的请求数", {}, hasher["rejected"])
+
+    auth = token_cache.stats()
+    yield ("aimovement_auth_cache_hits_total", "counter", "令牌缓存命中次数", {}, auth["hits"])
+    yield ("aimovement_auth_cache_misses_total", "counter", "令牌缓存未命中次数", {}, auth["misses"])
+
+
+registry.register_callback(service_samples)
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus 文本格式；配置了 METRICS_DIR 时汇总所有 worker 进程"""
+    body = await run_in_threadpool(metrics_exporter.render)
+    return Response(content=body, media_type=CONTENT_TYPE)
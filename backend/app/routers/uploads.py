@@ -0,0 +1,386 @@
+# 断点续传上传接口
+#
+# 协议（与 tus 类似）：
+#   1. POST   /uploads                 创建会话，声明文件名与总大小
+#   2. PATCH  /uploads/{id}            从 Upload-Offset 处追加一个分片（请求体为原始字节）
+#   3. HEAD/GET /uploads/{id}          连接中断后查询已接收的偏移，从该处继续
+#   4. POST   /uploads/{id}/finalize   全部接收后生成视频记录，可选立即加入分析队列
+import asyncio
+import hashlib
+import os
+import shutil
+import uuid
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Request, Response, status
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from ..database import get_db
+from ..models import UploadSession, Video
+from ..schemas import UploadCreate, UploadFinalize, UploadStatus
+from ..services.analysis import enqueue_analysis, normalize_uploaded_video, schedule_uploaded_video
+from ..services.media_probe import probe_video
+from ..services.storage import validate_video_filename, too_large
+from ..services.upload_sessions import active_session_count, expires_at, is_expired
+from ..core.config import settings
+from ..core.metrics import UPLOAD_BYTES
+from ..core.auth_cache import CachedUser
+from .auth import get_current_user
+
+router = APIRouter(prefix="/uploads", tags=["断点续传"])
+
+class _SessionLocks:
+    """按会话 id 的进程内锁，没有持有者与等待者时即移除（放弃或过期的会话不会留下锁）"""
+
+    def __init__(self):
+        self._locks: Dict[str, List] = {}  # upload_id -> [锁, 持有与等待的请求数]
+
+    @asynccontextmanager
+    async def hold(self, upload_id: str):
+        entry = self._locks.setdefault(upload_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[upload_id]
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+# 同一会话的分片写入与 finalize 串行执行（进程内）；跨进程由数据库条件更新兜底
+_upload_locks = _SessionLocks()
+
+def _get_session(db: Session, upload_id: str, current_user: CachedUser) -> UploadSession:
+    upload = db.query(UploadSession).filter(UploadSession.upload_id == upload_id).first()
+    if upload is None or upload.user_id != current_user.user_id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"未找到上传会话: {upload_id}"
+        )
+    return upload
+
+def _check_active(upload: UploadSession) -> None:
+    """已完成的会话返回 409，过期未完成的会话返回 410（之后由定期清理删除）"""
+    if upload.status != "uploading":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="上传已完成"
+        )
+    if is_expired(upload):
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="上传会话已过期，请重新上传"
+        )
+
+def _partial_path(upload: UploadSession):
+    return settings.UPLOAD_PARTIAL_DIR / f"{upload.upload_id}{upload.file_ext}.part"
+
+def _status(upload: UploadSession) -> UploadStatus:
+    return UploadStatus(
+        upload_id=upload.upload_id,
+        offset=upload.received_bytes,
+        size=upload.declared_size,
+        status=upload.status,
+        video_id=upload.video_id
+    )
+
+def _splice(chunk_path, path, offset: int) -> None:
+    """把暂存的分片复制到未完成文件的 offset 处"""
+    with open(chunk_path, "rb") as src, open(path, "r+b") as dst:
+        dst.seek(offset)
+        shutil.copyfileobj(src, dst, settings.UPLOAD_CHUNK_SIZE)
+
+def _sha256_file(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(settings.UPLOAD_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# 以下数据库操作由 async 接口经 run_in_threadpool 调用，不阻塞事件循环（SQLite 等锁时可能阻塞数秒）
+def _commit_chunk(db: Session, upload_id: str, offset: int, written: int, chunk_path, path) -> bool:
+    """先用条件更新占住偏移，再把暂存的分片写入未完成文件，最后提交
+
+    只有偏移未被其他进程推进时条件更新才生效；更新持有的行锁（SQLite 为写锁）在提交前
+    阻止其他进程在同一偏移提交分片，未占到偏移的请求不会改动文件。写入失败时回滚，偏移不变
+    """
+    try:
+        updated = db.query(UploadSession).filter(
+            UploadSession.upload_id == upload_id,
+            UploadSession.received_bytes == offset
+        ).update({
+            UploadSession.received_bytes: offset + written,
+            UploadSession.expires_at: expires_at()
+        }, synchronize_session=False)
+        if not updated:
+            db.rollback()
+            return False
+        _splice(chunk_path, path, offset)
+        db.commit()
+        return True
+    except BaseException:
+        db.rollback()
+        raise
+
+def _set_status(db: Session, upload_id: str, expected: Optional[str], new_status: str) -> bool:
+    """条件更新会话状态（expected 为空时无条件更新）"""
+    db.rollback()
+    query = db.query(UploadSession).filter(UploadSession.upload_id == upload_id)
+    if expected is not None:
+        query = query.filter(UploadSession.status == expected)
+    updated = query.update({UploadSession.status: new_status}, synchronize_session=False)
+    db.commit()
+    return bool(updated)
+
+def _complete(db: Session, upload: UploadSession, **values) -> dict:
+    """生成视频记录并把会话标记为已完成，返回响应需要的视频字段"""
+    video = Video(**values)
+    db.add(video)
+    db.flush()
+    upload.status = "completed"
+    upload.video_id = video.video_id
+    db.commit()
+    db.refresh(video)
+    return {
+        "video_id": video.video_id,
+        "file_path": video.file_path,
+        "action_type": video.action_type,
+        "created_at": video.created_at
+    }
+
+@router.post("", response_model=UploadStatus, status_code=status.HTTP_201_CREATED)
+def create_upload(
+    data: UploadCreate,
+    current_user: CachedUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """创建上传会话（声明的大小超过限制时直接拒绝）"""
+    file_ext = validate_video_filename(data.filename)
+    if data.size <= 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="文件大小必须大于 0"
+        )
+    if data.size > settings.MAX_UPLOAD_BYTES:
+        raise too_large(settings.MAX_UPLOAD_BYTES)
+    # 限制每个用户同时未完成的会话数，放弃的会话在过期前也占用名额
+    limit = settings.UPLOAD_MAX_ACTIVE_SESSIONS
+    if limit and active_session_count(db, current_user.user_id) >= limit:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"未完成的上传会话过多（上限 {limit} 个），请先完成或等待过期"
+        )
+
+    upload = UploadSession(
+        upload_id=str(uuid.uuid4()),
+        user_id=current_user.user_id,
+        filename=data.filename,
+        file_ext=file_ext,
+        declared_size=data.size,
+        received_bytes=0,
+        action_type=data.action_type,
+        camera_angle=data.camera_angle,
+        device=data.device,
+        expires_at=expires_at()
+    )
+    _partial_path(upload).touch()
+    db.add(upload)
+    db.commit()
+    db.refresh(upload)
+    return _status(upload)
+
+@router.get("/{upload_id}", response_model=UploadStatus)
+def get_upload(
+    upload_id: str,
+    current_user: CachedUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """查询上传进度"""
+    return _status(_get_session(db, upload_id, current_user))
+
+@router.head("/{upload_id}")
+def head_upload(
+    upload_id: str,
+    current_user: CachedUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """查询已接收的偏移（Upload-Offset 响应头）"""
+    upload = _get_session(db, upload_id, current_user)
+    return Response(headers={
+        "Upload-Offset": str(upload.received_bytes),
+        "Upload-Length": str(upload.declared_size),
+        "Cache-Control": "no-store"
+    })
+
+@router.patch("/{upload_id}", response_model=UploadStatus)
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    response: Response,
+    upload_offset: int = Header(..., description="本分片在文件中的起始偏移"),
+    x_chunk_sha256: Optional[str] = Header(None, description="本分片的 SHA-256（可选）"),
+    current_user: CachedUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """追加一个分片：边接收边写盘，超出声明大小立即中止，校验失败则回滚本分片"""
+    async with _upload_locks.hold(upload_id):
+        upload = await run_in_threadpool(_get_session, db, upload_id, current_user)
+        _check_active(upload)
+        if upload_offset != upload.received_bytes:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"偏移不匹配，应从 {upload.received_bytes} 继续",
+                headers={"Upload-Offset": str(upload.received_bytes)}
+            )
+
+        content_length = request.headers.get("content-length")
+        if content_length and upload_offset + int(content_length) > upload.declared_size:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail="分片超出声明的文件大小"
+            )
+
+        # 分片先写入独立的暂存文件，占到偏移后才拼入未完成文件（其他进程的并发请求不会覆盖已确认的数据）
+        path = _partial_path(upload)
+        chunk_path = settings.UPLOAD_PARTIAL_DIR / f"{upload_id}.{uuid.uuid4().hex}.chunk"
+        declared_size = upload.declared_size
+        digest = hashlib.sha256()
+        written = 0
+        f = await run_in_threadpool(open, chunk_path, "wb")
+        try:
+            async for chunk in request.stream():
+                if not chunk:
+                    continue
+                written += len(chunk)
+                if upload_offset + written > declared_size:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail="分片超出声明的文件大小"
+                    )
+                digest.update(chunk)
+                await run_in_threadpool(f.write, chunk)
+            await run_in_threadpool(f.close)
+            if x_chunk_sha256 and digest.hexdigest() != x_chunk_sha256.lower():
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="分片校验和不匹配"
+                )
+            committed = await run_in_threadpool(_commit_chunk, db, upload_id, upload_offset, written, chunk_path, path)
+        finally:
+            # 失败或冲突时丢弃本分片，客户端从原偏移重试
+            f.close()
+            chunk_path.unlink(missing_ok=True)
+
+        if not committed:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="分片冲突，请查询偏移后重试"
+            )
+        UPLOAD_BYTES.labels("resumable").inc(written)
+        # 提交后实例已过期，在线程池中重新加载
+        result = await run_in_threadpool(_status, upload)
+
+    response.headers["Upload-Offset"] = str(result.offset)
+    return result
+
+@router.post("/{upload_id}/finalize")
+async def finalize_upload(
+    upload_id: str,
+    background_tasks: BackgroundTasks,
+    data: Optional[UploadFinalize] = None,
+    current_user: CachedUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """完成上传：生成视频记录；analyze=true 时立即加入分析队列
+
+    重复或并发的 finalize 返回 409：进程内按会话串行，跨进程由状态的条件更新保证只有一个请求移动文件
+    """
+    data = data or UploadFinalize()
+    async with _upload_locks.hold(upload_id):
+        upload = await run_in_threadpool(_get_session, db, upload_id, current_user)
+        _check_active(upload)
+        if upload.received_bytes != upload.declared_size:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"文件未上传完整 ({upload.received_bytes}/{upload.declared_size})"
+            )
+        action_type = data.action_type or upload.action_type
+        if data.analyze and not action_type:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="分析需要指定 action_type"
+            )
+
+        # 提交会使实例过期，先取出之后需要的字段
+        partial_path = _partial_path(upload)
+        final_path = settings.UPLOAD_DIR / f"{upload.upload_id}{upload.file_ext}"
+        declared_size, camera_angle, device = upload.declared_size, upload.camera_angle, upload.device
+
+        # 条件更新占用会话：其他进程已开始或完成 finalize 时不再移动文件
+        if not await run_in_threadpool(_set_status, db, upload_id, "uploading", "finalizing"):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="上传已完成"
+            )
+
+        async def reopen():
+            # 失败后恢复为上传中，允许客户端重试 finalize
+            await run_in_threadpool(_set_status, db, upload_id, None, "uploading")
+
+        # 无法解析的文件保留在未完成目录，不生成视频记录
+        try:
+            probe = await run_in_threadpool(probe_video, partial_path)
+        except Exception as e:
+            await reopen()
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"无法解析视频文件: {str(e)}"
+            )
+
+        try:
+            await run_in_threadpool(os.replace, partial_path, final_path)
+            file_sha256 = await run_in_threadpool(_sha256_file, final_path)
+            extra = {"size": declared_size, "sha256": file_sha256, "upload_id": upload_id, "probe": probe}
+            video = await run_in_threadpool(
+                _complete, db, upload,
+                user_id=current_user.user_id,
+                file_path=str(final_path),
+                action_type=action_type,
+                camera_angle=camera_angle,
+                device=device,
+                extra_metadata=extra
+            )
+        except Exception as e:
+            # 文件移回未完成目录，允许客户端重试 finalize
+            if final_path.exists():
+                await run_in_threadpool(os.replace, final_path, partial_path)
+            await reopen()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"数据库记录创建失败: {str(e)}"
+            )
+
+    job_id = None
+    if data.analyze and settings.JOB_QUEUE_ENABLED:
+        # 写入持久化任务队列，由独立的 worker 进程执行（GET /jobs/{job_id} 查询进度）
+        job_id = await run_in_threadpool(
+            enqueue_analysis, final_path, action_type, video["video_id"], current_user.user_id, extra,
+            video_id=video["video_id"], job_class="batch"
+        )
+    elif data.analyze:
+        # 后台分析作为 batch 任务排队，交互请求优先
+        schedule_uploaded_video(video["video_id"], final_path, action_type, current_user.user_id, extra)
+    elif settings.NORMALIZE_UPLOADS:
+        background_tasks.add_task(normalize_uploaded_video, video["video_id"], final_path, probe)
+
+    return {
+        **video,
+        "analysis": "queued" if data.analyze else None,
+        "job_id": job_id,
+        "probe": probe
+    }
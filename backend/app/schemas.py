@@ -49,6 +49,50 @@ class VideoResponse(VideoBase):
     class Config:
         from_attributes = True
 
+class VideoSummary(BaseModel):
+    """历史列表中的轻量视频记录（不含 suggestions / extra_metadata）"""
+    video_id: str
+    action_type: Optional[str] = None
+    camera_angle: Optional[str] = None
+    device: Optional[str] = None
+    score: Optional[float] = None
+    video_url: Optional[str] = None
+    created_at: datetime
+
+class VideoPage(BaseModel):
+    items: List[VideoSummary]
+    next_cursor: Optional[str] = None
+
+class PoseProgressResponse(BaseModel):
+    """单个动作的练习进度"""
+    action_type: str
+    count: int
+    best_score: Optional[float] = None
+    worst_score: Optional[float] = None
+    average_score: Optional[float] = None
+    trend: float = 0.0  # 最近几次练习的分数变化趋势（每次）
+    recent_scores: List[float] = []
+    last_practiced_at: Optional[datetime] = None
+
+# ========== 断点续传相关 ==========
+class UploadCreate(BaseModel):
+    filename: str
+    size: int  # 文件总大小（字节）
+    action_type: Optional[str] = None
+    camera_angle: Optional[str] = None
+    device: Optional[str] = None
+
+class UploadStatus(BaseModel):
+    upload_id: str
+    offset: int  # 下一个分片应从该偏移开始
+    size: int
+    status: str
+    video_id: Optional[str] = None
+
+class UploadFinalize(BaseModel):
+    analyze: bool = False  # 完成后立即加入分析队列
+    action_type: Optional[str] = None  # 为空时使用创建会话时的 action_type
+
 # ========== AI 分析相关 ==========
 class InferenceRequest(BaseModel):
     video_id: Optional[str] = None
@@ -62,6 +106,23 @@ class InferenceResponse(BaseModel):
     score: Optional[float] = None
     suggestions: Optional[List[str]] = None
 
+class JobAccepted(BaseModel):
+    """已写入分析任务队列（/infer/async）"""
+    job_id: str
+    status: str = "queued"
+    status_url: str
+
+class JobStatus(BaseModel):
+    job_id: str
+    status: str  # queued / running / done / failed
+    attempts: int = 0
+    max_attempts: Optional[int] = None
+    result: Optional[Dict[str, Any]] = None  # 完成后与 /infer/sync 的 result 相同，登录用户另含 video_id
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
 class StandardPoseResponse(BaseModel):
     action_id: str
     display_name: Optional[str] = None
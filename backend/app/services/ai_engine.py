@@ -3,12 +3,363 @@ import mediapipe as mp
 import numpy as np
 import json
 import os
-from typing import Dict, List, Any
+import shutil
+import threading
+import time
+import urllib.request
+from pathlib import Path
+from typing import Callable, Dict, List, Any, Optional
+
+from mediapipe.framework.formats import landmark_pb2
+
+from ..core.config import settings
+from ..core.metrics import MODEL_INIT_SECONDS
+from ..core.timing import NULL_TIMER, StageTimer
+from .angle_series import write_angle_series
+from .frame_gate import INFER, REUSE, FrameGate
+from .overlay import OverlayRenderer, angle_labels
+from .cancellation import AnalysisCancelled, CancellationToken
 
 # MediaPipe 初始化
 mp_pose = mp.solutions.pose
 mp_drawing = mp.solutions.drawing_utils
 
+# 无法加载的模型复杂度（lite / heavy 模型首次使用时需下载，离线环境会失败），避免每次重试
+unavailable_complexities = set()
+# 创建失败的 Tasks 模型复杂度（如 GPU delegate 不可用、模型文件损坏），之后直接使用 legacy
+_tasks_failed_complexities = set()
+
+# legacy 各复杂度对应的模型文件（full 随包附带，lite / heavy 首次使用时由 MediaPipe 下载到同一目录）
+POSE_MODEL_FILES = {0: "pose_landmark_lite.tflite", 1: "pose_landmark_full.tflite", 2: "pose_landmark_heavy.tflite"}
+# Tasks PoseLandmarker 的模型包（放在 POSE_MODEL_DIR 下，可用 manage.py download-pose-models 下载）
+POSE_TASK_MODEL_NAMES = {0: "pose_landmarker_lite", 1: "pose_landmarker_full", 2: "pose_landmarker_heavy"}
+POSE_TASK_MODEL_URL = "https://storage.googleapis.com/mediapipe-models/pose_landmarker/{name}/float16/latest/{name}.task"
+
+RUNNING_MODES = ("image", "video", "live_stream")
+
+# 分析视频的叠加层（骨架颜色与原 draw_landmarks 的 DrawingSpec 一致）
+overlay = OverlayRenderer(mp_pose.POSE_CONNECTIONS, landmark_color=(0, 255, 0), connection_color=(0, 0, 255))
+
+
+def pose_task_model_path(model_complexity: int) -> Path:
+    name = POSE_TASK_MODEL_NAMES.get(model_complexity, POSE_TASK_MODEL_NAMES[1])
+    return settings.POSE_MODEL_DIR / f"{name}.task"
+
+
+def _tasks_available(model_complexity: int) -> bool:
+    return (settings.POSE_BACKEND in ("auto", "tasks")
+            and model_complexity not in _tasks_failed_complexities
+            and pose_task_model_path(model_complexity).exists())
+
+
+def _legacy_available(model_complexity: int) -> bool:
+    if model_complexity in unavailable_complexities:
+        return False
+    model_dir = os.path.join(os.path.dirname(mp.__file__), "modules", "pose_landmark")
+    return os.path.exists(os.path.join(model_dir, POSE_MODEL_FILES.get(model_complexity, "")))
+
+
+def pose_model_available(model_complexity: int) -> bool:
+    """该复杂度的模型是否已在本地（Tasks 模型包或 legacy 模型，不触发下载）；fake 后端总是可用"""
+    if settings.POSE_BACKEND == "fake":
+        return True
+    return _tasks_available(model_complexity) or _legacy_available(model_complexity)
+
+
+def download_pose_task_model(model_complexity: int, timeout: float = 60.0) -> Path:
+    """下载 PoseLandmarker 模型包到 POSE_MODEL_DIR（先写临时文件，完成后改名）"""
+    path = pose_task_model_path(model_complexity)
+    if path.exists():
+        return path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    url = POSE_TASK_MODEL_URL.format(name=POSE_TASK_MODEL_NAMES[model_complexity])
+    partial = path.with_suffix(".part")
+    with urllib.request.urlopen(url, timeout=timeout) as response, open(partial, "wb") as f:
+        shutil.copyfileobj(response, f)
+    os.replace(partial, path)
+    return path
+
+
+def create_pose_tracker(model_complexity: int = 1, static_image_mode: bool = False):
+    """创建 legacy 姿态跟踪器，请求的模型不可用时退回随包附带的 full 模型（complexity=1）
+
+    Returns:
+        (跟踪器, 实际使用的模型复杂度)
+    """
+    if model_complexity != 1 and model_complexity not in unavailable_complexities:
+        try:
+            return mp_pose.Pose(
+                static_image_mode=static_image_mode,
+                min_detection_confidence=0.5,
+                min_tracking_confidence=0.5,
+                model_complexity=model_complexity
+            ), model_complexity
+        except Exception as e:
+            unavailable_complexities.add(model_complexity)
+            print(f"警告: 无法加载 model_complexity={model_complexity} 的姿态模型，改用 1: {str(e)}")
+    return mp_pose.Pose(
+        static_image_mode=static_image_mode,
+        min_detection_confidence=0.5,
+        min_tracking_confidence=0.5,
+        model_complexity=1
+    ), 1
+
+
+class PoseFrame:
+    """一帧的检测结果，字段与 legacy 的 results 一致（landmark 列表为 protobuf，可直接用于 mp_drawing）"""
+
+    __slots__ = ("pose_landmarks", "pose_world_landmarks")
+
+    def __init__(self, pose_landmarks=None, pose_world_landmarks=None):
+        self.pose_landmarks = pose_landmarks
+        self.pose_world_landmarks = pose_world_landmarks
+
+
+EMPTY_POSE_FRAME = PoseFrame()
+
+
+def _to_pose_frame(result) -> PoseFrame:
+    """Tasks 的 PoseLandmarkerResult（每个人一组关键点）-> 第一个人的 PoseFrame"""
+    if not result or not result.pose_landmarks:
+        return EMPTY_POSE_FRAME
+    landmarks = landmark_pb2.NormalizedLandmarkList(landmark=[
+        landmark_pb2.NormalizedLandmark(x=lm.x, y=lm.y, z=lm.z, visibility=lm.visibility or 0.0,
+                                        presence=lm.presence or 0.0)
+        for lm in result.pose_landmarks[0]
+    ])
+    world = None
+    if result.pose_world_landmarks:
+        world = landmark_pb2.LandmarkList(landmark=[
+            landmark_pb2.Landmark(x=lm.x, y=lm.y, z=lm.z, visibility=lm.visibility or 0.0,
+                                  presence=lm.presence or 0.0)
+            for lm in result.pose_world_landmarks[0]
+        ])
+    return PoseFrame(landmarks, world)
+
+
+class LegacyPoseBackend:
+    """mp.solutions.pose.Pose（同步执行；live_stream 模式下也在 detect() 内直接回调）"""
+
+    name = "legacy"
+
+    def __init__(self, model_complexity: int = 1, running_mode: str = "video",
+                 result_callback: Optional[Callable[[PoseFrame, int], None]] = None):
+        self._pose, self.model_complexity = create_pose_tracker(model_complexity,
+                                                                static_image_mode=running_mode == "image")
+        self.running_mode = running_mode
+        self.result_callback = result_callback
+
+    def detect(self, image_rgb: np.ndarray, timestamp_ms: int) -> PoseFrame:
+        results = self._pose.process(image_rgb)
+        frame = PoseFrame(results.pose_landmarks, results.pose_world_landmarks)
+        if self.result_callback is not None:
+            self.result_callback(frame, timestamp_ms)
+        return frame
+
+    def close(self) -> None:
+        self._pose.close()
+
+
+class TasksPoseBackend:
+    """MediaPipe Tasks PoseLandmarker
+
+    - video: detect_for_video()，按显式时间戳同步返回（上传视频）
+    - live_stream: detect_async()，结果在 MediaPipe 线程中通过 result_callback 返回；
+      推理忙时新帧会被丢弃，detect() 返回最近一次的结果（实时摄像头）
+    - image: 每帧独立检测，不跟踪
+    """
+
+    name = "tasks"
+
+    def __init__(self, model_complexity: int = 1, running_mode: str = "video",
+                 result_callback: Optional[Callable[[PoseFrame, int], None]] = None,
+                 delegate: Optional[str] = None):
+        from mediapipe.tasks.python import BaseOptions, vision
+
+        delegate = (delegate or settings.POSE_DELEGATE).lower()
+        modes = {"image": vision.RunningMode.IMAGE, "video": vision.RunningMode.VIDEO,
+                 "live_stream": vision.RunningMode.LIVE_STREAM}
+        options = vision.PoseLandmarkerOptions(
+            base_options=BaseOptions(
+                model_asset_path=str(pose_task_model_path(model_complexity)),
+                delegate=BaseOptions.Delegate.GPU if delegate == "gpu" else BaseOptions.Delegate.CPU
+            ),
+            running_mode=modes[running_mode],
+            num_poses=1,
+            min_pose_detection_confidence=0.5,
+            min_pose_presence_confidence=0.5,
+            min_tracking_confidence=0.5,
+            result_callback=self._on_result if running_mode == "live_stream" else None
+        )
+        self._landmarker = vision.PoseLandmarker.create_from_options(options)
+        self.model_complexity = model_complexity
+        self.running_mode = running_mode
+        self.result_callback = result_callback
+        self._last_timestamp = -1
+        self._latest = EMPTY_POSE_FRAME
+        self._lock = threading.Lock()
+
+    def _on_result(self, result, output_image, timestamp_ms: int) -> None:
+        frame = _to_pose_frame(result)
+        with self._lock:
+            self._latest = frame
+        if self.result_callback is not None:
+            self.result_callback(frame, timestamp_ms)
+
+    def detect(self, image_rgb: np.ndarray, timestamp_ms: int) -> PoseFrame:
+        # 时间戳必须严格递增（可变帧率取整后可能重复）
+        timestamp_ms = max(int(timestamp_ms), self._last_timestamp + 1)
+        self._last_timestamp = timestamp_ms
+        image = mp.Image(image_format=mp.ImageFormat.SRGB, data=np.ascontiguousarray(image_rgb))
+        if self.running_mode == "live_stream":
+            self._landmarker.detect_async(image, timestamp_ms)
+            with self._lock:
+                return self._latest
+        if self.running_mode == "image":
+            return _to_pose_frame(self._landmarker.detect(image))
+        return _to_pose_frame(self._landmarker.detect_for_video(image, timestamp_ms))
+
+    def close(self) -> None:
+        self._landmarker.close()
+
+
+# 关键点录制文件（manage.py record-landmarks）：{"fps": 30.0, "frames": [null | [[x, y, z, visibility], ...33], ...]}
+LANDMARK_COUNT = 33
+# 脚本动作中固定不动的面部关键点（鼻、眼、耳、嘴）
+_SCRIPTED_FACE = {0: (0.5, 0.2), 1: (0.51, 0.19), 2: (0.52, 0.19), 3: (0.53, 0.19), 4: (0.49, 0.19),
+                  5: (0.48, 0.19), 6: (0.47, 0.19), 7: (0.54, 0.2), 8: (0.46, 0.2), 9: (0.51, 0.23), 10: (0.49, 0.23)}
+
+
+def _landmark_list(points) -> landmark_pb2.NormalizedLandmarkList:
+    return landmark_pb2.NormalizedLandmarkList(landmark=[
+        landmark_pb2.NormalizedLandmark(x=x, y=y, z=z, visibility=v) for x, y, z, v in points
+    ])
+
+
+def scripted_landmarks(frames: int = 60) -> List[List[tuple]]:
+    """内置的脚本动作：正面站立，双臂在身体两侧与头顶之间往复（frames 帧一个周期），膝盖随之微屈"""
+    sequence = []
+    for i in range(frames):
+        phase = (1 - np.cos(2 * np.pi * i / frames)) / 2  # 0 -> 1 -> 0
+        arm = 0.3 + 2.4 * phase  # 上臂与竖直向下方向的夹角
+        knee = 0.15 * phase
+        points = [(0.5, 0.5, 0.0, 0.0)] * LANDMARK_COUNT
+        for index, (x, y) in _SCRIPTED_FACE.items():
+            points[index] = (x, y, 0.0, 0.99)
+        # 人物左侧在画面右侧：side=+1 为左，-1 为右
+        for side, (shoulder, elbow, wrist, hip, knee_i, ankle, heel, foot) in (
+                (1, (11, 13, 15, 23, 25, 27, 29, 31)), (-1, (12, 14, 16, 24, 26, 28, 30, 32))):
+            sx, sy = 0.5 + 0.06 * side, 0.3
+            ex, ey = sx + side * 0.12 * np.sin(arm), sy + 0.12 * np.cos(arm)
+            wx, wy = ex + side * 0.11 * np.sin(arm * 1.05), ey + 0.11 * np.cos(arm * 1.05)
+            hx, hy = 0.5 + 0.04 * side, 0.55
+            kx, ky = hx + side * 0.15 * np.sin(knee), hy + 0.15 * np.cos(knee)
+            ax, ay = 0.5 + 0.045 * side, ky + 0.15
+            points[shoulder], points[elbow], points[wrist] = (sx, sy, 0.0, 0.99), (ex, ey, 0.0, 0.99), (wx, wy, 0.0, 0.99)
+            points[hip], points[knee_i], points[ankle] = (hx, hy, 0.0, 0.99), (kx, ky, 0.0, 0.99), (ax, ay, 0.0, 0.99)
+            points[heel], points[foot] = (ax - 0.01 * side, ay + 0.02, 0.0, 0.9), (ax + 0.02 * side, ay + 0.03, 0.0, 0.9)
+            # 手指（17-22）聚在手腕附近
+            for offset, index in enumerate((17, 19, 21) if side == 1 else (18, 20, 22)):
+                points[index] = (wx + side * 0.01 * (offset - 1), wy + 0.015, 0.0, 0.9)
+        sequence.append([tuple(float(v) for v in point) for point in points])
+    return sequence
+
+
+_landmark_sequences: Dict[str, List[PoseFrame]] = {}
+_landmark_sequences_lock = threading.Lock()
+
+
+def load_landmark_sequence(path: str = "") -> List[PoseFrame]:
+    """读取录制的关键点（为空时使用内置脚本动作），按路径缓存；录制中未检测到人体的帧为空结果"""
+    with _landmark_sequences_lock:
+        sequence = _landmark_sequences.get(path)
+        if sequence is None:
+            if path:
+                with open(path, "r", encoding="utf-8") as f:
+                    frames = json.load(f)["frames"]
+            else:
+                frames = scripted_landmarks()
+            sequence = [PoseFrame(_landmark_list(points)) if points else EMPTY_POSE_FRAME for points in frames]
+            if not sequence:
+                raise ValueError(f"关键点文件中没有帧: {path}")
+            _landmark_sequences[path] = sequence
+        return sequence
+
+
+class FakePoseBackend:
+    """不加载模型的模拟后端（POSE_BACKEND=fake），用于压测 API 层与 CI
+
+    按调用顺序循环返回录制或脚本生成的关键点，每帧 sleep FAKE_POSE_LATENCY_MS（± FAKE_POSE_JITTER_MS，
+    按帧序号确定，结果可复现）模拟推理耗时。sleep 会释放 GIL，与原生推理一样只占用分析工作线程
+    """
+
+    name = "fake"
+
+    def __init__(self, model_complexity: int = 1, running_mode: str = "video",
+                 result_callback: Optional[Callable[[PoseFrame, int], None]] = None,
+                 landmarks_path: Optional[str] = None, latency_ms: Optional[float] = None,
+                 jitter_ms: Optional[float] = None):
+        self.model_complexity = model_complexity
+        self.running_mode = running_mode
+        self.result_callback = result_callback
+        self._frames = load_landmark_sequence(settings.FAKE_POSE_LANDMARKS if landmarks_path is None else landmarks_path)
+        self._latency = (settings.FAKE_POSE_LATENCY_MS if latency_ms is None else latency_ms) / 1000.0
+        self._jitter = (settings.FAKE_POSE_JITTER_MS if jitter_ms is None else jitter_ms) / 1000.0
+        self._index = 0
+
+    def detect(self, image_rgb: np.ndarray, timestamp_ms: int) -> PoseFrame:
+        delay = self._latency
+        if self._jitter:
+            # 确定性的伪随机抖动（Knuth 乘法散列），范围 [-jitter, +jitter]
+            delay += self._jitter * (((self._index * 2654435761) % 2 ** 32) / 2 ** 31 - 1)
+        if delay > 0:
+            time.sleep(delay)
+        frame = self._frames[self._index % len(self._frames)]
+        self._index += 1
+        if self.result_callback is not None:
+            self.result_callback(frame, timestamp_ms)
+        return frame
+
+    def close(self) -> None:
+        pass
+
+
+def create_pose_backend(model_complexity: int = 1, running_mode: str = "video",
+                        result_callback: Optional[Callable[[PoseFrame, int], None]] = None):
+    """按 POSE_BACKEND 创建姿态后端
+
+    auto / tasks 时优先使用 POSE_MODEL_DIR 下的 PoseLandmarker 模型包，
+    没有模型包或创建失败时退回 legacy；请求的复杂度两种后端都没有时退回 full 模型。
+    fake 时返回不加载模型的 FakePoseBackend。
+    返回的对象有 name、model_complexity、detect(image_rgb, timestamp_ms) 与 close()
+    """
+    if running_mode not in RUNNING_MODES:
+        raise ValueError(f"未知的运行模式: {running_mode}")
+    start = time.perf_counter()
+    backend = _create_pose_backend(model_complexity, running_mode, result_callback)
+    MODEL_INIT_SECONDS.labels(backend.name, backend.model_complexity).observe(time.perf_counter() - start)
+    return backend
+
+
+def _create_pose_backend(model_complexity: int, running_mode: str,
+                         result_callback: Optional[Callable[[PoseFrame, int], None]]):
+    if settings.POSE_BACKEND == "fake":
+        return FakePoseBackend(model_complexity, running_mode, result_callback)
+    for complexity in dict.fromkeys([model_complexity, 1]):
+        if _tasks_available(complexity):
+            try:
+                return TasksPoseBackend(complexity, running_mode, result_callback)
+            except Exception as e:
+                _tasks_failed_complexities.add(complexity)
+                print(f"警告: 无法创建 PoseLandmarker（complexity={complexity}），改用 legacy: {str(e)}")
+        if _legacy_available(complexity):
+            return LegacyPoseBackend(complexity, running_mode, result_callback)
+    if settings.POSE_BACKEND == "tasks" and -1 not in _tasks_failed_complexities:
+        _tasks_failed_complexities.add(-1)  # 只提示一次
+        print(f"警告: {settings.POSE_MODEL_DIR} 下没有 PoseLandmarker 模型包，改用 legacy")
+    # 本地都没有时交给 legacy：MediaPipe 尝试下载，失败时退回 full
+    return LegacyPoseBackend(model_complexity, running_mode, result_callback)
+
 
 class PoseAnalyzer:
     def __init__(self, angles_json_path: str):
@@ -40,6 +391,9 @@ class PoseAnalyzer:
             "right_hip": [12, 24, 26]  # 右肩-右髋-右膝
         }
 
+        # 角度标签只有 0-180 共 181 种，预先光栅化
+        overlay.warm(angle_labels(), 0.5, (255, 255, 255), 2)
+
     def calculate_angle(self, a: List[float], b: List[float], c: List[float]) -> float:
         """计算三点之间的角度 (b为顶点)"""
         a = np.array(a)
@@ -53,7 +407,12 @@ class PoseAnalyzer:
             angle = 360 - angle
         return angle
 
-    def process_video(self, input_path: str, output_path: str, target_pose_name: str) -> Dict[str, Any]:
+    def process_video(self, input_path: str, output_path: str, target_pose_name: str,
+                      series_path: Optional[str] = None, fps: Optional[float] = None,
+                      frame_stride: int = 1, cancel_token: Optional[CancellationToken] = None,
+                      model_complexity: int = 1, inference_max_side: Optional[int] = None,
+                      frame_gate: Optional[FrameGate] = None,
+                      timer: Optional[StageTimer] = None) -> Dict[str, Any]:
         """
         核心功能：读取视频，逐帧分析，绘制建议，保存视频
         
@@ -61,6 +420,15 @@ class PoseAnalyzer:
             input_path: 输入视频路径
             output_path: 输出视频路径
             target_pose_name: 目标动作名称（需匹配 JSON 中的 key）
+            series_path: 逐帧关节角度序列的保存路径（可选）
+            fps: 探测得到的平均帧率（可选，可变帧率视频以此为准）
+            frame_stride: 每隔多少帧做一次姿态检测，其余帧沿用上一次的检测结果绘制
+            cancel_token: 取消标记（可选），每帧检查一次，取消时释放资源、删除未完成的输出并抛出 AnalysisCancelled
+            model_complexity: 姿态模型复杂度（0 / 1 / 2），不可用时退回 1；后端由 POSE_BACKEND 决定（见 create_pose_backend）
+            inference_max_side: 送入姿态模型前将帧缩放到的最长边（可选，关键点为归一化坐标，绘制仍按原分辨率）
+            frame_gate: 推理前的帧过滤（可选）：画面静止时沿用上次结果或跳过，模糊帧跳过；
+                跳过的帧只绘制，不计入统计，角度序列中记为 NaN
+            timer: 分阶段计时（可选，基准测试用）：decode / gate / convert / inference / angles / render / encode / finalize
         
         Returns:
             包含处理结果、分数和建议的字典
@@ -78,7 +446,12 @@ class PoseAnalyzer:
         # 获取视频属性
         width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        fps = int(cap.get(cv2.CAP_PROP_FPS)) or 30  # 默认 30fps
+        # 保留小数帧率（如 29.97），取整会使输出视频与角度序列的时间轴逐渐偏移
+        if not fps or fps <= 0:
+            fps = cap.get(cv2.CAP_PROP_FPS)
+        if not fps or fps <= 0 or np.isnan(fps):
+            fps = 30.0  # 默认 30fps
+        fps = float(fps)
 
         # 视频写入器 (使用 mp4v 编码，兼容性较好)
         fourcc = cv2.VideoWriter_fourcc(*'mp4v')
@@ -88,11 +461,14 @@ class PoseAnalyzer:
             cap.release()
             raise ValueError(f"无法创建输出视频文件: {output_path}")
 
-        pose_tracker = mp_pose.Pose(
-            min_detection_confidence=0.5,
-            min_tracking_confidence=0.5,
-            model_complexity=1
-        )
+        pose_backend = create_pose_backend(model_complexity, running_mode="video")
+        model_complexity = pose_backend.model_complexity
+
+        # 推理分辨率（只缩小不放大）
+        inference_size = None
+        if inference_max_side and max(width, height) > inference_max_side:
+            scale = inference_max_side / float(max(width, height))
+            inference_size = (max(1, int(width * scale)), max(1, int(height * scale)))
 
         # 获取该动作的标准角度数据
         target_standards = self.standards.get(target_pose_name, {})
@@ -105,50 +481,93 @@ class PoseAnalyzer:
         analysis_summary = []  # 存储总分析报告
         frame_count = 0
         detected_frames = 0  # 检测到姿态的帧数
+        joint_names = list(self.joint_map.keys())
+        frame_stride = max(1, int(frame_stride))
+        analyzed_frames = 0  # 计入统计的帧数（姿态检测 + 帧过滤判定为沿用结果的帧）
+        inferred_frames = 0  # 实际运行姿态模型的帧数
+        results = None
+        series_angles = []  # 每帧各关节角度（不可见为 NaN）
+        series_diffs = []  # 每帧各关节偏差（无标准数据为 NaN）
+        timer = timer or NULL_TIMER
+        timer.reset()
 
         while cap.isOpened():
+            # 取消检查点：客户端断开或超过截止时间
+            if cancel_token is not None and cancel_token.cancelled:
+                cap.release()
+                out.release()
+                pose_backend.close()
+                if os.path.exists(output_path):
+                    os.remove(output_path)
+                raise AnalysisCancelled(cancel_token.reason)
+
             ret, frame = cap.read()
+            timer.lap("decode")
             if not ret:
                 break
 
             frame_count += 1
-
-            # 1. 姿态检测
-            image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            image.flags.writeable = False
-            results = pose_tracker.process(image)
-            image.flags.writeable = True
-            image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+            scheduled = (frame_count - 1) % frame_stride == 0
+            decision = INFER
+            if scheduled and frame_gate is not None:
+                decision = frame_gate.check(frame)
+                timer.lap("gate")
+            analyzed = scheduled and decision in (INFER, REUSE)
+
+            # 1. 姿态检测（跳过的帧沿用上一次的结果，只用于绘制，不计入统计）
+            if analyzed:
+                analyzed_frames += 1
+            if analyzed and decision == INFER:
+                inferred_frames += 1
+                image_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                if inference_size:
+                    image_rgb = cv2.resize(image_rgb, inference_size, interpolation=cv2.INTER_AREA)
+                image_rgb.flags.writeable = False
+                timer.lap("convert")
+                # VIDEO 模式需要显式时间戳（毫秒，按帧序号与帧率计算）
+                results = pose_backend.detect(image_rgb, int((frame_count - 1) * 1000.0 / fps))
+                if frame_gate is not None:
+                    frame_gate.update(results.pose_landmarks)
+                timer.lap("inference")
+            # 在原始帧上绘制（帧不再复用）
+            image = frame
 
             frame_suggestions = []  # 当前帧的建议
             frame_diffs = []  # 当前帧的偏差
+            frame_angles = np.full(len(joint_names), np.nan, dtype=np.float32)
+            frame_devs = np.full(len(joint_names), np.nan, dtype=np.float32)
+            joint_marks = []  # 待绘制的关节标记 (cx, cy, 颜色, 角度)，角度计算与绘制分开以便分阶段计时
 
             if results.pose_landmarks:
-                detected_frames += 1
+                if analyzed:
+                    detected_frames += 1
                 landmarks = results.pose_landmarks.landmark
 
                 # 2. 遍历所有关注的关节，计算角度并对比
-                for joint_name, point_indices in self.joint_map.items():
+                for joint_index, (joint_name, point_indices) in enumerate(self.joint_map.items()):
+                    # 检查关键点可见性（z 值或 visibility）
+                    if (landmarks[point_indices[0]].visibility < 0.5 or
+                        landmarks[point_indices[1]].visibility < 0.5 or
+                        landmarks[point_indices[2]].visibility < 0.5):
+                        continue  # 跳过不可见的关节
+
+                    # 获取三个关键点坐标
+                    p1 = [landmarks[point_indices[0]].x, landmarks[point_indices[0]].y]
+                    p2 = [landmarks[point_indices[1]].x, landmarks[point_indices[1]].y]
+                    p3 = [landmarks[point_indices[2]].x, landmarks[point_indices[2]].y]
+
+                    # 计算当前角度（所有关节都记录到时间序列中）
+                    current_angle = self.calculate_angle(p1, p2, p3)
+                    frame_angles[joint_index] = current_angle
+
                     if joint_name in target_standards:
-                        # 获取三个关键点坐标
-                        p1 = [landmarks[point_indices[0]].x, landmarks[point_indices[0]].y]
-                        p2 = [landmarks[point_indices[1]].x, landmarks[point_indices[1]].y]
-                        p3 = [landmarks[point_indices[2]].x, landmarks[point_indices[2]].y]
-
-                        # 检查关键点可见性（z 值或 visibility）
-                        if (landmarks[point_indices[0]].visibility < 0.5 or
-                            landmarks[point_indices[1]].visibility < 0.5 or
-                            landmarks[point_indices[2]].visibility < 0.5):
-                            continue  # 跳过不可见的关节
-
-                        # 计算当前角度
-                        current_angle = self.calculate_angle(p1, p2, p3)
                         standard_angle = target_standards[joint_name]
 
                         # 3. 偏差判断 (设定容差，例如 ±15度)
                         diff = abs(current_angle - standard_angle)
                         threshold = 15.0
                         frame_diffs.append(diff)
+                        frame_devs[joint_index] = diff
 
                         # 4. 可视化反馈
                         # 获取关节在图像上的像素坐标用于绘图
@@ -164,42 +583,45 @@ class PoseAnalyzer:
                         else:
                             color = (0, 255, 0)  # 绿色代表标准
 
-                        # 在关节处画圈和写角度
-                        cv2.circle(image, (cx, cy), 10, color, -1)
-                        angle_text = f"{int(current_angle)}°"
-                        cv2.putText(image, angle_text, (cx + 15, cy),
-                                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
-
-                # 绘制骨架
-                mp_drawing.draw_landmarks(
-                    image, 
-                    results.pose_landmarks, 
-                    mp_pose.POSE_CONNECTIONS,
-                    mp_drawing.DrawingSpec(color=(0, 255, 0), thickness=2, circle_radius=2),
-                    mp_drawing.DrawingSpec(color=(0, 0, 255), thickness=2)
-                )
-                
+                        joint_marks.append((cx, cy, color, current_angle))
+
                 # 记录偏差
-                if frame_diffs:
+                if frame_diffs and analyzed:
                     all_diffs.extend(frame_diffs)
+                timer.lap("angles")
+
+                # 在关节处画圈和写角度
+                for cx, cy, color, current_angle in joint_marks:
+                    cv2.circle(image, (cx, cy), 10, color, -1)
+                    overlay.text(image, f"{int(current_angle)}°", (cx + 15, cy), 0.5, (255, 255, 255), 2)
+
+                # 绘制骨架（所有骨骼一次 polylines）
+                overlay.skeleton(image, results.pose_landmarks)
 
             # 5. 在左上角显示建议
             y_pos = 30
             for text in frame_suggestions[:5]:  # 最多显示5条建议
-                cv2.putText(image, text, (10, y_pos), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+                overlay.text(image, text, (10, y_pos), 0.6, (0, 0, 255), 2)
                 y_pos += 30
 
-            # 显示动作名称
-            cv2.putText(image, f"Action: {target_pose_name}", (10, height - 30),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+            # 显示动作名称（每帧相同，精灵只生成一次）
+            overlay.text(image, f"Action: {target_pose_name}", (10, height - 30), 0.7, (255, 255, 255), 2)
+            timer.lap("render")
 
             out.write(image)
+            timer.lap("encode")
+            if analyzed:
+                series_angles.append(frame_angles)
+                series_diffs.append(frame_devs)
+            elif scheduled:
+                # 被帧过滤跳过：保持角度序列的时间轴均匀
+                series_angles.append(np.full(len(joint_names), np.nan, dtype=np.float32))
+                series_diffs.append(np.full(len(joint_names), np.nan, dtype=np.float32))
 
         # 释放资源
         cap.release()
         out.release()
-        pose_tracker.close()
+        pose_backend.close()
 
         # 计算分数（基于平均偏差）
         if all_diffs:
@@ -212,11 +634,33 @@ class PoseAnalyzer:
             if frame_count > 0:
                 analysis_summary.append("未检测到人体姿态，请确保视频中包含完整的人体")
 
+        # 保存逐帧角度序列（含降采样金字塔），供角度曲线接口按需读取
+        if series_path:
+            os.makedirs(os.path.dirname(series_path), exist_ok=True)
+            empty = np.empty((0, len(joint_names)), dtype=np.float32)
+            write_angle_series(
+                series_path,
+                np.stack(series_angles) if series_angles else empty,
+                np.stack(series_diffs) if series_diffs else empty,
+                fps=fps / frame_stride,
+                joints=joint_names
+            )
+        timer.lap("finalize")
+
         return {
             "processed_video": output_path,
             "score": round(score, 2),
             "suggestions": list(set(analysis_summary)) if analysis_summary else ["动作标准，继续保持！"],
             "frame_count": frame_count,
             "detected_frames": detected_frames,
-            "avg_diff": round(np.mean(all_diffs), 2) if all_diffs else 0
+            "analyzed_frames": analyzed_frames,
+            "inferred_frames": inferred_frames,
+            "frame_gate": frame_gate.stats() if frame_gate is not None else None,
+            "frame_stride": frame_stride,
+            "model_complexity": model_complexity,
+            "pose_backend": pose_backend.name,
+            "inference_max_side": inference_max_side if inference_size else None,
+            "avg_diff": round(np.mean(all_diffs), 2) if all_diffs else 0,
+            "fps": fps,
+            "angle_series": series_path
         }
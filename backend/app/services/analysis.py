@@ -0,0 +1,300 @@
+# 视频分析流程（推理 + 结果持久化）
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from ..core.config import settings
+from ..core.metrics import (FRAME_GATE_DECISIONS, FRAMES, FRAMES_DETECTED, FRAMES_INFERRED, OUTPUT_BYTES,
+                            STAGE_SECONDS, VIDEO_ANALYSIS_SECONDS, VIDEOS_IN_FLIGHT)
+from ..core.profiling import attach_current_thread
+from ..core.timing import StageTimer
+from ..database import SessionLocal
+from ..models import Video
+from .ai_engine import PoseAnalyzer
+from .cancellation import AnalysisCancelled, CancellationToken, cancellation_stats
+from .frame_gate import INFER, REUSE, SKIP_BLUR, SKIP_STATIC, FrameGate
+from .media_probe import needs_normalization, normalize_video, normalized_path
+from .result_writer import result_writer
+from .quality import quality_controller
+from .scheduler import analysis_scheduler
+from .storage import static_url
+
+FRAME_GATE_KINDS = (INFER, REUSE, SKIP_STATIC, SKIP_BLUR)
+
+# 初始化 AI 引擎
+ai_engine = PoseAnalyzer(angles_json_path=str(settings.YOGA_ANGLES_JSON))
+
+
+def prepare_input(input_path: Path, file_id: str, probe: Dict[str, Any]) -> Tuple[Path, Dict[str, Any]]:
+    """按需将视频规范化为恒定帧率与统一分辨率
+
+    Returns:
+        (用于分析的文件路径, 对应的探测结果)；未开启规范化或已符合规范时返回原文件
+    """
+    if not settings.NORMALIZE_UPLOADS or not needs_normalization(probe):
+        return Path(input_path), probe
+    output_path = normalized_path(file_id)
+    normalized_probe = normalize_video(input_path, output_path, probe=probe)
+    return output_path, normalized_probe
+
+
+def normalized_metadata(path: Path, probe: Dict[str, Any]) -> Dict[str, Any]:
+    return {"path": str(path), **probe}
+
+
+def analyze_video(input_path: Path, action_type: str, file_id: str,
+                  probe: Optional[Dict[str, Any]] = None,
+                  cancel_token: Optional[CancellationToken] = None,
+                  quality: Optional[Dict[str, Any]] = None, keep_series: bool = True) -> Dict[str, Any]:
+    """逐帧分析视频，返回分析结果（含处理后视频的路径与 URL）
+
+    quality 为 choose_quality() 选出的档位，缺省时使用 standard 档；
+    keep_series=False 时不保存角度序列文件（结果不会写入视频记录时，没有记录引用它）
+    """
+    quality = quality or {}
+    processed_filename = settings.OUTPUT_DIR / f"processed_{file_id}.mp4"
+    series_filename = settings.ANGLE_SERIES_DIR / f"{file_id}.angles" if keep_series else None
+    timer = StageTimer(histogram=STAGE_SECONDS)
+    outcome = "error"
+    start = time.perf_counter()
+    VIDEOS_IN_FLIGHT.inc()
+    try:
+        with attach_current_thread() as profile:
+            result = ai_engine.process_video(
+                input_path=str(input_path),
+                output_path=str(processed_filename),
+                target_pose_name=action_type,
+                series_path=str(series_filename) if series_filename else None,
+                fps=(probe or {}).get("fps"),
+                frame_stride=quality.get("frame_stride", settings.ANALYSIS_FRAME_STRIDE),
+                cancel_token=cancel_token,
+                model_complexity=quality.get("model_complexity", 1),
+                inference_max_side=quality.get("inference_max_side"),
+                frame_gate=FrameGate.from_settings(),
+                timer=timer
+            )
+            if profile is not None:
+                profile.add_stages("process_video", timer.as_dict(per=result["frame_count"]))
+        outcome = "ok"
+    except AnalysisCancelled as e:
+        outcome = "cancelled"
+        cancellation_stats.record(e.reason, "running")
+        raise
+    finally:
+        VIDEOS_IN_FLIGHT.dec()
+        VIDEO_ANALYSIS_SECONDS.labels(outcome).observe(time.perf_counter() - start)
+    record_engine_metrics(result, processed_filename, series_filename)
+    # 记录档位，模型复杂度以实际加载的为准
+    result["quality"] = {**quality, "model_complexity": result.get("model_complexity")}
+    result["processed_path"] = str(processed_filename)
+    result["video_url"] = static_url(str(processed_filename))
+    return result
+
+
+def record_engine_metrics(result: Dict[str, Any], processed_path: Path, series_path: Optional[Path]) -> None:
+    """分析完成后累计帧数、帧过滤决策与输出字节数（每帧阶段耗时由 StageTimer 直接记入直方图）"""
+    FRAMES.inc(result["frame_count"])
+    FRAMES_INFERRED.inc(result["inferred_frames"])
+    FRAMES_DETECTED.inc(result["detected_frames"])
+    for decision, count in (result.get("frame_gate") or {}).items():
+        if decision in FRAME_GATE_KINDS and count:
+            FRAME_GATE_DECISIONS.labels(decision).inc(count)
+    for kind, path in (("video", processed_path), ("series", series_path)):
+        if path is not None and path.exists():
+            OUTPUT_BYTES.labels(kind).inc(path.stat().st_size)
+
+
+def analysis_probe(probe: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """实际送入分析的视频参数；开启规范化时按规范化后的分辨率与帧率估算"""
+    if probe and settings.NORMALIZE_UPLOADS and needs_normalization(probe):
+        scale = min(1.0, settings.NORMALIZE_MAX_SIDE / float(max(probe["width"], probe["height"])))
+        probe = {
+            "width": probe["width"] * scale,
+            "height": probe["height"] * scale,
+            "frame_count": (probe.get("duration") or 0) * settings.NORMALIZE_FPS
+        }
+    return probe
+
+
+def choose_quality(probe: Optional[Dict[str, Any]], deadline: Optional[float] = None,
+                   job_class: str = "interactive") -> Dict[str, Any]:
+    """按延迟预算与当前排队情况选择质量档位（含预估成本 cost）"""
+    return quality_controller.choose(analysis_probe(probe), deadline=deadline, job_class=job_class)
+
+
+def analysis_options() -> Dict[str, Any]:
+    """影响分析结果的选项（参与相同分析的去重键）"""
+    return {
+        "frame_stride": settings.ANALYSIS_FRAME_STRIDE,
+        "pose_backend": settings.POSE_BACKEND,
+        "frame_gate": [settings.FRAME_GATE_MOTION_THRESHOLD, settings.FRAME_GATE_BLUR_THRESHOLD,
+                       settings.FRAME_GATE_MAX_SKIP, settings.FRAME_GATE_SIZE] if settings.FRAME_GATE_ENABLED else None,
+        "normalize": [settings.NORMALIZE_MAX_SIDE, settings.NORMALIZE_FPS] if settings.NORMALIZE_UPLOADS else None
+    }
+
+
+def analyze_upload(input_path: Path, action_type: str, file_id: str, probe: Optional[Dict[str, Any]],
+                   extra: Dict[str, Any], cancel_token: Optional[CancellationToken] = None,
+                   quality: Optional[Dict[str, Any]] = None, keep_series: bool = True) -> Dict[str, Any]:
+    """按需规范化后分析视频；规范化文件的信息写入 extra["normalized"]"""
+    analysis_path = Path(input_path)
+    if probe:
+        if cancel_token is not None and cancel_token.cancelled:
+            cancellation_stats.record(cancel_token.reason, "running")
+            raise AnalysisCancelled(cancel_token.reason)
+        analysis_path, probe = prepare_input(input_path, file_id, probe)
+        if analysis_path != Path(input_path):
+            extra["normalized"] = normalized_metadata(analysis_path, probe)
+    try:
+        return analyze_video(analysis_path, action_type, file_id, probe=probe, cancel_token=cancel_token,
+                             quality=quality, keep_series=keep_series)
+    except AnalysisCancelled:
+        # 取消的分析不保留本次生成的规范化文件
+        if analysis_path != Path(input_path):
+            analysis_path.unlink(missing_ok=True)
+        raise
+
+
+def _result_values(result: Dict[str, Any], user_id: str, input_path: Path, action_type: str,
+                   video_id: Optional[str] = None, extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    extra_metadata = dict(extra or {})
+    extra_metadata.update({
+        "angle_series": result.get("angle_series"),
+        "quality": result.get("quality"),
+        "fps": result.get("fps"),
+        "frame_count": result.get("frame_count"),
+        "detected_frames": result.get("detected_frames"),
+        "frame_gate": result.get("frame_gate")
+    })
+    values = {
+        "user_id": user_id,
+        "file_path": str(input_path),
+        "processed_path": result.get("processed_path"),
+        "action_type": action_type,
+        "score": result.get("score"),
+        "suggestions": result.get("suggestions", []),
+        "extra_metadata": extra_metadata
+    }
+    if video_id:
+        values["video_id"] = video_id
+    return values
+
+
+def persist_result(result: Dict[str, Any], user_id: str, input_path: Path, action_type: str,
+                   video_id: Optional[str] = None, extra: Optional[Dict[str, Any]] = None,
+                   wait: bool = False) -> str:
+    """将分析结果交给后写队列；指定 video_id 时更新已有记录
+
+    wait=True 时同步写入，写入失败抛出异常
+    """
+    values = _result_values(result, user_id, input_path, action_type, video_id, extra)
+    if wait:
+        return result_writer.write(values)
+    return result_writer.submit(values)
+
+
+async def persist_result_async(result: Dict[str, Any], user_id: str, input_path: Path, action_type: str,
+                               video_id: Optional[str] = None, extra: Optional[Dict[str, Any]] = None) -> str:
+    """persist_result 的协程版本（异步接口中使用）：回退为同步写入时不阻塞事件循环"""
+    values = _result_values(result, user_id, input_path, action_type, video_id, extra)
+    return await result_writer.submit_async(values)
+
+
+def analyze_uploaded_video(video_id: str, input_path: Path, action_type: str, user_id: str,
+                           extra: Optional[Dict[str, Any]] = None, quality: Optional[Dict[str, Any]] = None) -> None:
+    """分析已上传的视频并回写到原记录（开启规范化时先转码再分析）"""
+    extra = dict(extra or {})
+    try:
+        result = analyze_upload(input_path, action_type, video_id, extra.get("probe"), extra, quality=quality)
+    except Exception as e:
+        print(f"警告: 视频 {video_id} 分析失败: {str(e)}")
+        return
+    persist_result(result, user_id, input_path, action_type, video_id=video_id, extra=extra)
+
+
+def normalize_uploaded_video(video_id: str, input_path: Path, probe: Dict[str, Any]) -> None:
+    """后台规范化已上传的视频，并将规范化文件的信息记入 extra_metadata["normalized"]"""
+    try:
+        analysis_path, normalized_probe = prepare_input(input_path, video_id, probe)
+    except Exception as e:
+        print(f"警告: 视频 {video_id} 规范化失败: {str(e)}")
+        return
+    if analysis_path == Path(input_path):
+        return
+
+    db = SessionLocal()
+    try:
+        video = db.get(Video, video_id)
+        if video is None:
+            return
+        # JSON 列需整体赋值才会被识别为修改
+        extra_metadata = dict(video.extra_metadata or {})
+        extra_metadata["normalized"] = normalized_metadata(analysis_path, normalized_probe)
+        video.extra_metadata = extra_metadata
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"警告: 视频 {video_id} 规范化信息保存失败: {str(e)}")
+    finally:
+        db.close()
+
+
+def schedule_uploaded_video(video_id: str, input_path: Path, action_type: str, user_id: str,
+                            extra: Optional[Dict[str, Any]] = None):
+    """将已上传视频的分析作为 batch 任务交给调度器"""
+    quality = choose_quality((extra or {}).get("probe"), job_class="batch")
+    return analysis_scheduler.submit(
+        analyze_uploaded_video, video_id, input_path, action_type, user_id, extra, quality,
+        cost=quality["cost"], job_class="batch", label=video_id
+    )
+
+
+# ========== 持久化任务队列（JOB_QUEUE_ENABLED，见 worker.py） ==========
+def enqueue_analysis(input_path: Path, action_type: str, file_id: str, user_id: Optional[str],
+                     extra: Optional[Dict[str, Any]] = None, video_id: Optional[str] = None,
+                     job_class: str = "batch") -> str:
+    """将分析写入持久化任务队列，返回任务 id
+
+    输入文件与输出目录需要位于 API 与 worker 共享的存储上（路径一致）。
+    质量档位由 worker 在执行时按自己的负载选择。
+    有提交者时预先分配 video_id：队列至少执行一次，任务重跑时更新同一条记录而不是新增
+    """
+    from .job_queue import get_job_queue
+    if user_id and video_id is None:
+        video_id = str(uuid.uuid4())
+    payload = {
+        "input_path": str(input_path),
+        "action_type": action_type,
+        "file_id": file_id,
+        "video_id": video_id,
+        "job_class": job_class,
+        "extra": extra or {},
+    }
+    return get_job_queue().enqueue(payload, user_id=user_id, job_class=job_class)
+
+
+def run_analysis_job(payload: Dict[str, Any], user_id: Optional[str] = None,
+                     cancel_token: Optional[CancellationToken] = None) -> Dict[str, Any]:
+    """worker 执行一个队列任务：分析并（有提交者时）同步写入视频记录，返回写入任务结果的摘要
+
+    写入失败时抛出异常，任务按失败处理并重试，不会在记录缺失时标记完成
+    """
+    input_path = Path(payload["input_path"])
+    action_type = payload["action_type"]
+    extra = dict(payload.get("extra") or {})
+    quality = choose_quality(extra.get("probe"), job_class=payload.get("job_class", "batch"))
+    result = analyze_upload(input_path, action_type, payload["file_id"], extra.get("probe"), extra,
+                            cancel_token=cancel_token, quality=quality, keep_series=bool(user_id))
+    video_id = None
+    if user_id:
+        video_id = persist_result(result, user_id, input_path, action_type, video_id=payload.get("video_id"),
+                                  extra=extra, wait=True)
+    return {
+        "action": action_type,
+        "score": result.get("score"),
+        "video_url": result.get("video_url"),
+        "suggestions": result.get("suggestions", []),
+        "quality": result.get("quality"),
+        "video_id": video_id,
+    }
@@ -0,0 +1,172 @@
+# 逐帧关节角度时间序列的紧凑存储（int16 量化 + 多分辨率金字塔）
+#
+# 文件格式 (.angles):
+#   b"ANGS" | uint32 头部长度 | JSON 头部 | 各层数据 (int16, 小端)
+#   第 0 层: (帧数, 关节数, 2)         通道 0=角度, 1=偏差
+#   第 k 层: (桶数, 关节数, 2, 3)      每桶 factor^k 帧的 min / max / mean
+# 数值按 SCALE 放大后取整，缺失值（未检测到/不可见）记为 MISSING
+import json
+import math
+import struct
+import warnings
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+MAGIC = b"ANGS"
+VERSION = 1
+SCALE = 100  # 0.01 度精度，180 度 -> 18000，在 int16 范围内
+MISSING = -32768
+CHANNELS = ("angle", "deviation")
+STATS = ("min", "max", "mean")
+
+
+def _quantize(values: np.ndarray) -> np.ndarray:
+    quantized = np.full(values.shape, MISSING, dtype="<i2")
+    valid = ~np.isnan(values)
+    quantized[valid] = np.clip(np.round(values[valid] * SCALE), -32767, 32767).astype("<i2")
+    return quantized
+
+
+def _dequantize(values: np.ndarray) -> np.ndarray:
+    result = values.astype(np.float32) / SCALE
+    result[values == MISSING] = np.nan
+    return result
+
+
+def _downsample(frames: np.ndarray, factor: int) -> np.ndarray:
+    """(帧数, 关节数, 2) -> (桶数, 关节数, 2, 3)"""
+    buckets = math.ceil(frames.shape[0] / factor)
+    padded = np.full((buckets * factor,) + frames.shape[1:], np.nan, dtype=np.float32)
+    padded[:frames.shape[0]] = frames
+    grouped = padded.reshape((buckets, factor) + frames.shape[1:])
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)  # 全部缺失的桶
+        return np.stack([
+            np.nanmin(grouped, axis=1),
+            np.nanmax(grouped, axis=1),
+            np.nanmean(grouped, axis=1),
+        ], axis=-1)
+
+
+def write_angle_series(path: str, angles: np.ndarray, deviations: np.ndarray, fps: float,
+                       joints: List[str], factor: int = 4, min_level_length: int = 8) -> Dict[str, Any]:
+    """写入角度序列及其降采样金字塔
+
+    Args:
+        angles / deviations: (帧数, 关节数) 浮点数组，缺失值为 NaN
+        factor: 相邻层之间的降采样倍数
+        min_level_length: 最粗一层的长度不超过该值
+    """
+    frames = np.stack([angles, deviations], axis=-1).astype(np.float32)
+    levels = [(1, _quantize(frames))]
+    step = factor
+    while levels[-1][1].shape[0] > min_level_length:
+        levels.append((step, _quantize(_downsample(frames, step))))
+        step *= factor
+
+    header = {
+        "version": VERSION,
+        "fps": fps,
+        "frame_count": int(frames.shape[0]),
+        "joints": list(joints),
+        "channels": list(CHANNELS),
+        "stats": list(STATS),
+        "scale": SCALE,
+        "missing": MISSING,
+        "levels": [],
+    }
+    # 偏移量相对于数据区起点，与头部长度无关
+    offset = 0
+    for step, data in levels:
+        header["levels"].append({"factor": step, "length": int(data.shape[0]),
+                                 "offset": offset, "row_bytes": int(data[0].nbytes) if len(data) else 0})
+        offset += data.nbytes
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    data_start = len(MAGIC) + 4 + len(header_bytes)
+
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header_bytes)))
+        f.write(header_bytes)
+        for _, data in levels:
+            f.write(data.tobytes())
+    header["data_start"] = data_start
+    return header
+
+
+def read_header(path: str) -> Dict[str, Any]:
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"不是有效的角度序列文件: {path}")
+        (length,) = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(length).decode("utf-8"))
+    header["data_start"] = len(MAGIC) + 4 + length
+    return header
+
+
+def read_range(path: str, start_frame: int = 0, end_frame: Optional[int] = None,
+               max_points: int = 500) -> Dict[str, Any]:
+    """读取 [start_frame, end_frame) 区间，自动选择点数不超过 max_points 的最精细层
+
+    只读取所选层中对应区间的字节，不解码整个文件
+    """
+    header = read_header(path)
+    frame_count = header["frame_count"]
+    end_frame = frame_count if end_frame is None else min(end_frame, frame_count)
+    start_frame = max(0, min(start_frame, end_frame))
+    span = end_frame - start_frame
+
+    level = header["levels"][-1]
+    for candidate in header["levels"]:
+        if math.ceil(span / candidate["factor"]) <= max_points:
+            level = candidate
+            break
+
+    factor = level["factor"]
+    first = start_frame // factor
+    last = min(level["length"], math.ceil(end_frame / factor)) if span else first
+    joints = header["joints"]
+    row_shape = (len(joints), len(CHANNELS)) if factor == 1 else (len(joints), len(CHANNELS), len(STATS))
+    count = (last - first) * int(np.prod(row_shape))
+    data = np.fromfile(path, dtype="<i2", count=count,
+                       offset=header["data_start"] + level["offset"] + first * level["row_bytes"])
+    values = _dequantize(data.reshape((last - first,) + row_shape))
+    if factor == 1:
+        # 原始层 min = max = mean
+        values = np.repeat(values[..., np.newaxis], len(STATS), axis=-1)
+
+    def to_list(array: np.ndarray) -> List[Optional[float]]:
+        return [None if np.isnan(v) else round(float(v), 2) for v in array]
+
+    fps = header["fps"] or 30.0
+    series = {}
+    for j, joint in enumerate(joints):
+        series[joint] = {
+            channel: {stat: to_list(values[:, j, c, s]) for s, stat in enumerate(STATS)}
+            for c, channel in enumerate(CHANNELS)
+        }
+    return {
+        "fps": fps,
+        "frame_count": frame_count,
+        "factor": factor,
+        "start_frame": first * factor,
+        "timestamps": [round((first + i) * factor / fps, 3) for i in range(last - first)],
+        "joints": series,
+    }
+
+
+def read_frames(path: str) -> Dict[str, Any]:
+    """读取原始层的全部逐帧数据（用于导出）"""
+    header = read_header(path)
+    level = header["levels"][0]
+    joints = header["joints"]
+    data = np.fromfile(path, dtype="<i2", count=level["length"] * len(joints) * len(CHANNELS),
+                       offset=header["data_start"] + level["offset"])
+    values = _dequantize(data.reshape((level["length"], len(joints), len(CHANNELS))))
+    return {
+        "fps": header["fps"],
+        "joints": joints,
+        "angles": values[:, :, 0],
+        "deviations": values[:, :, 1],
+    }
@@ -0,0 +1,148 @@
+# 分析任务的协作式取消（客户端断开 / 请求截止时间）
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, Iterable, List, Optional
+
+from ..core.config import settings
+
+
+class AnalysisCancelled(Exception):
+    """分析被取消（reason: client_disconnected / deadline_exceeded / ...）"""
+
+    def __init__(self, reason: str):
+        super().__init__(f"分析已取消: {reason}")
+        self.reason = reason
+
+
+class CancellationToken:
+    """线程安全的取消标记，帧循环等检查点通过 raise_if_cancelled() 协作退出
+
+    deadline 为 time.monotonic() 时间，到期即视为已取消，无需额外的定时器
+    """
+
+    def __init__(self, deadline: Optional[float] = None):
+        self.deadline = deadline
+        self._event = threading.Event()
+        self._reason: Optional[str] = None
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        if not self._event.is_set():
+            self._reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        if self._event.is_set():
+            return True
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel("deadline_exceeded")
+            return True
+        return False
+
+    @property
+    def reason(self) -> Optional[str]:
+        return self._reason if self.cancelled else None
+
+    def raise_if_cancelled(self) -> None:
+        if self.cancelled:
+            raise AnalysisCancelled(self._reason)
+
+
+class SharedCancellation(CancellationToken):
+    """多个请求共享同一次分析时使用：所有请求都取消后才取消分析"""
+
+    def __init__(self, tokens: Iterable[CancellationToken] = ()):
+        super().__init__()
+        self._tokens: List[CancellationToken] = list(tokens)
+        self._lock = threading.Lock()
+
+    def add(self, token: CancellationToken) -> None:
+        with self._lock:
+            self._tokens.append(token)
+
+    @property
+    def cancelled(self) -> bool:
+        if self._event.is_set():
+            return True
+        with self._lock:
+            tokens = list(self._tokens)
+        if tokens and all(token.cancelled for token in tokens):
+            self.cancel(tokens[-1].reason or "cancelled")
+            return True
+        return False
+
+
+class CancellationStats:
+    """按原因与阶段统计取消次数（queued: 排队时取消；running: 帧循环中取消；waiting: 请求放弃等待）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+
+    def record(self, reason: Optional[str], stage: str) -> None:
+        key = f"{reason or 'cancelled'}:{stage}"
+        with self._lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self.counts)
+        # waiting 统计的是放弃等待的请求；queued / running 统计的是实际中止的分析（合并执行时二者不一一对应）
+        return {
+            "requests": sum(v for k, v in counts.items() if k.endswith(":waiting")),
+            "analyses": sum(v for k, v in counts.items() if not k.endswith(":waiting")),
+            "by_reason": counts
+        }
+
+
+cancellation_stats = CancellationStats()
+
+
+def request_deadline(timeout_seconds: Optional[float]) -> Optional[float]:
+    """由客户端给出的等待秒数与服务端上限得到截止时间（monotonic）"""
+    limits = []
+    if timeout_seconds and timeout_seconds > 0:
+        limits.append(timeout_seconds)
+    if settings.ANALYSIS_MAX_SECONDS > 0:
+        limits.append(settings.ANALYSIS_MAX_SECONDS)
+    return time.monotonic() + min(limits) if limits else None
+
+
+async def watch_disconnect(request, token: CancellationToken, interval: Optional[float] = None) -> None:
+    """后台轮询客户端是否断开，断开时取消 token（由调用方在请求结束时取消本任务）"""
+    interval = interval or settings.DISCONNECT_POLL_INTERVAL
+    while not token.cancelled:
+        if await request.is_disconnected():
+            token.cancel("client_disconnected")
+            return
+        await asyncio.sleep(interval)
+
+
+async def wait_cancellable(awaitable, token: CancellationToken, interval: Optional[float] = None) -> Any:
+    """等待 awaitable，token 取消时立即抛出 AnalysisCancelled（不取消 awaitable 本身）"""
+    interval = interval or settings.DISCONNECT_POLL_INTERVAL
+    task = asyncio.ensure_future(awaitable)
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=interval)
+        if done:
+            return task.result()
+        if token.cancelled:
+            # 不再等待的结果不产生 "exception was never retrieved" 警告
+            task.add_done_callback(lambda f: f.cancelled() or f.exception())
+            cancellation_stats.record(token.reason, "waiting")
+            raise AnalysisCancelled(token.reason)
+
+
+async def wait_job(future: Future, token: CancellationToken, interval: Optional[float] = None) -> Any:
+    """等待调度器任务：尚未开始时取消直接出队；已开始时由帧循环检查点退出，等待其清理完成"""
+    interval = interval or settings.DISCONNECT_POLL_INTERVAL
+    wrapped = asyncio.wrap_future(future)
+    while True:
+        done, _ = await asyncio.wait({wrapped}, timeout=interval)
+        if done:
+            return wrapped.result()
+        if token.cancelled and future.cancel():
+            cancellation_stats.record(token.reason, "queued")
+            raise AnalysisCancelled(token.reason)
@@ -0,0 +1,209 @@
+# 分析历史的流式批量导出 (CSV / NDJSON / Parquet)
+import csv
+import io
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from ..database import SessionLocal
+from ..models import Video
+from .angle_series import read_frames
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+EXPORT_COLUMNS = [
+    "video_id", "user_id", "action_type", "camera_angle", "device", "score",
+    "suggestions", "created_at", "file_path", "processed_path",
+]
+
+
+class ExportFilters:
+    """导出过滤条件"""
+
+    def __init__(self, user_ids: Optional[Sequence[str]] = None, action_types: Optional[Sequence[str]] = None,
+                 start: Optional[datetime] = None, end: Optional[datetime] = None):
+        self.user_ids = list(user_ids or [])
+        self.action_types = list(action_types or [])
+        self.start = start
+        self.end = end
+
+
+def iter_rows(filters: ExportFilters, include_angles: bool = False,
+              chunk_size: int = 1000) -> Iterator[List[Dict[str, Any]]]:
+    """按块产出导出行
+
+    使用服务端游标 (stream_results) + yield_per，内存占用只与 chunk_size 有关；
+    使用独立会话，不依赖请求生命周期
+    """
+    columns = [getattr(Video, name) for name in EXPORT_COLUMNS]
+    if include_angles:
+        columns.append(Video.extra_metadata)
+
+    db = SessionLocal()
+    try:
+        query = db.query(*columns)
+        if filters.user_ids:
+            query = query.filter(Video.user_id.in_(filters.user_ids))
+        if filters.action_types:
+            query = query.filter(Video.action_type.in_(filters.action_types))
+        if filters.start:
+            query = query.filter(Video.created_at >= filters.start)
+        if filters.end:
+            query = query.filter(Video.created_at < filters.end)
+        query = query.order_by(Video.created_at, Video.video_id)
+        query = query.execution_options(stream_results=True, yield_per=chunk_size)
+
+        chunk = []
+        for row in query:
+            record = {name: getattr(row, name) for name in EXPORT_COLUMNS}
+            if include_angles:
+                record["angles"] = _load_angles(row.extra_metadata)
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    finally:
+        db.close()
+
+
+def _load_angles(extra_metadata: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    series_path = (extra_metadata or {}).get("angle_series")
+    if not series_path or not Path(series_path).exists():
+        return None
+    frames = read_frames(series_path)
+
+    def to_list(values: np.ndarray) -> List[Optional[float]]:
+        return [None if np.isnan(v) else round(float(v), 2) for v in values]
+
+    return {
+        "fps": frames["fps"],
+        "joints": {
+            joint: {
+                "angle": to_list(frames["angles"][:, j]),
+                "deviation": to_list(frames["deviations"][:, j]),
+            }
+            for j, joint in enumerate(frames["joints"])
+        },
+    }
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"无法序列化的类型: {type(value)}")
+
+
+def _flat_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """CSV / Parquet 使用扁平列：嵌套字段序列化为 JSON 字符串"""
+    flat = dict(record)
+    flat["suggestions"] = json.dumps(record.get("suggestions") or [], ensure_ascii=False)
+    flat["created_at"] = record["created_at"].isoformat() if record.get("created_at") else None
+    if "angles" in record:
+        flat["angles"] = json.dumps(record["angles"], ensure_ascii=False) if record["angles"] else None
+    return flat
+
+
+def stream_csv(chunks: Iterator[List[Dict[str, Any]]], include_angles: bool = False) -> Iterator[bytes]:
+    fieldnames = EXPORT_COLUMNS + (["angles"] if include_angles else [])
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+    # 带 BOM，方便 Excel 正确识别中文
+    buffer.write("\ufeff")
+    writer.writeheader()
+    for chunk in chunks:
+        for record in chunk:
+            writer.writerow(_flat_record(record))
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def stream_ndjson(chunks: Iterator[List[Dict[str, Any]]], include_angles: bool = False) -> Iterator[bytes]:
+    for chunk in chunks:
+        lines = [json.dumps(record, ensure_ascii=False, default=_json_default) for record in chunk]
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """收集 ParquetWriter 写出的字节，每写完一个 row group 取走一次"""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def take(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def stream_parquet(chunks: Iterator[List[Dict[str, Any]]], include_angles: bool = False) -> Iterator[bytes]:
+    """每个数据块写为一个 row group，写完即输出（需要安装 pyarrow）"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    fields = [
+        ("video_id", pa.string()), ("user_id", pa.string()), ("action_type", pa.string()),
+        ("camera_angle", pa.string()), ("device", pa.string()), ("score", pa.float64()),
+        ("suggestions", pa.string()), ("created_at", pa.string()), ("file_path", pa.string()),
+        ("processed_path", pa.string()),
+    ]
+    if include_angles:
+        fields.append(("angles", pa.string()))
+    schema = pa.schema(fields)
+
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for chunk in chunks:
+            flat = [_flat_record(record) for record in chunk]
+            writer.write_table(pa.Table.from_pylist(flat, schema=schema))
+            data = sink.take()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.take()
+
+
+_STREAMERS = {
+    "csv": stream_csv,
+    "ndjson": stream_ndjson,
+    "parquet": stream_parquet,
+}
+
+
+def stream_export(fmt: str, filters: ExportFilters, include_angles: bool = False,
+                  chunk_size: int = 1000) -> Iterator[bytes]:
+    """按格式流式导出，返回字节块迭代器"""
+    if fmt not in _STREAMERS:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+    if fmt == "parquet":
+        # 生成器是惰性执行的，提前检查依赖，避免响应头发出后才失败
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise RuntimeError("Parquet 导出需要安装 pyarrow")
+    return _STREAMERS[fmt](iter_rows(filters, include_angles, chunk_size), include_angles)
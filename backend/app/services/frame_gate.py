@@ -0,0 +1,121 @@
+# 姿态推理前的廉价帧过滤（画面静止 / 模糊的帧不送入姿态模型）
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from ..core.config import settings
+
+# 决策
+INFER = "infer"  # 送入姿态模型
+REUSE = "reuse"  # 人体区域内画面未变化，沿用上一次的检测结果（计入统计）
+SKIP_STATIC = "skip_static"  # 画面未变化且上次没有检测到人（空场景、固定手机的准备阶段）
+SKIP_BLUR = "skip_blur"  # 过于模糊，不参与统计
+
+PIXEL_DELTA = 16  # 灰度变化超过该值的像素视为变化（高于传感器噪声与压缩噪声）
+ROI_MARGIN = 0.2  # 人体包围框向外扩展的比例
+MIN_ROI_PIXELS = 64  # 缩小图上人体区域过小时改用全图
+
+
+def blur_score(gray: np.ndarray) -> float:
+    """拉普拉斯方差（越小越模糊）"""
+    _, std = cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_16S))
+    return float(std[0, 0]) ** 2
+
+
+class FrameGate:
+    """对每个待分析帧做一次低成本判断，决定是否需要运行姿态模型
+
+    - 在缩小到最长边 size 的灰度图上计算（双线性缩小，保留高频细节，耗时约为 INTER_AREA 的 1/10）：
+      - 模糊度：拉普拉斯方差，低于 blur_threshold 视为过于模糊
+      - 运动量：与上一次推理帧相比灰度变化超过 PIXEL_DELTA 的像素比例；
+        已知人体位置时只比较人体区域（上次关键点的包围框），手臂等小幅动作也能检出
+    - 画面未变化时：上次检测到人则沿用结果，否则跳过
+    - 连续 max_skip 个帧未推理后强制推理一次，避免一直沿用过时的结果或错过静止入画的人
+    """
+
+    def __init__(self, motion_threshold: float = 0.01, blur_threshold: float = 10.0,
+                 max_skip: int = 15, size: int = 256):
+        self.motion_threshold = motion_threshold
+        self.blur_threshold = blur_threshold
+        self.max_skip = max(0, max_skip)
+        self.size = size
+        self._reference: Optional[np.ndarray] = None  # 上一次推理帧的缩小灰度图
+        self._roi: Optional[Tuple[int, int, int, int]] = None  # 上次检测到的人体区域 (x0, y0, x1, y1)，缩小图坐标
+        self._since_infer = 0
+        self._small_shape: Optional[Tuple[int, int]] = None
+        self.counts = {INFER: 0, REUSE: 0, SKIP_STATIC: 0, SKIP_BLUR: 0}
+        self.seconds = 0.0
+
+    @classmethod
+    def from_settings(cls) -> Optional["FrameGate"]:
+        if not settings.FRAME_GATE_ENABLED:
+            return None
+        return cls(motion_threshold=settings.FRAME_GATE_MOTION_THRESHOLD,
+                   blur_threshold=settings.FRAME_GATE_BLUR_THRESHOLD,
+                   max_skip=settings.FRAME_GATE_MAX_SKIP,
+                   size=settings.FRAME_GATE_SIZE)
+
+    def _small_gray(self, frame: np.ndarray) -> np.ndarray:
+        if self._small_shape is None:
+            height, width = frame.shape[:2]
+            scale = min(1.0, self.size / float(max(width, height)))
+            self._small_shape = (max(1, int(width * scale)), max(1, int(height * scale)))
+        small = cv2.resize(frame, self._small_shape, interpolation=cv2.INTER_LINEAR)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    def check(self, frame: np.ndarray) -> str:
+        """判断 BGR 帧的处理方式（INFER / REUSE / SKIP_STATIC / SKIP_BLUR）"""
+        start = time.perf_counter()
+        gray = self._small_gray(frame)
+        decision = self._decide(gray)
+        if decision == INFER:
+            self._reference = gray
+            self._since_infer = 0
+        else:
+            self._since_infer += 1
+        self.counts[decision] += 1
+        self.seconds += time.perf_counter() - start
+        return decision
+
+    def _decide(self, gray: np.ndarray) -> str:
+        if self._reference is None or self._since_infer >= self.max_skip:
+            return INFER
+        if self.blur_threshold > 0 and blur_score(gray) < self.blur_threshold:
+            return SKIP_BLUR
+        if self._roi is not None:
+            x0, y0, x1, y1 = self._roi
+            diff = cv2.absdiff(gray[y0:y1, x0:x1], self._reference[y0:y1, x0:x1])
+        else:
+            diff = cv2.absdiff(gray, self._reference)
+        if np.count_nonzero(diff > PIXEL_DELTA) >= self.motion_threshold * diff.size:
+            return INFER
+        return REUSE if self._roi is not None else SKIP_STATIC
+
+    def update(self, pose_landmarks) -> None:
+        """推理后记录人体区域（可见关键点的包围框，向外扩展 ROI_MARGIN），没有检测到人时清空"""
+        if not pose_landmarks or self._small_shape is None:
+            self._roi = None
+            return
+        points = np.array([(lm.x, lm.y) for lm in pose_landmarks.landmark if lm.visibility >= 0.5],
+                          dtype=np.float64).reshape(-1, 2)
+        if len(points) == 0:
+            self._roi = None
+            return
+        width, height = self._small_shape
+        (x0, y0), (x1, y1) = points.min(axis=0), points.max(axis=0)
+        margin_x, margin_y = (x1 - x0) * ROI_MARGIN, (y1 - y0) * ROI_MARGIN
+        x0 = int(np.clip((x0 - margin_x) * width, 0, width - 1))
+        x1 = int(np.clip((x1 + margin_x) * width, 0, width - 1)) + 1
+        y0 = int(np.clip((y0 - margin_y) * height, 0, height - 1))
+        y1 = int(np.clip((y1 + margin_y) * height, 0, height - 1)) + 1
+        self._roi = (x0, y0, x1, y1) if (x1 - x0) * (y1 - y0) >= MIN_ROI_PIXELS else None
+
+    def stats(self) -> Dict[str, Any]:
+        checked = sum(self.counts.values())
+        return {
+            **self.counts,
+            "checked": checked,
+            "gate_ms_per_frame": round(self.seconds / checked * 1000, 3) if checked else None
+        }
@@ -0,0 +1,520 @@
+# 持久化的分析任务队列：API 进程入队，独立的 worker 进程（worker.py）按租约领取
+import json
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import and_, func, or_
+
+from ..core.config import settings
+from ..database import SessionLocal
+from ..models import AnalysisJob
+
+# 任务类别对应的领取优先级（越小越先领取），与调度器的类别一致
+JOB_PRIORITIES = {"interactive": 0, "batch": 1}
+JOB_STATUSES = ("queued", "running", "done", "failed")
+# 每次领取时检查的候选任务数（SQLite 没有行锁，多个 worker 从不同候选开始尝试，减少条件更新冲突）
+CLAIM_CANDIDATES = 5
+
+
+class Job:
+    """worker 领取到的任务"""
+
+    __slots__ = ("job_id", "payload", "user_id", "attempts")
+
+    def __init__(self, job_id: str, payload: Dict[str, Any], user_id: Optional[str], attempts: int):
+        self.job_id = job_id
+        self.payload = payload
+        self.user_id = user_id
+        self.attempts = attempts
+
+
+class SqlJobQueue:
+    """基于 DATABASE_URL 中 analysis_jobs 表的任务队列
+
+    - 领取：PostgreSQL / MySQL 下 SELECT ... FOR UPDATE SKIP LOCKED，多个 worker 拿到互不重叠的候选行；
+      再按 (状态, 领取次数) 条件更新为 running，SQLite（不支持行锁）同样由条件更新保证只有一个 worker 成功
+    - 租约：worker 定期心跳续期 lease_expires_at；worker 崩溃或失联后租约到期，任务被下一个 worker 直接领取。
+      领取次数达到 max_attempts 的过期任务标记为失败，避免反复拖垮 worker 的任务无限重试
+    - 分析失败时按 retry_delay × 已领取次数 延迟重试，次数用完后标记为失败
+    - 任务以 worker 身份 (owner) 续期与结束，租约已被接手的 worker 无法再覆盖结果
+    """
+
+    backend = "sql"
+
+    def __init__(self, session_factory: Callable = SessionLocal, lease_seconds: float = 60.0,
+                 max_attempts: int = 3, retry_delay: float = 10.0, retention_hours: float = 168.0):
+        self.session_factory = session_factory
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.retry_delay = retry_delay
+        self.retention_hours = retention_hours
+        self._lock = threading.Lock()
+        # 统计（本进程）
+        self.enqueued = 0
+        self.claimed = 0
+        self.requeued = 0  # 领取到租约过期的任务（上一个 worker 崩溃或失联）
+        self.abandoned = 0  # 租约过期且次数用完，标记为失败
+
+    # ========== 入队 / 查询（API 进程） ==========
+    def enqueue(self, payload: Dict[str, Any], user_id: Optional[str] = None, job_class: str = "batch") -> str:
+        if job_class not in JOB_PRIORITIES:
+            raise ValueError(f"未知的任务类别: {job_class}")
+        db = self.session_factory()
+        try:
+            job = AnalysisJob(user_id=user_id, payload=payload, priority=JOB_PRIORITIES[job_class],
+                              status="queued", attempts=0, max_attempts=self.max_attempts,
+                              available_at=datetime.utcnow())
+            db.add(job)
+            db.commit()
+            job_id = job.job_id
+        finally:
+            db.close()
+        with self._lock:
+            self.enqueued += 1
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        db = self.session_factory()
+        try:
+            job = db.get(AnalysisJob, job_id)
+            if job is None:
+                return None
+            return {
+                "job_id": job.job_id,
+                "user_id": job.user_id,
+                "status": job.status,
+                "attempts": job.attempts,
+                "max_attempts": job.max_attempts,
+                "result": job.result,
+                "error": job.error,
+                "created_at": job.created_at,
+                "started_at": job.started_at,
+                "finished_at": job.finished_at,
+            }
+        finally:
+            db.close()
+
+    # ========== 领取与租约（worker 进程） ==========
+    def claim(self, owner: str) -> Optional[Job]:
+        """领取一个可执行的任务（排队中且已到重试时间，或租约已过期），没有时返回 None"""
+        now = datetime.utcnow()
+        db = self.session_factory()
+        try:
+            candidates = (
+                db.query(AnalysisJob.job_id, AnalysisJob.status, AnalysisJob.attempts, AnalysisJob.max_attempts)
+                .filter(or_(
+                    and_(AnalysisJob.status == "queued", AnalysisJob.available_at <= now),
+                    and_(AnalysisJob.status == "running", AnalysisJob.lease_expires_at < now),
+                ))
+                .order_by(AnalysisJob.priority, AnalysisJob.available_at)
+                .limit(CLAIM_CANDIDATES)
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+            for job_id, status, attempts, max_attempts in candidates:
+                expected = (AnalysisJob.job_id == job_id, AnalysisJob.status == status,
+                            AnalysisJob.attempts == attempts)
+                if status == "running" and attempts >= max_attempts:
+                    abandoned = db.query(AnalysisJob).filter(*expected).update({
+                        AnalysisJob.status: "failed",
+                        AnalysisJob.error: f"worker 租约过期（已领取 {attempts} 次）",
+                        AnalysisJob.lease_expires_at: None,
+                        AnalysisJob.finished_at: now,
+                    }, synchronize_session=False)
+                    db.commit()
+                    if abandoned:
+                        with self._lock:
+                            self.abandoned += 1
+                    continue
+                taken = db.query(AnalysisJob).filter(*expected).update({
+                    AnalysisJob.status: "running",
+                    AnalysisJob.attempts: attempts + 1,
+                    AnalysisJob.owner: owner,
+                    AnalysisJob.lease_expires_at: now + timedelta(seconds=self.lease_seconds),
+                    AnalysisJob.started_at: now,
+                }, synchronize_session=False)
+                db.commit()
+                if not taken:
+                    continue  # 其他 worker 抢先领取
+                payload, user_id = db.query(AnalysisJob.payload, AnalysisJob.user_id).filter(
+                    AnalysisJob.job_id == job_id).one()
+                with self._lock:
+                    self.claimed += 1
+                    if status == "running":
+                        self.requeued += 1
+                return Job(job_id, payload, user_id, attempts + 1)
+            db.commit()  # 释放候选行的锁
+            return None
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _update_owned(self, job_id: str, owner: str, values: Dict[Any, Any]) -> bool:
+        """仅当任务仍由 owner 持有（running）时更新，返回是否成功"""
+        db = self.session_factory()
+        try:
+            updated = db.query(AnalysisJob).filter(
+                AnalysisJob.job_id == job_id, AnalysisJob.owner == owner, AnalysisJob.status == "running"
+            ).update(values, synchronize_session=False)
+            db.commit()
+            return bool(updated)
+        finally:
+            db.close()
+
+    def heartbeat(self, job_id: str, owner: str) -> bool:
+        """续期租约；返回 False 表示租约已丢失（过期后被其他 worker 接手）"""
+        return self._update_owned(job_id, owner, {
+            AnalysisJob.lease_expires_at: datetime.utcnow() + timedelta(seconds=self.lease_seconds)
+        })
+
+    def complete(self, job_id: str, owner: str, result: Dict[str, Any]) -> bool:
+        return self._update_owned(job_id, owner, {
+            AnalysisJob.status: "done",
+            AnalysisJob.result: result,
+            AnalysisJob.error: None,
+            AnalysisJob.lease_expires_at: None,
+            AnalysisJob.finished_at: datetime.utcnow(),
+        })
+
+    def fail(self, job_id: str, owner: str, error: str, attempts: int) -> bool:
+        """分析失败：次数未用完时延迟重新入队，否则标记为失败"""
+        now = datetime.utcnow()
+        if attempts < self.max_attempts:
+            return self._update_owned(job_id, owner, {
+                AnalysisJob.status: "queued",
+                AnalysisJob.error: error,
+                AnalysisJob.owner: None,
+                AnalysisJob.lease_expires_at: None,
+                AnalysisJob.available_at: now + timedelta(seconds=self.retry_delay * attempts),
+            })
+        return self._update_owned(job_id, owner, {
+            AnalysisJob.status: "failed",
+            AnalysisJob.error: error,
+            AnalysisJob.lease_expires_at: None,
+            AnalysisJob.finished_at: now,
+        })
+
+    def release(self, job_id: str, owner: str) -> bool:
+        """worker 停止时归还未完成的任务（立即可被领取，不计入领取次数）"""
+        return self._update_owned(job_id, owner, {
+            AnalysisJob.status: "queued",
+            AnalysisJob.attempts: AnalysisJob.attempts - 1,
+            AnalysisJob.owner: None,
+            AnalysisJob.lease_expires_at: None,
+            AnalysisJob.available_at: datetime.utcnow(),
+        })
+
+    def purge(self) -> int:
+        """删除超过保留时间的已结束任务，返回删除数"""
+        cutoff = datetime.utcnow() - timedelta(hours=self.retention_hours)
+        db = self.session_factory()
+        try:
+            deleted = db.query(AnalysisJob).filter(
+                AnalysisJob.status.in_(("done", "failed")), AnalysisJob.finished_at < cutoff
+            ).delete(synchronize_session=False)
+            db.commit()
+            return deleted
+        finally:
+            db.close()
+
+    # ========== 统计 ==========
+    def stats(self) -> Dict[str, Any]:
+        now = datetime.utcnow()
+        db = self.session_factory()
+        try:
+            counts = dict(db.query(AnalysisJob.status, func.count(AnalysisJob.job_id)).group_by(AnalysisJob.status))
+            oldest = db.query(func.min(AnalysisJob.created_at)).filter(AnalysisJob.status == "queued").scalar()
+            expired = db.query(func.count(AnalysisJob.job_id)).filter(
+                AnalysisJob.status == "running", AnalysisJob.lease_expires_at < now).scalar()
+        finally:
+            db.close()
+        with self._lock:
+            local = {"enqueued": self.enqueued, "claimed": self.claimed, "requeued": self.requeued,
+                     "abandoned": self.abandoned}
+        return {
+            "backend": self.backend,
+            "jobs": {status: counts.get(status, 0) for status in JOB_STATUSES},
+            "expired_leases": expired,
+            "oldest_queued_seconds": round((now - oldest).total_seconds(), 1) if oldest else None,
+            "process": local,
+        }
+
+
+class RedisJobQueue:
+    """基于 Redis 兼容服务的任务队列（JOB_QUEUE_BACKEND=redis）
+
+    键（prefix 默认 aimovement:jobs）：
+    - {prefix}:job:{id}      任务哈希（payload、状态、领取次数、owner、结果等）
+    - {prefix}:queue:{0|1}   各优先级的待领取列表
+    - {prefix}:leases        running 任务的租约到期时间（有序集合）
+    - {prefix}:delayed       等待重试的任务与可执行时间（有序集合）
+    - {prefix}:finished:{done|failed}  已结束任务与结束时间（有序集合，用于按状态统计，超过保留时间的由 purge 清理）
+
+    状态变更都在 WATCH / MULTI 事务中完成（不依赖 Lua 脚本），
+    测试中可以用 fakeredis 等本地替代实现（通过 client 参数传入）。
+    已结束的任务按 retention_hours 设置过期时间，由 Redis 自动清理
+    """
+
+    backend = "redis"
+
+    def __init__(self, client, prefix: str = "aimovement:jobs", lease_seconds: float = 60.0,
+                 max_attempts: int = 3, retry_delay: float = 10.0, retention_hours: float = 168.0):
+        self.client = client
+        self.prefix = prefix
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.retry_delay = retry_delay
+        self.retention_hours = retention_hours
+        self._lock = threading.Lock()
+        self.enqueued = 0
+        self.claimed = 0
+        self.requeued = 0
+        self.abandoned = 0
+
+    def _job_key(self, job_id: str) -> str:
+        return f"{self.prefix}:job:{job_id}"
+
+    def _queue_key(self, priority: int) -> str:
+        return f"{self.prefix}:queue:{priority}"
+
+    @property
+    def _leases_key(self) -> str:
+        return f"{self.prefix}:leases"
+
+    @property
+    def _delayed_key(self) -> str:
+        return f"{self.prefix}:delayed"
+
+    def _finished_key(self, status: str) -> str:
+        return f"{self.prefix}:finished:{status}"
+
+    @staticmethod
+    def _now() -> datetime:
+        return datetime.utcnow()
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    # ========== 入队 / 查询 ==========
+    def enqueue(self, payload: Dict[str, Any], user_id: Optional[str] = None, job_class: str = "batch") -> str:
+        if job_class not in JOB_PRIORITIES:
+            raise ValueError(f"未知的任务类别: {job_class}")
+        job_id = str(uuid.uuid4())
+        priority = JOB_PRIORITIES[job_class]
+        pipe = self.client.pipeline(transaction=True)
+        pipe.hset(self._job_key(job_id), mapping={
+            "payload": json.dumps(payload, ensure_ascii=False),
+            "user_id": user_id or "",
+            "priority": priority,
+            "status": "queued",
+            "attempts": 0,
+            "max_attempts": self.max_attempts,
+            "created_at": self._now().isoformat(),
+        })
+        pipe.rpush(self._queue_key(priority), job_id)
+        pipe.execute()
+        self._count("enqueued")
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        data = self.client.hgetall(self._job_key(job_id))
+        if not data:
+            return None
+        return {
+            "job_id": job_id,
+            "user_id": data.get("user_id") or None,
+            "status": data.get("status"),
+            "attempts": int(data.get("attempts", 0)),
+            "max_attempts": int(data.get("max_attempts", self.max_attempts)),
+            "result": json.loads(data["result"]) if data.get("result") else None,
+            "error": data.get("error") or None,
+            "created_at": data.get("created_at") or None,
+            "started_at": data.get("started_at") or None,
+            "finished_at": data.get("finished_at") or None,
+        }
+
+    # ========== 领取与租约 ==========
+    def _promote_delayed(self, now_ts: float) -> None:
+        """到达重试时间的任务移回待领取列表"""
+        for job_id in self.client.zrangebyscore(self._delayed_key, "-inf", now_ts):
+            def move(pipe, job_id=job_id):
+                score = pipe.zscore(self._delayed_key, job_id)
+                if score is None or score > now_ts:
+                    return
+                priority = int(pipe.hget(self._job_key(job_id), "priority") or 0)
+                pipe.multi()
+                pipe.zrem(self._delayed_key, job_id)
+                pipe.rpush(self._queue_key(priority), job_id)
+            self.client.transaction(move, self._delayed_key)
+
+    def _recover_expired(self, now_ts: float) -> None:
+        """租约过期的任务重新入队（排在最前）；领取次数用完时标记为失败"""
+        for job_id in self.client.zrangebyscore(self._leases_key, "-inf", now_ts):
+            job_key = self._job_key(job_id)
+
+            def recover(pipe, job_id=job_id, job_key=job_key):
+                score = pipe.zscore(self._leases_key, job_id)
+                if score is None or score > now_ts:
+                    return None
+                attempts, max_attempts, priority = pipe.hmget(job_key, "attempts", "max_attempts", "priority")
+                pipe.multi()
+                pipe.zrem(self._leases_key, job_id)
+                if int(attempts or 0) >= int(max_attempts or self.max_attempts):
+                    self._finish(pipe, job_key, job_id, {"status": "failed", "owner": "",
+                                                         "error": f"worker 租约过期（已领取 {attempts} 次）"})
+                    return "abandoned"
+                pipe.hset(job_key, mapping={"status": "queued", "owner": ""})
+                pipe.lpush(self._queue_key(int(priority or 0)), job_id)
+                return "requeued"
+
+            outcome = self.client.transaction(recover, self._leases_key, job_key, value_from_callable=True)
+            if outcome:
+                self._count(outcome)
+
+    def claim(self, owner: str) -> Optional[Job]:
+        now = self._now()
+        now_ts = now.timestamp()
+        self._promote_delayed(now_ts)
+        self._recover_expired(now_ts)
+        for priority in sorted(set(JOB_PRIORITIES.values())):
+            queue_key = self._queue_key(priority)
+
+            def pop(pipe):
+                job_id = pipe.lindex(queue_key, 0)
+                if job_id is None:
+                    return None
+                pipe.multi()
+                pipe.lpop(queue_key)
+                pipe.hincrby(self._job_key(job_id), "attempts", 1)
+                pipe.hset(self._job_key(job_id), mapping={"status": "running", "owner": owner,
+                                                          "started_at": now.isoformat()})
+                pipe.zadd(self._leases_key, {job_id: now_ts + self.lease_seconds})
+                return job_id
+
+            job_id = self.client.transaction(pop, queue_key, value_from_callable=True)
+            if job_id is None:
+                continue
+            payload, user_id, attempts = self.client.hmget(self._job_key(job_id), "payload", "user_id", "attempts")
+            self._count("claimed")
+            return Job(job_id, json.loads(payload), user_id or None, int(attempts))
+        return None
+
+    def _update_owned(self, job_id: str, owner: str, apply: Callable) -> bool:
+        """仅当任务仍由 owner 持有（running）时在事务中执行 apply(pipe)，返回是否成功"""
+        job_key = self._job_key(job_id)
+
+        def update(pipe):
+            current_owner, status = pipe.hmget(job_key, "owner", "status")
+            if current_owner != owner or status != "running":
+                return False
+            pipe.multi()
+            apply(pipe, job_key)
+            return True
+
+        return self.client.transaction(update, job_key, value_from_callable=True)
+
+    def heartbeat(self, job_id: str, owner: str) -> bool:
+        expires = self._now().timestamp() + self.lease_seconds
+        return self._update_owned(job_id, owner, lambda pipe, key: pipe.zadd(self._leases_key, {job_id: expires}))
+
+    def _finish(self, pipe, job_key: str, job_id: str, values: Dict[str, Any]) -> None:
+        now = self._now()
+        pipe.zrem(self._leases_key, job_id)
+        pipe.hset(job_key, mapping={**values, "finished_at": now.isoformat()})
+        pipe.expire(job_key, int(self.retention_hours * 3600))
+        pipe.zadd(self._finished_key(values["status"]), {job_id: now.timestamp()})
+
+    def complete(self, job_id: str, owner: str, result: Dict[str, Any]) -> bool:
+        values = {"status": "done", "result": json.dumps(result, ensure_ascii=False), "error": ""}
+        return self._update_owned(job_id, owner, lambda pipe, key: self._finish(pipe, key, job_id, values))
+
+    def fail(self, job_id: str, owner: str, error: str, attempts: int) -> bool:
+        if attempts >= self.max_attempts:
+            values = {"status": "failed", "error": error}
+            return self._update_owned(job_id, owner, lambda pipe, key: self._finish(pipe, key, job_id, values))
+        retry_at = self._now().timestamp() + self.retry_delay * attempts
+
+        def retry(pipe, key):
+            pipe.zrem(self._leases_key, job_id)
+            pipe.hset(key, mapping={"status": "queued", "owner": "", "error": error})
+            pipe.zadd(self._delayed_key, {job_id: retry_at})
+
+        return self._update_owned(job_id, owner, retry)
+
+    def release(self, job_id: str, owner: str) -> bool:
+        queue_key = self._queue_key(int(self.client.hget(self._job_key(job_id), "priority") or 0))
+
+        def requeue(pipe, key):
+            pipe.zrem(self._leases_key, job_id)
+            pipe.hincrby(key, "attempts", -1)
+            pipe.hset(key, mapping={"status": "queued", "owner": ""})
+            pipe.lpush(queue_key, job_id)
+
+        return self._update_owned(job_id, owner, requeue)
+
+    def purge(self) -> int:
+        """已结束的任务哈希由键过期自动清理，这里只从按状态统计的集合中移除超过保留时间的任务"""
+        cutoff = self._now().timestamp() - self.retention_hours * 3600
+        return sum(self.client.zremrangebyscore(self._finished_key(status), "-inf", cutoff)
+                   for status in ("done", "failed"))
+
+    # ========== 统计 ==========
+    def stats(self) -> Dict[str, Any]:
+        now_ts = self._now().timestamp()
+        cutoff = now_ts - self.retention_hours * 3600
+        queued = sum(self.client.llen(self._queue_key(p)) for p in set(JOB_PRIORITIES.values()))
+        with self._lock:
+            local = {"enqueued": self.enqueued, "claimed": self.claimed, "requeued": self.requeued,
+                     "abandoned": self.abandoned}
+        return {
+            "backend": self.backend,
+            "jobs": {
+                "queued": queued + self.client.zcard(self._delayed_key),
+                "running": self.client.zcard(self._leases_key),
+                # 与 SQL 后端一致：只统计保留期内的已结束任务
+                "done": self.client.zcount(self._finished_key("done"), cutoff, "+inf"),
+                "failed": self.client.zcount(self._finished_key("failed"), cutoff, "+inf"),
+            },
+            "expired_leases": self.client.zcount(self._leases_key, "-inf", now_ts),
+            "process": local,
+        }
+
+
+def create_job_queue(backend: Optional[str] = None, client=None):
+    """按配置创建任务队列；client 可传入 Redis 兼容的客户端（如测试中的 fakeredis）"""
+    backend = (backend or settings.JOB_QUEUE_BACKEND).lower()
+    options = {
+        "lease_seconds": settings.JOB_LEASE_SECONDS,
+        "max_attempts": settings.JOB_MAX_ATTEMPTS,
+        "retry_delay": settings.JOB_RETRY_DELAY_SECONDS,
+        "retention_hours": settings.JOB_RETENTION_HOURS,
+    }
+    if backend == "sql":
+        return SqlJobQueue(**options)
+    if backend == "redis":
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise RuntimeError(f"JOB_QUEUE_BACKEND=redis 需要安装 redis: {str(e)}") from e
+            client = redis.Redis.from_url(settings.JOB_QUEUE_REDIS_URL, decode_responses=True)
+        return RedisJobQueue(client, prefix=settings.JOB_QUEUE_REDIS_PREFIX, **options)
+    raise ValueError(f"不支持的任务队列后端: {backend}")
+
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """延迟创建全局任务队列（只在启用队列或 worker 进程中使用）"""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = create_job_queue()
+        return _job_queue
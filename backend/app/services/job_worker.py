@@ -0,0 +1,162 @@
+# 分析 worker：从持久化任务队列领取任务并执行，心跳续期租约（入口见 worker.py）
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from .analysis import run_analysis_job
+from .cancellation import AnalysisCancelled, CancellationToken
+from .job_queue import Job
+
+
+class AnalysisWorker:
+    """concurrency 个线程各自循环：领取 -> 执行 -> 标记完成 / 失败
+
+    - 心跳线程每 lease_seconds / 3 为所有进行中的任务续期；续期失败（租约已被其他 worker 接手）时
+      取消本地分析，结果以接手方为准
+    - stop()：不再领取新任务，等待进行中的任务完成；超过 timeout 后取消剩余分析并归还队列，
+      由其他 worker 重新领取（不计入领取次数）
+    - 队列为空时按 poll_interval（加随机抖动，避免多个 worker 同时轮询）等待
+    """
+
+    def __init__(self, queue, concurrency: int = 1, poll_interval: float = 1.0,
+                 purge_interval: float = 3600.0, handler: Callable = run_analysis_job):
+        self.queue = queue
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self.purge_interval = purge_interval
+        self.handler = handler
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._stopping = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._heartbeat_thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._active: Dict[str, CancellationToken] = {}
+        # 统计
+        self.completed = 0
+        self.failed = 0
+        self.lost = 0  # 租约丢失后放弃的任务
+        self.released = 0  # 停止时归还的任务
+
+    # ========== 生命周期 ==========
+    def start(self) -> None:
+        self._stopping.clear()
+        for index in range(self.concurrency):
+            thread = threading.Thread(target=self._run, name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        self._heartbeat_thread = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+        self._heartbeat_thread.start()
+
+    def request_stop(self) -> None:
+        """不再领取新任务（可在信号处理函数中调用），随后由 stop() 等待进行中的任务"""
+        self._stopping.set()
+
+    def stop(self, timeout: float = 300.0) -> None:
+        self._stopping.set()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        with self._lock:
+            tokens = list(self._active.values())
+        for token in tokens:
+            token.cancel("shutdown")
+        # 取消后帧循环在下一个检查点退出并归还任务
+        for thread in self._threads:
+            thread.join(30.0)
+        self._threads = []
+        if self._heartbeat_thread is not None:
+            self._heartbeat_thread.join(5.0)
+            self._heartbeat_thread = None
+
+    @property
+    def running(self) -> bool:
+        return any(thread.is_alive() for thread in self._threads)
+
+    def wait(self, interval: float = 1.0) -> None:
+        """阻塞到 request_stop() / stop() 被调用（主线程用于等待信号）"""
+        while not self._stopping.wait(interval):
+            pass
+
+    # ========== 工作线程 ==========
+    def _run(self) -> None:
+        last_purge = time.monotonic()
+        while not self._stopping.is_set():
+            try:
+                job = self.queue.claim(self.owner)
+            except Exception as e:
+                print(f"警告: 领取分析任务失败: {str(e)}")
+                job = None
+            if job is None:
+                self._stopping.wait(self.poll_interval * random.uniform(0.5, 1.5))
+                continue
+            self._process(job)
+            if self.purge_interval and time.monotonic() - last_purge > self.purge_interval:
+                last_purge = time.monotonic()
+                try:
+                    self.queue.purge()
+                except Exception as e:
+                    print(f"警告: 清理已结束的分析任务失败: {str(e)}")
+
+    def _process(self, job: Job) -> None:
+        token = CancellationToken()
+        with self._lock:
+            self._active[job.job_id] = token
+        try:
+            try:
+                result = self.handler(job.payload, user_id=job.user_id, cancel_token=token)
+            except AnalysisCancelled as e:
+                if e.reason == "lease_lost":
+                    self._count("lost")
+                    print(f"警告: 分析任务 {job.job_id} 的租约已被其他 worker 接手，放弃本次结果")
+                elif self.queue.release(job.job_id, self.owner):
+                    self._count("released")
+                return
+            except Exception as e:
+                print(f"警告: 分析任务 {job.job_id} 失败（第 {job.attempts} 次）: {str(e)}")
+                self.queue.fail(job.job_id, self.owner, str(e), job.attempts)
+                self._count("failed")
+                return
+            if self.queue.complete(job.job_id, self.owner, result):
+                self._count("completed")
+            else:
+                self._count("lost")
+                print(f"警告: 分析任务 {job.job_id} 完成时租约已丢失，结果以接手的 worker 为准")
+        except Exception as e:
+            # 队列不可用：不再续期，租约到期后由其他 worker 重新领取
+            print(f"警告: 分析任务 {job.job_id} 状态更新失败: {str(e)}")
+        finally:
+            with self._lock:
+                self._active.pop(job.job_id, None)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _heartbeat(self) -> None:
+        interval = max(self.queue.lease_seconds / 3.0, 0.1)
+        while self._threads and (not self._stopping.is_set() or self.running):
+            time.sleep(interval)
+            with self._lock:
+                active = list(self._active.items())
+            for job_id, token in active:
+                try:
+                    if not self.queue.heartbeat(job_id, self.owner):
+                        token.cancel("lease_lost")
+                except Exception as e:
+                    print(f"警告: 分析任务 {job_id} 租约续期失败: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "owner": self.owner,
+                "concurrency": self.concurrency,
+                "active": len(self._active),
+                "completed": self.completed,
+                "failed": self.failed,
+                "lost": self.lost,
+                "released": self.released,
+            }
@@ -0,0 +1,256 @@
+# 上传视频的媒体探测与规范化（恒定帧率 + 统一分析分辨率）
+import json
+import math
+import os
+import shutil
+import subprocess
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import cv2
+import numpy as np
+
+from ..core.config import settings
+
+
+def _parse_rate(value: Optional[str]) -> float:
+    """解析 ffprobe 的 "30000/1001" 形式帧率"""
+    if not value or value in ("0/0", "N/A"):
+        return 0.0
+    if "/" in value:
+        num, den = value.split("/", 1)
+        try:
+            return float(num) / float(den) if float(den) else 0.0
+        except ValueError:
+            return 0.0
+    try:
+        return float(value)
+    except ValueError:
+        return 0.0
+
+
+def _parse_number(*values: Any) -> float:
+    """依次尝试解析 ffprobe 的数值字段，跳过缺失、"N/A" 与非数值，全部无效时返回 0"""
+    for value in values:
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            continue
+        if math.isfinite(number):
+            return number
+    return 0.0
+
+
+def _display_size(width: int, height: int, rotation: int):
+    """旋转 90/270 度的视频，显示尺寸宽高互换"""
+    if rotation % 180 == 90:
+        return height, width
+    return width, height
+
+
+def _probe_ffprobe(path: str) -> Optional[Dict[str, Any]]:
+    binary = shutil.which(settings.FFPROBE_BIN)
+    if not binary:
+        return None
+    try:
+        completed = subprocess.run(
+            [binary, "-v", "error", "-select_streams", "v:0", "-print_format", "json",
+             "-show_streams", "-show_format", path],
+            capture_output=True, timeout=settings.PROBE_TIMEOUT_SECONDS, check=True
+        )
+        data = json.loads(completed.stdout or b"{}")
+    except (subprocess.SubprocessError, OSError, ValueError) as e:
+        print(f"警告: ffprobe 探测失败，改用 OpenCV: {str(e)}")
+        return None
+
+    streams = data.get("streams") or []
+    if not streams:
+        return None
+    stream = streams[0]
+    fmt = data.get("format") or {}
+
+    avg_fps = _parse_rate(stream.get("avg_frame_rate"))
+    base_fps = _parse_rate(stream.get("r_frame_rate"))
+    fps = avg_fps or base_fps
+
+    rotation = 0
+    tags = stream.get("tags") or {}
+    if tags.get("rotate"):
+        rotation = int(_parse_number(tags["rotate"]))
+    for side_data in stream.get("side_data_list") or []:
+        if "rotation" in side_data:
+            rotation = int(_parse_number(side_data["rotation"]))
+    rotation %= 360
+
+    duration = _parse_number(stream.get("duration"), fmt.get("duration"))
+    frame_count = int(_parse_number(stream.get("nb_frames"))) or int(round(duration * fps))
+    width, height = _display_size(int(stream.get("width") or 0), int(stream.get("height") or 0), rotation)
+
+    return {
+        "prober": "ffprobe",
+        "codec": stream.get("codec_name"),
+        "width": width,
+        "height": height,
+        "rotation": rotation,
+        "fps": round(fps, 3),
+        "frame_count": frame_count,
+        "duration": round(duration, 3),
+        # 平均帧率与基准帧率不一致即为可变帧率（手机录制常见）
+        "vfr": bool(avg_fps and base_fps and abs(avg_fps - base_fps) > 0.01 * base_fps),
+    }
+
+
+def _probe_opencv(path: str) -> Dict[str, Any]:
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError(f"无法打开视频文件: {path}")
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        fps = fps if fps and fps > 0 and not math.isnan(fps) else 0.0
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        fourcc = int(cap.get(cv2.CAP_PROP_FOURCC) or 0)
+        codec = "".join(chr((fourcc >> (8 * i)) & 0xFF) for i in range(4)).strip("\x00 ").lower() or None
+        rotation = int(cap.get(cv2.CAP_PROP_ORIENTATION_META) or 0) % 360
+        # OpenCV 默认按元数据自动旋转，读到的宽高即显示尺寸
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+        # 抽样前若干帧的时间戳估计是否为可变帧率
+        timestamps = []
+        for _ in range(settings.PROBE_SAMPLE_FRAMES):
+            if not cap.grab():
+                break
+            timestamps.append(cap.get(cv2.CAP_PROP_POS_MSEC))
+    finally:
+        cap.release()
+
+    if width <= 0 or height <= 0:
+        raise ValueError(f"无法解析视频尺寸: {path}")
+
+    vfr = False
+    intervals = np.diff(np.asarray(timestamps, dtype=np.float64))
+    intervals = intervals[intervals > 0]
+    if intervals.size >= 2:
+        vfr = bool(intervals.std() > 0.1 * intervals.mean())
+        if not fps:
+            fps = 1000.0 / float(intervals.mean())
+
+    duration = frame_count / fps if fps else 0.0
+    return {
+        "prober": "opencv",
+        "codec": codec,
+        "width": width,
+        "height": height,
+        "rotation": rotation,
+        "fps": round(fps, 3),
+        "frame_count": frame_count,
+        "duration": round(duration, 3),
+        "vfr": vfr,
+    }
+
+
+def probe_video(path) -> Dict[str, Any]:
+    """探测视频的时长、帧数、分辨率、旋转、编码与是否可变帧率
+
+    优先使用 ffprobe（读取容器元数据，不解码），不可用时退回 OpenCV。
+
+    Raises:
+        ValueError: 文件无法作为视频解析
+    """
+    path = str(path)
+    probe = _probe_ffprobe(path) or _probe_opencv(path)
+    if not probe["width"] or not probe["height"]:
+        raise ValueError(f"无法解析视频尺寸: {path}")
+    return probe
+
+
+def _target_size(width: int, height: int, max_side: int):
+    """按最长边缩放到 max_side 以内，保持宽高比，尺寸取偶数（编码器要求）"""
+    scale = min(1.0, max_side / float(max(width, height)))
+    return max(2, int(width * scale) // 2 * 2), max(2, int(height * scale) // 2 * 2)
+
+
+def needs_normalization(probe: Dict[str, Any], max_side: Optional[int] = None,
+                        fps: Optional[float] = None) -> bool:
+    """视频是否偏离规范格式（分辨率超限、可变帧率、帧率不同或带旋转元数据）"""
+    max_side = max_side or settings.NORMALIZE_MAX_SIDE
+    fps = fps or settings.NORMALIZE_FPS
+    return (
+        max(probe["width"], probe["height"]) > max_side
+        or probe.get("vfr", False)
+        or abs((probe.get("fps") or 0) - fps) > 0.01
+        or probe.get("rotation", 0) != 0
+    )
+
+
+def _normalize_ffmpeg(binary: str, input_path: str, output_path: str, size, fps: float) -> None:
+    # ffmpeg 默认按旋转元数据自动转正
+    subprocess.run(
+        [binary, "-y", "-v", "error", "-i", input_path,
+         "-vf", f"scale={size[0]}:{size[1]},fps={fps}",
+         "-an", "-c:v", "libx264", "-preset", "veryfast", "-crf", "23",
+         "-pix_fmt", "yuv420p", "-movflags", "+faststart", output_path],
+        capture_output=True, timeout=settings.NORMALIZE_TIMEOUT_SECONDS, check=True
+    )
+
+
+def _normalize_opencv(input_path: str, output_path: str, size, fps: float) -> None:
+    cap = cv2.VideoCapture(input_path)
+    if not cap.isOpened():
+        raise ValueError(f"无法打开视频文件: {input_path}")
+    out = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+    if not out.isOpened():
+        cap.release()
+        raise ValueError(f"无法创建输出视频文件: {output_path}")
+
+    # 按时间戳重采样为恒定帧率：每个输出时刻取不晚于该时刻的最近一帧
+    step = 1.0 / fps
+    next_time = 0.0
+    previous = None
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            timestamp = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            if frame.shape[1] != size[0] or frame.shape[0] != size[1]:
+                frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+            if previous is not None:
+                while next_time < timestamp - 1e-6:
+                    out.write(previous)
+                    next_time += step
+            previous = frame
+        if previous is not None:
+            out.write(previous)
+    finally:
+        cap.release()
+        out.release()
+
+
+def normalize_video(input_path, output_path, probe: Optional[Dict[str, Any]] = None,
+                    max_side: Optional[int] = None, fps: Optional[float] = None) -> Dict[str, Any]:
+    """转码为规范格式（恒定帧率、最长边不超过 max_side、无旋转），返回输出文件的探测结果
+
+    优先使用 ffmpeg，不可用时退回 OpenCV 逐帧重采样。失败时删除不完整的输出文件。
+    """
+    input_path, output_path = str(input_path), str(output_path)
+    max_side = max_side or settings.NORMALIZE_MAX_SIDE
+    fps = float(fps or settings.NORMALIZE_FPS)
+    probe = probe or probe_video(input_path)
+    size = _target_size(probe["width"], probe["height"], max_side)
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    binary = shutil.which(settings.FFMPEG_BIN)
+    try:
+        if binary:
+            _normalize_ffmpeg(binary, input_path, output_path, size, fps)
+        else:
+            _normalize_opencv(input_path, output_path, size, fps)
+        return probe_video(output_path)
+    except BaseException:
+        Path(output_path).unlink(missing_ok=True)
+        raise
+
+
+def normalized_path(video_id: str) -> Path:
+    return settings.NORMALIZED_DIR / f"{video_id}.mp4"
@@ -0,0 +1,184 @@
+# 分析视频的叠加层绘制（文字精灵缓存 + 骨架批量绘制）
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+# 与 mediapipe drawing_utils 一致：可见度 / 存在度低于该值的关键点不绘制
+VISIBILITY_THRESHOLD = 0.5
+PRESENCE_THRESHOLD = 0.5
+BORDER_COLOR = (224, 224, 224)  # 关键点外圈颜色（drawing_utils.WHITE_COLOR）
+
+Color = Tuple[int, int, int]
+
+
+class Sprite:
+    """预先光栅化的图形：颜色块 + 覆盖掩码（uint8），以及相对绘制原点的偏移"""
+
+    __slots__ = ("pixels", "mask", "dx", "dy")
+
+    def __init__(self, pixels: np.ndarray, mask: np.ndarray, dx: int, dy: int):
+        self.pixels = pixels
+        self.mask = mask
+        self.dx = dx
+        self.dy = dy
+
+
+def _crop(canvas: np.ndarray, pixels: np.ndarray, org: Tuple[int, int]) -> Sprite:
+    """按掩码画布的非零区域裁剪"""
+    ys, xs = np.nonzero(canvas)
+    if len(xs) == 0:
+        return Sprite(np.zeros((0, 0, 3), np.uint8), np.zeros((0, 0), np.uint8), 0, 0)
+    y0, y1, x0, x1 = ys.min(), ys.max() + 1, xs.min(), xs.max() + 1
+    return Sprite(np.ascontiguousarray(pixels[y0:y1, x0:x1]),
+                  np.ascontiguousarray((canvas[y0:y1, x0:x1] > 0).astype(np.uint8)),
+                  int(x0 - org[0]), int(y0 - org[1]))
+
+
+def rasterize_text(text: str, scale: float, color: Color, thickness: int = 2,
+                   font: int = cv2.FONT_HERSHEY_SIMPLEX) -> Sprite:
+    """用 cv2.putText 在足够大的画布上绘制一次，裁剪到实际覆盖的像素
+
+    putText 默认 LINE_8（无抗锯齿），结果与原点平移无关，因此贴图与直接 putText 逐像素一致
+    """
+    (width, height), baseline = cv2.getTextSize(text, font, scale, thickness)
+    pad = 2 * thickness + 4
+    canvas = np.zeros((height + baseline + 2 * pad, width + 2 * pad), dtype=np.uint8)
+    org = (pad, pad + height)
+    cv2.putText(canvas, text, org, font, scale, 255, thickness)
+    pixels = np.empty(canvas.shape + (3,), dtype=np.uint8)
+    pixels[:] = color
+    return _crop(canvas, pixels, org)
+
+
+def rasterize_landmark(radius: int, border_radius: int, color: Color, thickness: int) -> Sprite:
+    """关键点圆点：外圈 + 内圈，与 draw_landmarks 的两次 cv2.circle 相同（原点为圆心）"""
+    center = border_radius + thickness + 2
+    size = 2 * center + 1
+    canvas = np.zeros((size, size), dtype=np.uint8)
+    pixels = np.zeros((size, size, 3), dtype=np.uint8)
+    for r, c in ((border_radius, BORDER_COLOR), (radius, color)):
+        cv2.circle(canvas, (center, center), r, 255, thickness)
+        cv2.circle(pixels, (center, center), r, c, thickness)
+    return _crop(canvas, pixels, (center, center))
+
+
+class SpriteCache:
+    """按 (文字, 字号, 颜色, 线宽, 字体) 缓存精灵（LRU，进程内共享，线程安全）"""
+
+    def __init__(self, max_size: int = 2048):
+        self.max_size = max_size
+        self._items: "OrderedDict[tuple, Sprite]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, text: str, scale: float, color: Color, thickness: int, font: int) -> Sprite:
+        key = (text, scale, tuple(color), thickness, font)
+        with self._lock:
+            sprite = self._items.get(key)
+            if sprite is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return sprite
+            self.misses += 1
+        sprite = rasterize_text(text, scale, color, thickness, font)
+        with self._lock:
+            self._items[key] = sprite
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+        return sprite
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+sprite_cache = SpriteCache()
+
+
+class OverlayRenderer:
+    """叠加层绘制，输出与 cv2.putText / mp_drawing.draw_landmarks 逐像素一致
+
+    - 文字：首次出现时光栅化为精灵，之后只把覆盖到的小块区域拷贝进帧（角度 0-180 可预先生成）
+    - 骨架：关键点坐标向量化计算，所有骨骼一次 cv2.polylines 绘制；关键点圆点预先光栅化，
+      按序号依次贴图，保证相互重叠时的覆盖顺序与 draw_landmarks 相同
+    - 贴图用 cv2.copyTo 按掩码只写覆盖到的像素；压在画面边缘时退回直接绘制
+      （OpenCV 对裁剪后的图形光栅化略有不同）
+    """
+
+    def __init__(self, connections: Iterable[Tuple[int, int]] = (),
+                 landmark_color: Color = (0, 0, 255), connection_color: Color = BORDER_COLOR,
+                 thickness: int = 2, circle_radius: int = 2, landmark_thickness: Optional[int] = None,
+                 cache: SpriteCache = sprite_cache):
+        self.connections = np.array(sorted(connections), dtype=np.int64).reshape(-1, 2)
+        self.landmark_color = landmark_color
+        self.connection_color = connection_color
+        self.thickness = thickness
+        self.landmark_thickness = landmark_thickness if landmark_thickness is not None else thickness
+        self.circle_radius = circle_radius
+        self.border_radius = max(circle_radius + 1, int(circle_radius * 1.2))
+        self.cache = cache
+        self.dot = rasterize_landmark(circle_radius, self.border_radius, landmark_color, self.landmark_thickness)
+
+    # ========== 文字 ==========
+    def warm(self, texts: Iterable[str], scale: float, color: Color, thickness: int = 2,
+             font: int = cv2.FONT_HERSHEY_SIMPLEX) -> None:
+        """预先光栅化一组文字（如角度 "0°" ~ "180°"）"""
+        for text in texts:
+            self.cache.get(text, scale, color, thickness, font)
+
+    def text(self, image: np.ndarray, text: str, org: Tuple[int, int], scale: float, color: Color,
+             thickness: int = 2, font: int = cv2.FONT_HERSHEY_SIMPLEX) -> None:
+        """与 cv2.putText(image, text, org, font, scale, color, thickness) 效果相同"""
+        sprite = self.cache.get(text, scale, color, thickness, font)
+        if not self.blit(image, sprite, org[0] + sprite.dx, org[1] + sprite.dy):
+            cv2.putText(image, text, org, font, scale, color, thickness)
+
+    @staticmethod
+    def blit(image: np.ndarray, sprite: Sprite, x: int, y: int) -> bool:
+        """把精灵拷贝到 (x, y)（只写覆盖到的像素）；精灵不完全在画面内时不绘制并返回 False"""
+        h, w = sprite.mask.shape
+        if x < 0 or y < 0 or x + w > image.shape[1] or y + h > image.shape[0]:
+            return False
+        cv2.copyTo(sprite.pixels, sprite.mask, image[y:y + h, x:x + w])
+        return True
+
+    # ========== 骨架 ==========
+    def landmark_pixels(self, landmark_list, width: int, height: int) -> Tuple[np.ndarray, np.ndarray]:
+        """归一化关键点 -> (像素坐标 int32 [N, 2], 是否绘制 [N])，规则与 draw_landmarks 相同"""
+        values = np.array([
+            (lm.x, lm.y,
+             lm.visibility if lm.HasField("visibility") else 1.0,
+             lm.presence if lm.HasField("presence") else 1.0)
+            for lm in landmark_list.landmark
+        ], dtype=np.float64).reshape(-1, 4)
+        x, y = values[:, 0], values[:, 1]
+        valid = ((values[:, 2] >= VISIBILITY_THRESHOLD) & (values[:, 3] >= PRESENCE_THRESHOLD)
+                 & (x >= 0) & (x <= 1) & (y >= 0) & (y <= 1))
+        pixels = np.empty((len(values), 2), dtype=np.int32)
+        pixels[:, 0] = np.minimum(np.floor(x * width), width - 1)
+        pixels[:, 1] = np.minimum(np.floor(y * height), height - 1)
+        return pixels, valid
+
+    def skeleton(self, image: np.ndarray, landmark_list) -> None:
+        """与 draw_landmarks(image, landmark_list, connections, landmark_spec, connection_spec) 效果相同"""
+        if not landmark_list:
+            return
+        height, width = image.shape[:2]
+        pixels, valid = self.landmark_pixels(landmark_list, width, height)
+        if len(self.connections):
+            bones = self.connections[valid[self.connections[:, 0]] & valid[self.connections[:, 1]]]
+            if len(bones):
+                cv2.polylines(image, list(pixels[bones]), False, self.connection_color, self.thickness)
+        dot = self.dot
+        for x, y in pixels[valid].tolist():
+            if not self.blit(image, dot, x + dot.dx, y + dot.dy):
+                cv2.circle(image, (x, y), self.border_radius, BORDER_COLOR, self.landmark_thickness)
+                cv2.circle(image, (x, y), self.circle_radius, self.landmark_color, self.landmark_thickness)
+
+
+def angle_labels(suffix: str = "°") -> Sequence[str]:
+    """角度标签 "0°" ~ "180°"（与 process_video 的格式一致）"""
+    return [f"{angle}{suffix}" for angle in range(181)]
@@ -0,0 +1,177 @@
+# 每用户每动作的进度汇总（增量维护）
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..models import PoseProgress, Video
+
+
+def previous_scores(db: Session, video_ids: Iterable[str]) -> Dict[str, Tuple[Optional[float], Optional[datetime]]]:
+    """已存在的视频记录写入前的 (score, created_at)，供 apply_results 区分新增与更新"""
+    video_ids = list(video_ids)
+    if not video_ids:
+        return {}
+    return {
+        video_id: (score, created_at)
+        for video_id, score, created_at in
+        db.query(Video.video_id, Video.score, Video.created_at).filter(Video.video_id.in_(video_ids))
+    }
+
+
+def apply_results(db: Session, results: Iterable[Dict[str, Any]], window: Optional[int] = None,
+                  previous: Optional[Dict[str, Tuple[Optional[float], Optional[datetime]]]] = None) -> None:
+    """将新持久化的推理结果合并进汇总表（与结果写入处于同一事务，由调用方提交）
+
+    results 中每项需包含 user_id、action_type、score，created_at 缺省为当前时间
+    previous 为本批中已存在记录的原分数与创建时间（见 previous_scores）：原来有分数的记录
+    重新写入（任务重试、重新分析）时替换原分数，不再计为一次新的练习
+    """
+    window = window or settings.PROGRESS_RECENT_WINDOW
+    previous = dict(previous or {})
+    grouped: Dict[tuple, List[Dict[str, Any]]] = {}
+    for values in results:
+        if not values.get("user_id") or not values.get("action_type") or values.get("score") is None:
+            continue
+        key = (values["user_id"], values["action_type"])
+        grouped.setdefault(key, []).append(values)
+    if not grouped:
+        return
+
+    # 一次查询取出本批涉及的所有汇总行（PostgreSQL 下加行锁，防止并发更新丢失）
+    user_ids = {key[0] for key in grouped}
+    existing = {
+        (row.user_id, row.action_type): row
+        for row in db.query(PoseProgress)
+        .filter(PoseProgress.user_id.in_(user_ids))
+        .filter(PoseProgress.action_type.in_({key[1] for key in grouped}))
+        .with_for_update()
+    }
+
+    def created_at_of(values: Dict[str, Any]) -> Optional[datetime]:
+        return values.get("created_at") or previous.get(values.get("video_id"), (None, None))[1]
+
+    stale_bounds: Set[tuple] = set()
+    for key, items in grouped.items():
+        items.sort(key=lambda v: created_at_of(v) or datetime.min)
+        row = existing.get(key)
+        if row is None:
+            row = PoseProgress(user_id=key[0], action_type=key[1], count=0, score_sum=0.0, recent_scores=[])
+            db.add(row)
+            existing[key] = row
+        recent = list(row.recent_scores or [])
+        for values in items:
+            score = float(values["score"])
+            old_score = previous.get(values.get("video_id"), (None, None))[0]
+            created_at = created_at_of(values)
+            previous[values.get("video_id")] = (score, created_at)
+            if old_score is not None:
+                # 更新已计入的记录：替换原分数，次数不变
+                old_score = float(old_score)
+                row.score_sum = (row.score_sum or 0.0) - old_score + score
+                if old_score in recent:
+                    recent[len(recent) - 1 - recent[::-1].index(old_score)] = score
+                if old_score in (row.score_min, row.score_max):
+                    stale_bounds.add(key)
+                row.score_min = score if row.score_min is None else min(row.score_min, score)
+                row.score_max = score if row.score_max is None else max(row.score_max, score)
+                continue
+            row.count = (row.count or 0) + 1
+            row.score_sum = (row.score_sum or 0.0) + score
+            row.score_min = score if row.score_min is None else min(row.score_min, score)
+            row.score_max = score if row.score_max is None else max(row.score_max, score)
+            recent.append(score)
+            created_at = created_at or datetime.utcnow()
+            if row.last_practiced_at is None or created_at > row.last_practiced_at:
+                row.last_practiced_at = created_at
+        # JSON 列需整体赋值才会被识别为修改
+        row.recent_scores = recent[-window:]
+
+    # 被替换的原分数正好是最低 / 最高分时，从 videos 表重新计算（需先写入本批的记录）
+    if stale_bounds:
+        db.flush()
+        for user_id, action_type in stale_bounds:
+            score_min, score_max = (
+                db.query(func.min(Video.score), func.max(Video.score))
+                .filter(Video.user_id == user_id, Video.action_type == action_type, Video.score.isnot(None))
+                .one()
+            )
+            row = existing[(user_id, action_type)]
+            row.score_min, row.score_max = score_min, score_max
+
+
+def rebuild_progress(db: Session, window: Optional[int] = None) -> int:
+    """从 videos 表批量重建汇总表，返回生成的行数"""
+    window = window or settings.PROGRESS_RECENT_WINDOW
+    scored = (Video.user_id.isnot(None), Video.action_type.isnot(None), Video.score.isnot(None))
+
+    aggregates = (
+        db.query(
+            Video.user_id,
+            Video.action_type,
+            func.count(Video.video_id),
+            func.sum(Video.score),
+            func.min(Video.score),
+            func.max(Video.score),
+            func.max(Video.created_at),
+        )
+        .filter(*scored)
+        .group_by(Video.user_id, Video.action_type)
+        .all()
+    )
+
+    # 每组最近 N 次分数：窗口函数按时间倒序编号后取前 N 条
+    ranked = (
+        db.query(
+            Video.user_id,
+            Video.action_type,
+            Video.score,
+            Video.created_at,
+            func.row_number().over(
+                partition_by=(Video.user_id, Video.action_type),
+                order_by=(Video.created_at.desc(), Video.video_id.desc()),
+            ).label("rn"),
+        )
+        .filter(*scored)
+        .subquery()
+    )
+    recent: Dict[tuple, List[tuple]] = {}
+    for user_id, action_type, score, created_at in (
+        db.query(ranked.c.user_id, ranked.c.action_type, ranked.c.score, ranked.c.created_at)
+        .filter(ranked.c.rn <= window)
+    ):
+        recent.setdefault((user_id, action_type), []).append((created_at or datetime.min, score))
+
+    db.query(PoseProgress).delete(synchronize_session=False)
+    rows = []
+    for user_id, action_type, count, score_sum, score_min, score_max, last_at in aggregates:
+        scores = [score for _, score in sorted(recent.get((user_id, action_type), []), key=lambda item: item[0])]
+        rows.append({
+            "user_id": user_id,
+            "action_type": action_type,
+            "count": count,
+            "score_sum": score_sum,
+            "score_min": score_min,
+            "score_max": score_max,
+            "recent_scores": scores,
+            "last_practiced_at": last_at,
+            "updated_at": datetime.utcnow(),
+        })
+    if rows:
+        db.bulk_insert_mappings(PoseProgress, rows)
+    db.commit()
+    return len(rows)
+
+
+def score_trend(scores: List[float]) -> float:
+    """最近分数的线性趋势（每次练习的分数变化，最小二乘斜率）"""
+    n = len(scores)
+    if n < 2:
+        return 0.0
+    mean_x = (n - 1) / 2.0
+    mean_y = sum(scores) / n
+    numerator = sum((i - mean_x) * (y - mean_y) for i, y in enumerate(scores))
+    denominator = sum((i - mean_x) ** 2 for i in range(n))
+    return numerator / denominator
@@ -0,0 +1,152 @@
+# 按延迟预算选择分析质量档位（模型复杂度 / 推理分辨率 / 帧间隔）
+import time
+from typing import Any, Dict, List, Optional
+
+from ..core.config import settings
+from .ai_engine import pose_model_available
+from .scheduler import AnalysisScheduler, analysis_scheduler, estimate_cost
+
+
+class QualityTier:
+    """一个质量档位
+
+    - model_complexity: MediaPipe Pose 模型复杂度（0 lite / 1 full / 2 heavy）
+    - inference_max_side: 送入姿态模型前将帧缩放到的最长边，None 表示原分辨率
+    - frame_stride: 每隔多少帧做一次姿态检测（再乘以 ANALYSIS_FRAME_STRIDE）
+    - complexity_factor: 相对 full 模型的单帧耗时倍数，用于预估
+    """
+
+    __slots__ = ("name", "model_complexity", "inference_max_side", "frame_stride", "complexity_factor")
+
+    def __init__(self, name: str, model_complexity: int, inference_max_side: Optional[int],
+                 frame_stride: int, complexity_factor: float):
+        self.name = name
+        self.model_complexity = model_complexity
+        self.inference_max_side = inference_max_side
+        self.frame_stride = frame_stride
+        self.complexity_factor = complexity_factor
+
+    @property
+    def stride(self) -> int:
+        return self.frame_stride * max(1, settings.ANALYSIS_FRAME_STRIDE)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "tier": self.name,
+            "model_complexity": self.model_complexity,
+            "inference_max_side": self.inference_max_side,
+            "frame_stride": self.stride
+        }
+
+
+# 从高到低排列；standard 与引入档位之前的行为一致
+QUALITY_TIERS: List[QualityTier] = [
+    QualityTier("high", 2, None, 1, 2.5),
+    QualityTier("standard", 1, None, 1, 1.0),
+    QualityTier("reduced", 1, 640, 2, 1.0),
+    QualityTier("low", 0, 480, 3, 0.6),
+    QualityTier("minimal", 0, 360, 6, 0.6),
+]
+TIERS_BY_NAME = {tier.name: tier for tier in QUALITY_TIERS}
+DEFAULT_TIER = TIERS_BY_NAME["standard"]
+
+
+# 成本构成的相对权重（单位与调度器一致：百万像素·帧；绝对耗时由调度器的 seconds_per_unit 校准）
+IO_UNITS_PER_MP = 0.2  # 解码 + 绘制 + 编码：每帧都要做，与原分辨率成正比
+INFERENCE_UNITS_PER_FRAME = 0.25  # 姿态推理：模型输入尺寸固定，主要是每个分析帧的固定开销
+PREPROCESS_UNITS_PER_MP = 0.05  # 推理前的颜色转换与缩放，与推理分辨率成正比
+
+
+def tier_cost(probe: Optional[Dict[str, Any]], tier: QualityTier) -> float:
+    """档位下的预估成本 = 所有帧的读写开销 + 分析帧的推理开销 × 模型复杂度倍数"""
+    if not probe:
+        return 0.0
+    frames = probe.get("frame_count") or (probe.get("duration") or 0) * (probe.get("fps") or 0)
+    width, height = probe.get("width") or 0, probe.get("height") or 0
+    io_units = estimate_cost(probe) * IO_UNITS_PER_MP
+    if tier.inference_max_side and max(width, height) > tier.inference_max_side:
+        scale = tier.inference_max_side / float(max(width, height))
+        width, height = width * scale, height * scale
+    inference_units = frames / tier.stride * (INFERENCE_UNITS_PER_FRAME * tier.complexity_factor
+                                              + width * height / 1e6 * PREPROCESS_UNITS_PER_MP)
+    return io_units + inference_units
+
+
+class QualityController:
+    """根据延迟预算选择能按时完成的最高质量档位
+
+    预算 = min(请求的剩余截止时间, 目标完成时间)，再乘以安全系数；
+    目标完成时间按类别取 ANALYSIS_TARGET_SECONDS（interactive）或 ANALYSIS_BATCH_TARGET_SECONDS（batch）。
+    预计完成时间 = 调度器中排在前面的任务的预计耗时 + 本任务在该档位下的预计耗时。
+    空闲时选最高档位，高峰期逐级降级，任何档位都来不及时使用最低档位（而不是超时）
+    """
+
+    def __init__(self, scheduler: AnalysisScheduler, tiers: List[QualityTier] = QUALITY_TIERS):
+        self.scheduler = scheduler
+        self.tiers = tiers
+        self.chosen: Dict[str, int] = {tier.name: 0 for tier in tiers}
+
+    def _candidates(self) -> List[QualityTier]:
+        """从 QUALITY_MAX_TIER 往下的档位
+
+        本地没有对应模型的档位（lite / heavy 需先执行 manage.py download-pose-models）按 complexity=1 计算，
+        与更低档位相同时去掉
+        """
+        names = [tier.name for tier in self.tiers]
+        top = names.index(settings.QUALITY_MAX_TIER) if settings.QUALITY_MAX_TIER in names else 0
+        candidates, seen = [], set()
+        for tier in reversed(self.tiers[top:]):
+            if not pose_model_available(tier.model_complexity):
+                tier = QualityTier(tier.name, 1, tier.inference_max_side, tier.frame_stride, 1.0)
+            signature = (tier.model_complexity, tier.inference_max_side, tier.frame_stride)
+            if signature not in seen:
+                seen.add(signature)
+                candidates.append(tier)
+        return candidates[::-1]
+
+    def choose(self, probe: Optional[Dict[str, Any]], deadline: Optional[float] = None,
+               job_class: str = "interactive") -> Dict[str, Any]:
+        """选择档位，返回档位参数与决策依据（记入结果元数据）
+
+        Args:
+            probe: 上传时的探测结果（用于按帧数与分辨率预估耗时）
+            deadline: 请求的截止时间（time.monotonic()），可选
+        """
+        if not settings.QUALITY_ENABLED:
+            return {**DEFAULT_TIER.as_dict(), "cost": tier_cost(probe, DEFAULT_TIER), "reason": "disabled"}
+
+        budgets = []
+        if deadline is not None:
+            budgets.append(deadline - time.monotonic())
+        target = settings.ANALYSIS_TARGET_SECONDS if job_class == "interactive" else settings.ANALYSIS_BATCH_TARGET_SECONDS
+        if target > 0:
+            budgets.append(target)
+        budget = min(budgets) * settings.QUALITY_SAFETY_FACTOR if budgets else None
+        wait = self.scheduler.estimated_wait(job_class)
+
+        candidates = self._candidates()
+        chosen, predicted = candidates[-1], None
+        for tier in candidates:
+            predicted = self.scheduler.predict(tier_cost(probe, tier))
+            if budget is None or wait + predicted <= budget:
+                chosen = tier
+                break
+        else:
+            predicted = self.scheduler.predict(tier_cost(probe, chosen))
+
+        self.chosen[chosen.name] += 1
+        return {
+            **chosen.as_dict(),
+            "cost": tier_cost(probe, chosen),
+            "budget_seconds": round(budget, 3) if budget is not None else None,
+            "estimated_wait_seconds": round(wait, 3),
+            "predicted_seconds": round(predicted, 3),
+            "reason": "fits_budget" if budget is None or wait + predicted <= budget else "over_budget"
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {"enabled": settings.QUALITY_ENABLED, "max_tier": settings.QUALITY_MAX_TIER, "chosen": dict(self.chosen)}
+
+
+# 全局控制器（按分析调度器的排队情况估计等待时间）
+quality_controller = QualityController(analysis_scheduler)
@@ -0,0 +1,245 @@
+# 推理结果的后写 (write-behind) 批量持久化
+import atexit
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from ..core.config import settings
+from ..database import SessionLocal
+from ..models import Video
+from .progress import apply_results, previous_scores
+
+_STOP = object()
+
+
+class ResultWriter:
+    """将推理结果放入进程内队列，由后台线程按批量大小或时间阈值合并提交
+
+    - 队列满、未启动或被禁用时回退为同步写入，保证结果不丢失
+    - stop() 会在退出前写完队列中剩余的结果
+    """
+
+    def __init__(self, session_factory: Callable = SessionLocal, batch_size: int = 50,
+                 flush_interval: float = 0.2, max_queue: int = 10000, enabled: bool = True):
+        self.session_factory = session_factory
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.enabled = enabled
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        # 统计
+        self.submitted = 0
+        self.written = 0
+        self.failed = 0
+        self.sync_writes = 0
+        self.batches = 0
+        self.last_batch_size = 0
+        self.max_batch_size = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_seconds = 0.0
+
+    # ========== 生命周期 ==========
+    def start(self) -> None:
+        if not self.enabled or self.running:
+            return
+        self._thread = threading.Thread(target=self._run, name="result-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 30.0) -> None:
+        """停止后台线程并写完剩余结果"""
+        thread = self._thread
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+        self._thread = None
+        # 后台线程超时未退出时，由当前线程兜底写入剩余结果
+        self._drain_sync()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    # ========== 写入接口 ==========
+    def submit(self, values: Dict[str, Any]) -> str:
+        """提交一条 Video 记录，返回 video_id
+
+        未指定 video_id 时新建记录（预先生成 id）；指定已存在的 video_id 时更新该记录
+        """
+        values = self._prepare(values)
+        if not self._enqueue(values):
+            self._write_batch([values])
+        return values["video_id"]
+
+    async def submit_async(self, values: Dict[str, Any]) -> str:
+        """submit 的协程版本（异步接口中使用）：需要回退为同步写入时在线程池中执行，不阻塞事件循环"""
+        values = self._prepare(values)
+        if not self._enqueue(values):
+            await run_in_threadpool(self._write_batch, [values])
+        return values["video_id"]
+
+    def write(self, values: Dict[str, Any]) -> str:
+        """同步写入一条 Video 记录，失败时抛出异常（调用方需要确认已落库时使用，如队列任务标记完成前）"""
+        values = self._prepare(values)
+        with self._lock:
+            self.submitted += 1
+            self.sync_writes += 1
+        self._write_batch([values], raise_on_error=True)
+        return values["video_id"]
+
+    def flush(self) -> None:
+        """同步写完当前队列中的所有结果（用于测试与关闭前）"""
+        self._drain_sync()
+
+    # ========== 内部实现 ==========
+    @staticmethod
+    def _prepare(values: Dict[str, Any]) -> Dict[str, Any]:
+        values = dict(values)
+        if "video_id" not in values:
+            values["video_id"] = str(uuid.uuid4())
+            values.setdefault("created_at", datetime.utcnow())
+        return values
+
+    def _enqueue(self, values: Dict[str, Any]) -> bool:
+        """放入后写队列；返回 False 表示需要调用方同步写入（队列满、未启动或被禁用）"""
+        with self._lock:
+            self.submitted += 1
+        if self.running:
+            try:
+                self._queue.put_nowait(values)
+                return True
+            except queue.Full:
+                pass
+        with self._lock:
+            self.sync_writes += 1
+        return False
+
+    def _run(self) -> None:
+        batch: List[Dict[str, Any]] = []
+        deadline = None
+        stopping = False
+        while not stopping:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+                if item is _STOP:
+                    stopping = True
+                else:
+                    batch.append(item)
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_interval
+            except queue.Empty:
+                pass
+            if batch and (stopping or len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._write_batch(batch)
+                batch = []
+                deadline = None
+        self._drain_sync()
+
+    def _drain_sync(self) -> None:
+        batch = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                batch.append(item)
+            if len(batch) >= self.batch_size:
+                self._write_batch(batch)
+                batch = []
+        if batch:
+            self._write_batch(batch)
+
+    def _write_batch(self, batch: List[Dict[str, Any]], raise_on_error: bool = False) -> None:
+        """单个事务写入一批结果并更新进度汇总；整批失败时逐条重试，隔离坏数据
+
+        raise_on_error 时（仅用于单条写入）记录统计后重新抛出异常，而不是只打印警告
+        """
+        start = time.perf_counter()
+        error = None
+        db = self.session_factory()
+        try:
+            # 已存在的记录（任务重试、重新分析）更新而不是新增，进度汇总中替换原分数
+            previous = previous_scores(db, [values["video_id"] for values in batch])
+            for values in batch:
+                if values["video_id"] in previous:
+                    db.merge(Video(**values))
+                else:
+                    db.add(Video(**values))
+            apply_results(db, batch, previous=previous)
+            db.commit()
+            written, failed = len(batch), 0
+        except Exception as e:
+            db.rollback()
+            written, failed = 0, 0
+            if len(batch) == 1:
+                failed = 1
+                if raise_on_error:
+                    error = e
+                else:
+                    print(f"警告: 推理结果写入失败: {str(e)}")
+            else:
+                for values in batch:
+                    try:
+                        previous = previous_scores(db, [values["video_id"]])
+                        db.merge(Video(**values))
+                        apply_results(db, [values], previous=previous)
+                        db.commit()
+                        written += 1
+                    except Exception as row_error:
+                        db.rollback()
+                        failed += 1
+                        print(f"警告: 推理结果写入失败: {str(row_error)}")
+        finally:
+            db.close()
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.written += written
+            self.failed += failed
+            self.batches += 1
+            self.last_batch_size = len(batch)
+            self.max_batch_size = max(self.max_batch_size, len(batch))
+            self.last_flush_ms = elapsed * 1000
+            self.max_flush_ms = max(self.max_flush_ms, elapsed * 1000)
+            self.total_flush_seconds += elapsed
+        if error is not None:
+            raise error
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "running": self.running,
+                "pending": self._queue.qsize(),
+                "submitted": self.submitted,
+                "written": self.written,
+                "failed": self.failed,
+                "sync_writes": self.sync_writes,
+                "batches": self.batches,
+                "avg_batch_size": round((self.written + self.failed) / self.batches, 2) if self.batches else 0.0,
+                "last_batch_size": self.last_batch_size,
+                "max_batch_size": self.max_batch_size,
+                "avg_flush_ms": round(self.total_flush_seconds / self.batches * 1000, 2) if self.batches else 0.0,
+                "last_flush_ms": round(self.last_flush_ms, 2),
+                "max_flush_ms": round(self.max_flush_ms, 2),
+            }
+
+
+# 全局结果写入器
+result_writer = ResultWriter(
+    batch_size=settings.RESULT_BATCH_SIZE,
+    flush_interval=settings.RESULT_FLUSH_INTERVAL_MS / 1000.0,
+    max_queue=settings.RESULT_QUEUE_MAX,
+    enabled=settings.RESULT_WRITE_BEHIND,
+)
+
+# 非 ASGI 场景（脚本、worker）退出时同样写完剩余结果
+atexit.register(result_writer.stop)
@@ -0,0 +1,281 @@
+# 视频分析任务调度（按预估成本的短作业优先 + 老化）
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+from ..core.config import settings
+
+# 优先级类别：interactive（请求方在等待结果）、batch（后台分析）
+JOB_CLASSES = ("interactive", "batch")
+
+
+def estimate_cost(probe: Optional[Dict[str, Any]], frame_stride: int = 1) -> float:
+    """预估分析成本（百万像素·帧）= 分析帧数 × 分辨率
+
+    缺少探测信息时返回 0（按最短作业处理）
+    """
+    if not probe:
+        return 0.0
+    frames = probe.get("frame_count") or (probe.get("duration") or 0) * (probe.get("fps") or 0)
+    pixels = (probe.get("width") or 0) * (probe.get("height") or 0)
+    return frames / max(1, frame_stride) * pixels / 1e6
+
+
+def priority_key(predicted_seconds: float, class_offset: float, enqueued_at: float, aging_rate: float) -> float:
+    """排序键（越小越先执行）
+
+    等效优先级 = 预估耗时 + 类别偏移 - aging_rate × 已等待时间。
+    所有任务以相同速率老化，因此“- aging_rate × now”对所有任务相同，
+    可以在入队时一次算出固定的键，用普通小顶堆维护。
+    """
+    return predicted_seconds + class_offset + aging_rate * enqueued_at
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return round(ordered[index], 3)
+
+
+class _Job:
+    __slots__ = ("key", "seq", "fn", "args", "kwargs", "context", "future", "cost", "predicted",
+                 "job_class", "label", "enqueued_at")
+
+    def __lt__(self, other: "_Job") -> bool:
+        return (self.key, self.seq) < (other.key, other.seq)
+
+
+class AnalysisScheduler:
+    """按预估成本调度分析任务的线程池
+
+    - 短作业优先：15 秒的片段不必排在 20 分钟的长视频之后
+    - 老化：每等待 1 秒，等效预估耗时减少 aging_rate 秒，长作业不会被无限推迟
+    - 优先级类别：batch 任务额外加 batch_penalty 秒，交互请求优先
+    - 校准：按实际耗时更新“每单位成本的秒数”（指数滑动平均），stats() 报告预估与实际的误差
+    - 首次提交时自动启动工作线程
+    """
+
+    def __init__(self, workers: int = 1, aging_rate: float = 1.0, batch_penalty: float = 30.0,
+                 seconds_per_unit: float = 0.04, history: int = 500):
+        self.workers = max(1, workers)
+        self.aging_rate = aging_rate
+        self.class_offsets = {"interactive": 0.0, "batch": batch_penalty}
+        self.seconds_per_unit = seconds_per_unit
+        self._heap: List[_Job] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._stopping = False
+        self._running = 0
+        self._active: Dict[int, tuple] = {}  # seq -> (开始时间, 预估耗时)
+        self._history: deque = deque(maxlen=history)
+        # 统计
+        self.submitted = {name: 0 for name in JOB_CLASSES}
+        self.completed = {name: 0 for name in JOB_CLASSES}
+        self.failed = 0
+        self.cancelled = 0
+
+    # ========== 生命周期 ==========
+    def start(self) -> None:
+        with self._cond:
+            if self._threads:
+                return
+            self._stopping = False
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"analysis-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout: float = 30.0, drain: float = 0.0) -> None:
+        """停止调度：drain 秒内继续执行已排队的任务（优雅重启时排空队列），之后正在执行的任务跑完，尚未开始的任务取消"""
+        if drain > 0:
+            deadline = time.monotonic() + drain
+            with self._cond:
+                while (self._heap or self._running) and self._threads:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+        with self._cond:
+            self._stopping = True
+            pending, self._heap = self._heap, []
+            self._cond.notify_all()
+            threads, self._threads = self._threads, []
+        cancelled = sum(1 for job in pending if job.future.cancel())
+        with self._cond:
+            self.cancelled += cancelled
+        if pending:
+            print(f"警告: 调度器停止，取消了 {len(pending)} 个未开始的分析任务")
+        deadline = time.monotonic() + timeout
+        for thread in threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+
+    @property
+    def running(self) -> bool:
+        return any(thread.is_alive() for thread in self._threads)
+
+    # ========== 提交接口 ==========
+    def predict(self, cost: float) -> float:
+        """按当前校准值预估耗时（秒）"""
+        return cost * self.seconds_per_unit
+
+    def submit(self, fn: Callable, *args, cost: float = 0.0, job_class: str = "interactive",
+               label: Optional[str] = None, **kwargs) -> Future:
+        """提交任务，返回 concurrent.futures.Future（异步代码可用 asyncio.wrap_future 等待）"""
+        if job_class not in self.class_offsets:
+            raise ValueError(f"未知的任务类别: {job_class}")
+        if not self._threads:
+            self.start()
+
+        job = _Job()
+        job.fn, job.args, job.kwargs = fn, args, kwargs
+        job.context = contextvars.copy_context()  # 在提交方的上下文中执行（如请求的剖析会话）
+        job.future = Future()
+        job.cost = cost
+        job.predicted = self.predict(cost)
+        job.job_class = job_class
+        job.label = label
+        job.enqueued_at = time.monotonic()
+        job.seq = next(self._seq)
+        job.key = priority_key(job.predicted, self.class_offsets[job_class], job.enqueued_at, self.aging_rate)
+
+        with self._cond:
+            if self._stopping:
+                raise RuntimeError("调度器已停止")
+            heapq.heappush(self._heap, job)
+            self.submitted[job_class] += 1
+            self._cond.notify()
+        return job.future
+
+    # ========== 工作线程 ==========
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._heap and not self._stopping:
+                    self._cond.wait()
+                if self._stopping:
+                    return
+                job = heapq.heappop(self._heap)
+                self._running += 1
+                self._active[job.seq] = (time.monotonic(), job.predicted)
+            try:
+                self._execute(job)
+            finally:
+                with self._cond:
+                    self._running -= 1
+                    self._active.pop(job.seq, None)
+                    self._cond.notify_all()  # 唤醒等待排空的 stop()
+
+    def _execute(self, job: _Job) -> None:
+        if not job.future.set_running_or_notify_cancel():
+            with self._cond:
+                self.cancelled += 1
+            return
+        started = time.monotonic()
+        try:
+            result = job.context.run(job.fn, *job.args, **job.kwargs)
+        except BaseException as e:
+            job.future.timing = self._record(job, started, time.monotonic(), ok=False)
+            job.future.set_exception(e)
+            return
+        finished = time.monotonic()
+        # 预估与实际耗时附在 future 上，调用方可记入结果元数据
+        job.future.timing = self._record(job, started, finished, ok=True)
+        job.future.set_result(result)
+
+    def _record(self, job: _Job, started: float, finished: float, ok: bool) -> Dict[str, Any]:
+        actual = finished - started
+        entry = {
+            "label": job.label,
+            "job_class": job.job_class,
+            "cost": round(job.cost, 3),
+            "predicted_seconds": round(job.predicted, 3),
+            "actual_seconds": round(actual, 3),
+            "wait_seconds": round(started - job.enqueued_at, 3),
+            "completion_seconds": round(finished - job.enqueued_at, 3),
+            "ok": ok
+        }
+        with self._cond:
+            if not ok:
+                self.failed += 1
+            else:
+                self.completed[job.job_class] += 1
+                # 只用成功的任务校准（失败通常提前退出，耗时不具代表性）
+                if job.cost > 0:
+                    alpha = settings.SCHEDULER_CALIBRATION_ALPHA
+                    self.seconds_per_unit = (1 - alpha) * self.seconds_per_unit + alpha * (actual / job.cost)
+            self._history.append(entry)
+        return entry
+
+    def estimated_wait(self, job_class: str = "interactive") -> float:
+        """新任务开始执行前的预计等待时间（秒）
+
+        = (同类及更高优先级的排队任务预估耗时 + 正在执行任务的剩余预估耗时) / 工作线程数。
+        短作业优先下新任务可能插队，因此这是偏保守的估计
+        """
+        now = time.monotonic()
+        offset = self.class_offsets.get(job_class, 0.0)
+        with self._cond:
+            queued = sum(job.predicted for job in self._heap if self.class_offsets[job.job_class] <= offset)
+            remaining = sum(max(0.0, predicted - (now - started)) for started, predicted in self._active.values())
+        return (queued + remaining) / self.workers
+
+    # ========== 统计 ==========
+    def finished_jobs(self) -> int:
+        """已结束（成功或失败）的任务数，可在其他线程读取（如 serve.py 的回收检查）"""
+        with self._cond:
+            return sum(self.completed.values()) + self.failed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            history = list(self._history)
+            queued = {name: 0 for name in JOB_CLASSES}
+            for job in self._heap:
+                queued[job.job_class] += 1
+            running = self._running
+            submitted, completed = dict(self.submitted), dict(self.completed)
+            failed, cancelled = self.failed, self.cancelled
+        per_class = {}
+        for name in JOB_CLASSES:
+            items = [h for h in history if h["job_class"] == name]
+            completion = [h["completion_seconds"] for h in items]
+            per_class[name] = {
+                "submitted": submitted[name],
+                "completed": completed[name],
+                "queued": queued[name],
+                "completion_p50": _percentile(completion, 50),
+                "completion_p99": _percentile(completion, 99),
+                "wait_p99": _percentile([h["wait_seconds"] for h in items], 99),
+            }
+        # 预估误差：|预估 - 实际| / 实际 的平均值
+        errors = [abs(h["predicted_seconds"] - h["actual_seconds"]) / h["actual_seconds"]
+                  for h in history if h["ok"] and h["actual_seconds"] > 0 and h["cost"] > 0]
+        return {
+            "workers": self.workers,
+            "running": running,
+            "failed": failed,
+            "cancelled": cancelled,
+            "classes": per_class,
+            "calibration": {
+                "seconds_per_unit": round(self.seconds_per_unit, 6),
+                "mean_abs_error_ratio": round(sum(errors) / len(errors), 3) if errors else None,
+                "samples": len(errors),
+            },
+            "recent": history[-10:],
+        }
+
+
+# 全局调度器
+analysis_scheduler = AnalysisScheduler(
+    workers=settings.ANALYSIS_WORKERS,
+    aging_rate=settings.SCHEDULER_AGING_RATE,
+    batch_penalty=settings.SCHEDULER_BATCH_PENALTY_SECONDS,
+    seconds_per_unit=settings.SCHEDULER_SECONDS_PER_UNIT
+)
@@ -0,0 +1,267 @@
+# 相同分析的合并执行（single-flight）：进程内共享 future + 数据库租约跨进程去重
+import asyncio
+import hashlib
+import json
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+from starlette.concurrency import run_in_threadpool
+
+from ..core.config import settings
+from ..database import SessionLocal
+from ..models import AnalysisLease
+from .cancellation import AnalysisCancelled, CancellationToken, SharedCancellation, wait_cancellable
+
+
+def analysis_key(sha256: str, action_type: str, options: Optional[Dict[str, Any]] = None) -> str:
+    """内容哈希 + 动作 + 影响结果的分析选项 -> 去重键"""
+    payload = json.dumps({"sha256": sha256, "action_type": action_type, "options": options or {}},
+                         sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _Flight:
+    __slots__ = ("task", "cancellation")
+
+    def __init__(self, task: asyncio.Future, cancellation: SharedCancellation):
+        self.task = task
+        self.cancellation = cancellation
+
+
+class SingleFlight:
+    """同一时刻相同 key 的分析只执行一次，其余请求等待并共享结果
+
+    - 进程内：同一 key 的后续请求加入正在运行的分析任务，等待同一个结果
+    - 跨进程：首个请求在 analysis_leases 表中插入租约并定期续期；其他进程轮询该行，
+      完成后读取结果（保留 result_ttl 秒，也覆盖客户端超时后的重试）。
+      持有方崩溃时租约到期，由等待方通过条件更新接手
+    - 持有方失败时不缓存错误（多为文件、ffmpeg、数据库等临时故障），释放租约：
+      进程内的等待方得到同一个错误，其他进程的等待方与之后的重试重新分析
+    - 所有等待的请求都取消时才取消分析，并释放租约
+    """
+
+    def __init__(self, session_factory: Callable = SessionLocal, lease_seconds: float = 60.0,
+                 poll_interval: float = 0.5, result_ttl: float = 60.0, cross_process: bool = True):
+        self.session_factory = session_factory
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.result_ttl = result_ttl
+        self.cross_process = cross_process
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._inflight: Dict[str, _Flight] = {}
+        # 统计
+        self.leaders = 0
+        self.coalesced_local = 0
+        self.coalesced_remote = 0
+        self.takeovers = 0
+
+    async def run(self, key: str, fn: Callable[[CancellationToken], Awaitable[Dict[str, Any]]],
+                  token: Optional[CancellationToken] = None,
+                  on_abandon: Optional[Callable[[], None]] = None) -> Tuple[Dict[str, Any], bool]:
+        """执行或加入 key 对应的分析
+
+        分析在独立的任务中运行，fn 收到的取消标记只有在所有等待的请求都取消后才会取消；
+        单个请求取消（客户端断开、超过截止时间）时只是不再等待，抛出 AnalysisCancelled。
+        此时共享的分析可能仍在读取该请求的输入文件，on_abandon（如删除上传的文件）在分析任务结束后才调用
+
+        Returns:
+            (分析结果, 是否复用了其他请求的结果)
+        """
+        token = token or CancellationToken()
+        while True:
+            flight = self._inflight.get(key)
+            if flight is None or flight.cancellation.cancelled:
+                # 没有进行中的分析，或已有的分析正在因全部请求取消而退出：发起新的分析
+                cancellation = SharedCancellation([token])
+                task = asyncio.ensure_future(self._run_leased(key, fn, cancellation))
+                flight = _Flight(task, cancellation)
+                self._inflight[key] = flight
+                task.add_done_callback(lambda t, key=key, flight=flight: self._done(key, flight))
+                leader = True
+            else:
+                flight.cancellation.add(token)
+                leader = False
+            try:
+                result, reused = await wait_cancellable(asyncio.shield(flight.task), token)
+            except AnalysisCancelled:
+                # 分析因其他请求取消而退出，但当前请求仍在等待：重新发起
+                if not token.cancelled:
+                    continue
+                if on_abandon is not None:
+                    self._after(flight.task, on_abandon)
+                raise
+            if not leader:
+                self.coalesced_local += 1
+            return result, reused or not leader
+
+    @staticmethod
+    def _after(task: asyncio.Future, callback: Callable[[], None]) -> None:
+        def call(_task=None):
+            try:
+                callback()
+            except Exception as e:
+                print(f"警告: 分析结束后的清理失败: {str(e)}")
+
+        if task.done():
+            call()
+        else:
+            task.add_done_callback(call)
+
+    def _done(self, key: str, flight: "_Flight") -> None:
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
+        # 没有等待方时不产生 "exception was never retrieved" 警告
+        if not flight.task.cancelled():
+            flight.task.exception()
+
+    async def _run_leased(self, key: str, fn: Callable[[CancellationToken], Awaitable[Dict[str, Any]]],
+                          cancellation: CancellationToken) -> Tuple[Dict[str, Any], bool]:
+        if not self.cross_process:
+            self.leaders += 1
+            return await fn(cancellation), False
+
+        while True:
+            cancellation.raise_if_cancelled()
+            state, payload = await run_in_threadpool(self._acquire, key)
+            if state == "leader":
+                break
+            if state == "done":
+                self.coalesced_remote += 1
+                return payload, True
+            await asyncio.sleep(self.poll_interval)
+
+        self.leaders += 1
+        heartbeat = asyncio.create_task(self._heartbeat(key))
+        try:
+            result = await fn(cancellation)
+        except BaseException:
+            # 取消或失败：释放租约，让其他进程的等待方接手，不把一次性的错误当作结果保留
+            await run_in_threadpool(self._release, key)
+            raise
+        finally:
+            heartbeat.cancel()
+        await run_in_threadpool(self._finish, key, result)
+        return result, False
+
+    async def _heartbeat(self, key: str) -> None:
+        interval = max(self.lease_seconds / 3.0, 0.1)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await run_in_threadpool(self._renew, key)
+            except Exception as e:
+                print(f"警告: 分析租约续期失败: {str(e)}")
+
+    # ========== 租约表操作（在线程池中执行） ==========
+    def _acquire(self, key: str) -> Tuple[str, Any]:
+        """尝试获取租约，返回 ("leader" | "wait" | "done", 结果)"""
+        now = datetime.utcnow()
+        db = self.session_factory()
+        try:
+            lease = db.get(AnalysisLease, key)
+            if lease is None:
+                db.add(AnalysisLease(key=key, owner=self.owner, status="running",
+                                     expires_at=now + timedelta(seconds=self.lease_seconds)))
+                try:
+                    db.commit()
+                except IntegrityError:
+                    db.rollback()  # 其他进程抢先插入
+                    return "wait", None
+                return "leader", None
+            if lease.expires_at > now:
+                if lease.status == "done":
+                    return "done", lease.result
+                return "wait", None
+
+            # 租约已过期（持有方崩溃或结果已过保留期）：条件更新接手，只有一个进程能成功
+            taken = db.query(AnalysisLease).filter(
+                AnalysisLease.key == key,
+                AnalysisLease.owner == lease.owner,
+                AnalysisLease.expires_at == lease.expires_at
+            ).update({
+                AnalysisLease.owner: self.owner,
+                AnalysisLease.status: "running",
+                AnalysisLease.result: None,
+                AnalysisLease.error: None,
+                AnalysisLease.expires_at: now + timedelta(seconds=self.lease_seconds),
+                AnalysisLease.updated_at: now
+            }, synchronize_session=False)
+            db.commit()
+            if not taken:
+                return "wait", None
+            if lease.status == "running":
+                self.takeovers += 1
+            return "leader", None
+        finally:
+            db.close()
+
+    def _renew(self, key: str) -> None:
+        db = self.session_factory()
+        try:
+            db.query(AnalysisLease).filter(
+                AnalysisLease.key == key, AnalysisLease.owner == self.owner
+            ).update({
+                AnalysisLease.expires_at: datetime.utcnow() + timedelta(seconds=self.lease_seconds)
+            }, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def _finish(self, key: str, result: Dict[str, Any]) -> None:
+        now = datetime.utcnow()
+        db = self.session_factory()
+        try:
+            db.query(AnalysisLease).filter(
+                AnalysisLease.key == key, AnalysisLease.owner == self.owner
+            ).update({
+                AnalysisLease.status: "done",
+                AnalysisLease.result: result,
+                AnalysisLease.expires_at: now + timedelta(seconds=self.result_ttl)
+            }, synchronize_session=False)
+            # 顺带清理早已过期的租约
+            db.query(AnalysisLease).filter(
+                AnalysisLease.expires_at < now - timedelta(seconds=self.lease_seconds)
+            ).delete(synchronize_session=False)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"警告: 分析租约状态保存失败: {str(e)}")
+        finally:
+            db.close()
+
+    def _release(self, key: str) -> None:
+        db = self.session_factory()
+        try:
+            db.query(AnalysisLease).filter(
+                AnalysisLease.key == key, AnalysisLease.owner == self.owner
+            ).delete(synchronize_session=False)
+            db.commit()
+        except Exception as e:
+            # 释放失败时租约到期后由等待方接手
+            db.rollback()
+            print(f"警告: 分析租约释放失败: {str(e)}")
+        finally:
+            db.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "inflight": len(self._inflight),
+            "leaders": self.leaders,
+            "coalesced_local": self.coalesced_local,
+            "coalesced_remote": self.coalesced_remote,
+            "takeovers": self.takeovers,
+            "cross_process": self.cross_process
+        }
+
+
+# 全局实例
+analysis_singleflight = SingleFlight(
+    lease_seconds=settings.SINGLEFLIGHT_LEASE_SECONDS,
+    poll_interval=settings.SINGLEFLIGHT_POLL_INTERVAL,
+    result_ttl=settings.SINGLEFLIGHT_RESULT_TTL,
+    cross_process=settings.SINGLEFLIGHT_CROSS_PROCESS
+)
@@ -0,0 +1,91 @@
+# 上传文件的流式保存与路径工具
+import hashlib
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import HTTPException, UploadFile, status
+from starlette.concurrency import run_in_threadpool
+
+from ..core.config import settings
+from ..core.metrics import UPLOAD_BYTES
+from .media_probe import probe_video
+
+ALLOWED_EXTENSIONS = {".mp4", ".avi", ".mov", ".mkv", ".webm"}
+
+
+def validate_video_filename(filename: Optional[str]) -> str:
+    """校验文件名与扩展名，返回小写扩展名"""
+    if not filename:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="文件名不能为空"
+        )
+    file_ext = Path(filename).suffix.lower()
+    if file_ext not in ALLOWED_EXTENSIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"不支持的文件类型，仅支持: {', '.join(ALLOWED_EXTENSIONS)}"
+        )
+    return file_ext
+
+
+def too_large(limit: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"文件超过大小限制 ({limit // (1024 * 1024)}MB)"
+    )
+
+
+async def save_upload_file(file: UploadFile, dest: Path, max_bytes: Optional[int] = None) -> Tuple[int, str]:
+    """分块保存上传文件，超过大小限制立即中止并删除
+
+    Returns:
+        (文件大小, SHA-256 十六进制摘要)
+    """
+    max_bytes = max_bytes or settings.MAX_UPLOAD_BYTES
+    if file.size is not None and file.size > max_bytes:
+        raise too_large(max_bytes)
+
+    digest = hashlib.sha256()
+    size = 0
+    out = await run_in_threadpool(open, dest, "wb")
+    try:
+        while True:
+            chunk = await file.read(settings.UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise too_large(max_bytes)
+            digest.update(chunk)
+            await run_in_threadpool(out.write, chunk)
+    except BaseException:
+        out.close()
+        dest.unlink(missing_ok=True)
+        raise
+    out.close()
+    UPLOAD_BYTES.labels("form").inc(size)
+    return size, digest.hexdigest()
+
+
+async def probe_saved_video(path: Path) -> Dict[str, Any]:
+    """探测已保存的视频，无法解析时删除文件并返回 400"""
+    try:
+        return await run_in_threadpool(probe_video, path)
+    except Exception as e:
+        path.unlink(missing_ok=True)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"无法解析视频文件: {str(e)}"
+        )
+
+
+def static_url(path: Optional[str]) -> Optional[str]:
+    """将 STORAGE_DIR 下的文件路径转换为静态文件 URL"""
+    if not path:
+        return None
+    try:
+        relative_path = str(Path(path).resolve().relative_to(settings.STORAGE_DIR.resolve())).replace("\\", "/")
+    except ValueError:
+        return None
+    return f"{settings.BASE_URL}{settings.STATIC_URL}/{relative_path}"
@@ -0,0 +1,107 @@
+# 断点续传会话的过期与清理
+import asyncio
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from ..core.config import settings
+from ..database import SessionLocal
+from ..models import UploadSession
+
+# 未完成的会话状态（finalizing 只在 finalize 中途崩溃时才会一直保留）
+UNFINISHED = ("uploading", "finalizing")
+
+
+def session_ttl() -> timedelta:
+    return timedelta(hours=settings.UPLOAD_SESSION_TTL_HOURS)
+
+
+def expires_at(now: Optional[datetime] = None) -> datetime:
+    """从 now 起算的过期时间（创建会话与每次提交分片时写入）"""
+    return (now or datetime.utcnow()) + session_ttl()
+
+
+def is_expired(upload: UploadSession, now: Optional[datetime] = None) -> bool:
+    now = now or datetime.utcnow()
+    if upload.status not in UNFINISHED:
+        return False
+    if upload.expires_at is not None:
+        return upload.expires_at <= now
+    # 加上 expires_at 列之前创建的会话按最后更新时间计算
+    return upload.updated_at is not None and upload.updated_at + session_ttl() <= now
+
+
+def _expired_filter(now: datetime):
+    return and_(
+        UploadSession.status.in_(UNFINISHED),
+        or_(
+            UploadSession.expires_at <= now,
+            and_(UploadSession.expires_at.is_(None), UploadSession.updated_at <= now - session_ttl())
+        )
+    )
+
+
+def purge_expired_uploads(db: Session, now: Optional[datetime] = None, batch_size: int = 100) -> int:
+    """删除过期的未完成会话及其未完成文件与暂存分片，返回删除的会话数
+
+    按会话条件删除：删除前刚提交分片（过期时间已顺延）的会话会被跳过；多个进程同时清理时只有一个删除成功
+    """
+    now = now or datetime.utcnow()
+    purged = 0
+    while True:
+        uploads = [
+            (upload.upload_id, upload.file_ext) for upload in
+            db.query(UploadSession).filter(_expired_filter(now)).limit(batch_size)
+        ]
+        if not uploads:
+            return purged
+        for upload_id, file_ext in uploads:
+            deleted = db.query(UploadSession).filter(
+                UploadSession.upload_id == upload_id, _expired_filter(now)
+            ).delete(synchronize_session=False)
+            db.commit()
+            if not deleted:
+                continue
+            purged += 1
+            (settings.UPLOAD_PARTIAL_DIR / f"{upload_id}{file_ext}.part").unlink(missing_ok=True)
+            for chunk in settings.UPLOAD_PARTIAL_DIR.glob(f"{upload_id}.*.chunk"):
+                chunk.unlink(missing_ok=True)
+        if len(uploads) < batch_size:
+            return purged
+
+
+def active_session_count(db: Session, user_id: str, now: Optional[datetime] = None) -> int:
+    """用户未过期的未完成会话数"""
+    now = now or datetime.utcnow()
+    return db.query(UploadSession).filter(
+        UploadSession.user_id == user_id,
+        UploadSession.status.in_(UNFINISHED),
+        or_(
+            UploadSession.expires_at > now,
+            and_(UploadSession.expires_at.is_(None),
+                 or_(UploadSession.updated_at.is_(None), UploadSession.updated_at > now - session_ttl()))
+        )
+    ).count()
+
+
+def _purge_once() -> int:
+    db = SessionLocal()
+    try:
+        return purge_expired_uploads(db)
+    finally:
+        db.close()
+
+
+async def purge_periodically(interval: float) -> None:
+    """API 进程内的定期清理（UPLOAD_PURGE_INTERVAL_SECONDS），在线程池中执行"""
+    while True:
+        try:
+            purged = await run_in_threadpool(_purge_once)
+            if purged:
+                print(f"已清理 {purged} 个过期的上传会话")
+        except Exception as e:
+            print(f"警告: 清理过期上传会话失败: {str(e)}")
+        await asyncio.sleep(interval)
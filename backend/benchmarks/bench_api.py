@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+API 端点基准测试（进程内 ASGI 客户端，不需要启动服务器）
+
+依次测量以下端点的顺序请求延迟与吞吐：
+- POST /auth/register、POST /auth/login/json、GET /auth/me
+- GET /standards
+- POST /infer/sync（上传确定性合成视频，端到端包含保存、探测、调度与分析）
+
+使用临时数据库；关闭单飞去重（每次都真正分析）与质量档位（固定 standard 档，结果可比）。
+测试中 /infer/sync 写入 uploads/ 与 outputs/ 的文件在结束后删除。
+
+用法:
+    python -m benchmarks.bench_api
+    python -m benchmarks.bench_api --auth-requests 20 --standards-requests 200 --infer-requests 3 --output /tmp/api.json
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.common import environment, percentile, synthetic_video, write_results  # noqa: E402
+
+
+def configure_environment(bcrypt_rounds=None) -> None:
+    """必须在导入 app 之前调用（配置在导入时读取）"""
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='bench_api_')}/bench_api.db"
+    os.environ["RESULT_WRITE_BEHIND"] = "false"
+    os.environ["SINGLEFLIGHT_ENABLED"] = "false"
+    os.environ["QUALITY_ENABLED"] = "false"
+    if bcrypt_rounds:
+        os.environ["BCRYPT_ROUNDS"] = str(bcrypt_rounds)
+
+
+def summarize(latencies, statuses, elapsed: float) -> dict:
+    return {
+        "requests": len(latencies),
+        "status_counts": {str(code): statuses.count(code) for code in sorted(set(statuses))},
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "requests_per_s": round(len(latencies) / elapsed, 2),
+    }
+
+
+async def measure(count: int, send) -> dict:
+    """顺序发送 count 个请求，send(i) 返回响应"""
+    latencies, statuses = [], []
+    start = time.perf_counter()
+    for i in range(count):
+        t0 = time.perf_counter()
+        response = await send(i)
+        latencies.append(time.perf_counter() - t0)
+        statuses.append(response.status_code)
+    return summarize(latencies, statuses, time.perf_counter() - start)
+
+
+def snapshot(directories) -> set:
+    return {path for directory in directories if directory.exists() for path in directory.rglob("*") if path.is_file()}
+
+
+async def bench(auth_requests: int, standards_requests: int, infer_requests: int, video: Path) -> dict:
+    import httpx
+    from app.main import app
+    from app.core.config import settings
+
+    prefix = settings.API_V1_PREFIX
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    # ASGITransport 不触发 lifespan：手动启动调度器与后台写入线程
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            await client.get(f"{prefix}/standards")  # 预热（路由、标准数据加载）
+
+            results["register"] = await measure(auth_requests, lambda i: client.post(
+                f"{prefix}/auth/register", json={"username": f"bench{i}", "password": "benchpass"}))
+            results["login"] = await measure(auth_requests, lambda i: client.post(
+                f"{prefix}/auth/login/json", json={"username": f"bench{i}", "password": "benchpass"}))
+            login = await client.post(f"{prefix}/auth/login/json", json={"username": "bench0", "password": "benchpass"})
+            headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+            results["me"] = await measure(standards_requests, lambda i: client.get(f"{prefix}/auth/me", headers=headers))
+            results["standards"] = await measure(standards_requests, lambda i: client.get(f"{prefix}/standards"))
+
+            action = (await client.get(f"{prefix}/standards")).json()[0]["actionId"]
+            payload = video.read_bytes()
+
+            def infer(i):
+                return client.post(f"{prefix}/infer/sync", headers=headers, data={"actionType": action},
+                                   files={"file": (video.name, payload, "video/mp4")})
+
+            await infer(0)  # 预热（模型加载）
+            results["infer_sync"] = await measure(infer_requests, infer)
+    return results
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--auth-requests", type=int, default=10, help="注册 / 登录请求数（受 bcrypt 成本支配）")
+    parser.add_argument("--standards-requests", type=int, default=200, help="/standards 与 /auth/me 请求数")
+    parser.add_argument("--infer-requests", type=int, default=3, help="/infer/sync 请求数（另有一次预热）")
+    parser.add_argument("--infer-seconds", type=float, default=2.0, help="上传的合成视频时长")
+    parser.add_argument("--bcrypt-rounds", type=int, default=None, help="默认沿用 BCRYPT_ROUNDS")
+
+
+def run(auth_requests: int = 10, standards_requests: int = 200, infer_requests: int = 3,
+        infer_seconds: float = 2.0, bcrypt_rounds=None) -> dict:
+    configure_environment(bcrypt_rounds)
+    from app.core.config import settings
+
+    directories = [settings.UPLOAD_DIR, settings.OUTPUT_DIR]
+    before = snapshot(directories)
+    try:
+        with tempfile.TemporaryDirectory(prefix="bench_api_") as tmp:
+            video = synthetic_video(Path(tmp) / "bench.mp4", seconds=infer_seconds)
+            return asyncio.run(bench(auth_requests, standards_requests, infer_requests, video))
+    finally:
+        for path in snapshot(directories) - before:
+            path.unlink(missing_ok=True)
+
+
+def print_results(results: dict) -> None:
+    for name, entry in results.items():
+        print(f"  {name:<11} n={entry['requests']:<4} p50={entry['p50_ms']:9.2f}ms  p99={entry['p99_ms']:9.2f}ms  "
+              f"{entry['requests_per_s']:8.2f} req/s  状态码 {entry['status_counts']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API 端点基准测试")
+    add_arguments(parser)
+    parser.add_argument("--output", default=None, help="结果 JSON 路径")
+    args = parser.parse_args()
+
+    results = run(args.auth_requests, args.standards_requests, args.infer_requests, args.infer_seconds,
+                  args.bcrypt_rounds)
+    print_results(results)
+    if args.output:
+        write_results(Path(args.output), {"environment": environment(), "metrics": {"api": results}})
+        print(f"结果已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
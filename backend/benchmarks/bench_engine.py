@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+分析引擎分阶段基准测试
+
+对 PoseAnalyzer.process_video 逐阶段计时（app.core.timing.StageTimer）：
+decode（解码）/ gate（帧过滤，开启时）/ convert（颜色转换与缩放）/ inference（姿态模型）/
+angles（角度计算）/ render（叠加层绘制）/ encode（编码写出）/ finalize（写角度序列）。
+
+输入为确定性生成的合成视频（见 benchmarks.common.synthetic_video），
+另外 benchmarks/clips（或 --clips-dir / BENCH_CLIPS_DIR）下有真实片段时一并测试。
+每个视频先完整跑一遍预热（模型加载、精灵缓存），再取 --repeat 次中每帧总耗时最小的一次。
+
+用法:
+    python -m benchmarks.bench_engine
+    python -m benchmarks.bench_engine --sizes 640x480 1280x720 --seconds 4 --repeat 3 --output /tmp/engine.json
+    python -m benchmarks.bench_engine --clips-dir ~/clips --complexity 0 --frame-gate
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.common import environment, find_clips, synthetic_video, write_results  # noqa: E402
+
+DEFAULT_SIZES = ["640x480", "1280x720"]
+
+
+def time_video(analyzer, video: Path, action: str, workdir: Path, repeat: int = 1, complexity: int = 1,
+               frame_gate: bool = False) -> dict:
+    """同一视频跑 repeat 次（另加一次预热），返回每帧总耗时最小的一次的分阶段结果"""
+    from app.core.timing import StageTimer
+    from app.services.frame_gate import FrameGate
+
+    best = None
+    for attempt in range(repeat + 1):
+        timer = StageTimer()
+        start = time.perf_counter()
+        result = analyzer.process_video(
+            str(video), str(workdir / f"{video.stem}_out.mp4"), action,
+            series_path=str(workdir / f"{video.stem}.angles"), model_complexity=complexity,
+            frame_gate=FrameGate() if frame_gate else None, timer=timer
+        )
+        elapsed = time.perf_counter() - start
+        if attempt == 0:
+            continue  # 预热
+        frames = max(1, result["frame_count"])
+        entry = {
+            "frames": result["frame_count"],
+            "detected_frames": result["detected_frames"],
+            "inferred_frames": result["inferred_frames"],
+            "pose_backend": result["pose_backend"],
+            "frame_ms": round(elapsed * 1000 / frames, 3),
+            "throughput_fps": round(frames / elapsed, 2),
+            "stages": {f"{stage}_ms": values["per_frame_ms"] for stage, values in timer.as_dict(per=frames).items()},
+            "share": {stage: values["share"] for stage, values in timer.as_dict().items()},
+        }
+        if best is None or entry["frame_ms"] < best["frame_ms"]:
+            best = entry
+    return best
+
+
+def run(sizes=None, seconds: float = 4.0, fps: float = 30.0, seed: int = 0, clips_dir=None, repeat: int = 1,
+        complexity: int = 1, frame_gate: bool = False, action=None) -> dict:
+    from app.core.config import settings
+    from app.services.ai_engine import PoseAnalyzer
+
+    analyzer = PoseAnalyzer(str(settings.YOGA_ANGLES_JSON))
+    action = action or next(iter(analyzer.standards), "unknown")
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="bench_engine_") as tmp:
+        workdir = Path(tmp)
+        videos = []
+        for size in sizes or DEFAULT_SIZES:
+            width, height = (int(v) for v in size.lower().split("x"))
+            videos.append((f"synthetic_{width}x{height}",
+                           synthetic_video(workdir / f"synthetic_{width}x{height}.mp4", seconds, fps, width, height, seed)))
+        videos.extend((f"clip_{clip.stem}", clip) for clip in find_clips(clips_dir))
+        for name, video in videos:
+            results[name] = time_video(analyzer, video, action, workdir, repeat, complexity, frame_gate)
+    return results
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--sizes", nargs="+", default=DEFAULT_SIZES, help="合成视频分辨率，如 640x480")
+    parser.add_argument("--seconds", type=float, default=4.0, help="合成视频时长")
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--clips-dir", default=None, help="真实视频片段目录（默认 benchmarks/clips 或 BENCH_CLIPS_DIR）")
+    parser.add_argument("--repeat", type=int, default=1, help="预热后的重复次数，取最快的一次")
+    parser.add_argument("--complexity", type=int, choices=[0, 1, 2], default=1)
+    parser.add_argument("--frame-gate", action="store_true", help="开启推理前帧过滤")
+
+
+def print_results(results: dict) -> None:
+    for name, entry in results.items():
+        print(f"{name}: {entry['frames']} 帧（检测到 {entry['detected_frames']}），后端 {entry['pose_backend']}，"
+              f"{entry['frame_ms']:.2f}ms/帧，{entry['throughput_fps']:.1f} fps")
+        for stage, ms in entry["stages"].items():
+            print(f"  {stage[:-3]:<10} {ms:8.3f}ms/帧  {entry['share'][stage[:-3]]:6.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分析引擎分阶段基准测试")
+    add_arguments(parser)
+    parser.add_argument("--output", default=None, help="结果 JSON 路径")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.seconds, args.fps, args.seed, args.clips_dir, args.repeat,
+                  args.complexity, args.frame_gate)
+    print_results(results)
+    if args.output:
+        write_results(Path(args.output), {"environment": environment(), "metrics": {"engine": results}})
+        print(f"结果已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+推理前帧过滤基准测试
+
+对同一段视频逐帧比较：
+- 帧过滤（缩小灰度图上的模糊度与运动量判断）的单帧耗时
+- 姿态推理（颜色转换 + 模型）的单帧耗时
+并报告帧过滤的决策分布，以及按决策跳过推理后预计节省的推理时间。
+
+用法:
+    python -m benchmarks.bench_frame_gate --video uploads/sample.mp4 --frames 600
+    python -m benchmarks.bench_frame_gate --video uploads/sample.mp4 --motion-threshold 0.02 --blur-threshold 20
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def main():
+    import cv2
+    from app.core.config import settings
+    from app.services.ai_engine import create_pose_backend
+    from app.services.frame_gate import INFER, FrameGate
+
+    parser = argparse.ArgumentParser(description="推理前帧过滤基准测试")
+    parser.add_argument("--video", required=True)
+    parser.add_argument("--frames", type=int, default=600)
+    parser.add_argument("--motion-threshold", type=float, default=settings.FRAME_GATE_MOTION_THRESHOLD)
+    parser.add_argument("--blur-threshold", type=float, default=settings.FRAME_GATE_BLUR_THRESHOLD)
+    parser.add_argument("--max-skip", type=int, default=settings.FRAME_GATE_MAX_SKIP)
+    parser.add_argument("--size", type=int, default=settings.FRAME_GATE_SIZE)
+    parser.add_argument("--complexity", type=int, choices=[0, 1, 2], default=1)
+    args = parser.parse_args()
+
+    cap = cv2.VideoCapture(args.video)
+    if not cap.isOpened():
+        raise SystemExit(f"无法打开视频文件: {args.video}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+
+    gate = FrameGate(args.motion_threshold, args.blur_threshold, args.max_skip, args.size)
+    backend = create_pose_backend(args.complexity, running_mode="video")
+    gate_times, infer_times = [], []
+    frame_index = 0
+    while frame_index < args.frames:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        start = time.perf_counter()
+        decision = gate.check(frame)
+        gate_times.append(time.perf_counter() - start)
+
+        # 每帧都推理以测量推理耗时；只有 INFER 帧的结果用于更新人体区域（与 process_video 一致）
+        start = time.perf_counter()
+        image_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        result = backend.detect(image_rgb, int(frame_index * 1000.0 / fps))
+        infer_times.append(time.perf_counter() - start)
+        if decision == INFER:
+            gate.update(result.pose_landmarks)
+        frame_index += 1
+    cap.release()
+    backend.close()
+    if not gate_times:
+        raise SystemExit(f"视频中没有可读取的帧: {args.video}")
+
+    stats = gate.stats()
+    infer_mean = statistics.mean(infer_times)
+    gate_mean = statistics.mean(gate_times)
+    skipped = stats["checked"] - stats[INFER]
+    print(f"视频: {args.video}，{len(gate_times)} 帧，后端: {backend.name}")
+    print(f"  帧过滤   mean={gate_mean * 1000:6.2f}ms  p99={percentile(gate_times, 99) * 1000:6.2f}ms")
+    print(f"  姿态推理 mean={infer_mean * 1000:6.2f}ms  p99={percentile(infer_times, 99) * 1000:6.2f}ms")
+    print(f"  帧过滤耗时约为推理的 {gate_mean / infer_mean:.1%}")
+    print(f"  决策: {stats}")
+    saved = skipped * infer_mean - len(gate_times) * gate_mean
+    print(f"  跳过 {skipped} 次推理，预计净节省 {saved:.2f}s（占推理总耗时 {saved / sum(infer_times):.1%}）")
+
+
+if __name__ == "__main__":
+    main()
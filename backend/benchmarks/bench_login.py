@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+登录吞吐量基准测试
+
+1. 单线程测量 bcrypt 验证速度，得到每核每秒可支撑的登录数
+2. 通过进程内 ASGI 客户端并发登录，测量端到端吞吐量，
+   同时测量登录高峰期间 /standards 的延迟（验证其不被哈希计算阻塞）
+
+用法:
+    python -m benchmarks.bench_login --logins 200 --concurrency 32 --rounds 12
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def bench_raw_bcrypt(rounds: int, iterations: int) -> float:
+    """单线程 bcrypt 验证速率（次/秒）"""
+    from passlib.context import CryptContext
+    ctx = CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds)
+    hashed = ctx.hash("benchmark-password")
+    start = time.perf_counter()
+    for _ in range(iterations):
+        ctx.verify("benchmark-password", hashed)
+    return iterations / (time.perf_counter() - start)
+
+
+async def bench_api(logins: int, concurrency: int) -> dict:
+    import httpx
+    from app.main import app
+    from app.core.config import settings
+    from app.core.security import password_hasher
+
+    prefix = settings.API_V1_PREFIX
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        r = await client.post(f"{prefix}/auth/register", json={"username": "bench", "password": "benchpass"})
+        assert r.status_code in (201, 400), r.text
+
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies, standards_latencies = [], []
+        status_counts = {}
+        done = asyncio.Event()
+
+        async def one_login():
+            async with semaphore:
+                t0 = time.perf_counter()
+                resp = await client.post(f"{prefix}/auth/login/json",
+                                         json={"username": "bench", "password": "benchpass"})
+                latencies.append(time.perf_counter() - t0)
+                status_counts[resp.status_code] = status_counts.get(resp.status_code, 0) + 1
+
+        async def probe_standards():
+            while not done.is_set():
+                t0 = time.perf_counter()
+                await client.get(f"{prefix}/standards")
+                standards_latencies.append(time.perf_counter() - t0)
+                await asyncio.sleep(0.05)
+
+        probe = asyncio.create_task(probe_standards())
+        start = time.perf_counter()
+        await asyncio.gather(*(one_login() for _ in range(logins)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await probe
+
+    ok = status_counts.get(200, 0)
+    latencies.sort()
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "status_counts": status_counts,
+        "logins_per_s": round(ok / elapsed, 2),
+        "logins_per_s_per_worker": round(ok / elapsed / password_hasher.max_workers, 2),
+        "login_p50_ms": round(latencies[len(latencies) // 2] * 1000, 1),
+        "login_p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 1),
+        "standards_median_ms": round(statistics.median(standards_latencies) * 1000, 2) if standards_latencies else None,
+        "hasher": password_hasher.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="登录吞吐量基准测试")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt 工作因子")
+    parser.add_argument("--raw-iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    # 使用临时数据库，避免污染开发数据
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench_login.db"
+    os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+
+    per_core = bench_raw_bcrypt(args.rounds, args.raw_iterations)
+    print(f"bcrypt rounds={args.rounds}: {per_core:.2f} 次验证/秒/核 (单线程)")
+
+    result = asyncio.run(bench_api(args.logins, args.concurrency))
+    print(f"端到端: {result['logins_per_s']} 次登录/秒 "
+          f"({result['logins_per_s_per_worker']} /秒/哈希线程, 共 {os.cpu_count()} 核)")
+    print(f"登录延迟 p50={result['login_p50_ms']}ms p99={result['login_p99_ms']}ms, "
+          f"状态码 {result['status_counts']}")
+    print(f"高峰期间 /standards 中位延迟: {result['standards_median_ms']}ms")
+    print(f"哈希线程池: {result['hasher']}")
+
+
+if __name__ == "__main__":
+    main()
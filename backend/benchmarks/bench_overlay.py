@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+叠加层绘制基准测试
+
+按 process_video 的绘制内容（8 个关节的圆点与角度、骨架、最多 5 条建议、底部动作名称）
+比较两种实现的单帧绘制耗时，并逐帧校验输出是否逐像素一致：
+
+- legacy: cv2.putText + mp_drawing.draw_landmarks（优化前的实现）
+- overlay: app.services.overlay.OverlayRenderer（文字精灵 + 骨架批量绘制）
+
+关键点为围绕固定站姿随机抖动的合成数据，角度与建议随帧变化。
+
+用法:
+    python -m benchmarks.bench_overlay --frames 500 --width 1280 --height 720
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+
+# 站姿的 33 个关键点（归一化坐标），只用于生成合理的骨架形状
+STANDING_POSE = [
+    (0.50, 0.12), (0.51, 0.10), (0.52, 0.10), (0.53, 0.10), (0.49, 0.10), (0.48, 0.10), (0.47, 0.10),
+    (0.55, 0.11), (0.45, 0.11), (0.52, 0.14), (0.48, 0.14), (0.58, 0.22), (0.42, 0.22), (0.62, 0.35),
+    (0.38, 0.35), (0.64, 0.47), (0.36, 0.47), (0.65, 0.50), (0.35, 0.50), (0.64, 0.50), (0.36, 0.50),
+    (0.63, 0.49), (0.37, 0.49), (0.55, 0.50), (0.45, 0.50), (0.56, 0.68), (0.44, 0.68), (0.56, 0.86),
+    (0.44, 0.86), (0.56, 0.88), (0.44, 0.88), (0.58, 0.90), (0.42, 0.90),
+]
+JOINTS = {
+    "left_elbow": 13, "right_elbow": 14, "left_shoulder": 11, "right_shoulder": 12,
+    "left_knee": 25, "right_knee": 26, "left_hip": 23, "right_hip": 24,
+}
+
+
+def synthetic_frames(count: int, seed: int):
+    """每帧：(关键点 protobuf, [(关节名, 角度, 偏差)])"""
+    from mediapipe.framework.formats import landmark_pb2
+
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in range(count):
+        jitter = rng.normal(0, 0.01, size=(len(STANDING_POSE), 2))
+        landmarks = landmark_pb2.NormalizedLandmarkList(landmark=[
+            landmark_pb2.NormalizedLandmark(x=float(x + dx), y=float(y + dy), z=0.0,
+                                            visibility=float(rng.uniform(0.4, 1.0)))
+            for (x, y), (dx, dy) in zip(STANDING_POSE, jitter)
+        ])
+        joints = [(name, float(rng.uniform(0, 180)), float(rng.uniform(0, 30))) for name in JOINTS]
+        frames.append((landmarks, joints))
+    return frames
+
+
+def draw_legacy(image, landmarks, joints, action: str) -> None:
+    import mediapipe as mp
+
+    mp_pose, mp_drawing = mp.solutions.pose, mp.solutions.drawing_utils
+    height, width = image.shape[:2]
+    suggestions = []
+    for name, angle, diff in joints:
+        lm = landmarks.landmark[JOINTS[name]]
+        cx, cy = int(lm.x * width), int(lm.y * height)
+        color = (0, 0, 255) if diff > 15 else (0, 255, 0)
+        if diff > 15:
+            suggestions.append(f"调整 {name.replace('_', ' ')}")
+        cv2.circle(image, (cx, cy), 10, color, -1)
+        cv2.putText(image, f"{int(angle)}°", (cx + 15, cy), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
+    mp_drawing.draw_landmarks(
+        image, landmarks, mp_pose.POSE_CONNECTIONS,
+        mp_drawing.DrawingSpec(color=(0, 255, 0), thickness=2, circle_radius=2),
+        mp_drawing.DrawingSpec(color=(0, 0, 255), thickness=2)
+    )
+    y_pos = 30
+    for text in suggestions[:5]:
+        cv2.putText(image, text, (10, y_pos), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+        y_pos += 30
+    cv2.putText(image, f"Action: {action}", (10, height - 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+
+
+def draw_overlay(image, landmarks, joints, action: str) -> None:
+    from app.services.ai_engine import overlay
+
+    height, width = image.shape[:2]
+    suggestions = []
+    for name, angle, diff in joints:
+        lm = landmarks.landmark[JOINTS[name]]
+        cx, cy = int(lm.x * width), int(lm.y * height)
+        color = (0, 0, 255) if diff > 15 else (0, 255, 0)
+        if diff > 15:
+            suggestions.append(f"调整 {name.replace('_', ' ')}")
+        cv2.circle(image, (cx, cy), 10, color, -1)
+        overlay.text(image, f"{int(angle)}°", (cx + 15, cy), 0.5, (255, 255, 255), 2)
+    overlay.skeleton(image, landmarks)
+    y_pos = 30
+    for text in suggestions[:5]:
+        overlay.text(image, text, (10, y_pos), 0.6, (0, 0, 255), 2)
+        y_pos += 30
+    overlay.text(image, f"Action: {action}", (10, height - 30), 0.7, (255, 255, 255), 2)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="叠加层绘制基准测试")
+    parser.add_argument("--frames", type=int, default=500)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--action", default="Tree_Pose_or_Vrksasana_")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    from app.services.ai_engine import overlay
+    from app.services.overlay import angle_labels, sprite_cache
+
+    # 与 PoseAnalyzer 初始化时相同：预先光栅化角度标签（一次性开销单独报告）
+    start = time.perf_counter()
+    overlay.warm(angle_labels(), 0.5, (255, 255, 255), 2)
+    warm_seconds = time.perf_counter() - start
+
+    frames = synthetic_frames(args.frames, args.seed)
+    background = np.random.default_rng(args.seed).integers(0, 255, (args.height, args.width, 3), dtype=np.uint8)
+    timings = {"legacy": [], "overlay": []}
+    mismatched = 0
+    # 两种实现交替执行，避免 CPU 频率变化只影响其中一方
+    for landmarks, joints in frames:
+        expected, actual = background.copy(), background.copy()
+        start = time.perf_counter()
+        draw_legacy(expected, landmarks, joints, args.action)
+        timings["legacy"].append(time.perf_counter() - start)
+        start = time.perf_counter()
+        draw_overlay(actual, landmarks, joints, args.action)
+        timings["overlay"].append(time.perf_counter() - start)
+        mismatched += bool((expected != actual).any())
+
+    print(f"{args.frames} 帧，{args.width}x{args.height}，预先光栅化 181 个角度标签耗时 {warm_seconds * 1000:.1f}ms")
+    for name, values in timings.items():
+        print(f"  {name:<8} mean={statistics.mean(values) * 1e6:7.1f}us  p50={percentile(values, 50) * 1e6:7.1f}us  "
+              f"p99={percentile(values, 99) * 1e6:7.1f}us")
+    speedup = statistics.mean(timings["legacy"]) / statistics.mean(timings["overlay"])
+    print(f"  加速比: {speedup:.2f}x，精灵缓存: {len(sprite_cache)} 个（命中 {sprite_cache.hits}，未命中 {sprite_cache.misses}）")
+    print(f"  输出不一致的帧: {mismatched}")
+    sys.exit(1 if mismatched else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+姿态后端基准测试（CPU）
+
+用同一段视频比较 legacy mp.solutions.pose 与 Tasks PoseLandmarker：
+
+- legacy: 同步 process()
+- tasks-video: VIDEO 模式 detect_for_video()（上传视频分析使用）
+- tasks-live: LIVE_STREAM 模式 detect_async()，按视频帧率送帧（模拟摄像头），
+  推理忙时 MediaPipe 丢帧；延迟 = 回调时间 - 送帧时间，吞吐 = 回调次数 / 耗时
+
+每种后端报告：初始化耗时、处理帧数、吞吐（帧/秒）、单帧延迟 p50/p99、检测到姿态的帧比例。
+Tasks 模型包不存在时跳过对应项（python manage.py download-pose-models 下载）。
+
+用法:
+    python -m benchmarks.bench_pose_backends --video uploads/sample.mp4 --frames 300
+    python -m benchmarks.bench_pose_backends --video uploads/sample.mp4 --complexity 0 --max-side 480
+"""
+import argparse
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def load_frames(video: str, frames: int, max_side: int):
+    """预先解码为 RGB 帧，避免把解码耗时算进推理"""
+    import cv2
+
+    cap = cv2.VideoCapture(video)
+    if not cap.isOpened():
+        raise SystemExit(f"无法打开视频文件: {video}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    result = []
+    while len(result) < frames:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        height, width = frame.shape[:2]
+        if max_side and max(width, height) > max_side:
+            scale = max_side / float(max(width, height))
+            frame = cv2.resize(frame, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+        result.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    cap.release()
+    if not result:
+        raise SystemExit(f"视频中没有可读取的帧: {video}")
+    return result, fps
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def bench_sync(backend_cls, complexity: int, frames, fps: float):
+    """legacy / tasks-video：逐帧同步推理"""
+    started = time.perf_counter()
+    backend = backend_cls(complexity, running_mode="video")
+    init_seconds = time.perf_counter() - started
+
+    latencies, detected = [], 0
+    started = time.perf_counter()
+    for index, image in enumerate(frames):
+        t0 = time.perf_counter()
+        result = backend.detect(image, int(index * 1000.0 / fps))
+        latencies.append(time.perf_counter() - t0)
+        detected += result.pose_landmarks is not None
+    elapsed = time.perf_counter() - started
+    backend.close()
+    return {"backend": backend, "init": init_seconds, "processed": len(latencies), "elapsed": elapsed,
+            "latencies": latencies, "detected": detected}
+
+
+def bench_live(complexity: int, frames, fps: float):
+    """tasks-live：按帧率异步送帧，统计回调延迟"""
+    from app.services.ai_engine import TasksPoseBackend
+
+    submitted, latencies = {}, []
+    counters = {"detected": 0}
+    lock = threading.Lock()
+
+    def on_result(frame, timestamp_ms):
+        now = time.perf_counter()
+        with lock:
+            latencies.append(now - submitted.pop(timestamp_ms, now))
+            counters["detected"] += frame.pose_landmarks is not None
+
+    started = time.perf_counter()
+    backend = TasksPoseBackend(complexity, running_mode="live_stream", result_callback=on_result)
+    init_seconds = time.perf_counter() - started
+
+    interval = 1.0 / fps
+    started = time.perf_counter()
+    for index, image in enumerate(frames):
+        timestamp_ms = int(index * 1000.0 * interval)
+        with lock:
+            submitted[timestamp_ms] = time.perf_counter()
+        backend.detect(image, timestamp_ms)
+        delay = started + (index + 1) * interval - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    backend.close()  # 等待已送入的帧处理完
+    elapsed = time.perf_counter() - started
+    return {"backend": backend, "init": init_seconds, "processed": len(latencies), "elapsed": elapsed,
+            "latencies": latencies, "detected": counters["detected"]}
+
+
+def report(name: str, stats, total: int) -> None:
+    latencies = stats["latencies"]
+    if not latencies:
+        print(f"  {name:<12} 没有结果")
+        return
+    print(f"  {name:<12} init={stats['init'] * 1000:7.1f}ms  frames={stats['processed']:4d}/{total}  "
+          f"throughput={stats['processed'] / stats['elapsed']:6.1f} fps  "
+          f"p50={percentile(latencies, 50) * 1000:6.1f}ms  p99={percentile(latencies, 99) * 1000:6.1f}ms  "
+          f"mean={statistics.mean(latencies) * 1000:6.1f}ms  "
+          f"detected={stats['detected'] / max(1, stats['processed']):.0%}  "
+          f"(model_complexity={stats['backend'].model_complexity})")
+
+
+def main():
+    from app.services.ai_engine import LegacyPoseBackend, TasksPoseBackend, pose_task_model_path
+
+    parser = argparse.ArgumentParser(description="姿态后端基准测试")
+    parser.add_argument("--video", required=True, help="测试视频（最好包含完整人体）")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--complexity", type=int, choices=[0, 1, 2], default=1)
+    parser.add_argument("--max-side", type=int, default=0, help="推理前缩放到的最长边，0 表示原分辨率")
+    parser.add_argument("--live-fps", type=float, default=0, help="tasks-live 的送帧帧率，默认取视频帧率")
+    parser.add_argument("--backends", default="legacy,tasks-video,tasks-live")
+    args = parser.parse_args()
+
+    frames, fps = load_frames(args.video, args.frames, args.max_side)
+    height, width = frames[0].shape[:2]
+    print(f"视频: {args.video}，{len(frames)} 帧，{width}x{height}，{fps:.2f} fps，model_complexity={args.complexity}")
+
+    backends = [name.strip() for name in args.backends.split(",") if name.strip()]
+    has_task_model = pose_task_model_path(args.complexity).exists()
+    for name in backends:
+        if name.startswith("tasks") and not has_task_model:
+            print(f"  {name:<12} 跳过：{pose_task_model_path(args.complexity)} 不存在")
+            continue
+        if name == "legacy":
+            stats = bench_sync(LegacyPoseBackend, args.complexity, frames, fps)
+        elif name == "tasks-video":
+            stats = bench_sync(TasksPoseBackend, args.complexity, frames, fps)
+        elif name == "tasks-live":
+            stats = bench_live(args.complexity, frames, args.live_fps or fps)
+        else:
+            print(f"  {name:<12} 未知的后端")
+            continue
+        report(name, stats, len(frames))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+分析调度策略基准测试（离散事件模拟，不实际运行推理）
+
+合成混合负载：大部分为 15 秒短片段，少量为 20 分钟长视频，按泊松过程到达。
+实际耗时 = 预估耗时 × 对数正态噪声（模拟成本预估误差）。
+比较三种策略下各类任务的完成时间（到达 → 完成）p50 / p99：
+
+- fifo: 先到先服务（现状）
+- sjf: 纯短作业优先（长作业可能饿死）
+- sjf_aging: 短作业优先 + 老化（app.services.scheduler 使用的排序键）
+
+加 --live 时改为用真实的 AnalysisScheduler 线程池执行 sleep 任务（按 --time-scale 缩放），
+验证实现与模拟结论一致。
+
+用法:
+    python -m benchmarks.bench_scheduler --jobs 2000 --long-ratio 0.02 --workers 2 --load 0.8
+    python -m benchmarks.bench_scheduler --jobs 200 --live --time-scale 0.001
+"""
+import argparse
+import heapq
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+SHORT_SECONDS = 15
+LONG_SECONDS = 20 * 60
+FPS = 30
+WIDTH, HEIGHT = 1280, 720
+
+
+def generate_workload(jobs: int, long_ratio: float, workers: int, load: float, batch_ratio: float,
+                      seconds_per_unit: float, noise: float, seed: int):
+    """生成 (到达时间, 成本, 实际耗时, 类别, 是否长作业) 列表，平均到达率按目标负载计算"""
+    from app.services.scheduler import estimate_cost
+
+    rng = random.Random(seed)
+    short_cost = estimate_cost({"frame_count": SHORT_SECONDS * FPS, "width": WIDTH, "height": HEIGHT})
+    long_cost = estimate_cost({"frame_count": LONG_SECONDS * FPS, "width": WIDTH, "height": HEIGHT})
+    mean_service = seconds_per_unit * ((1 - long_ratio) * short_cost + long_ratio * long_cost)
+    arrival_rate = load * workers / mean_service
+
+    workload, now = [], 0.0
+    for _ in range(jobs):
+        now += rng.expovariate(arrival_rate)
+        is_long = rng.random() < long_ratio
+        cost = long_cost if is_long else short_cost
+        actual = cost * seconds_per_unit * rng.lognormvariate(0, noise)
+        job_class = "batch" if rng.random() < batch_ratio else "interactive"
+        workload.append((now, cost, actual, job_class, is_long))
+    return workload
+
+
+def simulate(workload, policy: str, workers: int, seconds_per_unit: float,
+             aging_rate: float, batch_penalty: float):
+    """返回每个任务的 (完成时间 - 到达时间, 类别, 是否长作业)"""
+    from app.services.scheduler import priority_key
+
+    offsets = {"interactive": 0.0, "batch": batch_penalty}
+    ready, finish_events, results = [], [], []
+    free, index, seq = workers, 0, 0
+    now = 0.0
+
+    def key(arrival, cost, job_class):
+        predicted = cost * seconds_per_unit
+        if policy == "fifo":
+            return arrival
+        if policy == "sjf":
+            return predicted + offsets[job_class]
+        return priority_key(predicted, offsets[job_class], arrival, aging_rate)
+
+    while index < len(workload) or ready or finish_events:
+        next_arrival = workload[index][0] if index < len(workload) else float("inf")
+        next_finish = finish_events[0][0] if finish_events else float("inf")
+        if next_arrival <= next_finish:
+            now = next_arrival
+            arrival, cost, actual, job_class, is_long = workload[index]
+            heapq.heappush(ready, (key(arrival, cost, job_class), seq, workload[index]))
+            seq += 1
+            index += 1
+        else:
+            now, _, job = heapq.heappop(finish_events)
+            arrival, _, _, job_class, is_long = job
+            results.append((now - arrival, job_class, is_long))
+            free += 1
+        while free and ready:
+            _, _, job = heapq.heappop(ready)
+            heapq.heappush(finish_events, (now + job[2], seq, job))
+            seq += 1
+            free -= 1
+    return results
+
+
+def run_live(workload, workers: int, seconds_per_unit: float, aging_rate: float,
+             batch_penalty: float, time_scale: float):
+    """用真实调度器执行缩放后的 sleep 任务"""
+    from app.services.scheduler import AnalysisScheduler
+
+    scheduler = AnalysisScheduler(workers=workers, aging_rate=aging_rate / time_scale,
+                                  batch_penalty=batch_penalty * time_scale,
+                                  seconds_per_unit=seconds_per_unit * time_scale)
+    scheduler.start()
+    start = time.monotonic()
+    pending = []
+    for arrival, cost, actual, job_class, is_long in workload:
+        delay = arrival * time_scale - (time.monotonic() - start)
+        if delay > 0:
+            time.sleep(delay)
+        submitted = time.monotonic()
+        future = scheduler.submit(time.sleep, actual * time_scale, cost=cost, job_class=job_class)
+        pending.append((future, submitted, job_class, is_long))
+    results = []
+    for future, submitted, job_class, is_long in pending:
+        future.result()
+        results.append((future.timing["completion_seconds"] / time_scale, job_class, is_long))
+    calibration = scheduler.stats()["calibration"]
+    scheduler.stop()
+    return results, calibration
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def report(name: str, results) -> None:
+    groups = {
+        "short": [r[0] for r in results if not r[2]],
+        "long": [r[0] for r in results if r[2]],
+        "interactive": [r[0] for r in results if r[1] == "interactive"],
+        "batch": [r[0] for r in results if r[1] == "batch"],
+        "all": [r[0] for r in results],
+    }
+    cells = []
+    for group, values in groups.items():
+        if values:
+            cells.append(f"{group}: p50={percentile(values, 50):8.1f}s p99={percentile(values, 99):8.1f}s")
+    print(f"  {name:<10} " + " | ".join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分析调度策略基准测试")
+    parser.add_argument("--jobs", type=int, default=2000)
+    parser.add_argument("--long-ratio", type=float, default=0.02, help="长视频（20 分钟）占比")
+    parser.add_argument("--batch-ratio", type=float, default=0.3, help="batch 类任务占比")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--load", type=float, default=0.8, help="目标利用率（到达率 × 平均耗时 / 工作线程数）")
+    parser.add_argument("--noise", type=float, default=0.3, help="实际/预估耗时的对数正态标准差")
+    parser.add_argument("--seconds-per-unit", type=float, default=0.04)
+    parser.add_argument("--aging-rate", type=float, default=1.0)
+    parser.add_argument("--batch-penalty", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--live", action="store_true", help="用真实调度器执行（sleep 任务）")
+    parser.add_argument("--time-scale", type=float, default=0.001, help="--live 时的时间缩放")
+    args = parser.parse_args()
+
+    workload = generate_workload(args.jobs, args.long_ratio, args.workers, args.load, args.batch_ratio,
+                                 args.seconds_per_unit, args.noise, args.seed)
+    services = [job[2] for job in workload]
+    print(f"任务数: {len(workload)}，长视频: {sum(1 for job in workload if job[4])}，"
+          f"平均耗时: {statistics.mean(services):.1f}s，工作线程: {args.workers}，目标负载: {args.load}")
+
+    print("\n模拟（完成时间 = 排队 + 执行）:")
+    for policy in ("fifo", "sjf", "sjf_aging"):
+        report(policy, simulate(workload, policy, args.workers, args.seconds_per_unit,
+                                args.aging_rate, args.batch_penalty))
+
+    if args.live:
+        results, calibration = run_live(workload, args.workers, args.seconds_per_unit,
+                                        args.aging_rate, args.batch_penalty, args.time_scale)
+        print("\n真实调度器（换算回未缩放的秒数）:")
+        report("live", results)
+        print(f"  校准: {calibration}")
+
+
+if __name__ == "__main__":
+    main()
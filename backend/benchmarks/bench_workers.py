@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+多进程吞吐基准测试：worker 进程数与 CPU 线程预算（app/core/resources.py）对总吞吐的影响
+
+对每个进程数 N 和每种模式各启动 N 个子进程，每个子进程先预热一遍，全部就绪后同时开始，
+各自用 process_video 分析 --videos 次同一段合成视频：
+- budget：THREAD_BUDGET_ENABLED=true、CPU_WORKERS=N，每个进程的 OpenCV / BLAS 线程数为 可用核数 / N
+  （--affinity auto 时按 WORKER_INDEX 绑定各自的核）
+- unlimited：关闭线程预算，各库按整机核数开线程（改动前的行为）
+
+报告总吞吐（所有进程的帧数 / 墙钟时间）、每进程吞吐、相对 1 个进程的加速比，
+以及每秒的非自愿上下文切换次数（线程超额订阅时明显升高）。
+子进程通过环境变量接收配置，BLAS 的线程数设置在导入 numpy 之前生效。
+
+用法:
+    python -m benchmarks.bench_workers
+    python -m benchmarks.bench_workers --workers 1,2,4,8 --videos 3 --affinity auto --output /tmp/workers.json
+    python -m benchmarks.bench_workers --modes budget --workers 2 --size 1280x720
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+MODES = ("budget", "unlimited")
+BLAS_ENV = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "VECLIB_MAXIMUM_THREADS",
+            "NUMEXPR_NUM_THREADS", "BLIS_NUM_THREADS")
+
+
+def child(video: str, videos: int, workdir: str) -> None:
+    """子进程：预热后输出 ready，收到 go 后开始计时，结束时输出一行 JSON 结果"""
+    import resource
+
+    from app.core import resources
+    from app.core.config import settings
+    from app.services.ai_engine import PoseAnalyzer
+
+    analyzer = PoseAnalyzer(angles_json_path=str(settings.YOGA_ANGLES_JSON))
+    action = next(iter(analyzer.standards), "unknown")
+    output = str(Path(workdir) / "out.mp4")
+    analyzer.process_video(video, output, action)  # 预热（模型加载）
+    print("ready", flush=True)
+    sys.stdin.readline()
+
+    usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.time()
+    frames = 0
+    for _ in range(videos):
+        frames += analyzer.process_video(video, output, action)["frame_count"]
+    end = time.time()
+    usage_after = resource.getrusage(resource.RUSAGE_SELF)
+    print(json.dumps({
+        "start": start,
+        "end": end,
+        "frames": frames,
+        "cpu_s": (usage_after.ru_utime + usage_after.ru_stime) - (usage_before.ru_utime + usage_before.ru_stime),
+        "involuntary_switches": usage_after.ru_nivcsw - usage_before.ru_nivcsw,
+        "budget": resources.thread_budget.as_dict() if resources.thread_budget else None,
+    }), flush=True)
+
+
+def child_env(mode: str, workers: int, index: int, affinity: str, pose_backend: str) -> dict:
+    env = dict(os.environ)
+    for name in BLAS_ENV:
+        env.pop(name, None)
+    env.update({
+        "THREAD_BUDGET_ENABLED": "true" if mode == "budget" else "false",
+        "CPU_WORKERS": str(workers),
+        "WORKER_INDEX": str(index),
+        "CPU_AFFINITY": affinity if mode == "budget" else "",
+        "DATABASE_URL": "sqlite://",
+    })
+    if pose_backend:
+        env["POSE_BACKEND"] = pose_backend
+    return env
+
+
+def run_group(mode: str, workers: int, video: Path, videos: int, affinity: str, pose_backend: str,
+              tmp: Path) -> dict:
+    processes = []
+    for index in range(workers):
+        workdir = tmp / f"{mode}_{workers}_{index}"
+        workdir.mkdir()
+        processes.append(subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.bench_workers", "--child", str(video), str(videos), str(workdir)],
+            cwd=str(Path(__file__).resolve().parent.parent), env=child_env(mode, workers, index, affinity, pose_backend),
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+        ))
+    try:
+        for process in processes:
+            if process.stdout.readline().strip() != "ready":
+                raise RuntimeError(f"子进程启动失败（{mode}, {workers} 个进程）")
+        for process in processes:
+            process.stdin.write("go\n")
+            process.stdin.flush()
+        results = [json.loads(process.stdout.readline()) for process in processes]
+    finally:
+        for process in processes:
+            process.stdin.close()
+            process.wait()
+
+    wall = max(r["end"] for r in results) - min(r["start"] for r in results)
+    frames = sum(r["frames"] for r in results)
+    return {
+        "workers": workers,
+        "aggregate_fps": round(frames / wall, 2),
+        "per_worker_fps": round(frames / wall / workers, 2),
+        "cpu_utilization": round(sum(r["cpu_s"] for r in results) / wall, 2),
+        "involuntary_switches_per_s": round(sum(r["involuntary_switches"] for r in results) / wall, 1),
+        "threads_per_worker": (results[0]["budget"] or {}).get("threads"),
+        "cpus": [(r["budget"] or {}).get("cpus") for r in results],
+    }
+
+
+def run(worker_counts, modes, seconds: float, size: str, videos: int, affinity: str, pose_backend: str) -> dict:
+    from benchmarks.common import synthetic_video
+
+    width, height = (int(v) for v in size.lower().split("x"))
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="bench_workers_") as tmp:
+        tmp = Path(tmp)
+        video = synthetic_video(tmp / "bench.mp4", seconds=seconds, width=width, height=height)
+        for mode in modes:
+            single = None
+            for workers in worker_counts:
+                entry = run_group(mode, workers, video, videos, affinity, pose_backend, tmp)
+                single = single or (entry["aggregate_fps"] if workers == 1 else None)
+                if single:
+                    entry["speedup"] = round(entry["aggregate_fps"] / single, 2)
+                results[f"{mode}_{workers}w"] = entry
+                print_entry(mode, entry)
+    return results
+
+
+def print_entry(mode: str, entry: dict) -> None:
+    speedup = f"  加速 {entry['speedup']:.2f}x" if "speedup" in entry else ""
+    print(f"  {mode:<9} {entry['workers']:>2} 进程  总吞吐 {entry['aggregate_fps']:8.2f} fps  "
+          f"每进程 {entry['per_worker_fps']:7.2f} fps  CPU {entry['cpu_utilization']:5.2f} 核  "
+          f"非自愿切换 {entry['involuntary_switches_per_s']:8.1f}/s  线程 {entry['threads_per_worker']}{speedup}")
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        child(sys.argv[2], int(sys.argv[3]), sys.argv[4])
+        return
+
+    parser = argparse.ArgumentParser(description="多进程吞吐基准测试")
+    cpu_count = os.cpu_count() or 1
+    default_workers = ",".join(str(n) for n in sorted({1, 2, max(1, cpu_count // 2), cpu_count}))
+    parser.add_argument("--workers", default=default_workers, help="逗号分隔的进程数（默认 1、2、半数核、全部核）")
+    parser.add_argument("--modes", default=",".join(MODES), help="budget / unlimited，逗号分隔")
+    parser.add_argument("--seconds", type=float, default=2.0, help="合成视频时长")
+    parser.add_argument("--size", default="640x480", help="合成视频分辨率")
+    parser.add_argument("--videos", type=int, default=2, help="每个进程计时分析的次数")
+    parser.add_argument("--affinity", default="", help="budget 模式的 CPU_AFFINITY（auto 为各进程绑定各自的核）")
+    parser.add_argument("--pose-backend", default="", help="覆盖 POSE_BACKEND（默认沿用配置）")
+    parser.add_argument("--output", default=None, help="结果 JSON 路径")
+    args = parser.parse_args()
+
+    from benchmarks.common import environment, write_results
+
+    worker_counts = sorted({int(v) for v in args.workers.split(",") if v.strip()})
+    modes = [m for m in args.modes.split(",") if m in MODES]
+    print(f"{cpu_count} 核，进程数 {worker_counts}，模式 {modes}")
+    results = run(worker_counts, modes, args.seconds, args.size, args.videos, args.affinity, args.pose_backend)
+    if args.output:
+        write_results(Path(args.output), {"environment": environment(), "options": vars(args),
+                                          "metrics": {"workers": results}})
+        print(f"结果已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
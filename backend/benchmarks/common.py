@@ -0,0 +1,146 @@
+# 基准测试公共工具：确定性合成视频、真实片段查找、结果 JSON 与基线对比
+import json
+import os
+import platform
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import cv2
+import numpy as np
+
+BENCH_DIR = Path(__file__).resolve().parent
+DEFAULT_CLIPS_DIR = BENCH_DIR / "clips"
+DEFAULT_BASELINE = BENCH_DIR / "baseline.json"
+VIDEO_EXTENSIONS = {".mp4", ".mov", ".avi", ".mkv", ".webm"}
+
+# 指标方向按名称后缀判断：耗时越小越好，吞吐越大越好；其余指标只记录不比较
+LOWER_IS_BETTER = ("_ms",)
+HIGHER_IS_BETTER = ("_fps", "_per_s")
+
+# 合成人体的关节（归一化坐标，站立时），手臂与腿按帧做周期摆动
+_BODY = {
+    "head": (0.50, 0.16), "neck": (0.50, 0.25), "hip": (0.50, 0.52),
+    "l_shoulder": (0.44, 0.27), "r_shoulder": (0.56, 0.27),
+    "l_hip": (0.46, 0.52), "r_hip": (0.54, 0.52),
+}
+
+
+def percentile(values: Iterable[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def _limb(origin, length: float, angle: float):
+    return origin[0] + length * np.sin(angle), origin[1] + length * np.cos(angle)
+
+
+def synthetic_video(path: Path, seconds: float = 4.0, fps: float = 30.0, width: int = 640, height: int = 480,
+                    seed: int = 0) -> Path:
+    """生成确定性的测试视频：带纹理的背景上一个做开合动作的人形（同样的参数生成逐字节相同的帧）
+
+    不依赖网络与外部素材；人形足够粗略，姿态模型不一定能检出，但解码、推理、编码的耗时与真实视频同量级
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    background = cv2.GaussianBlur(rng.integers(60, 200, (height, width, 3), dtype=np.uint8), (0, 0), 3)
+    out = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    if not out.isOpened():
+        raise RuntimeError(f"无法创建合成视频: {path}")
+
+    def px(point):
+        return int(point[0] * width), int(point[1] * height)
+
+    thickness = max(2, width // 40)
+    for index in range(int(round(seconds * fps))):
+        phase = 2 * np.pi * index / fps / 2.0  # 2 秒一个周期
+        swing = 0.5 + 0.5 * np.sin(phase)  # 0 ~ 1
+        frame = background.copy()
+        body = {name: np.array(point) for name, point in _BODY.items()}
+        # 手臂从下垂抬到水平以上，腿开合
+        for side, sign in (("l", -1), ("r", 1)):
+            shoulder = body[f"{side}_shoulder"]
+            arm = sign * (0.2 + 2.2 * swing)
+            elbow = _limb(shoulder, 0.12, arm)
+            wrist = _limb(elbow, 0.11, arm + sign * 0.3)
+            hip = body[f"{side}_hip"]
+            leg = sign * (0.05 + 0.35 * swing)
+            knee = _limb(hip, 0.17, leg)
+            ankle = _limb(knee, 0.17, leg * 0.6)
+            for a, b in ((shoulder, elbow), (elbow, wrist), (hip, knee), (knee, ankle)):
+                cv2.line(frame, px(a), px(b), (40, 70, 150), thickness, cv2.LINE_AA)
+        cv2.fillConvexPoly(frame, np.array([px(body["l_shoulder"]), px(body["r_shoulder"]),
+                                            px(body["r_hip"]), px(body["l_hip"])], dtype=np.int32),
+                           (150, 90, 40), cv2.LINE_AA)
+        cv2.line(frame, px(body["neck"]), px(body["head"]), (120, 160, 210), thickness, cv2.LINE_AA)
+        cv2.circle(frame, px(body["head"]), int(0.06 * height), (120, 160, 210), -1, cv2.LINE_AA)
+        out.write(frame)
+    out.release()
+    return path
+
+
+def find_clips(clips_dir: Optional[str] = None) -> List[Path]:
+    """真实视频片段：--clips-dir、BENCH_CLIPS_DIR 或 benchmarks/clips（不存在时为空）"""
+    directory = Path(clips_dir or os.getenv("BENCH_CLIPS_DIR") or DEFAULT_CLIPS_DIR)
+    if not directory.is_dir():
+        return []
+    return sorted(p for p in directory.iterdir() if p.suffix.lower() in VIDEO_EXTENSIONS)
+
+
+def environment() -> Dict[str, Any]:
+    """运行环境（对比基线时只有同一台机器的结果才有意义）"""
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def write_results(path: Path, results: Dict[str, Any]) -> None:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+def flatten(results: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    """嵌套结果 -> {"engine.synthetic_640x480.stages.inference_ms": ...}，只保留数值"""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else str(key)
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = float(value)
+    return flat
+
+
+def compare_to_baseline(current: Dict[str, Any], baseline: Dict[str, Any],
+                        tolerance: float = 0.15, noise_floor_ms: float = 0.5) -> List[Dict[str, Any]]:
+    """逐项比较两次结果的 metrics，返回变差超过 tolerance（相对值）的指标
+
+    耗时指标的绝对变化小于 noise_floor_ms 时忽略（亚毫秒级阶段的相对波动没有意义）
+    """
+    current_flat = flatten(current.get("metrics", {}))
+    baseline_flat = flatten(baseline.get("metrics", {}))
+    regressions = []
+    for name, base in sorted(baseline_flat.items()):
+        value = current_flat.get(name)
+        if value is None or base <= 0:
+            continue
+        if name.endswith(LOWER_IS_BETTER):
+            if value - base < noise_floor_ms:
+                continue
+            change = value / base - 1
+        elif name.endswith(HIGHER_IS_BETTER):
+            change = base / value - 1 if value > 0 else float("inf")
+        else:
+            continue
+        if change > tolerance:
+            regressions.append({"metric": name, "baseline": base, "current": value,
+                                "worse_by": round(change, 4)})
+    return regressions
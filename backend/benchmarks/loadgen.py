@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+并发压测：按固定到达率（开环）逐级加压，找出 API 的饱和点
+
+- 每一级以 --rps 中的一个速率发出请求，持续 --duration 秒。同时在途的请求不超过 --concurrency，
+  超出时在客户端排队。延迟从计划发出的时刻算起（含客户端排队），服务端变慢时不会因为压测端
+  跟着放慢而低估延迟
+- 请求按 --mix 的权重分配到各场景：register / login / me / standards / upload / infer
+- 每一级报告总体与各场景的 p50 / p95 / p99、错误率与实际吞吐，并在压测期间轮询 /metrics，
+  记录调度器排队数、后写队列、密码哈希队列等的最大值，用来判断瓶颈在哪一层
+- 饱和点：第一个满足任一条件的级别——实际吞吐低于到达率的 (1 - --tolerance)、
+  错误率超过 --max-error-rate、p99 超过 --slo-ms（设置时）
+- 默认在子进程中启动 uvicorn（临时数据库，POSE_BACKEND=fake，不加载模型，可在 CI 中运行）；
+  --url 指向已启动的服务时压测该服务（姿态后端等以服务端配置为准）
+
+用法:
+    python -m benchmarks.loadgen --rps 2,5,10,20 --duration 10
+    python -m benchmarks.loadgen --mix standards=8,me=2 --rps 50,100,200,400 --concurrency 128
+    python -m benchmarks.loadgen --mix infer=1 --rps 0.5,1,2,4 --duration 30 --fake-latency-ms 30 --output /tmp/load.json
+    python -m benchmarks.loadgen --url http://localhost:8000 --mix login=1 --rps 2,4,8
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.common import environment, percentile, synthetic_video, write_results  # noqa: E402
+
+SCENARIOS = ("register", "login", "me", "standards", "upload", "infer")
+DEFAULT_MIX = "standards=6,me=2,login=1,infer=1"
+API_PREFIX = "/api/v1"
+PASSWORD = "loadgen-pass"
+# 压测期间轮询的服务端仪表（同名不同标签的值相加）
+SERVER_GAUGES = {
+    "aimovement_http_requests_in_progress": "http_in_progress",
+    "aimovement_scheduler_queued": "scheduler_queued",
+    "aimovement_scheduler_running": "scheduler_running",
+    "aimovement_videos_in_flight": "videos_in_flight",
+    "aimovement_result_writer_pending": "result_writer_pending",
+    "aimovement_password_hash_pending": "password_hash_pending",
+}
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"未知场景: {name}（可选 {', '.join(SCENARIOS)}）")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def parse_rates(text: str) -> List[float]:
+    return [float(value) for value in text.split(",") if value.strip()]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int, workers: int, fake_latency_ms: float, bcrypt_rounds: Optional[int],
+                 root: Path) -> subprocess.Popen:
+    """在子进程中启动服务：数据库、上传与输出目录都放在临时目录 root 下，模拟姿态后端，
+    关闭相同分析去重（压测反复上传同一个视频）"""
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": f"sqlite:///{root / 'loadgen.db'}",
+        "STORAGE_DIR": str(root),
+        "POSE_BACKEND": "fake",
+        "FAKE_POSE_LATENCY_MS": str(fake_latency_ms),
+        "SINGLEFLIGHT_ENABLED": "false",
+    })
+    if bcrypt_rounds:
+        env["BCRYPT_ROUNDS"] = str(bcrypt_rounds)
+    if workers > 1:
+        env.setdefault("METRICS_DIR", str(root / "metrics"))
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        cwd=str(Path(__file__).resolve().parent.parent), env=env,
+    )
+
+
+async def wait_ready(client, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if (await client.get(f"{API_PREFIX}/health")).status_code == 200:
+                return
+        except Exception:
+            pass
+        if time.monotonic() > deadline:
+            raise RuntimeError("服务在超时前没有就绪")
+        await asyncio.sleep(0.2)
+
+
+class Scenarios:
+    """各场景的请求；setup() 预先注册一批用户，login / me / upload / infer 轮流使用"""
+
+    def __init__(self, client, video: Path, users: int, run_id: str):
+        self.client = client
+        self.payload = video.read_bytes()
+        self.video_name = video.name
+        self.user_count = users
+        self.run_id = run_id
+        self.usernames: List[str] = []
+        self.tokens: List[str] = []
+        self.action = None
+        self._registered = 0
+        self._turn = 0
+
+    async def setup(self) -> None:
+        for i in range(self.user_count):
+            username = f"load{self.run_id}u{i}"
+            response = await self.client.post(f"{API_PREFIX}/auth/register",
+                                              json={"username": username, "password": PASSWORD})
+            response.raise_for_status()
+            login = await self.client.post(f"{API_PREFIX}/auth/login/json",
+                                           json={"username": username, "password": PASSWORD})
+            login.raise_for_status()
+            self.usernames.append(username)
+            self.tokens.append(login.json()["access_token"])
+        standards = (await self.client.get(f"{API_PREFIX}/standards")).json()
+        self.action = standards[0]["actionId"] if standards else "unknown"
+
+    def _next(self) -> int:
+        self._turn += 1
+        return self._turn % len(self.tokens)
+
+    def _auth(self) -> dict:
+        return {"Authorization": f"Bearer {self.tokens[self._next()]}"}
+
+    def send(self, name: str):
+        return getattr(self, name)()
+
+    def register(self):
+        self._registered += 1
+        return self.client.post(f"{API_PREFIX}/auth/register", json={
+            "username": f"load{self.run_id}r{self._registered}", "password": PASSWORD})
+
+    def login(self):
+        return self.client.post(f"{API_PREFIX}/auth/login/json", json={
+            "username": self.usernames[self._next()], "password": PASSWORD})
+
+    def me(self):
+        return self.client.get(f"{API_PREFIX}/auth/me", headers=self._auth())
+
+    def standards(self):
+        return self.client.get(f"{API_PREFIX}/standards")
+
+    def upload(self):
+        return self.client.post(f"{API_PREFIX}/upload/video", headers=self._auth(), data={"action_type": self.action},
+                                files={"file": (self.video_name, self.payload, "video/mp4")})
+
+    def infer(self):
+        return self.client.post(f"{API_PREFIX}/infer/sync", headers=self._auth(), data={"actionType": self.action},
+                                files={"file": (self.video_name, self.payload, "video/mp4")})
+
+
+async def poll_server(client, peaks: Dict[str, float], stop: asyncio.Event, interval: float) -> None:
+    """轮询 /metrics，记录各仪表在本级中的最大值（未开启指标时不记录）"""
+    while not stop.is_set():
+        try:
+            response = await client.get("/metrics")
+        except Exception:
+            response = None
+        if response is None or response.status_code != 200:
+            return
+        totals = defaultdict(float)
+        for line in response.text.splitlines():
+            if line.startswith("#") or not line:
+                continue
+            name = line.split("{", 1)[0].split(" ", 1)[0]
+            if name in SERVER_GAUGES:
+                totals[SERVER_GAUGES[name]] += float(line.rsplit(" ", 1)[1])
+        for key, value in totals.items():
+            peaks[key] = max(peaks.get(key, 0.0), value)
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+def summarize(records: List[tuple], elapsed: float) -> dict:
+    latencies = [latency for _, latency in records]
+    errors = sum(1 for outcome, _ in records if outcome != "ok")
+    return {
+        "requests": len(records),
+        "errors": errors,
+        "error_rate": round(errors / len(records), 4) if records else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2) if records else None,
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2) if records else None,
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2) if records else None,
+        "throughput_per_s": round(len(records) / elapsed, 2) if elapsed > 0 else 0.0,
+    }
+
+
+async def run_stage(scenarios: Scenarios, rate: float, duration: float, concurrency: int, mix: Dict[str, float],
+                    rng: random.Random, timeout: float, poll_interval: float) -> dict:
+    names, weights = list(mix), list(mix.values())
+    limiter = asyncio.Semaphore(concurrency)
+    records: Dict[str, List[tuple]] = defaultdict(list)
+    outcomes: Dict[str, int] = defaultdict(int)
+    peaks: Dict[str, float] = {}
+    stop = asyncio.Event()
+    poller = asyncio.create_task(poll_server(scenarios.client, peaks, stop, poll_interval))
+
+    async def one(name: str, scheduled: float) -> None:
+        async with limiter:
+            try:
+                response = await asyncio.wait_for(scenarios.send(name), timeout)
+                outcome = "ok" if response.status_code < 400 else str(response.status_code)
+            except asyncio.TimeoutError:
+                outcome = "timeout"
+            except Exception as e:
+                outcome = type(e).__name__
+        records[name].append((outcome, time.perf_counter() - scheduled))
+        outcomes[outcome] += 1
+
+    start = time.perf_counter()
+    tasks = []
+    arrivals = max(1, int(rate * duration))
+    for i in range(arrivals):
+        scheduled = start + i / rate
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(one(rng.choices(names, weights)[0], scheduled)))
+    await asyncio.gather(*tasks)
+    # 至少按整个到达窗口计算吞吐（最后一个请求很快完成时不会高估）
+    elapsed = max(time.perf_counter() - start, arrivals / rate)
+    stop.set()
+    await poller
+
+    everything = [record for items in records.values() for record in items]
+    return {
+        "offered_per_s": rate,
+        "elapsed_s": round(elapsed, 2),
+        **summarize(everything, elapsed),
+        "outcomes": dict(outcomes),
+        "scenarios": {name: summarize(items, elapsed) for name, items in sorted(records.items())},
+        "server_peaks": peaks,
+    }
+
+
+def saturation(stage: dict, tolerance: float, max_error_rate: float, slo_ms: Optional[float]) -> List[str]:
+    """本级是否饱和，返回触发的原因（空列表表示未饱和）"""
+    reasons = []
+    if stage["throughput_per_s"] < stage["offered_per_s"] * (1 - tolerance):
+        reasons.append(f"吞吐 {stage['throughput_per_s']}/s 低于到达率 {stage['offered_per_s']}/s")
+    if stage["error_rate"] > max_error_rate:
+        reasons.append(f"错误率 {stage['error_rate']:.1%}")
+    if slo_ms and stage["p99_ms"] is not None and stage["p99_ms"] > slo_ms:
+        reasons.append(f"p99 {stage['p99_ms']}ms 超过 {slo_ms}ms")
+    return reasons
+
+
+def print_stage(stage: dict) -> None:
+    print(f"  {stage['offered_per_s']:>7.2f}/s  完成 {stage['throughput_per_s']:>7.2f}/s  "
+          f"p50={stage['p50_ms']:>9.2f}ms p95={stage['p95_ms']:>9.2f}ms p99={stage['p99_ms']:>9.2f}ms  "
+          f"错误 {stage['error_rate']:.1%}  {stage['outcomes']}")
+    for name, entry in stage["scenarios"].items():
+        print(f"      {name:<10} n={entry['requests']:<5} p50={entry['p50_ms']:>9.2f}ms "
+              f"p99={entry['p99_ms']:>9.2f}ms  错误 {entry['error_rate']:.1%}")
+    if stage["server_peaks"]:
+        print("      服务端峰值 " + "  ".join(f"{k}={v:g}" for k, v in sorted(stage["server_peaks"].items())))
+
+
+async def load_test(args, base_url: str, video: Path) -> dict:
+    import httpx
+
+    limits = httpx.Limits(max_connections=args.concurrency + 4, max_keepalive_connections=args.concurrency + 4)
+    async with httpx.AsyncClient(base_url=base_url, timeout=None, limits=limits) as client:
+        await wait_ready(client)
+        scenarios = Scenarios(client, video, args.users, run_id=f"{int(time.time()) % 100000}")
+        await scenarios.setup()
+        for name in args.mix:  # 预热（连接、路由、首次分析）
+            await scenarios.send(name)
+
+        rng = random.Random(args.seed)
+        stages, saturated_at, max_sustained = [], None, None
+        for rate in args.rps:
+            stage = await run_stage(scenarios, rate, args.duration, args.concurrency, args.mix, rng,
+                                    args.timeout, args.poll_interval)
+            stage["saturated"] = saturation(stage, args.tolerance, args.max_error_rate, args.slo_ms)
+            stages.append(stage)
+            print_stage(stage)
+            if stage["saturated"]:
+                saturated_at = rate
+                print(f"  -> 在 {rate}/s 饱和: {'；'.join(stage['saturated'])}")
+                if not args.keep_going:
+                    break
+            elif saturated_at is None:
+                max_sustained = rate
+            await asyncio.sleep(args.cooldown)
+    return {"stages": stages, "max_sustained_per_s": max_sustained, "saturated_at_per_s": saturated_at}
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--url", default=None, help="已启动服务的地址；不指定时在子进程中启动（POSE_BACKEND=fake）")
+    parser.add_argument("--workers", type=int, default=1, help="自动启动服务时的 uvicorn worker 数")
+    parser.add_argument("--fake-latency-ms", type=float, default=30.0, help="自动启动服务时每帧模拟的推理耗时")
+    parser.add_argument("--bcrypt-rounds", type=int, default=None, help="自动启动服务时的 bcrypt 成本（默认沿用配置）")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"场景权重，如 {DEFAULT_MIX}（可选 {', '.join(SCENARIOS)}）")
+    parser.add_argument("--rps", type=parse_rates, default=parse_rates("1,2,4,8,16"), help="逐级的到达率（每秒请求数）")
+    parser.add_argument("--duration", type=float, default=10.0, help="每一级的持续时间（秒）")
+    parser.add_argument("--concurrency", type=int, default=64, help="同时在途的请求上限")
+    parser.add_argument("--cooldown", type=float, default=2.0, help="两级之间的间隔（秒），让队列排空")
+    parser.add_argument("--timeout", type=float, default=120.0, help="单个请求的超时（秒），超时计为错误")
+    parser.add_argument("--users", type=int, default=10, help="预先注册的用户数")
+    parser.add_argument("--video-seconds", type=float, default=1.0, help="上传的合成视频时长")
+    parser.add_argument("--video-size", default="320x240", help="上传的合成视频分辨率")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="实际吞吐允许低于到达率的比例")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="允许的错误率")
+    parser.add_argument("--slo-ms", type=float, default=None, help="p99 延迟上限（毫秒）")
+    parser.add_argument("--keep-going", action="store_true", help="饱和后继续跑完所有级别")
+    parser.add_argument("--poll-interval", type=float, default=0.5, help="轮询 /metrics 的间隔（秒）")
+    parser.add_argument("--seed", type=int, default=0, help="场景选择的随机种子")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="并发压测")
+    add_arguments(parser)
+    parser.add_argument("--output", default=None, help="结果 JSON 路径")
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.video_size.lower().split("x"))
+    server = None
+    server_root = None
+    try:
+        base_url = args.url
+        if base_url is None:
+            port = free_port()
+            server_root = Path(tempfile.mkdtemp(prefix="loadgen_"))
+            server = start_server(port, args.workers, args.fake_latency_ms, args.bcrypt_rounds, server_root)
+            base_url = f"http://127.0.0.1:{port}"
+        print(f"压测 {base_url}  场景 {args.mix}  每级 {args.duration}s  并发上限 {args.concurrency}")
+        with tempfile.TemporaryDirectory(prefix="loadgen_") as tmp:
+            video = synthetic_video(Path(tmp) / "load.mp4", seconds=args.video_seconds, width=width, height=height)
+            results = asyncio.run(load_test(args, base_url, video))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        if server_root is not None:
+            # 自动启动的服务只写入自己的临时目录（数据库、上传与分析文件）
+            shutil.rmtree(server_root, ignore_errors=True)
+
+    if results["saturated_at_per_s"] is None:
+        print(f"所有级别均未饱和（最高 {args.rps[-1]}/s）")
+    else:
+        print(f"可持续到达率: {results['max_sustained_per_s']}/s，饱和于 {results['saturated_at_per_s']}/s")
+    if args.output:
+        write_results(Path(args.output), {"environment": environment(), "options": vars(args),
+                                          "metrics": {"load": results}})
+        print(f"结果已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+基准测试套件：分析引擎分阶段耗时 + API 端点延迟，结果写为 JSON 并与基线对比
+
+- 全部离线运行（合成视频、临时数据库、进程内 ASGI 客户端），只需要 CPU
+- 与基线相比，名称以 _ms 结尾的指标变大、以 _fps / _per_s 结尾的指标变小超过 --tolerance 视为退化，
+  有退化时退出码为 1（便于在 CI 或改动前后手动对比）
+- 基线因机器而异，不入库：在同一台机器上先用 --save-baseline 记录，再在改动后运行对比
+
+用法:
+    python -m benchmarks.run_all --save-baseline
+    python -m benchmarks.run_all --output benchmarks/results/latest.json
+    python -m benchmarks.run_all --skip-api --repeat 3 --tolerance 0.1
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks import bench_api, bench_engine  # noqa: E402
+from benchmarks.common import DEFAULT_BASELINE, compare_to_baseline, environment, write_results  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="基准测试套件")
+    bench_engine.add_arguments(parser)
+    bench_api.add_arguments(parser)
+    parser.add_argument("--skip-engine", action="store_true")
+    parser.add_argument("--skip-api", action="store_true")
+    parser.add_argument("--output", default=None, help="结果 JSON 路径")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE), help="基线 JSON 路径")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果保存为基线（不做对比）")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="允许的相对退化比例")
+    parser.add_argument("--noise-floor-ms", type=float, default=0.5, help="耗时指标绝对变化低于此值时不算退化")
+    args = parser.parse_args()
+
+    metrics = {}
+    # API 先运行：它在导入 app 之前设置临时数据库等环境变量
+    if not args.skip_api:
+        print("API 端点:")
+        metrics["api"] = bench_api.run(args.auth_requests, args.standards_requests, args.infer_requests,
+                                       args.infer_seconds, args.bcrypt_rounds)
+        bench_api.print_results(metrics["api"])
+    if not args.skip_engine:
+        print("分析引擎:")
+        metrics["engine"] = bench_engine.run(args.sizes, args.seconds, args.fps, args.seed, args.clips_dir,
+                                             args.repeat, args.complexity, args.frame_gate)
+        bench_engine.print_results(metrics["engine"])
+
+    results = {"environment": environment(), "options": vars(args), "metrics": metrics}
+    if args.output:
+        write_results(Path(args.output), results)
+        print(f"结果已写入 {args.output}")
+
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        write_results(baseline_path, results)
+        print(f"基线已保存到 {baseline_path}")
+        return
+    if not baseline_path.exists():
+        print(f"没有基线（{baseline_path}），跳过对比；可用 --save-baseline 记录")
+        return
+
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    if baseline.get("environment", {}).get("platform") != results["environment"]["platform"]:
+        print("注意: 基线来自不同的运行环境，对比结果仅供参考")
+    regressions = compare_to_baseline(results, baseline, args.tolerance, args.noise_floor_ms)
+    if not regressions:
+        print(f"与基线相比没有超过 {args.tolerance:.0%} 的退化")
+        return
+    print(f"与基线相比退化超过 {args.tolerance:.0%} 的指标:")
+    for item in regressions:
+        print(f"  {item['metric']}: {item['baseline']:.3f} -> {item['current']:.3f}（差 {item['worse_by']:.1%}）")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+管理命令
+
+用法:
+    python manage.py init-db             # 建表并补齐新增的列与索引（部署时执行一次）
+    python manage.py rebuild-progress    # 从 videos 表重建进度汇总表
+    python manage.py export --format csv --output videos.csv [--action-type X] [--start 2026-01-01]
+    python manage.py download-pose-models [--legacy]  # 下载 PoseLandmarker 模型包（--legacy: lite / heavy 旧模型）
+    python manage.py record-landmarks demo.mp4 landmarks.json  # 录制关键点，供 POSE_BACKEND=fake 回放
+    python manage.py purge-uploads       # 删除过期的断点续传会话及其未完成文件
+"""
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+
+from app.database import engine, init_db, SessionLocal
+from app import models  # noqa: F401  注册表结构
+
+
+def cmd_init_db(args):
+    init_db(engine)
+    print("[OK] 数据库表结构已是最新")
+
+
+def cmd_rebuild_progress(args):
+    from app.services.progress import rebuild_progress
+    init_db(engine)
+    start = time.perf_counter()
+    db = SessionLocal()
+    try:
+        count = rebuild_progress(db, window=args.window)
+    finally:
+        db.close()
+    print(f"[OK] 已重建 {count} 条进度汇总，耗时 {time.perf_counter() - start:.2f}s")
+
+
+def cmd_export(args):
+    from app.services.exporter import ExportFilters, stream_export
+    filters = ExportFilters(
+        user_ids=args.user_id,
+        action_types=args.action_type,
+        start=datetime.fromisoformat(args.start) if args.start else None,
+        end=datetime.fromisoformat(args.end) if args.end else None,
+    )
+    output = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    written = 0
+    try:
+        for data in stream_export(args.format, filters, include_angles=args.include_angles,
+                                  chunk_size=args.chunk_size):
+            output.write(data)
+            written += len(data)
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+    print(f"[OK] 已导出 {written} 字节", file=sys.stderr)
+
+
+def cmd_download_pose_models(args):
+    from app.services.ai_engine import (
+        POSE_MODEL_FILES, create_pose_tracker, download_pose_task_model, pose_task_model_path, _legacy_available
+    )
+    failed = 0
+    for complexity in args.complexity:
+        if args.legacy:
+            # legacy 模型由 MediaPipe 在创建对应复杂度的跟踪器时下载
+            name = POSE_MODEL_FILES[complexity]
+            if _legacy_available(complexity):
+                print(f"[OK] {name} 已存在")
+                continue
+            tracker, actual = create_pose_tracker(complexity)
+            tracker.close()
+            ok = actual == complexity
+        else:
+            name = pose_task_model_path(complexity).name
+            if pose_task_model_path(complexity).exists():
+                print(f"[OK] {name} 已存在")
+                continue
+            try:
+                download_pose_task_model(complexity)
+                ok = True
+            except Exception as e:
+                print(f"[ERROR] {e}", file=sys.stderr)
+                ok = False
+        if ok:
+            print(f"[OK] 已下载 {name}")
+        else:
+            failed += 1
+            print(f"[FAIL] {name} 下载失败", file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+
+def cmd_record_landmarks(args):
+    import cv2
+    from app.core.config import settings
+    from app.services.ai_engine import create_pose_backend
+    if settings.POSE_BACKEND == "fake":
+        print("[ERROR] POSE_BACKEND=fake 时无法录制，请使用真实后端", file=sys.stderr)
+        sys.exit(1)
+    cap = cv2.VideoCapture(args.video)
+    if not cap.isOpened():
+        print(f"[ERROR] 无法打开视频文件: {args.video}", file=sys.stderr)
+        sys.exit(1)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    backend = create_pose_backend(args.model_complexity, running_mode="video")
+    frames = []
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret or (args.max_frames and len(frames) >= args.max_frames):
+                break
+            result = backend.detect(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), int(len(frames) * 1000 / fps))
+            landmarks = result.pose_landmarks
+            frames.append([[round(lm.x, 5), round(lm.y, 5), round(lm.z, 5), round(lm.visibility, 4)]
+                           for lm in landmarks.landmark] if landmarks else None)
+    finally:
+        cap.release()
+        backend.close()
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"source": args.video, "fps": fps, "backend": backend.name,
+                   "model_complexity": backend.model_complexity, "frames": frames}, f)
+    detected = sum(1 for points in frames if points)
+    print(f"[OK] 已录制 {len(frames)} 帧（检测到人体 {detected} 帧）到 {args.output}")
+
+
+def cmd_purge_uploads(args):
+    from app.services.upload_sessions import purge_expired_uploads
+    init_db(engine)
+    db = SessionLocal()
+    try:
+        count = purge_expired_uploads(db)
+    finally:
+        db.close()
+    print(f"[OK] 已清理 {count} 个过期的上传会话")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AIMovement 管理命令")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    p = subparsers.add_parser("init-db", help="建表并补齐新增的列与索引")
+    p.set_defaults(func=cmd_init_db)
+
+    p = subparsers.add_parser("rebuild-progress", help="从 videos 表重建进度汇总表")
+    p.add_argument("--window", type=int, default=None, help="保留最近 N 次分数（默认读取配置）")
+    p.set_defaults(func=cmd_rebuild_progress)
+
+    p = subparsers.add_parser("export", help="流式导出分析历史")
+    p.add_argument("--format", choices=["csv", "ndjson", "parquet"], default="csv")
+    p.add_argument("--output", default="-", help="输出文件，- 表示标准输出")
+    p.add_argument("--user-id", action="append", default=[], help="按用户过滤，可重复")
+    p.add_argument("--action-type", action="append", default=[], help="按动作过滤，可重复")
+    p.add_argument("--start", help="起始时间 (ISO 格式，含)")
+    p.add_argument("--end", help="结束时间 (ISO 格式，不含)")
+    p.add_argument("--include-angles", action="store_true", help="包含逐帧角度数据")
+    p.add_argument("--chunk-size", type=int, default=1000)
+    p.set_defaults(func=cmd_export)
+
+    p = subparsers.add_parser("download-pose-models", help="下载姿态模型（默认 PoseLandmarker 模型包）")
+    p.add_argument("--complexity", type=int, action="append", choices=[0, 1, 2], default=None,
+                   help="只下载指定复杂度，可重复（默认全部）")
+    p.add_argument("--legacy", action="store_true", help="下载 legacy 的 lite / heavy 模型（full 随包附带）")
+    p.set_defaults(func=cmd_download_pose_models)
+
+    p = subparsers.add_parser("record-landmarks", help="录制视频的逐帧关键点（供 FAKE_POSE_LANDMARKS 回放）")
+    p.add_argument("video", help="输入视频")
+    p.add_argument("output", help="输出 JSON 文件")
+    p.add_argument("--model-complexity", dest="model_complexity", type=int, choices=[0, 1, 2], default=1)
+    p.add_argument("--max-frames", type=int, default=0, help="最多录制的帧数，0 表示整段视频")
+    p.set_defaults(func=cmd_record_landmarks)
+
+    p = subparsers.add_parser("purge-uploads", help="删除过期的断点续传会话及其未完成文件")
+    p.set_defaults(func=cmd_purge_uploads)
+
+    args = parser.parse_args()
+    if getattr(args, "complexity", 0) is None:
+        args.complexity = [0, 2] if args.legacy else [0, 1, 2]
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
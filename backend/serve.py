@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+生产环境启动脚本（多 worker 进程；run.py 为开发用，单进程 + 自动重载）
+
+- 主进程绑定端口并预加载应用（路由、标准角度数据、叠加层精灵、模型文件读入页缓存）后 fork 出 worker，
+  各 worker 共享监听 socket。MediaPipe 图创建后带有线程，不能跨 fork 使用，所以在每个 worker 中创建并预热
+- worker 回收：完成的分析任务数达到 --max-jobs（加随机抖动，避免同时回收）或常驻内存超过 --max-rss-mb 时，
+  worker 通知主进程启动替代者，自己停止接收新连接，等进行中的请求与排队的分析完成后退出
+- 信号：SIGTERM / SIGINT 优雅停止（超过 worker_stop_seconds() 后强制结束）；SIGHUP 逐个滚动重启（新 worker 就绪后再停旧的）。
+  预加载时新 worker 由主进程 fork，沿用主进程已导入的代码，更新代码后需配合 --no-preload 使用 SIGHUP，或重启主进程
+- 自动设置 CPU_WORKERS（线程预算）与 SHUTDOWN_DRAIN_SECONDS；多 worker 时设置 METRICS_DIR（指标汇总），
+  启动时清空其中旧的指标快照
+
+参数也可以用环境变量设置（命令行优先）：WEB_CONCURRENCY、SERVE_BIND、SERVE_MAX_JOBS、SERVE_MAX_RSS_MB、
+SERVE_GRACEFUL_TIMEOUT、SERVE_KEEP_ALIVE
+
+用法:
+    python serve.py --workers 4 --bind 0.0.0.0:8000
+    WEB_CONCURRENCY=4 SERVE_MAX_JOBS=500 SERVE_MAX_RSS_MB=1500 python serve.py
+    kill -HUP <主进程 pid>    # 滚动重启（加载新代码需 --no-preload）
+"""
+import argparse
+import os
+import random
+import resource
+import select
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="AIMovement 生产环境启动")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1))),
+                        help="worker 进程数（默认 CPU 核数）")
+    parser.add_argument("--bind", default=os.getenv("SERVE_BIND", "0.0.0.0:8000"),
+                        help="监听地址 host:port 或 unix:/path/to.sock")
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--max-jobs", type=int, default=int(os.getenv("SERVE_MAX_JOBS", "0")),
+                        help="worker 完成多少个分析任务后回收，0 表示不按任务数回收")
+    parser.add_argument("--max-jobs-jitter", type=int, default=None, help="回收任务数的随机抖动（默认 max-jobs 的 10%%）")
+    parser.add_argument("--max-rss-mb", type=float, default=float(os.getenv("SERVE_MAX_RSS_MB", "0")),
+                        help="worker 常驻内存上限（MB），超过后回收，0 表示不检查")
+    parser.add_argument("--graceful-timeout", type=float, default=float(os.getenv("SERVE_GRACEFUL_TIMEOUT", "300")),
+                        help="优雅停止时等待进行中请求与排队分析的最长秒数")
+    parser.add_argument("--keep-alive", type=int, default=int(os.getenv("SERVE_KEEP_ALIVE", "5")),
+                        help="HTTP keep-alive 超时（秒）")
+    parser.add_argument("--check-interval", type=float, default=2.0, help="worker 检查回收条件的间隔（秒）")
+    parser.add_argument("--no-preload", action="store_true", help="不在主进程中预加载应用（每个 worker 各自导入）")
+    parser.add_argument("--no-warmup", action="store_true", help="worker 启动时不预热姿态模型")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    args.workers = max(1, args.workers)
+    if args.max_jobs_jitter is None:
+        args.max_jobs_jitter = args.max_jobs // 10
+    return args
+
+
+def log(message: str) -> None:
+    print(f"[serve {os.getpid()}] {message}", flush=True)
+
+
+def configure_environment(args) -> None:
+    """必须在导入 app 之前调用（配置在导入时读取）"""
+    os.environ["CPU_WORKERS"] = str(args.workers)
+    os.environ["WORKER_INDEX"] = "0"  # 主进程按 0 号槽位应用线程预算，不占用自动分配的槽位
+    os.environ.setdefault("SHUTDOWN_DRAIN_SECONDS", str(args.graceful_timeout))
+    # 表结构由主进程在 fork 前初始化一次（init_database），worker 导入应用时不再执行 DDL
+    os.environ["DB_INIT_ON_STARTUP"] = "false"
+    if args.workers > 1 and not os.getenv("METRICS_DIR"):
+        os.environ["METRICS_DIR"] = str(Path(tempfile.gettempdir()) / f"aimovement-metrics-{args.bind.replace('/', '_')}")
+    metrics_dir = os.getenv("METRICS_DIR")
+    if metrics_dir:
+        # 新实例不继承上次运行的计数
+        Path(metrics_dir).mkdir(parents=True, exist_ok=True)
+        for path in Path(metrics_dir).glob("*.json"):
+            path.unlink(missing_ok=True)
+
+
+def worker_stop_seconds(args) -> float:
+    """worker 优雅停止的最长耗时，超过后主进程强制结束
+
+    两个阶段依次进行：uvicorn 先等待进行中的连接（最多 --graceful-timeout），之后 lifespan 才排空调度器
+    （最多 SHUTDOWN_DRAIN_SECONDS，再等正在执行的分析最多 30s），最后写完剩余结果（最多 30s）
+    """
+    drain = float(os.getenv("SHUTDOWN_DRAIN_SECONDS") or 0)
+    return args.graceful_timeout + drain + 30 + 30 + 10
+
+
+def bind_socket(bind: str, backlog: int) -> socket.socket:
+    if bind.startswith("unix:"):
+        path = bind[len("unix:"):]
+        if os.path.exists(path):
+            os.unlink(path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(path)
+    else:
+        host, _, port = bind.rpartition(":")
+        host = host.strip("[]") or "0.0.0.0"
+        family = socket.AF_INET6 if ":" in host else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((host, int(port)))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def init_database() -> None:
+    """初始化表结构（建表、补齐列与索引）一次，避免多个 worker 同时执行 DDL
+
+    在子进程中执行 manage.py init-db：主进程不导入数据库模块，--no-preload 时 worker 仍能加载更新后的模型定义
+    """
+    subprocess.run([sys.executable, str(BACKEND_DIR / "manage.py"), "init-db"], check=True)
+
+
+def preload() -> None:
+    """fork 之前导入应用（子进程写时复制共享），并把姿态模型文件读入页缓存；不创建 MediaPipe 图"""
+    start = time.perf_counter()
+    from app.database import engine
+    from app.main import app  # noqa: F401
+    from app.services import ai_engine
+
+    paths = [ai_engine.pose_task_model_path(c) for c in ai_engine.POSE_TASK_MODEL_NAMES]
+    legacy_dir = Path(ai_engine.mp.__file__).parent / "modules" / "pose_landmark"
+    paths += [legacy_dir / name for name in ai_engine.POSE_MODEL_FILES.values()]
+    cached = 0
+    for path in paths:
+        if path.is_file():
+            cached += len(path.read_bytes())
+    engine.dispose()  # 不把连接池里的数据库连接带进子进程
+    log(f"已预加载应用与模型文件（{cached / 1e6:.1f}MB），耗时 {time.perf_counter() - start:.2f}s")
+
+
+def current_rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError):
+        # 非 Linux：只能取峰值（macOS 为字节，Linux 为 KB）
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+
+def run_worker(index: int, sock: socket.socket, notify_fd: int, args) -> None:
+    """worker 进程：应用本槽位的线程预算，预热模型，运行 uvicorn，满足回收条件时通知主进程并优雅退出"""
+    import uvicorn
+
+    from app.core import resources
+    resources.configure_process(worker_index=index)
+    from app.main import app
+    from app.services.scheduler import analysis_scheduler
+
+    if not args.no_warmup:
+        from app.services.ai_engine import create_pose_backend
+        create_pose_backend(1, running_mode="video").close()
+
+    config = uvicorn.Config(app, log_level=args.log_level, timeout_keep_alive=args.keep_alive,
+                            timeout_graceful_shutdown=int(args.graceful_timeout), lifespan="on")
+    server = uvicorn.Server(config)
+    max_jobs = args.max_jobs + random.randint(0, args.max_jobs_jitter) if args.max_jobs else 0
+
+    def notify(message: str) -> None:
+        try:
+            os.write(notify_fd, f"{message}\n".encode())
+        except OSError:
+            pass
+
+    def monitor() -> None:
+        while not server.started and not server.should_exit:
+            time.sleep(0.1)
+        notify("ready")
+        while not server.should_exit:
+            time.sleep(args.check_interval)
+            jobs = analysis_scheduler.finished_jobs()
+            rss = current_rss_mb()
+            reason = None
+            if max_jobs and jobs >= max_jobs:
+                reason = f"已完成 {jobs} 个分析任务"
+            elif args.max_rss_mb and rss > args.max_rss_mb:
+                reason = f"常驻内存 {rss:.0f}MB 超过 {args.max_rss_mb:.0f}MB"
+            if reason:
+                log(f"worker {index} 回收: {reason}，等待进行中的请求完成后退出")
+                notify("recycle")
+                server.should_exit = True
+
+    threading.Thread(target=monitor, name="serve-monitor", daemon=True).start()
+    server.run(sockets=[sock])
+
+
+class Worker:
+    def __init__(self, pid: int, index: int, fd: int, replaces=None):
+        self.pid = pid
+        self.index = index
+        self.fd = fd
+        self.replaces = replaces  # 滚动重启时被替换的旧 worker pid
+        self.started = time.monotonic()
+        self.ready = False
+        self.retiring = False
+        self.buffer = b""
+
+
+class Arbiter:
+    """主进程：维持 worker 数量，处理回收、滚动重启与停止"""
+
+    def __init__(self, args, sock: socket.socket):
+        self.args = args
+        self.sock = sock
+        self.workers = {}
+        self.stopping = False
+        self.restart_queue = []
+
+    def spawn(self, index: int, replaces=None) -> None:
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            for worker in self.workers.values():
+                os.close(worker.fd)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGHUP, signal.SIG_IGN)  # 滚动重启由主进程处理
+            code = 0
+            try:
+                run_worker(index, self.sock, write_fd, self.args)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+        os.close(write_fd)
+        self.workers[pid] = Worker(pid, index, read_fd, replaces)
+        log(f"worker {index} 已启动（pid {pid}）")
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_reload)
+        for index in range(self.args.workers):
+            self.spawn(index)
+        while not self.stopping:
+            self._read_messages(timeout=0.5)
+            self._reap()
+            self._continue_restart()
+        self._shutdown()
+
+    def _on_stop(self, signum, frame) -> None:
+        self.stopping = True
+
+    def _on_reload(self, signum, frame) -> None:
+        pending = set(self.restart_queue)
+        self.restart_queue += [pid for pid, w in self.workers.items() if not w.retiring and pid not in pending]
+        log(f"滚动重启 {len(self.restart_queue)} 个 worker")
+        if self.args.no_preload:
+            # 新代码可能新增了列或索引，在启动新 worker 之前补齐
+            try:
+                init_database()
+            except (OSError, subprocess.CalledProcessError) as e:
+                log(f"警告: 数据库表结构初始化失败: {e}")
+        else:
+            log("警告: 应用已在主进程预加载，新 worker 沿用主进程导入的代码，不会加载更新；"
+                "需要加载新代码时使用 --no-preload 启动，或重启主进程")
+
+    def _read_messages(self, timeout: float) -> None:
+        by_fd = {worker.fd: worker for worker in self.workers.values()}
+        try:
+            readable, _, _ = select.select(list(by_fd), [], [], timeout)
+        except InterruptedError:
+            return
+        for fd in readable:
+            worker = by_fd[fd]
+            try:
+                data = os.read(fd, 1024)
+            except OSError:
+                data = b""
+            worker.buffer += data
+            while b"\n" in worker.buffer:
+                line, worker.buffer = worker.buffer.split(b"\n", 1)
+                self._handle(worker, line.decode())
+
+    def _handle(self, worker: Worker, message: str) -> None:
+        if message == "ready":
+            worker.ready = True
+            log(f"worker {worker.index}（pid {worker.pid}）就绪，启动耗时 {time.monotonic() - worker.started:.1f}s")
+            old = self.workers.get(worker.replaces)
+            if old is not None:
+                os.kill(old.pid, signal.SIGTERM)
+        elif message == "recycle" and not worker.retiring and not self.stopping:
+            worker.retiring = True
+            self.spawn(worker.index)
+
+    def _reap(self) -> None:
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            worker = self.workers.pop(pid, None)
+            if worker is None:
+                continue
+            os.close(worker.fd)
+            code = os.waitstatus_to_exitcode(status)
+            if worker.retiring or self.stopping:
+                log(f"worker {worker.index}（pid {pid}）已退出")
+                continue
+            log(f"警告: worker {worker.index}（pid {pid}）意外退出（{code}），重新启动")
+            if time.monotonic() - worker.started < 5:
+                time.sleep(1)  # 启动即崩溃时避免空转
+            # 滚动重启的替代者就绪前崩溃：重启的 worker 继续负责替换旧 worker，旧的不会被遗留
+            self.spawn(worker.index, replaces=None if worker.ready else worker.replaces)
+
+    def _continue_restart(self) -> None:
+        """滚动重启：同一时刻只替换一个 worker，新 worker 就绪后旧的才停止接收"""
+        if any(w.replaces is not None and w.replaces in self.workers for w in self.workers.values()):
+            return
+        while self.restart_queue:
+            old = self.workers.get(self.restart_queue.pop(0))
+            if old is None or old.retiring:
+                continue
+            old.retiring = True
+            self.spawn(old.index, replaces=old.pid)
+            return
+
+    def _shutdown(self) -> None:
+        stop_seconds = worker_stop_seconds(self.args)
+        log(f"停止 {len(self.workers)} 个 worker（最多等待 {stop_seconds:.0f}s）")
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + stop_seconds
+        while self.workers and time.monotonic() < deadline:
+            self._read_messages(timeout=0.2)
+            self._reap()
+        for pid in list(self.workers):
+            log(f"警告: worker（pid {pid}）未在超时内退出，强制结束")
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        self.sock.close()
+
+
+def main():
+    args = parse_args()
+    os.chdir(BACKEND_DIR)
+    sys.path.insert(0, str(BACKEND_DIR))
+    configure_environment(args)
+    sock = bind_socket(args.bind, args.backlog)
+    log(f"监听 {args.bind}，{args.workers} 个 worker")
+    init_database()
+    if not args.no_preload:
+        preload()
+    Arbiter(args, sock).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+# 分析任务队列的单元测试：SQL 后端用临时 SQLite 数据库，Redis 后端用 fakeredis
+import threading
+import time
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models import AnalysisJob
+from app.services.job_queue import RedisJobQueue, SqlJobQueue
+
+LEASE_SECONDS = 0.2
+
+
+@pytest.fixture(params=["sql", "redis"])
+def make_queue(request, tmp_path):
+    """返回按参数创建队列的工厂，同一个测试内创建的队列共享存储（模拟多个 worker）"""
+    if request.param == "sql":
+        engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}", connect_args={"check_same_thread": False})
+        AnalysisJob.__table__.create(engine)
+        session_factory = sessionmaker(bind=engine)
+
+        def make(**options):
+            return SqlJobQueue(session_factory, **options)
+
+        yield make
+        engine.dispose()
+    else:
+        fakeredis = pytest.importorskip("fakeredis")
+        client = fakeredis.FakeRedis(decode_responses=True)
+
+        def make(**options):
+            return RedisJobQueue(client, prefix="test:jobs", **options)
+
+        yield make
+
+
+def expire_leases():
+    time.sleep(LEASE_SECONDS * 1.5)
+
+
+def test_claim_is_exclusive(make_queue):
+    queue = make_queue(retry_delay=0)
+    job_ids = {queue.enqueue({"n": n}) for n in range(3)}
+    claimed = []
+    lock = threading.Lock()
+
+    def worker(index):
+        worker_queue = make_queue(retry_delay=0)
+        while True:
+            job = worker_queue.claim(f"worker-{index}")
+            if job is None:
+                return
+            with lock:
+                claimed.append(job.job_id)
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(claimed) == sorted(job_ids)
+    assert queue.claim("late") is None
+
+
+def test_interactive_jobs_are_claimed_first(make_queue):
+    queue = make_queue()
+    batch = queue.enqueue({"n": 1}, job_class="batch")
+    interactive = queue.enqueue({"n": 2}, job_class="interactive")
+    assert queue.claim("a").job_id == interactive
+    assert queue.claim("a").job_id == batch
+
+
+def test_expired_lease_is_reclaimed_and_old_owner_rejected(make_queue):
+    queue = make_queue(lease_seconds=LEASE_SECONDS)
+    job_id = queue.enqueue({"n": 1})
+    first = queue.claim("a")
+    assert first.attempts == 1
+    assert queue.heartbeat(job_id, "a") is True
+    assert queue.claim("b") is None
+
+    expire_leases()
+    second = queue.claim("b")
+    assert second.job_id == job_id
+    assert second.attempts == 2
+    # 租约已被接手：原 worker 的续期与结果都被拒绝
+    assert queue.heartbeat(job_id, "a") is False
+    assert queue.complete(job_id, "a", {"score": 1}) is False
+    assert queue.heartbeat(job_id, "b") is True
+    assert queue.complete(job_id, "b", {"score": 2}) is True
+    job = queue.get(job_id)
+    assert job["status"] == "done"
+    assert job["result"] == {"score": 2}
+
+
+def test_failures_retry_until_max_attempts(make_queue):
+    queue = make_queue(max_attempts=2, retry_delay=0)
+    job_id = queue.enqueue({"n": 1})
+    job = queue.claim("a")
+    assert queue.fail(job_id, "a", "boom", job.attempts) is True
+    assert queue.get(job_id)["status"] == "queued"
+
+    job = queue.claim("a")
+    assert job.attempts == 2
+    assert queue.fail(job_id, "a", "boom again", job.attempts) is True
+    job = queue.get(job_id)
+    assert job["status"] == "failed"
+    assert job["error"] == "boom again"
+    assert queue.claim("a") is None
+
+
+def test_expired_lease_after_max_attempts_is_failed(make_queue):
+    queue = make_queue(lease_seconds=LEASE_SECONDS, max_attempts=1)
+    job_id = queue.enqueue({"n": 1})
+    assert queue.claim("a").attempts == 1
+    expire_leases()
+    assert queue.claim("b") is None
+    assert queue.get(job_id)["status"] == "failed"
+    assert queue.abandoned == 1
+
+
+def test_release_does_not_consume_an_attempt(make_queue):
+    queue = make_queue(max_attempts=1)
+    job_id = queue.enqueue({"n": 1})
+    assert queue.claim("a").attempts == 1
+    assert queue.release(job_id, "a") is True
+    job = queue.get(job_id)
+    assert job["status"] == "queued"
+    assert job["attempts"] == 0
+    # 只允许领取一次的任务归还后仍可被领取
+    assert queue.claim("b").attempts == 1
+    assert queue.release(job_id, "a") is False
+
+
+def test_stats_count_jobs_by_status(make_queue):
+    queue = make_queue(max_attempts=1)
+    done, failed, running = (queue.enqueue({"n": n}) for n in range(3))
+    queue.enqueue({"n": 3})
+    for job_id in (done, failed, running):
+        assert queue.claim("a").job_id == job_id
+    queue.complete(done, "a", {})
+    queue.fail(failed, "a", "boom", 1)
+    assert queue.stats()["jobs"] == {"queued": 1, "running": 1, "done": 1, "failed": 1}
+
+
+def test_rerun_job_updates_the_same_video(tmp_path, monkeypatch):
+    from app.database import Base
+    from app.models import PoseProgress, User, Video
+    from app.services import analysis, job_queue
+    from app.services.result_writer import ResultWriter
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'rerun.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine)
+    db = session_factory()
+    db.add(User(user_id="user-1", username="tester", password_hash="x"))
+    db.commit()
+    db.close()
+
+    queue = SqlJobQueue(session_factory, lease_seconds=LEASE_SECONDS)
+    monkeypatch.setattr(job_queue, "get_job_queue", lambda: queue)
+    monkeypatch.setattr(analysis, "result_writer", ResultWriter(session_factory, enabled=False))
+    monkeypatch.setattr(analysis, "choose_quality", lambda *args, **kwargs: {})
+    monkeypatch.setattr(analysis, "analyze_upload", lambda *args, **kwargs: {"score": 80.0, "suggestions": []})
+
+    job_id = analysis.enqueue_analysis(tmp_path / "a.mp4", "Tree_Pose", "file-1", "user-1")
+    # 第一次执行写入了结果，但没来得及标记完成，租约过期后被重新领取
+    job = queue.claim("a")
+    first = analysis.run_analysis_job(job.payload, job.user_id)
+    expire_leases()
+    job = queue.claim("b")
+    assert job.job_id == job_id
+    second = analysis.run_analysis_job(job.payload, job.user_id)
+    assert queue.complete(job_id, "b", second) is True
+
+    assert first["video_id"] == second["video_id"] is not None
+    db = session_factory()
+    assert db.query(Video).count() == 1
+    progress = db.get(PoseProgress, ("user-1", "Tree_Pose"))
+    assert (progress.count, progress.score_sum) == (1, 80.0)
+    db.close()
+    engine.dispose()
@@ -0,0 +1,79 @@
+# 进度汇总的单元测试：结果写入时的增量更新与从 videos 表重建
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models import PoseProgress, User, Video
+from app.services.progress import rebuild_progress
+from app.services.result_writer import ResultWriter
+
+USER_ID = "user-1"
+ACTION = "Tree_Pose"
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'progress.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    db.add(User(user_id=USER_ID, username="tester", password_hash="x"))
+    db.commit()
+    db.close()
+    yield factory
+    engine.dispose()
+
+
+def result(score, **values):
+    return {"user_id": USER_ID, "action_type": ACTION, "file_path": "a.mp4", "score": score, **values}
+
+
+def progress(factory):
+    db = factory()
+    try:
+        row = db.get(PoseProgress, (USER_ID, ACTION))
+        return row.count, row.score_sum, row.score_min, row.score_max, row.recent_scores
+    finally:
+        db.close()
+
+
+def test_rewriting_a_video_replaces_its_score(session_factory):
+    writer = ResultWriter(session_factory, enabled=False)
+    writer.write(result(70.0))
+    video_id = writer.write(result(60.0))
+    writer.write(result(80.0, video_id=video_id))
+    writer.write(result(80.0, video_id=video_id))
+
+    db = session_factory()
+    assert db.query(Video).count() == 2
+    db.close()
+    assert progress(session_factory) == (2, 150.0, 70.0, 80.0, [70.0, 80.0])
+
+
+def test_scoring_an_unscored_video_counts_once(session_factory):
+    writer = ResultWriter(session_factory, enabled=False)
+    video_id = writer.write(result(None))
+    writer.write(result(75.0, video_id=video_id))
+    assert progress(session_factory) == (1, 75.0, 75.0, 75.0, [75.0])
+
+
+def test_rebuild_progress_matches_videos(session_factory):
+    start = datetime(2026, 1, 1)
+    db = session_factory()
+    for index, score in enumerate([50.0, 90.0, 70.0, None]):
+        db.add(Video(user_id=USER_ID, action_type=ACTION, file_path="a.mp4", score=score,
+                     created_at=start + timedelta(days=index)))
+    db.add(PoseProgress(user_id=USER_ID, action_type="stale", count=9, score_sum=1.0, recent_scores=[]))
+    db.commit()
+
+    assert rebuild_progress(db, window=2) == 1
+    db.close()
+    assert progress(session_factory) == (3, 210.0, 50.0, 90.0, [90.0, 70.0])
+    db = session_factory()
+    assert db.get(PoseProgress, (USER_ID, "stale")) is None
+    row = db.get(PoseProgress, (USER_ID, ACTION))
+    assert row.last_practiced_at == start + timedelta(days=2)
+    db.close()
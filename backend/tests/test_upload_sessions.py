@@ -0,0 +1,56 @@
+# 断点续传会话过期清理的单元测试
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.database import Base
+from app.models import UploadSession, User
+from app.services.upload_sessions import active_session_count, purge_expired_uploads
+
+NOW = datetime(2026, 6, 1, 12, 0)
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_PARTIAL_DIR", tmp_path)
+    monkeypatch.setattr(settings, "UPLOAD_SESSION_TTL_HOURS", 24)
+    engine = create_engine(f"sqlite:///{tmp_path / 'uploads.db'}")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add(User(user_id="user-1", username="tester", password_hash="x"))
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def add_session(db, upload_id, status="uploading", expires_at=None, updated_at=NOW):
+    db.add(UploadSession(upload_id=upload_id, user_id="user-1", filename="a.mp4", file_ext=".mp4",
+                         declared_size=10, received_bytes=0, status=status, expires_at=expires_at,
+                         updated_at=updated_at))
+    db.commit()
+    part = settings.UPLOAD_PARTIAL_DIR / f"{upload_id}.mp4.part"
+    part.write_bytes(b"x")
+    return part
+
+
+def test_purge_removes_only_expired_unfinished_sessions(db):
+    expired = add_session(db, "expired", expires_at=NOW - timedelta(minutes=1))
+    chunk = settings.UPLOAD_PARTIAL_DIR / "expired.abc.chunk"
+    chunk.write_bytes(b"x")
+    stuck = add_session(db, "stuck", status="finalizing", expires_at=NOW - timedelta(minutes=1))
+    legacy = add_session(db, "legacy", updated_at=NOW - timedelta(hours=25))
+    fresh = add_session(db, "fresh", expires_at=NOW + timedelta(hours=1))
+    recent_legacy = add_session(db, "recent-legacy", updated_at=NOW - timedelta(hours=1))
+    completed = add_session(db, "completed", status="completed", expires_at=NOW - timedelta(days=1))
+
+    assert active_session_count(db, "user-1", now=NOW) == 2
+    assert purge_expired_uploads(db, now=NOW, batch_size=2) == 3
+    remaining = {upload_id for (upload_id,) in db.query(UploadSession.upload_id)}
+    assert remaining == {"fresh", "recent-legacy", "completed"}
+    assert not expired.exists() and not chunk.exists() and not stuck.exists() and not legacy.exists()
+    assert fresh.exists() and recent_legacy.exists() and completed.exists()
+    assert purge_expired_uploads(db, now=NOW) == 0
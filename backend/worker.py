@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+独立的分析 worker：从持久化任务队列（JOB_QUEUE_BACKEND，默认 DATABASE_URL 的 analysis_jobs 表）领取分析任务
+
+API 进程设置 JOB_QUEUE_ENABLED=true 后，后台分析（/infer/async、上传完成后的分析）只写入队列，
+由任意多个 worker（可以在不同机器上）领取执行，分析能力与 API 分开扩容。
+worker 需要与 API 使用同一个数据库 / Redis，并能以相同路径访问 uploads 与 outputs 目录（共享存储）。
+
+- 任务按租约领取，心跳续期；worker 崩溃或失联后租约到期，任务由其他 worker 重新领取
+- 分析结果同步写入数据库后才标记任务完成（不经过后写队列，worker 退出不会丢结果）
+- SIGTERM / SIGINT：不再领取新任务，等待进行中的分析完成；超过 --graceful-timeout 后取消并归还队列
+
+参数也可以用环境变量设置（命令行优先）：JOB_WORKER_CONCURRENCY（默认 ANALYSIS_WORKERS）、WORKER_GRACEFUL_TIMEOUT
+
+用法:
+    JOB_QUEUE_ENABLED=true python worker.py
+    python worker.py --concurrency 2 --graceful-timeout 600
+    JOB_QUEUE_BACKEND=redis JOB_QUEUE_REDIS_URL=redis://queue:6379/0 python worker.py
+"""
+import argparse
+import os
+import signal
+import time
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="AIMovement 分析 worker")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("JOB_WORKER_CONCURRENCY", "0")),
+                        help="同时执行的分析任务数（默认 ANALYSIS_WORKERS）")
+    parser.add_argument("--graceful-timeout", type=float, default=float(os.getenv("WORKER_GRACEFUL_TIMEOUT", "300")),
+                        help="停止时等待进行中分析的最长秒数，之后取消并归还队列")
+    parser.add_argument("--no-warmup", action="store_true", help="启动时不预热姿态模型")
+    return parser.parse_args()
+
+
+def log(message: str) -> None:
+    print(f"[worker {os.getpid()}] {message}", flush=True)
+
+
+def main():
+    args = parse_args()
+
+    # 导入 app 时按配置应用线程预算（app/__init__.py）
+    from app import models  # noqa: F401  注册表结构
+    from app.core.config import settings
+    from app.core.metrics import metrics_exporter
+    from app.database import engine, init_db
+    from app.services.job_queue import get_job_queue
+    from app.services.job_worker import AnalysisWorker
+
+    if settings.DB_INIT_ON_STARTUP:
+        init_db(engine)
+    queue = get_job_queue()
+    if not args.no_warmup:
+        from app.services.ai_engine import create_pose_backend
+        start = time.perf_counter()
+        create_pose_backend(1).close()
+        log(f"姿态模型已预热，耗时 {time.perf_counter() - start:.2f}s")
+
+    worker = AnalysisWorker(queue, concurrency=args.concurrency or settings.ANALYSIS_WORKERS,
+                            poll_interval=settings.JOB_POLL_INTERVAL)
+
+    def handle_stop(signum, frame):
+        log("收到停止信号，等待进行中的分析完成")
+        worker.request_stop()
+
+    signal.signal(signal.SIGTERM, handle_stop)
+    signal.signal(signal.SIGINT, handle_stop)
+
+    metrics_exporter.start()
+    worker.start()
+    log(f"已启动：{worker.owner}，队列 {queue.backend}，并发 {worker.concurrency}")
+    worker.wait()
+    worker.stop(timeout=args.graceful_timeout)
+    metrics_exporter.stop()
+    stats = worker.stats()
+    log(f"已停止：完成 {stats['completed']}，失败 {stats['failed']}，"
+        f"租约丢失 {stats['lost']}，归还 {stats['released']}")
+
+
+if __name__ == "__main__":
+    main()